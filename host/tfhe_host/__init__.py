@@ -0,0 +1,8 @@
+"""
+Python host library for the tfhe-PU on the VCU128.
+
+Talks to the card through the Xilinx XDMA driver (driver/dma_ip_drivers) and
+replaces the one-shot tools next to it (control, dma_test.sh). Every module
+also runs against a local stand-in of the card, so the host stack can be
+exercised without an FPGA.
+"""
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+PBS completion: wait for DONE in slv_reg0 without re-running control.
+
+Completion.wait_done(timeout) and its awaitable wait_done_async(timeout)
+return as soon as the engine has set DONE, then clear DONE so that the next
+START begins from a clean handshake. Two ways to notice it:
+  poll   - adaptive spin-then-backoff over the mapped BAR (tfhe_host.control).
+           The duration of the last PBSs is tracked; the waiter sleeps until
+           shortly before the expected end, spins for --spin seconds and then
+           backs off exponentially up to --max-sleep, so short PBSs are seen
+           within a few register reads and long ones cost little CPU.
+  events - the XDMA user interrupt event file /dev/xdma0_events_N, for
+           bitstreams that wire the PBS done line to usr_irq_req. The waiter
+           blocks in poll() and confirms DONE with one register read.
+           The stand-in uses an eventfd that the simulated engine signals.
+Every wait records its wakeup latency (DONE visible to the host noticing it;
+exact on the stand-in, bounded by the last read that missed it on hardware)
+and its CPU cost (thread CPU time spent waiting).
+
+Usage:
+  python3 -m tfhe_host.completion --local --pbs-time 1e-3 --runs 200
+  python3 -m tfhe_host.completion --local --events --runs 200
+  sudo python3 -m tfhe_host.completion --device /dev/xdma0_user --runs 100
+  sudo python3 -m tfhe_host.completion --device /dev/xdma0_user --events /dev/xdma0_events_0
+"""
+
+import argparse
+import asyncio
+import os
+import select
+import time
+from collections import deque
+from typing import Callable, Dict, NamedTuple, Optional
+
+import numpy as np
+
+from . import trace
+from .control import REG_CONTROL, Controller, SimulatedRegisters
+
+DONE = 0b100
+
+
+class WaitStats(NamedTuple):
+    via: str             # "poll" or "events"
+    wait_s: float        # from the start of the wait (or the START write) to DONE seen
+    wakeup_s: float      # from DONE set to DONE seen
+    cpu_s: float         # thread CPU time spent in the wait
+    reads: int           # register reads of slv_reg0
+
+
+class EventSource:
+    """An XDMA events file (4-byte reads) or the eventfd of the stand-in (8-byte reads)."""
+
+    def __init__(self, fd: int, read_size: int, owned: bool):
+        self.fd = fd
+        self.read_size = read_size
+        self._owned = owned
+
+    @classmethod
+    def open(cls, path: str) -> "EventSource":
+        return cls(os.open(path, os.O_RDONLY), 4, True)
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+        if not poller.poll(None if timeout is None else max(0, int(timeout * 1000))):
+            return False
+        self.consume()
+        return True
+
+    def consume(self):
+        try:
+            os.read(self.fd, self.read_size)
+        except BlockingIOError:
+            pass
+
+    def drain(self):
+        """Drops events of earlier PBSs that were noticed by polling."""
+        while self.wait(0):
+            pass
+
+    def close(self):
+        if self._owned:
+            os.close(self.fd)
+
+
+class Completion:
+    def __init__(self, ctrl: Controller, events: Optional[EventSource] = None, spin: float = 50e-6,
+                 max_sleep: float = 1e-3, min_sleep: float = 10e-6, clear: bool = True, history: int = 1 << 16):
+        self.ctrl = ctrl
+        self.events = events
+        self.spin = spin
+        self.max_sleep = max_sleep
+        self.min_sleep = min_sleep
+        self.clear = clear
+        self.expected: Optional[float] = None    # moving average of the PBS duration
+        self.history = deque(maxlen=history)
+        self.cycles: Optional[Callable[[], int]] = None   # 32-bit device cycle counter, see tfhe_host.trace
+        self._started: Optional[float] = None
+        self._started_ns = 0
+        self._start_cycles: Optional[int] = None
+
+    @classmethod
+    def local(cls, pbs_time: float = 1e-3, events: bool = False, **kwargs) -> "Completion":
+        ctrl = Controller.local(pbs_time, record=False)
+        source = EventSource(ctrl.regs.open_events(), 8, False) if events else None
+        return cls(ctrl, source, **kwargs)
+
+    def close(self):
+        if self.events is not None:
+            self.events.close()
+        self.ctrl.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- handshake ----------
+    def start(self):
+        """Clears DONE, sets START and remembers the start time for the duration estimate."""
+        if self.events is not None:
+            self.events.drain()
+        self._start_cycles = self.cycles() if self.cycles is not None else None
+        self._started_ns = time.perf_counter_ns()
+        self._started = self._started_ns / 1e9
+        self.ctrl.start()
+
+    def _done(self) -> bool:
+        return bool(self.ctrl.read(REG_CONTROL) & DONE)
+
+    def _finish(self, via: str, begin: float, seen: float, last_miss: float, cpu: float, reads: int) -> WaitStats:
+        tracer = trace.ACTIVE
+        if tracer is not None and self._started is not None:
+            cycles = -1
+            if self._start_cycles is not None:
+                cycles = (self.cycles() - self._start_cycles) % (1 << 32)
+            tracer.record("pbs", self._started_ns, int(seen * 1e9), device=trace.device_of(self.ctrl.regs.name),
+                          queue="engine", cycles=cycles)
+        if self.clear:
+            self.ctrl.set("DONE", 0)
+        regs = self.ctrl.regs
+        done_time = regs.done_time if isinstance(regs, SimulatedRegisters) else None
+        wakeup = seen - (done_time if done_time is not None else last_miss)
+        if self._started is not None:
+            if reads > 1 or self.expected is None:
+                # DONE was set between the last read that missed it and seen
+                duration = (seen if reads == 1 else (last_miss + seen) / 2) - self._started
+                self.expected = duration if self.expected is None else 0.8 * self.expected + 0.2 * duration
+            else:
+                self.expected *= 0.9    # DONE was already set at the first read: woke up too late
+            begin, self._started = self._started, None
+        stats = WaitStats(via, seen - begin, max(wakeup, 0.0), time.thread_time() - cpu, reads)
+        self.history.append(stats)
+        return stats
+
+    def _sleep_until_expected(self, deadline: float):
+        if self._started is None or self.expected is None:
+            return
+        wake = min(self._started + 0.9 * self.expected - self.spin, deadline)
+        if wake > time.perf_counter():
+            time.sleep(wake - time.perf_counter())
+
+    # ---------- waiting ----------
+    def wait_done(self, timeout: Optional[float] = None) -> WaitStats:
+        """Blocks until DONE is set; raises TimeoutError after timeout seconds."""
+        begin = time.perf_counter()
+        cpu = time.thread_time()
+        deadline = float("inf") if timeout is None else begin + timeout
+        reads = 0
+        last_miss = begin
+        if self.events is not None:
+            while True:
+                reads += 1
+                if self._done():
+                    seen = time.perf_counter()
+                    return self._finish("events", begin, seen, last_miss, cpu, reads)
+                last_miss = time.perf_counter()
+                remaining = None if timeout is None else deadline - last_miss
+                if remaining is not None and remaining <= 0 or not self.events.wait(remaining):
+                    raise TimeoutError(f"no PBS completion within {timeout} s")
+
+        self._sleep_until_expected(deadline)
+        spin_until = time.perf_counter() + self.spin
+        sleep = self.min_sleep
+        while True:
+            reads += 1
+            if self._done():
+                seen = time.perf_counter()
+                return self._finish("poll", begin, seen, last_miss, cpu, reads)
+            last_miss = time.perf_counter()
+            if last_miss >= deadline:
+                raise TimeoutError(f"no PBS completion within {timeout} s")
+            if last_miss >= spin_until:
+                time.sleep(min(sleep, deadline - last_miss))
+                sleep = min(2 * sleep, self.max_sleep)
+
+    async def wait_done_async(self, timeout: Optional[float] = None) -> WaitStats:
+        """wait_done() for asyncio: the event loop keeps running while the PBS does."""
+        loop = asyncio.get_running_loop()
+        if self.events is None:
+            # the event loop only sleeps in whole milliseconds, so the poller runs in a worker thread
+            return await loop.run_in_executor(None, self.wait_done, timeout)
+        begin = time.perf_counter()
+        cpu = time.thread_time()
+        deadline = float("inf") if timeout is None else begin + timeout
+        reads = 0
+        last_miss = begin
+        ready = asyncio.Event()
+        loop.add_reader(self.events.fd, ready.set)
+        try:
+            while True:
+                reads += 1
+                if self._done():
+                    return self._finish("events", begin, time.perf_counter(), last_miss, cpu, reads)
+                last_miss = time.perf_counter()
+                remaining = None if timeout is None else deadline - last_miss
+                await asyncio.wait_for(ready.wait(), remaining)
+                ready.clear()
+                self.events.consume()
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"no PBS completion within {timeout} s") from None
+        finally:
+            loop.remove_reader(self.events.fd)
+
+    def run(self, timeout: Optional[float] = None) -> WaitStats:
+        """START and wait for the PBS."""
+        self.start()
+        return self.wait_done(timeout)
+
+    # ---------- statistics ----------
+    def summary(self) -> Dict[str, dict]:
+        out = {}
+        for via in sorted({s.via for s in self.history}):
+            mine = [s for s in self.history if s.via == via]
+            wakeup = np.array([s.wakeup_s for s in mine]) * 1e6
+            cpu = np.array([s.cpu_s for s in mine]) * 1e6
+            out[via] = {"completions": len(mine),
+                        "wakeup_us": dict(zip(("p50", "p99", "max"), map(float, np.percentile(wakeup, (50, 99, 100))))),
+                        "cpu_us_mean": float(cpu.mean()),
+                        "reads_mean": float(np.mean([s.reads for s in mine]))}
+        return out
+
+
+def format_summary(summary: Dict[str, dict]) -> str:
+    lines = []
+    for via, s in summary.items():
+        w = s["wakeup_us"]
+        lines.append(f"{via}: {s['completions']} completions, wakeup p50/p99/max "
+                     f"{w['p50']:.1f}/{w['p99']:.1f}/{w['max']:.1f} us, CPU {s['cpu_us_mean']:.1f} us "
+                     f"and {s['reads_mean']:.1f} register reads per completion")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PBS completion latency and CPU cost")
+    parser.add_argument("--device", default="/dev/xdma0_user")
+    parser.add_argument("--local", action="store_true", help="use the simulated register file")
+    parser.add_argument("--pbs-time", type=float, default=1e-3, help="PBS duration of the simulated engine")
+    parser.add_argument("--events", nargs="?", const="", metavar="PATH",
+                        help="wait on an events file, e.g. /dev/xdma0_events_0 (the eventfd with --local)")
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--spin", type=float, default=50e-6, help="seconds of busy polling before backing off")
+    parser.add_argument("--max-sleep", type=float, default=1e-3)
+    parser.add_argument("--asyncio", action="store_true", help="use wait_done_async")
+    args = parser.parse_args()
+
+    kwargs = {"spin": args.spin, "max_sleep": args.max_sleep}
+    if args.local:
+        waiter = Completion.local(args.pbs_time, args.events is not None, **kwargs)
+    else:
+        events = EventSource.open(args.events or "/dev/xdma0_events_0") if args.events is not None else None
+        waiter = Completion(Controller.open(args.device, record=False), events, **kwargs)
+
+    async def run_async():
+        for _ in range(args.runs):
+            waiter.start()
+            await waiter.wait_done_async(args.timeout)
+
+    with waiter:
+        if args.asyncio:
+            asyncio.run(run_async())
+        else:
+            for _ in range(args.runs):
+                waiter.run(args.timeout)
+        print(format_summary(waiter.summary()))
+
+
+if __name__ == "__main__":
+    main()
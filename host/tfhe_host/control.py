@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Persistent client for the control registers of the tfhe-PU (controller.v).
+
+The one-shot control tool opens /dev/xdma0_user for every register access, so
+every START, BUSY check or select change costs a process spawn and an
+open/close. Controller opens the user BAR once and maps it, so a register
+read is one uncached load from the BAR (pread/pwrite on the open fd if the
+driver does not allow the mapping).
+
+Registers (host/README.md has the full map):
+  0x0 slv_reg0 - START b0, BUSY b1 (read-only), DONE b2 (sticky), RD/WR
+                 ownership of the stacks b4..b7 (only for designs with the
+                 generated mux/demux glue; tfhe_pu.vhd splits them statically)
+  0x4..0xC slv_reg1..slv_reg3 - unused, plain read/write registers
+Fields are read and written by name (FIELDS). batch() collects several
+read-modify-writes: every register is read at most once, and the changed ones
+are written back in the order they were first changed when the block ends.
+A read-modify-write of slv_reg0 never writes START back (only start() sets
+it) and is refused while a PBS runs.
+Every access can be timed; latency() summarises the last samples per kind.
+
+SimulatedRegisters is the stand-in for the card: the register file of
+controller.v, where START makes the engine busy for --pbs-time seconds, after
+which START is cleared and DONE is set.
+
+Usage:
+  python3 -m tfhe_host.control --device /dev/xdma0_user 0x0 0x20
+  python3 -m tfhe_host.control --device /dev/xdma0_user --show
+  python3 -m tfhe_host.control --local --bench 100000
+"""
+
+import argparse
+import mmap
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from . import trace
+
+USER_BAR_SIZE = 0x1000
+NUM_REGS = 4
+
+REG_CONTROL = 0x0   # slv_reg0
+
+
+class Field(NamedTuple):
+    reg: int
+    bit: int
+    width: int = 1
+    writable: bool = True
+
+    @property
+    def mask(self) -> int:
+        return ((1 << self.width) - 1) << self.bit
+
+    def get(self, word: int) -> int:
+        return (word & self.mask) >> self.bit
+
+    def put(self, word: int, value: int) -> int:
+        if value >> self.width:
+            raise ValueError(f"{value:#x} does not fit into {self.width} bits")
+        return (word & ~self.mask) | (value << self.bit)
+
+
+FIELDS: Dict[str, Field] = {
+    "START": Field(REG_CONTROL, 0),
+    "BUSY": Field(REG_CONTROL, 1, writable=False),
+    "DONE": Field(REG_CONTROL, 2),             # host clears it before the next START
+    "WR0": Field(REG_CONTROL, 4),
+    "RD0": Field(REG_CONTROL, 5),
+    "WR1": Field(REG_CONTROL, 6),
+    "RD1": Field(REG_CONTROL, 7),
+}
+REG_NAMES = {4 * i: f"slv_reg{i}" for i in range(NUM_REGS)}
+
+
+def _check_offset(offset: int):
+    if offset % 4 or not 0 <= offset < NUM_REGS * 4:
+        raise ValueError(f"no register at {offset:#x}")
+
+
+class MappedRegisters:
+    """The user BAR mapped into the process; every access is one 32-bit load or store."""
+
+    def __init__(self, path: str = "/dev/xdma0_user"):
+        self.name = path
+        self._fd = os.open(path, os.O_RDWR | os.O_SYNC)
+        try:
+            self._map = mmap.mmap(self._fd, USER_BAR_SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        except OSError:
+            os.close(self._fd)
+            raise
+        self._words = memoryview(self._map).cast("I")
+
+    def read32(self, offset: int) -> int:
+        return self._words[offset >> 2]
+
+    def write32(self, offset: int, value: int):
+        self._words[offset >> 2] = value
+
+    def close(self):
+        self._words.release()
+        self._map.close()
+        os.close(self._fd)
+
+
+class FileRegisters:
+    """pread/pwrite on the open user device, like the control tool but without reopening it."""
+
+    def __init__(self, path: str = "/dev/xdma0_user"):
+        self.name = path
+        self._fd = os.open(path, os.O_RDWR | os.O_SYNC)
+
+    def read32(self, offset: int) -> int:
+        return int.from_bytes(os.pread(self._fd, 4, offset), "little")
+
+    def write32(self, offset: int, value: int):
+        if os.pwrite(self._fd, value.to_bytes(4, "little"), offset) != 4:
+            raise OSError(f"{self.name}: short write at {offset:#x}")
+
+    def close(self):
+        os.close(self._fd)
+
+
+class SimulatedRegisters:
+    """Register file of controller.v with an engine that takes pbs_time seconds per PBS."""
+
+    def __init__(self, pbs_time: float = 1e-3):
+        self.name = "local"
+        self.pbs_time = pbs_time
+        self._regs = [0] * NUM_REGS
+        self._started: Optional[float] = None
+        self._finishing = False
+        self._lock = threading.Lock()
+        self.done_time: Optional[float] = None   # perf_counter() at which the last PBS finished
+        self.event_fd: Optional[int] = None
+        self.on_done: Optional[Callable[[], None]] = None   # stands in for what the engine computes
+
+    def _update(self) -> bool:
+        """True if the PBS has just run out, then the caller has to _finish() it."""
+        finished = (self._started is not None and not self._finishing
+                    and time.perf_counter() - self._started >= self.pbs_time)
+        self._finishing |= finished
+        return finished
+
+    def _finish(self):
+        # on_done moves data over the card, so it runs without the lock; BUSY stays set until it returns
+        try:
+            if self.on_done is not None:
+                self.on_done()
+        finally:
+            with self._lock:
+                self.done_time = self._started + self.pbs_time
+                self._started = None
+                self._finishing = False
+                self._regs[0] = (self._regs[0] & ~0b011) | 0b100   # clear START and BUSY, set DONE
+
+    def read32(self, offset: int) -> int:
+        with self._lock:
+            finished = self._update()
+        if finished:
+            self._finish()
+        with self._lock:
+            return self._regs[offset >> 2]
+
+    def write32(self, offset: int, value: int):
+        with self._lock:
+            finished = self._update()
+        if finished:
+            self._finish()
+        with self._lock:
+            if offset == REG_CONTROL:
+                busy = self._started is not None
+                if value & 1 and not self._regs[0] & 1 and not busy:
+                    self._started = time.perf_counter()
+                    busy = True
+                    if self.event_fd is not None:
+                        timer = threading.Timer(self.pbs_time, os.eventfd_write, (self.event_fd, 1))
+                        timer.daemon = True
+                        timer.start()
+                value = (value & ~0b10) | (busy << 1)   # BUSY follows the engine, not the host
+            self._regs[offset >> 2] = value & 0xFFFFFFFF
+            finished = self._update()
+        if finished:
+            self._finish()
+
+    def open_events(self) -> int:
+        """eventfd that is signalled when a PBS finishes, the stand-in of /dev/xdma0_events_N."""
+        if self.event_fd is None:
+            self.event_fd = os.eventfd(0, os.EFD_NONBLOCK)
+        return self.event_fd
+
+    def close(self):
+        if self.event_fd is not None:
+            os.close(self.event_fd)
+            self.event_fd = None
+
+
+class LatencyLog:
+    """Preallocated ring of the last capacity access times per kind, in ns."""
+
+    def __init__(self, capacity: int = 1 << 16):
+        self.capacity = capacity
+        self._samples: Dict[str, np.ndarray] = {}
+        self._counts: Dict[str, int] = {}
+
+    def record(self, kind: str, ns: int):
+        ring = self._samples.get(kind)
+        if ring is None:
+            ring = self._samples[kind] = np.zeros(self.capacity, dtype=np.int64)
+            self._counts[kind] = 0
+        ring[self._counts[kind] % self.capacity] = ns
+        self._counts[kind] += 1
+
+    def summary(self) -> Dict[str, dict]:
+        out = {}
+        for kind, ring in self._samples.items():
+            samples = ring[:min(self._counts[kind], self.capacity)]
+            p50, p99 = np.percentile(samples, (50, 99))
+            out[kind] = {"count": self._counts[kind], "mean_ns": float(samples.mean()), "p50_ns": float(p50),
+                         "p99_ns": float(p99), "max_ns": int(samples.max())}
+        return out
+
+    def reset(self):
+        self._samples.clear()
+        self._counts.clear()
+
+
+class Batch:
+    """Shadow copy of the registers touched inside Controller.batch().
+
+    START is cleared in the shadow of slv_reg0, and slv_reg0 is not written
+    while START or BUSY was set: the PBS could end between the read and the
+    write, which would then restart it or clear its DONE.
+    """
+
+    def __init__(self, ctrl: "Controller"):
+        self._ctrl = ctrl
+        self._values: Dict[int, int] = {}
+        self._dirty: List[int] = []
+        self._running = 0
+
+    def read(self, offset: int) -> int:
+        if offset not in self._values:
+            value = self._ctrl.read(offset)
+            if offset == REG_CONTROL:
+                self._running = value & 0b011
+                value &= ~0b001
+            self._values[offset] = value
+        return self._values[offset]
+
+    def write(self, offset: int, value: int):
+        _check_offset(offset)
+        self._values[offset] = value
+        if offset not in self._dirty:
+            self._dirty.append(offset)
+
+    def get(self, name: str) -> int:
+        field = FIELDS[name]
+        return field.get(self.read(field.reg))
+
+    def set(self, name: str, value: int):
+        field = FIELDS[name]
+        if not field.writable:
+            raise ValueError(f"{name} is read-only")
+        self.write(field.reg, field.put(self.read(field.reg), int(value)))
+
+    def flush(self):
+        if REG_CONTROL in self._dirty and self._running:
+            raise RuntimeError(f"a PBS is running, slv_reg0 is left alone (START/BUSY = {self._running:#04b})")
+        for offset in self._dirty:
+            self._ctrl.write(offset, self._values[offset])
+        self._dirty = []
+
+
+class Controller:
+    """Typed access to the control registers over one of the register backends."""
+
+    def __init__(self, regs, record: bool = True):
+        self.regs = regs
+        self.log = LatencyLog() if record else None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def open(cls, path: str = "/dev/xdma0_user", record: bool = True) -> "Controller":
+        """Maps the user BAR; falls back to pread/pwrite if the driver refuses the mapping."""
+        try:
+            regs = MappedRegisters(path)
+        except OSError:
+            regs = FileRegisters(path)
+        return cls(regs, record)
+
+    @classmethod
+    def local(cls, pbs_time: float = 1e-3, record: bool = True) -> "Controller":
+        return cls(SimulatedRegisters(pbs_time), record)
+
+    def close(self):
+        self.regs.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- raw access ----------
+    def read(self, offset: int) -> int:
+        _check_offset(offset)
+        if self.log is None:
+            return self.regs.read32(offset)
+        start = time.perf_counter_ns()
+        value = self.regs.read32(offset)
+        self.log.record("read", time.perf_counter_ns() - start)
+        return value
+
+    def write(self, offset: int, value: int):
+        _check_offset(offset)
+        if self.log is None:
+            self.regs.write32(offset, value)
+            return
+        start = time.perf_counter_ns()
+        self.regs.write32(offset, value)
+        self.log.record("write", time.perf_counter_ns() - start)
+
+    # ---------- fields ----------
+    def get(self, name: str) -> int:
+        field = FIELDS[name]
+        return field.get(self.read(field.reg))
+
+    def set(self, name: str, value: int):
+        with self.batch() as b:
+            b.set(name, value)
+
+    @contextmanager
+    def batch(self, phase: str = "registers"):
+        """Read-modify-write of several fields; the changed registers are written when the block ends."""
+        with self._lock:
+            b = Batch(self)
+            start = time.perf_counter_ns()
+            yield b
+            b.flush()
+            end = time.perf_counter_ns()
+            if self.log is not None:
+                self.log.record("batch", end - start)
+            tracer = trace.ACTIVE
+            if tracer is not None:
+                tracer.record(phase, start, end, device=trace.device_of(self.regs.name), queue="user")
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.read(REG_CONTROL) & 0b010)
+
+    @property
+    def done(self) -> bool:
+        return bool(self.read(REG_CONTROL) & 0b100)
+
+    def start(self):
+        """Clears the sticky DONE and sets START in one write, keeping the ownership bits."""
+        with self.batch("start") as b:
+            b.set("DONE", 0)
+            b.set("START", 1)
+
+    def set_stack_owner(self, stack: int, write: bool, read: bool):
+        """Whole-stack ownership in slv_reg0: True hands the direction to the TFHE processor."""
+        with self.batch("select") as b:
+            b.set(f"WR{stack}", write)
+            b.set(f"RD{stack}", read)
+
+    def fields(self) -> Dict[str, int]:
+        words = {offset: self.read(offset) for offset in REG_NAMES}
+        return {name: f.get(words[f.reg]) for name, f in FIELDS.items()}
+
+    def latency(self) -> Dict[str, dict]:
+        return self.log.summary() if self.log is not None else {}
+
+
+def format_fields(fields: Dict[str, int]) -> str:
+    return "\n".join(f"{name:<9} {value:#x}" if FIELDS[name].width > 1 else f"{name:<9} {value}"
+                     for name, value in fields.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tfhe-PU control register client")
+    parser.add_argument("--device", default="/dev/xdma0_user")
+    parser.add_argument("--local", action="store_true", help="use the simulated register file")
+    parser.add_argument("--pbs-time", type=float, default=1e-3, help="PBS duration of the simulated engine")
+    parser.add_argument("--show", action="store_true", help="print all fields")
+    parser.add_argument("--bench", type=int, metavar="N", help="time N reads of DONE")
+    parser.add_argument("offset", nargs="?", type=lambda x: int(x, 0))
+    parser.add_argument("value", nargs="?", type=lambda x: int(x, 0))
+    args = parser.parse_args()
+
+    ctrl = Controller.local(args.pbs_time) if args.local else Controller.open(args.device)
+    with ctrl:
+        status = 0
+        if args.offset is not None:
+            if args.value is not None:
+                ctrl.write(args.offset, args.value)
+            readback = ctrl.read(args.offset)
+            if args.value is None:
+                print(f"Read 0x{readback:08x} @ offset {args.offset:#x}")
+            else:
+                print(f"Wrote 0x{args.value:08x}, Read 0x{readback:08x} @ offset {args.offset:#x}")
+                status = readback != args.value
+        if args.show:
+            print(format_fields(ctrl.fields()))
+        if args.bench:
+            ctrl.log.reset()
+            for _ in range(args.bench):
+                ctrl.done
+            read = ctrl.latency()["read"]
+            print(f"{args.bench} reads of DONE: mean {read['mean_ns']:.0f} ns, p50 {read['p50_ns']:.0f} ns, "
+                  f"p99 {read['p99_ns']:.0f} ns, max {read['max_ns']} ns")
+    raise SystemExit(status)
+
+
+if __name__ == "__main__":
+    main()
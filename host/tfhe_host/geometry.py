@@ -0,0 +1,81 @@
+"""
+Engine geometry and HBM channel roles of the tfhe-PU, seen from the host.
+
+The sizes come from the VHDL packages through tfhe_model.vhdl_constants
+(src/secondary_code), so a bitstream built with other constants only needs
+a different set of overrides, not edited host code.
+
+Channel roles are those of tfhe_pu.vhd: stack 1 carries op, lut, ai, b and
+result on its pseudo channels 0..4, the BSK lives on stack 0.
+
+The modulus is tfhe_modulus = ntt_prime, which get_ntt_prime_list_pair
+(ntt_utils.vhd) picks by debug_mode; the evaluator does not follow that
+record lookup, so load_geometry() repeats the choice.
+"""
+
+import os
+import sys
+from functools import lru_cache
+from typing import NamedTuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src", "secondary_code"))
+
+from .hbm_alloc import CHANNELS_PER_STACK  # noqa: E402
+from tfhe_model.ntt_params import SMALL_PRIME, SOLINAS_PRIME  # noqa: E402
+from tfhe_model.pbs import PbsParams  # noqa: E402
+
+# channel_*_idx of tfhe_pu.vhd, on stack 1
+CHANNEL_OP = CHANNELS_PER_STACK + 0
+CHANNEL_LUT = CHANNELS_PER_STACK + 1
+CHANNEL_AI = CHANNELS_PER_STACK + 2
+CHANNEL_B = CHANNELS_PER_STACK + 3
+CHANNEL_RESULT = CHANNELS_PER_STACK + 4
+TFHE_PU_HOST_READS = (CHANNEL_RESULT,)   # the channels whose reads tfhe_pu.vhd gives to PCIe
+
+SAMPLE_EXTRACT_DEFAULT_IDX = 0   # sample_extract_default_sample_extract_idx, tfhe_constants.vhd
+
+
+class Geometry(NamedTuple):
+    k_lwe: int
+    batchsize: int           # pbs_batchsize, ciphertexts per START
+    ai_coeffs_per_word: int  # ai_hbm_coeffs_per_clk
+    coeffs_per_word: int     # hbm_coeffs_per_clock_per_ps_port
+    word_bytes: int          # hbm_bytes_per_ps_port
+    k: int
+    n: int                   # num_coefficients
+    addr_bits: int           # hbm_addr_width, the address fields of an op record
+    idx_bits: int            # log2_num_coefficients, the sample extract index of an op record
+    modulus: int             # tfhe_modulus
+
+    @property
+    def ai_bytes_per_lwe(self) -> int:
+        return self.k_lwe // self.ai_coeffs_per_word * self.word_bytes
+
+    @property
+    def result_words_per_lwe(self) -> int:
+        """k * N coefficients plus the word with b, as written by pbs_lwe_n_storage_read_to_hbm."""
+        return self.k * self.n // self.coeffs_per_word + 1
+
+    @property
+    def result_bytes_per_lwe(self) -> int:
+        return self.result_words_per_lwe * self.word_bytes
+
+    @property
+    def result_body_index(self) -> int:
+        """Coefficient of a result that holds b: the first one of the word after the k * N mask coefficients."""
+        return self.k * self.n
+
+
+@lru_cache(maxsize=None)
+def load_geometry(**overrides) -> Geometry:
+    from tfhe_model.vhdl_constants import load
+    graph = load(**overrides)
+    values = [graph.value(name) for name in (
+        "k_lwe", "pbs_batchsize", "ai_hbm_coeffs_per_clk", "hbm_coeffs_per_clock_per_ps_port",
+        "hbm_bytes_per_ps_port", "k", "num_coefficients", "hbm_addr_width", "log2_num_coefficients")]
+    return Geometry(*values, SMALL_PRIME if graph.value("debug_mode") else SOLINAS_PRIME)
+
+
+def params_of(geom: Geometry) -> PbsParams:
+    """The tfhe_model parameters of a geometry, for keys and BSK images that match the bitstream."""
+    return PbsParams(log2_n=geom.idx_bits, k=geom.k, k_lwe=geom.k_lwe, prime=geom.modulus)
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+HBM address map and allocator of the tfhe-PU.
+
+AddressMap loads the AXI_nn windows of src/mmap/memory_map/AddressSegments.csv
+(tfhe_model.address_segments) into a table indexed by address >> log2(window
+size), so channel_of(addr) is a shift and a list lookup, and base() and size()
+are dictionary lookups. Nothing assumes the 256 MB / 4 GB strides; they are
+whatever the block design assigned.
+
+HbmAllocator manages every window with a buddy allocator whose smallest block
+is one HBM burst (hbm_burstlen_max + 1 words of hbm_bytes_per_ps_port = 512
+bytes), so blocks start on burst boundaries and never share a burst:
+  alloc       - a block in the least used of the candidate channels, so
+                buffers spread over the pseudo channels
+  alloc_span  - the same offset in several channels, for buffers the engine
+                reads at one address from several ports (ai ports and b share
+                lwe_addr_in)
+  reserve     - a given offset, for the fixed regions of the engine
+                (op_base_addr, res_base_addr, the BSK at offset 0)
+Layouts of the scheduler take their regions from here, so two layouts on
+one allocator never overlap.
+
+host_channels() turns the control fields (tfhe_host.control) into the
+channels the host may write and read under the current selects: a channel
+belongs to the TFHE processor for a direction if the stack bit of its stack
+in slv_reg0 is set. That is what the generated mux/demux glue does; the
+shipped tfhe_pu.vhd ignores the selects and lets the host write every channel
+and read only the result channel. AddressMap.check() rejects a transfer that
+leaves its window or goes to a channel the host does not own; the scheduler
+and the residency cache check every transfer against host_access() of the
+channels they may read.
+
+Usage:
+  python3 -m tfhe_host.hbm_alloc --allocs 100000
+  sudo python3 -m tfhe_host.hbm_alloc --device /dev/xdma0_user
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src", "secondary_code"))
+
+from tfhe_model.address_segments import DEFAULT_CSV, hbm_windows  # noqa: E402
+
+WORD_BYTES = 32                               # hbm_bytes_per_ps_port
+BURST_BYTES = (0xF + 1) * WORD_BYTES          # hbm_burstlen_max + 1 words
+CHANNELS_PER_STACK = 16                       # hbm_stack_num_ps_ports
+
+
+class Window(NamedTuple):
+    channel: int
+    base: int
+    size: int
+
+
+class Block(NamedTuple):
+    channel: int
+    offset: int    # in the channel window, what the engine's address fields hold
+    size: int
+    addr: int      # host address
+
+
+class AddressMap:
+    def __init__(self, windows: Iterable[Window]):
+        self.windows: Dict[int, Window] = {w.channel: w for w in windows}
+        if not self.windows:
+            raise ValueError("no HBM windows")
+        granule = min(w.size for w in self.windows.values())
+        self._shift = granule.bit_length() - 1
+        if granule != 1 << self._shift:
+            raise ValueError(f"window size {granule:#x} is not a power of two")
+        self._table: List[Optional[int]] = [None] * (max(w.base + w.size for w in self.windows.values()) >> self._shift)
+        for w in self.windows.values():
+            if w.base % granule or w.size % granule:
+                raise ValueError(f"window of AXI_{w.channel:02d} is not aligned to {granule:#x}")
+            for i in range(w.base >> self._shift, (w.base + w.size) >> self._shift):
+                if self._table[i] is not None:
+                    raise ValueError(f"windows of AXI_{self._table[i]:02d} and AXI_{w.channel:02d} overlap")
+                self._table[i] = w.channel
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_CSV) -> "AddressMap":
+        return cls(Window(port, seg.offset, seg.size) for port, seg in hbm_windows(path).items())
+
+    @property
+    def channels(self) -> List[int]:
+        return sorted(self.windows)
+
+    def base(self, channel: int) -> int:
+        return self.windows[channel].base
+
+    def size(self, channel: int) -> int:
+        return self.windows[channel].size
+
+    def channel_of(self, addr: int) -> int:
+        index = addr >> self._shift
+        channel = self._table[index] if 0 <= index < len(self._table) else None
+        if channel is None:
+            raise ValueError(f"{addr:#x} is in no HBM window")
+        return channel
+
+    def check(self, addr: int, nbytes: int, write: bool,
+              access: Optional[Tuple[int, int]] = None) -> int:
+        """Channel of a transfer; raises if it leaves the window or the host does not own that direction."""
+        channel = self.channel_of(addr)
+        w = self.windows[channel]
+        if addr + nbytes > w.base + w.size:
+            raise ValueError(f"{nbytes} bytes at {addr:#x} cross the end of the AXI_{channel:02d} window")
+        if access is not None and not access[0 if write else 1] >> channel & 1:
+            raise PermissionError(f"the host does not own the {'writes' if write else 'reads'} of AXI_{channel:02d}")
+        return channel
+
+
+def host_channels(fields: Dict[str, int]) -> Tuple[int, int]:
+    """(write, read) bit masks of the channels the host owns, from Controller.fields()."""
+    full = (1 << CHANNELS_PER_STACK) - 1
+    host = []
+    for stack_bit in ("WR", "RD"):
+        tfhe = 0
+        for stack in (0, 1):
+            if fields[f"{stack_bit}{stack}"]:
+                tfhe |= full << (stack * CHANNELS_PER_STACK)
+        host.append(~tfhe & ((1 << (2 * CHANNELS_PER_STACK)) - 1))
+    return host[0], host[1]
+
+
+def host_access(readable: Optional[Iterable[int]] = None) -> Optional[Tuple[int, int]]:
+    """access of AddressMap.check for a host that writes every channel and reads those of readable (None: all)."""
+    if readable is None:
+        return None
+    return (1 << 2 * CHANNELS_PER_STACK) - 1, sum(1 << c for c in set(readable))
+
+
+class BuddyAllocator:
+    """Power-of-two blocks of at least min_block bytes in [0, size)."""
+
+    def __init__(self, size: int, min_block: int = BURST_BYTES):
+        self.min_order = min_block.bit_length() - 1
+        self.max_order = size.bit_length() - 1
+        if size != 1 << self.max_order or min_block != 1 << self.min_order or min_block > size:
+            raise ValueError("size and min_block must be powers of two, min_block <= size")
+        self._free: Dict[int, set] = {order: set() for order in range(self.min_order, self.max_order + 1)}
+        self._lowest: Dict[int, List[int]] = {order: [] for order in self._free}   # heaps, may hold taken offsets
+        self._add(self.max_order, 0)
+        self._used: Dict[int, int] = {}    # offset -> order
+        self.used_bytes = 0
+
+    def order(self, nbytes: int) -> int:
+        return max(self.min_order, (max(nbytes, 1) - 1).bit_length())
+
+    def _add(self, order: int, offset: int):
+        self._free[order].add(offset)
+        heapq.heappush(self._lowest[order], offset)
+
+    def _pop_lowest(self, order: int) -> int:
+        heap = self._lowest[order]
+        while heap[0] not in self._free[order]:
+            heapq.heappop(heap)
+        return heap[0]
+
+    def _take(self, offset: int, order: int, want: int) -> int:
+        """Splits the free block (offset, order) down to want, keeping its first half."""
+        self._free[order].remove(offset)
+        while order > want:
+            order -= 1
+            self._add(order, offset + (1 << order))
+        self._used[offset] = want
+        self.used_bytes += 1 << want
+        return offset
+
+    def alloc(self, nbytes: int) -> int:
+        want = self.order(nbytes)
+        for order in range(want, self.max_order + 1):
+            if self._free[order]:
+                return self._take(self._pop_lowest(order), order, want)
+        raise MemoryError(f"no free block of {1 << want} bytes")
+
+    def reserve(self, offset: int, nbytes: int) -> int:
+        """Claims the block of nbytes at offset, which must be aligned to its rounded-up size."""
+        want = self.order(nbytes)
+        if offset % (1 << want):
+            raise ValueError(f"{offset:#x} is not aligned to {1 << want:#x}")
+        for order in range(want, self.max_order + 1):
+            block = offset & ~((1 << order) - 1)
+            if block in self._free[order]:
+                # split towards offset: keep the half that contains it
+                self._free[order].remove(block)
+                while order > want:
+                    order -= 1
+                    half = 1 << order
+                    if offset & half:
+                        self._add(order, block)
+                        block += half
+                    else:
+                        self._add(order, block + half)
+                self._add(want, block)
+                return self._take(block, want, want)
+        raise MemoryError(f"{offset:#x} ({1 << want} bytes) is already in use")
+
+    def free(self, offset: int):
+        order = self._used.pop(offset)
+        self.used_bytes -= 1 << order
+        while order < self.max_order:
+            buddy = offset ^ (1 << order)
+            if buddy not in self._free[order]:
+                break
+            self._free[order].remove(buddy)
+            offset = min(offset, buddy)
+            order += 1
+        self._add(order, offset)
+
+
+class HbmAllocator:
+    def __init__(self, amap: Optional[AddressMap] = None, min_block: int = BURST_BYTES):
+        self.amap = amap or AddressMap.load()
+        self.min_block = min_block
+        self._buddies: Dict[int, BuddyAllocator] = {}
+
+    def _buddy(self, channel: int) -> BuddyAllocator:
+        buddy = self._buddies.get(channel)
+        if buddy is None:
+            buddy = self._buddies[channel] = BuddyAllocator(self.amap.size(channel), self.min_block)
+        return buddy
+
+    def block_at(self, channel: int, offset: int) -> Block:
+        """The allocated block that starts at offset in the window of channel, e.g. to free it again."""
+        buddy = self._buddy(channel)
+        return Block(channel, offset, 1 << buddy._used[offset], self.amap.base(channel) + offset)
+
+    def used(self, channel: int) -> int:
+        return self._buddies[channel].used_bytes if channel in self._buddies else 0
+
+    def alloc(self, nbytes: int, channels: Optional[Iterable[int]] = None) -> Block:
+        """A block in the least used channel of channels (default: all) that has room."""
+        for channel in sorted(self.amap.channels if channels is None else channels, key=self.used):
+            try:
+                return self.block_at(channel, self._buddy(channel).alloc(nbytes))
+            except MemoryError:
+                continue
+        raise MemoryError(f"no channel has {nbytes} free bytes")
+
+    def alloc_span(self, nbytes: int, channels: List[int]) -> List[Block]:
+        """Blocks at the same offset in every channel."""
+        first = self._buddy(channels[0]).alloc(nbytes)
+        blocks = [self.block_at(channels[0], first)]
+        try:
+            for channel in channels[1:]:
+                blocks.append(self.reserve(channel, first, nbytes))
+        except MemoryError:
+            self.free(blocks)
+            raise
+        return blocks
+
+    def reserve(self, channel: int, offset: int, nbytes: int) -> Block:
+        return self.block_at(channel, self._buddy(channel).reserve(offset, nbytes))
+
+    def free(self, blocks):
+        for block in [blocks] if isinstance(blocks, Block) else blocks:
+            self._buddies[block.channel].free(block.offset)
+
+    def usage(self) -> Dict[int, int]:
+        return {channel: self.used(channel) for channel in self.amap.channels if self.used(channel)}
+
+
+def main():
+    from .control import Controller
+
+    parser = argparse.ArgumentParser(description="HBM address map and allocator")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="AddressSegments.csv of the block design")
+    parser.add_argument("--device", help="control register device, to show the channels the host owns")
+    parser.add_argument("--allocs", type=int, default=100000, help="random alloc/free operations to time")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    amap = AddressMap.load(args.csv)
+    for channel in amap.channels:
+        w = amap.windows[channel]
+        try:
+            first, last = amap.check(w.base, w.size, True), amap.channel_of(w.base + w.size - 1)
+        except ValueError as e:
+            raise SystemExit(f"{args.csv}: {e}")
+        if first != channel or last != channel:
+            raise SystemExit(f"{args.csv}: the window of AXI_{channel:02d} maps to AXI_{first:02d}..AXI_{last:02d}")
+    stacks = sorted({c // CHANNELS_PER_STACK for c in amap.channels})
+    print(f"{len(amap.channels)} windows on {len(stacks)} stacks, "
+          f"{sum(w.size for w in amap.windows.values()) >> 30} GB, burst {BURST_BYTES} bytes")
+    if args.device:
+        with Controller.open(args.device, record=False) as ctrl:
+            write, read = host_channels(ctrl.fields())
+        print(f"host writes {write:#010x}, reads {read:#010x}")
+
+    rng = random.Random(args.seed)
+    alloc = HbmAllocator(amap)
+    live: List[Block] = []
+    addrs = [rng.randrange(0, amap.base(amap.channels[-1]) + amap.size(amap.channels[-1])) for _ in range(args.allocs)]
+    start = time.perf_counter()
+    for _ in range(args.allocs):
+        if live and rng.random() < 0.45:
+            alloc.free(live.pop(rng.randrange(len(live))))
+        else:
+            live.append(alloc.alloc(rng.choice((BURST_BYTES, 4096, 36000, 1 << 20))))
+    elapsed = time.perf_counter() - start
+    usage = alloc.usage()
+    print(f"{args.allocs} alloc/free in {elapsed * 1e3:.1f} ms ({elapsed / args.allocs * 1e6:.2f} us each), "
+          f"{len(live)} live blocks over {len(usage)} channels, {min(usage.values()) >> 20}.."
+          f"{max(usage.values()) >> 20} MB per channel")
+    start = time.perf_counter()
+    for addr in addrs:
+        amap.channel_of(addr)
+    elapsed = time.perf_counter() - start
+    print(f"channel_of: {elapsed / len(addrs) * 1e9:.0f} ns per lookup")
+    errors = []
+    live.sort(key=lambda b: (b.channel, b.offset))
+    for block, following in zip(live, live[1:]):
+        if block.offset % BURST_BYTES:
+            errors.append(f"block at AXI_{block.channel:02d} + {block.offset:#x} is not burst aligned")
+        if block.channel == following.channel and block.offset + block.size > following.offset:
+            errors.append(f"blocks at AXI_{block.channel:02d} + {block.offset:#x} and {following.offset:#x} overlap")
+    alloc.free(live)
+    if alloc.usage():
+        errors.append(f"{sum(alloc.usage().values())} bytes still allocated after freeing every block")
+    for error in errors:
+        print(error)
+    raise SystemExit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Parallel, hash-verified HBM channel bandwidth and integrity benchmark.
+
+Replaces the serial dma_test.sh (one process spawn and one cmp of two 100 MB
+files per channel). All selected channels are driven concurrently: every
+channel window is cut into --transfer-size transfers, and --jobs of them are
+in flight at a time, spread round-robin over the DMA queues.
+
+The data is a deterministic pattern from --seed, so nothing has to be kept
+or written back to disk: every transfer's BLAKE2 digest is recorded when it
+is written and compared with the digest of what is read back.
+
+The port rules of the bitstream (host/README.md) decide what can be checked:
+  strict   - PCIe only writes the HBM, except the result channel AXI_20,
+             which it only reads. Writes are timed but cannot be verified,
+             and the result channel is only timed on reads.
+  loopback - every channel is written and read back (dma_test.sh bitstreams,
+             designs with the mux/demux glue, or the --local stand-in)
+The report has per-channel and aggregate H2C/C2H GB/s, latency percentiles
+per transfer (waiting for a busy queue included) and the verification result.
+
+Usage:
+  python3 -m tfhe_host.hbm_bench --local --size 16M
+  python3 -m tfhe_host.hbm_bench --device /dev/xdma0 --rules loopback --size 256M --jobs 16
+  python3 -m tfhe_host.hbm_bench --device /dev/xdma0 --channels 16-20 --json bench.json
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from .hbm_alloc import AddressMap
+from .xdma import XdmaDevice, parse_size
+
+ADDRESS_MAP = AddressMap.load()   # AXI_nn windows of AddressSegments.csv
+RESULT_CHANNEL = 20            # stack 1, channel_result_idx of tfhe_pu.vhd
+RULES = ("strict", "loopback")
+GOLDEN = 0x9E3779B97F4A7C15
+
+
+def channel_base(channel: int) -> int:
+    return ADDRESS_MAP.base(channel)
+
+
+def parse_channels(text: str) -> List[int]:
+    """'0-3,16,20' -> [0, 1, 2, 3, 16, 20]"""
+    channels = []
+    for part in text.split(","):
+        lo, _, hi = part.partition("-")
+        channels += range(int(lo), int(hi or lo) + 1)
+    return channels
+
+
+def host_access(channel: int, rules: str) -> tuple:
+    """(may write, may read) for the host under the given port rules."""
+    if rules == "loopback":
+        return True, True
+    return channel != RESULT_CHANNEL, channel == RESULT_CHANNEL
+
+
+class Pattern:
+    """Deterministic transfer data: one random base block per channel, xor-ed with the transfer index."""
+
+    def __init__(self, seed: int, transfer_size: int):
+        self.seed = seed
+        self.words = transfer_size // 8
+        self._bases: Dict[int, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def base(self, channel: int) -> np.ndarray:
+        with self._lock:
+            if channel not in self._bases:
+                rng = np.random.default_rng([self.seed, channel])
+                self._bases[channel] = rng.integers(0, 1 << 64, self.words, dtype=np.uint64, endpoint=False)
+            return self._bases[channel]
+
+    def block(self, channel: int, index: int, out: np.ndarray) -> np.ndarray:
+        np.bitwise_xor(self.base(channel), np.uint64(GOLDEN * (index + 1) % (1 << 64)), out=out)
+        return out
+
+
+def digest(data) -> bytes:
+    return hashlib.blake2b(memoryview(data).cast("B"), digest_size=16).digest()
+
+
+class ChannelResult(NamedTuple):
+    channel: int
+    direction: str               # "h2c" or "c2h"
+    bytes: int
+    seconds: float               # first transfer start to last transfer end
+    latencies_us: List[float]
+    verified: Optional[bool]     # None: not checkable under the port rules
+    first_bad_offset: Optional[int]
+
+    @property
+    def gbps(self) -> float:
+        return self.bytes / self.seconds / 1e9 if self.seconds else 0.0
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {}
+    return {f"p{p}": float(v) for p, v in zip((50, 90, 99), np.percentile(latencies, (50, 90, 99)))}
+
+
+class Benchmark:
+    def __init__(self, dev: XdmaDevice, channels: List[int], size: int, transfer_size: int, jobs: int,
+                 seed: int = 0, rules: str = "strict"):
+        if size % transfer_size or transfer_size % 8:
+            raise ValueError("--size must be a multiple of --transfer-size, which must be a multiple of 8")
+        window = min(ADDRESS_MAP.size(c) for c in channels)
+        if size > window:
+            raise ValueError(f"--size exceeds the {window >> 20} MB window of a channel")
+        self.dev = dev
+        self.channels = channels
+        self.size = size
+        self.transfer_size = transfer_size
+        self.jobs = jobs
+        self.rules = rules
+        self.pattern = Pattern(seed, transfer_size)
+        self.written: Dict[tuple, bytes] = {}
+        self._buffers = threading.local()
+
+    def _buffer(self, name: str) -> np.ndarray:
+        buf = getattr(self._buffers, name, None)
+        if buf is None:
+            buf = self.dev.buffer(self.transfer_size, np.uint64)
+            setattr(self._buffers, name, buf)
+        return buf
+
+    def _transfer(self, direction: str, channel: int, index: int, queue) -> tuple:
+        addr = channel_base(channel) + index * self.transfer_size
+        if direction == "h2c":
+            data = self.pattern.block(channel, index, self._buffer("h2c"))
+            start = time.perf_counter()
+            queue.transfer(memoryview(data).cast("B"), addr)
+            end = time.perf_counter()
+            self.written[(channel, index)] = digest(data)
+        else:
+            data = self._buffer("c2h")
+            start = time.perf_counter()
+            queue.transfer(memoryview(data).cast("B"), addr)
+            end = time.perf_counter()
+            expected = self.written.get((channel, index))
+            ok = None if expected is None else digest(data) == expected
+            return start, end, ok
+        return start, end, None
+
+    def run_direction(self, direction: str) -> List[ChannelResult]:
+        allowed = {ch: host_access(ch, self.rules)[direction == "c2h"] for ch in self.channels}
+        channels = [ch for ch in self.channels if allowed[ch]]
+        queues = self.dev.h2c if direction == "h2c" else self.dev.c2h
+        per_channel = self.size // self.transfer_size
+        # interleave the channels so that all of them are busy from the start
+        tasks = [(ch, idx) for idx in range(per_channel) for ch in channels]
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = [pool.submit(self._transfer, direction, ch, idx, queues[n % len(queues)])
+                       for n, (ch, idx) in enumerate(tasks)]
+            outcomes = [f.result() for f in futures]
+
+        results = []
+        for ch in channels:
+            mine = [(idx, o) for (c, idx), o in zip(tasks, outcomes) if c == ch]
+            starts = [o[0] for _, o in mine]
+            ends = [o[1] for _, o in mine]
+            checks = [(idx, o[2]) for idx, o in mine]
+            verified = None
+            first_bad = None
+            if direction == "c2h" and all(ok is not None for _, ok in checks):
+                bad = [idx for idx, ok in checks if not ok]
+                verified = not bad
+                first_bad = bad[0] * self.transfer_size if bad else None
+            results.append(ChannelResult(ch, direction, len(mine) * self.transfer_size, max(ends) - min(starts),
+                                         [(e - s) * 1e6 for s, e in zip(starts, ends)], verified, first_bad))
+        return results
+
+    def run(self) -> dict:
+        report = {"rules": self.rules, "size": self.size, "transfer_size": self.transfer_size, "jobs": self.jobs,
+                  "channels": [], "aggregate": {}}
+        for direction in ("h2c", "c2h"):
+            start = time.perf_counter()
+            results = self.run_direction(direction)
+            wall = time.perf_counter() - start
+            nbytes = sum(r.bytes for r in results)
+            latencies = [lat for r in results for lat in r.latencies_us]
+            report["aggregate"][direction] = {"bytes": nbytes, "seconds": wall,
+                                              "gbps": nbytes / wall / 1e9 if nbytes else 0.0,
+                                              "latency_us": percentiles(latencies)}
+            for r in results:
+                report["channels"].append({"channel": f"AXI_{r.channel:02d}", "direction": direction,
+                                           "bytes": r.bytes, "gbps": r.gbps,
+                                           "latency_us": percentiles(r.latencies_us), "verified": r.verified,
+                                           "first_bad_offset": r.first_bad_offset})
+        return report
+
+
+def format_report(report: dict) -> str:
+    lines = [f"rules {report['rules']}, {report['size'] >> 20} MB per channel in "
+             f"{report['transfer_size'] >> 10} KB transfers, {report['jobs']} in flight",
+             f"{'channel':<8} {'dir':<4} {'GB/s':>7} {'p50 us':>9} {'p99 us':>9}  verified"]
+    for c in report["channels"]:
+        verified = {None: "-", True: "ok"}.get(c["verified"]) or f"FAIL at +{c['first_bad_offset']:#x}"
+        lat = c["latency_us"]
+        lines.append(f"{c['channel']:<8} {c['direction']:<4} {c['gbps']:>7.2f} {lat.get('p50', 0):>9.1f} "
+                     f"{lat.get('p99', 0):>9.1f}  {verified}")
+    for direction, agg in report["aggregate"].items():
+        lat = agg["latency_us"]
+        lines.append(f"{direction} aggregate: {agg['gbps']:.2f} GB/s, latency p50/p90/p99 "
+                     f"{lat.get('p50', 0):.1f}/{lat.get('p90', 0):.1f}/{lat.get('p99', 0):.1f} us")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel, hash-verified HBM channel benchmark")
+    parser.add_argument("--device", default="/dev/xdma0", help="device prefix, e.g. /dev/xdma1")
+    parser.add_argument("--local", action="store_true", help="use the memfd stand-in instead of a card")
+    parser.add_argument("--channels", type=parse_channels, default=ADDRESS_MAP.channels,
+                        help="e.g. 0-15,20 (default: all 32)")
+    parser.add_argument("--size", type=parse_size, default=parse_size("16M"), help="bytes per channel")
+    parser.add_argument("--transfer-size", type=parse_size, default=parse_size("1M"))
+    parser.add_argument("--jobs", type=int, default=8, help="transfers in flight")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rules", choices=RULES, help="default: loopback for --local, strict otherwise")
+    parser.add_argument("--json", help="write the report as JSON")
+    args = parser.parse_args()
+
+    rules = args.rules or ("loopback" if args.local else "strict")
+    dev = XdmaDevice.local() if args.local else XdmaDevice.open(args.device)
+    with dev:
+        report = Benchmark(dev, args.channels, args.size, args.transfer_size, args.jobs, args.seed, rules).run()
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=1)
+    if any(c["verified"] is False for c in report["channels"]):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+LWE encryption, decryption and decoding for the PBS inputs and results.
+
+Everything works on whole batches of ciphertexts as uint64 arrays, with the
+modulus of the hardware (tfhe_modulus = ntt_prime, Geometry.modulus):
+  encrypt / decrypt    - LWE ciphertexts (count, dim + 1), a_0..a_{dim-1}
+                         then b, under a binary key. Messages of --bits bits
+                         get one padding bit: Delta = q / 2**(bits + 1).
+  to_rotate_idx        - modulus switching to 2N, what the ai and b channels
+                         hold (pbs.vhd expects rotate_idx values)
+  encrypt_inputs       - both at once, chunk by chunk over --workers threads,
+                         straight into the (count, k_lwe + 1) array that
+                         PbsBatch carries
+  unpack_results       - mask and body views of the result words
+  decrypt_results      - messages of the sample-extracted ciphertexts under
+                         the GLWE key, flattened to an LWE key of k * N bits
+The mask is drawn from the raw 64-bit output of the bit generator (with
+rejection above the modulus) and the noise from NumPy's ziggurat normal
+sampler, rounded. Inner products with a binary key are exact float64
+matrix products of the 32-bit halves, so they run in BLAS and never
+overflow. Rounding to 2N or to the plaintext space is exact as well: a float
+estimate, and modarith.mul_mod for the rare values within its error of a tie.
+
+The secret keys are those of tfhe_model.keygen (--keys), so the inputs are
+encrypted under the key the BSK was generated from.
+
+Usage:
+  python3 -m tfhe_host.lwe --count 100000 --bits 2
+  python3 -m tfhe_host.lwe --count 1000000 --keys secret_keys.npz
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .geometry import Geometry, load_geometry, params_of
+from .packing import buffer_layouts
+from .scheduler import PbsBatch
+from tfhe_model.keygen import SecretKeys, generate_keys, load_keys
+from tfhe_model.modarith import add_mod, mul_mod, sub_mod
+
+LWE_NOISE_STD = 2 ** -15   # relative to the modulus
+CHUNK = 4096               # ciphertexts per step of encrypt_inputs
+
+
+class Encoding(NamedTuple):
+    modulus: int
+    bits: int = 2
+
+    @property
+    def plaintexts(self) -> int:
+        """2**(bits + 1): the message bits plus the padding bit."""
+        return 2 << self.bits
+
+    def encode(self, messages) -> np.ndarray:
+        """floor(m * q / 2**(bits + 1)) without leaving uint64."""
+        m = np.asarray(messages, dtype=np.uint64) % np.uint64(self.plaintexts)
+        p = self.plaintexts
+        return m * np.uint64(self.modulus // p) + m * np.uint64(self.modulus % p) // np.uint64(p)
+
+    def decode(self, phase) -> np.ndarray:
+        return rescale(phase, self.modulus, self.plaintexts) % np.uint64(1 << self.bits)
+
+
+# ---------- sampling ----------
+def uniform(rng: np.random.Generator, shape, q: int) -> np.ndarray:
+    """Uniform in [0, q)."""
+    if q < 1 << 63:
+        return rng.integers(0, q, shape, dtype=np.uint64)
+    raw = rng.bit_generator.random_raw(shape)
+    bad = raw >= np.uint64(q)
+    while bad.any():   # probability (2**64 - q) / 2**64 per word, 2**-32 for the solinas prime
+        raw[bad] = rng.bit_generator.random_raw(int(bad.sum()))
+        bad = raw >= np.uint64(q)
+    return raw
+
+
+def gaussian(rng: np.random.Generator, shape, std: float, q: int) -> np.ndarray:
+    """Rounded normal noise of standard deviation std (absolute), reduced into [0, q)."""
+    e = np.rint(rng.standard_normal(shape) * std).astype(np.int64)
+    return np.where(e < 0, np.uint64(q) - (-e).astype(np.uint64), e.astype(np.uint64))
+
+
+# ---------- arithmetic ----------
+def _halves(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Low and high 32 bits of uint64 values as float64 (uint32 converts several times faster than uint64)."""
+    x32 = np.ascontiguousarray(x).view(np.uint32)   # little-endian: the low half comes first
+    return x32[..., 0::2].astype(np.float64), x32[..., 1::2].astype(np.float64)
+
+
+def dot_binary(a, key, q: int) -> np.ndarray:
+    """<a, key> mod q for a (..., dim) in [0, q) and a binary key (dim,)."""
+    lo, hi = _halves(np.asarray(a, dtype=np.uint64))
+    key = np.asarray(key, dtype=np.float64)
+    # every half is below 2**32, so the sums of at most 2**21 of them are exact in float64
+    lo = (lo @ key).astype(np.uint64) % np.uint64(q)
+    hi = (hi @ key).astype(np.uint64) % np.uint64(q)
+    return add_mod(mul_mod(hi, np.uint64((1 << 32) % q), q), lo, q)
+
+
+def rescale(x, q: int, target: int) -> np.ndarray:
+    """round(x * target / q) mod target for x in [0, q), target < q."""
+    x = np.asarray(x, dtype=np.uint64)
+    lo, hi = _halves(x)
+    y = (hi * 2.0 ** 32 + lo) * (target / q)
+    rounded = np.rint(y)
+    # y is off by at most target * 2**-51; only values that close to a tie need the exact path
+    near = np.abs(y - rounded) > 0.5 - target * 2.0 ** -45
+    rounded[rounded == target] = 0
+    out = rounded.astype(np.uint64)
+    if near.any():
+        xs = x[near]
+        rem = mul_mod(xs, np.uint64(target), q)
+        # xs * target - rem is a multiple of q, so its quotient has no rounding boundary nearby
+        quotient = np.rint(xs.astype(np.float64) * (target / q) - rem.astype(np.float64) / q).astype(np.uint64)
+        out[near] = (quotient + (rem > np.uint64(q // 2))) % np.uint64(target)
+    return out
+
+
+# ---------- ciphertexts ----------
+def encrypt(messages, key, enc: Encoding, rng: np.random.Generator, noise_std: float = LWE_NOISE_STD) -> np.ndarray:
+    """LWE encryptions mod q of messages (count,) under a binary key (dim,): (count, dim + 1)."""
+    q = enc.modulus
+    messages = np.asarray(messages)
+    out = np.empty((len(messages), len(key) + 1), dtype=np.uint64)
+    out[:, :-1] = uniform(rng, (len(messages), len(key)), q)
+    noisy = add_mod(enc.encode(messages), gaussian(rng, len(messages), noise_std * q, q), q)
+    out[:, -1] = add_mod(dot_binary(out[:, :-1], key, q), noisy, q)
+    return out
+
+
+def phase(lwe, key, q: int) -> np.ndarray:
+    lwe = np.asarray(lwe, dtype=np.uint64)
+    return sub_mod(lwe[..., -1], dot_binary(lwe[..., :-1], key, q), q)
+
+
+def decrypt(lwe, key, enc: Encoding) -> np.ndarray:
+    return enc.decode(phase(lwe, key, enc.modulus))
+
+
+def to_rotate_idx(lwe, geom: Geometry) -> np.ndarray:
+    """Modulus switching of every a_i and b to 2N, the rotate_idx values of pbs.vhd."""
+    return rescale(lwe, geom.modulus, 2 * geom.n)
+
+
+def encrypt_inputs(messages, keys: SecretKeys, geom: Geometry, bits: int = 2, rng: Optional[np.random.Generator] = None,
+                   noise_std: float = LWE_NOISE_STD, chunk: int = CHUNK, workers: Optional[int] = None) -> np.ndarray:
+    """PBS inputs for messages: switched ciphertexts (count, k_lwe + 1).
+
+    Chunks of CHUNK ciphertexts are encrypted by a thread pool (NumPy releases
+    the GIL), each from its own generator seeded by rng.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    enc = Encoding(geom.modulus, bits)
+    messages = np.asarray(messages)
+    out = np.empty((len(messages), geom.k_lwe + 1), dtype=np.uint64)
+    firsts = range(0, len(messages), chunk)
+    seeds = rng.integers(0, 1 << 63, len(firsts))
+
+    def step(first: int, seed: int):
+        part = messages[first:first + chunk]
+        lwe = encrypt(part, keys.lwe, enc, np.random.default_rng(seed), noise_std)
+        out[first:first + len(part)] = to_rotate_idx(lwe, geom)
+
+    with ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+        list(pool.map(step, firsts, seeds))
+    return out
+
+
+def to_batches(lwe: np.ndarray, geom: Geometry, **kwargs) -> Iterator[PbsBatch]:
+    """Views of pbs_batchsize ciphertexts each, as scheduler/pool batches."""
+    for first in range(0, len(lwe), geom.batchsize):
+        yield PbsBatch(lwe[first:first + geom.batchsize], **kwargs)
+
+
+def unpack_results(words: np.ndarray, geom: Geometry) -> Tuple[np.ndarray, np.ndarray]:
+    """(mask (count, k * N), body (count,)) views of result rows as Scheduler.run returns them."""
+    words = np.asarray(words, dtype=np.uint64).reshape(-1, geom.result_words_per_lwe * geom.coeffs_per_word)
+    return words[:, :geom.k * geom.n], words[:, geom.result_body_index]
+
+
+def decrypt_results(words: np.ndarray, keys: SecretKeys, geom: Geometry, bits: int = 2) -> np.ndarray:
+    mask, body = unpack_results(words, geom)
+    enc = Encoding(geom.modulus, bits)
+    return enc.decode(sub_mod(body, dot_binary(mask, keys.glwe.reshape(-1), enc.modulus), enc.modulus))
+
+
+def pack_results(lwe: np.ndarray, geom: Geometry) -> np.ndarray:
+    """Result rows for ciphertexts of dimension k * N: the inverse of unpack_results, for stand-ins."""
+    layout = buffer_layouts(geom, len(lwe))["result"]
+    words = layout.unpack(layout.allocate())
+    mask, body = unpack_results(words, geom)
+    mask[...] = lwe[:, :-1]
+    body[...] = lwe[:, -1]
+    return words
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched LWE encryption and decoding for the PBS inputs and results")
+    parser.add_argument("--count", type=int, default=100000, help="ciphertexts")
+    parser.add_argument("--bits", type=int, default=2, help="message bits (plus one padding bit)")
+    parser.add_argument("--keys", help="secret keys of tfhe_model.keygen (default: fresh keys)")
+    parser.add_argument("--noise-std", type=float, default=LWE_NOISE_STD, help="relative to the modulus")
+    parser.add_argument("--chunk", type=int, default=CHUNK)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="encryption threads")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    geom = load_geometry()
+    keys = load_keys(args.keys) if args.keys else generate_keys(params_of(geom), args.seed)
+    rng = np.random.default_rng(args.seed)
+    enc = Encoding(geom.modulus, args.bits)
+    messages = rng.integers(0, 1 << args.bits, args.count)
+
+    def timed(label: str, count: int, func, *func_args):
+        start = time.perf_counter()
+        res = func(*func_args)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<28} {elapsed * 1e3:>9.1f} ms  {count / elapsed / 1e6:>6.2f} M ciphertexts/s")
+        return res
+
+    inputs = timed("encrypt_inputs", args.count, encrypt_inputs, messages, keys, geom, args.bits, rng, args.noise_std,
+                   args.chunk, args.workers)
+    print(f"  {inputs.nbytes / 1e6:.0f} MB of ai/b, rotate_idx below {int(inputs.max()) + 1}")
+
+    # round trip at the full modulus, and results as the engine writes them (dimension k * N)
+    sample = messages[:min(args.count, 16384)]
+    lwe = encrypt(sample, keys.lwe, enc, rng, args.noise_std)
+    errors = int(np.count_nonzero(decrypt(lwe, keys.lwe, enc) != sample))
+    results = pack_results(encrypt(sample, keys.glwe.reshape(-1), enc, rng, args.noise_std), geom)
+    decoded = timed("decrypt_results", len(sample), decrypt_results, results, keys, geom, args.bits)
+    errors += int(np.count_nonzero(decoded != sample))
+    print(f"{errors} decryption errors")
+    if errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
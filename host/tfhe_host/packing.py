@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Zero-copy packing of the engine's HBM buffers.
+
+The engine moves 256-bit words: hbm_coeffs_per_clock_per_ps_port = 4 uint64
+coefficients (lanes, lane 0 in the low bits) per clock and pseudo channel,
+at 32-byte aligned addresses (hbm_addr_base_bits). Each slave of crossbar_1
+stripes its buffer over the channels in its own way:
+  op     - one pbs_operation record per word
+  lut    - (k+1) * N coefficients per LUT, 4 per word
+  ai     - k_lwe a_i per ciphertext over ai_hbm_num_ps_ports channels from
+           channel_ai_idx; coefficient c of a clock is lane c % 4 of port
+           c // 4, and every port reads the same address
+  b      - one b per ciphertext, in lane 0 of the first word at its ai offset
+  result - k * N mask coefficients, then b in lane 0 of the next word
+  bsk    - bsk_hbm_num_ports_to_use channels of stack 0, each slot split
+           into num_sub_blocks words per port (tfhe_model.keygen)
+
+A BufferLayout declares one of them as the named axes of its storage, port
+outermost and lane innermost, and the axes of the caller's array grouped
+into its dimensions. Storage axes that are in no group are padding, read
+and written at index 0. view() turns a contiguous or memory-mapped buffer
+into a strided ndarray of those axes without copying, so pack() is one
+NumPy assignment into the buffer and unpack() returns a view wherever the
+layout allows (a copy only where ports interleave). Where the ports
+interleave (ai, bsk), pack() copies blocks of the first dimension that stay
+in the L2 cache while they are scattered over the ports, instead of walking
+all of the caller's array once per port. segments() gives the host address
+(hbm_alloc.AddressMap) and bytes of every port for XdmaDevice.write/read.
+
+The benchmark packs every buffer of --count ciphertexts over --workers
+threads (default: one per CPU), unpacks it again and compares the bytes of HBM words packed per
+second with the PCIe line rate of the XDMA core (256-bit AXI at 250 MHz,
+tfhe_pu_bd.tcl). Unpacking shows "view" where it copies nothing.
+
+Usage:
+  python3 -m tfhe_host.packing --count 16384
+  python3 -m tfhe_host.packing --count 4096 --repeat 20 --workers 8
+"""
+
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .geometry import CHANNEL_AI, CHANNEL_B, CHANNEL_LUT, CHANNEL_OP, CHANNEL_RESULT, Geometry, load_geometry, params_of
+from .hbm_alloc import AddressMap
+from .xdma import aligned_empty
+from tfhe_model.keygen import CHANNEL_WINDOW, bsk_layout, to_ports
+from tfhe_model.pbs import bsk_stream
+
+WORD_ALIGN = 32                     # hbm_bytes_per_ps_port, hbm_addr_base_bits = "00000"
+PCIE_LINE_RATE = 32 * 250e6         # bytes/s, axi_data_width 256_bit at axisten_freq 250 MHz
+CHANNEL_BSK = 0                     # stack 0, AXI_00..AXI_15
+BLOCK_BYTES = 1 << 18               # of the caller's array per copy, well inside the L2 cache
+
+
+class Axis(NamedTuple):
+    name: str
+    size: int
+
+
+class BufferLayout(NamedTuple):
+    name: str
+    channel: int                          # channel of port 0, port p uses channel + p
+    storage: Tuple[Axis, ...]             # outermost first, from "port" to "lane"
+    logical: Tuple[Tuple[str, ...], ...]  # axes of each dimension of the caller's array
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return tuple(a.size for a in self.storage)
+
+    @property
+    def ports(self) -> int:
+        return self.storage[0].size
+
+    @property
+    def port_bytes(self) -> int:
+        return math.prod(self.shape[1:]) * 8
+
+    @property
+    def nbytes(self) -> int:
+        return self.ports * self.port_bytes
+
+    @property
+    def logical_shape(self) -> Tuple[int, ...]:
+        sizes = dict(self.storage)
+        return tuple(math.prod(sizes[name] for name in group) for group in self.logical)
+
+    def allocate(self) -> np.ndarray:
+        """A zeroed, page-aligned buffer of the layout, (ports, port_bytes) uint8."""
+        return aligned_empty(self.nbytes).reshape(self.ports, self.port_bytes)
+
+    def _ports(self, buffer, port_stride: Optional[int]) -> np.ndarray:
+        raw = np.asarray(buffer).reshape(-1).view(np.uint8)
+        stride = port_stride or self.port_bytes
+        if raw.ctypes.data % WORD_ALIGN or stride % WORD_ALIGN:
+            raise ValueError(f"{self.name} buffers must be {WORD_ALIGN}-byte aligned")
+        if len(raw) < (self.ports - 1) * stride + self.port_bytes:
+            raise ValueError(f"{self.name} needs {(self.ports - 1) * stride + self.port_bytes} bytes, got {len(raw)}")
+        return np.lib.stride_tricks.as_strided(raw, (self.ports, self.port_bytes), (stride, 1),
+                                               writeable=raw.flags.writeable)
+
+    def view(self, buffer, port_stride: Optional[int] = None) -> np.ndarray:
+        """Strided uint64 view of buffer with the logical axes in order, split into their storage axes.
+
+        port_stride is the distance of the ports in buffer, e.g. the channel
+        window of a keygen image; by default they follow each other.
+        """
+        words = self._ports(buffer, port_stride).view(np.uint64).reshape(self.shape)
+        names = [a.name for a in self.storage]
+        order = [names.index(name) for group in self.logical for name in group]
+        padding = [i for i in range(len(names)) if i not in order]
+        return words.transpose(order + padding)[(Ellipsis,) + (0,) * len(padding)]
+
+    def pack(self, values, buffer=None, port_stride: Optional[int] = None,
+             workers: Optional[int] = None) -> np.ndarray:
+        """Writes values of logical_shape into buffer (a new one by default) and returns the buffer.
+
+        The first dimension is copied in blocks of about BLOCK_BYTES, spread
+        over workers threads (default: os.cpu_count()); NumPy copies without
+        the GIL.
+        """
+        buffer = self.allocate() if buffer is None else buffer
+        view = self.view(buffer, port_stride)
+        values = np.asarray(values).reshape(view.shape)
+        rows = max(1, BLOCK_BYTES // max(1, values[:1].nbytes))
+        blocks = [(lo, lo + rows) for lo in range(0, len(view), rows)]
+        workers = min(workers or os.cpu_count() or 1, len(blocks))
+        if workers <= 1:
+            for lo, hi in blocks:
+                np.copyto(view[lo:hi], values[lo:hi])
+        else:
+            with ThreadPoolExecutor(workers) as pool:
+                list(pool.map(lambda block: np.copyto(view[block[0]:block[1]], values[block[0]:block[1]]), blocks))
+        return buffer
+
+    def unpack(self, buffer, port_stride: Optional[int] = None) -> np.ndarray:
+        """The logical array of buffer: a view if the layout keeps its dimensions contiguous, else a copy."""
+        return self.view(buffer, port_stride).reshape(self.logical_shape)
+
+    def segments(self, buffer, amap: AddressMap, offset: int,
+                 port_stride: Optional[int] = None) -> List[Tuple[int, np.ndarray]]:
+        """(host address, bytes) of every port, at offset into the window of its channel."""
+        ports = self._ports(buffer, port_stride)
+        return [(amap.base(self.channel + p) + offset, ports[p]) for p in range(self.ports)]
+
+
+def buffer_layouts(geom: Geometry, items: Optional[int] = None, luts: int = 1) -> Dict[str, BufferLayout]:
+    """The layouts of the crossbar_1 slaves for items ciphertexts (default: pbs_batchsize)."""
+    items = geom.batchsize if items is None else items
+    lanes = geom.coeffs_per_word
+    ai_ports = geom.ai_coeffs_per_word // lanes
+    ai_words = geom.k_lwe // geom.ai_coeffs_per_word
+    bsk = bsk_layout(params_of(geom))
+    return {
+        "op": BufferLayout("op", CHANNEL_OP, (Axis("port", 1), Axis("item", items), Axis("lane", lanes)),
+                           (("item",), ("lane",))),
+        "lut": BufferLayout("lut", CHANNEL_LUT,
+                            (Axis("port", 1), Axis("lut", luts), Axis("word", (geom.k + 1) * geom.n // lanes),
+                             Axis("lane", lanes)),
+                            (("lut",), ("word", "lane"))),
+        "ai": BufferLayout("ai", CHANNEL_AI,
+                           (Axis("port", ai_ports), Axis("item", items), Axis("word", ai_words), Axis("lane", lanes)),
+                           (("item",), ("word", "port", "lane"))),
+        "b": BufferLayout("b", CHANNEL_B,
+                          (Axis("port", 1), Axis("item", items), Axis("word", ai_words), Axis("lane", lanes)),
+                          (("item",),)),
+        "result": BufferLayout("result", CHANNEL_RESULT,
+                               (Axis("port", 1), Axis("item", items), Axis("word", geom.result_words_per_lwe),
+                                Axis("lane", lanes)),
+                               (("item",), ("word", "lane"))),
+        "bsk": BufferLayout("bsk", CHANNEL_BSK,
+                            (Axis("port", bsk.ports), Axis("iteration", geom.k_lwe), Axis("slot", bsk.slots),
+                             Axis("sub_block", bsk.sub_blocks), Axis("lane", lanes)),
+                            (("iteration",), ("slot", "port", "lane", "sub_block"))),
+    }
+
+
+def check_bsk(geom: Geometry, iterations: int = 2, seed: int = 0) -> bool:
+    """The bsk layout against keygen.to_ports, for the first iterations of a random hardware BSK."""
+    params = params_of(geom)
+    rng = np.random.default_rng(seed)
+    shape = (iterations, params.k + 1, params.k + 1, params.decomp_length, params.n)
+    bsk_hw = rng.integers(0, params.prime, shape, dtype=np.uint64)
+    expected = to_ports(bsk_hw, params, bsk_layout(params))
+    layout = buffer_layouts(geom)["bsk"]
+    image = aligned_empty((layout.ports - 1) * CHANNEL_WINDOW + layout.port_bytes)
+    view = layout.view(image, CHANNEL_WINDOW)
+    view[:iterations] = np.stack([bsk_stream(bsk_i, params) for bsk_i in bsk_hw]).reshape(
+        (iterations,) + view.shape[1:])
+    words = layout._ports(image, CHANNEL_WINDOW)
+    return all(np.array_equal(words[p].view(np.uint64)[:expected[p].size], expected[p].reshape(-1))
+               for p in range(layout.ports))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack and unpack the HBM buffers of the engine")
+    parser.add_argument("--count", type=int, default=16384, help="ciphertexts per buffer")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="packing threads (default: one per CPU)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    geom = load_geometry()
+    rng = np.random.default_rng(args.seed)
+    layouts = buffer_layouts(geom, args.count, luts=16)
+    layouts["bsk"] = buffer_layouts(geom)["bsk"]
+    lwe = rng.integers(0, 2 * geom.n, (args.count, geom.k_lwe + 1), dtype=np.uint64)
+    values = {"op": rng.integers(0, 1 << 63, layouts["op"].logical_shape, dtype=np.uint64),
+              "ai": lwe[:, :geom.k_lwe], "b": lwe[:, geom.k_lwe]}
+    for name in ("lut", "result", "bsk"):
+        values[name] = rng.integers(0, geom.modulus, layouts[name].logical_shape, dtype=np.uint64)
+
+    print(f"{'buffer':<8} {'MB':>8} {'pack GB/s':>10} {'x PCIe':>7} {'unpack GB/s':>12}  round trip")
+    status = 0
+    for name, layout in layouts.items():
+        buffer = layout.allocate()
+        pack = unpack = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            layout.pack(values[name], buffer, workers=args.workers)
+            pack = min(pack, time.perf_counter() - start)
+            start = time.perf_counter()
+            out = layout.unpack(buffer)
+            unpack = min(unpack, time.perf_counter() - start)
+        ok = np.array_equal(out, np.asarray(values[name]).reshape(layout.logical_shape))
+        status |= not ok
+        unpacked = "view" if np.shares_memory(out, buffer) else f"{layout.nbytes / unpack / 1e9:.2f}"
+        print(f"{name:<8} {layout.nbytes / 1e6:>8.1f} {layout.nbytes / pack / 1e9:>10.2f} "
+              f"{layout.nbytes / pack / PCIE_LINE_RATE:>7.1f} {unpacked:>12}  {'ok' if ok else 'MISMATCH'}")
+    same = check_bsk(geom)
+    print(f"bsk layout {'matches' if same else 'DIFFERS FROM'} tfhe_model.keygen.to_ports")
+    raise SystemExit(status or not same)
+
+
+if __name__ == "__main__":
+    main()
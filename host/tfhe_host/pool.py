@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Pool of tfhe-PU boards: one PBS stream sharded over every XDMA device.
+
+discover() finds every /dev/xdma<N>_user, so nothing is tied to xdma0. Each
+board gets its own DMA queues, control registers and scheduler
+(tfhe_host.scheduler); load_bsk() writes the bootstrapping key image to all
+boards in parallel. Every board remembers what is in its HBM
+(tfhe_host.residency), so a key set that is already there is not uploaded
+again, and with --index DIR it remembers it across processes. place() sends
+the key set of a tenant to the board that holds it, or else to the least
+recently used one.
+
+DevicePool.run() puts the batches into one shared queue. A board takes the
+next batch only when one of its input slots frees up (Scheduler.run), so a
+slow or busy board holds at most Layout.input_slots batches and never a
+backlog that others wait for: the idle boards take the work instead.
+Results come back through a reorder buffer in submission order.
+The report has per board the batches it took, its PBS/s and its engine busy
+fraction, next to the aggregate PBS/s of the pool.
+
+DevicePool.local(n) builds n stand-in boards (memfd card, simulated engine);
+--pbs-time takes one duration per board to model mixed or loaded boards.
+
+Usage:
+  python3 -m tfhe_host.pool --local 4 --batches 400 --pbs-time 1e-3,1e-3,2e-3,4e-3
+  sudo python3 -m tfhe_host.pool --batches 1000 --bsk bsk_stack0.bin --index ~/.cache/tfhe_pu/residency
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from . import trace
+from .completion import Completion
+from .control import Controller
+from .geometry import TFHE_PU_HOST_READS
+from .residency import BSK_BASE, Residency, digest_of
+from .scheduler import Layout, PbsBatch, Scheduler, format_metrics, local_engine, random_batches
+from .xdma import XdmaDevice, parse_size
+
+
+def discover(pattern: str = "/dev/xdma*_user") -> List[str]:
+    """Device prefixes of all XDMA instances, e.g. ["/dev/xdma0", "/dev/xdma1"]."""
+    paths = [p[:-len("_user")] for p in glob.glob(pattern)]
+    return sorted(paths, key=lambda p: int(re.findall(r"\d+$", p)[0]))
+
+
+class Board:
+    def __init__(self, name: str, dev: XdmaDevice, waiter: Completion, layout: Layout,
+                 index: Optional[str] = None, samples: int = 8, readable: Optional[Iterable[int]] = None):
+        self.name = name
+        self.dev = dev
+        self.waiter = waiter
+        self.scheduler = Scheduler(dev, waiter, layout, readable=readable)
+        self.residency = Residency(dev, path=index, geom=layout.geom, samples=samples, ctrl=waiter.ctrl,
+                                   readable=readable)
+        self.taken = 0
+
+    @classmethod
+    def open(cls, prefix: str, layout: Layout, index_dir: Optional[str] = None, samples: int = 8) -> "Board":
+        dev = XdmaDevice.open(prefix)
+        index = os.path.join(index_dir, f"{os.path.basename(prefix)}.json") if index_dir else None
+        return cls(prefix, dev, Completion(Controller.open(f"{prefix}_user", record=False)), layout, index, samples,
+                   TFHE_PU_HOST_READS)
+
+    @classmethod
+    def local(cls, name: str, layout: Layout, pbs_time: float, index_dir: Optional[str] = None,
+              samples: int = 8) -> "Board":
+        # with an index the card is a file next to it, so that it outlives the process like a real one
+        dev = XdmaDevice.local(name=name, path=os.path.join(index_dir, f"{name}.hbm") if index_dir else None)
+        waiter = Completion.local(pbs_time)
+        waiter.ctrl.regs.name = name
+        waiter.ctrl.regs.on_done = local_engine(dev, layout)
+        index = os.path.join(index_dir, f"{name}.json") if index_dir else None
+        return cls(name, dev, waiter, layout, index, samples)
+
+    @property
+    def bsk_digest(self) -> Optional[str]:
+        entry = self.residency.bsk()
+        return entry.digest if entry is not None else None
+
+    def load_bsk(self, image: np.ndarray, base: int = BSK_BASE, windows: Optional[List[Tuple[int, int]]] = None,
+                 digest: Optional[str] = None, tenant: str = "") -> str:
+        """Writes the BSK image, or only its (offset, bytes) windows, unless it is resident; returns its digest."""
+        start = time.perf_counter_ns()
+        digest, hit = self.residency.load_bsk(image, windows, digest, tenant, base)
+        tracer = trace.ACTIVE
+        if tracer is not None and not hit:
+            nbytes = sum(length for _, length in self.residency.bsk().windows)
+            tracer.record("bsk_upload", start, time.perf_counter_ns(), nbytes, self.name, "bsk")
+        return digest
+
+    def close(self):
+        self.waiter.close()
+        self.dev.close()
+
+
+class DevicePool:
+    def __init__(self, boards: List[Board]):
+        if not boards:
+            raise ValueError("no boards")
+        self.boards = boards
+        self.latencies: List[float] = []
+        self._wall = 0.0
+
+    @classmethod
+    def open(cls, prefixes: Optional[List[str]] = None, layout: Optional[Layout] = None,
+             index_dir: Optional[str] = None, samples: int = 8) -> "DevicePool":
+        from .geometry import load_geometry
+        layout = layout or Layout(load_geometry())
+        prefixes = discover() if prefixes is None else prefixes
+        if not prefixes:
+            raise FileNotFoundError("no /dev/xdma*_user found, is the xdma driver loaded?")
+        return cls([Board.open(p, layout, index_dir, samples) for p in prefixes])
+
+    @classmethod
+    def local(cls, n: int, pbs_times: Iterable[float] = (1e-3,), layout: Optional[Layout] = None,
+              index_dir: Optional[str] = None, samples: int = 8) -> "DevicePool":
+        from .geometry import load_geometry
+        layout = layout or Layout(load_geometry())
+        times = list(pbs_times)
+        times += times[-1:] * (n - len(times))
+        return cls([Board.local(f"local{i}", layout, times[i], index_dir, samples) for i in range(n)])
+
+    def close(self):
+        for board in self.boards:
+            board.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def load_bsk(self, image: np.ndarray, base: int = BSK_BASE,
+                 windows: Optional[List[Tuple[int, int]]] = None) -> List[str]:
+        """Loads the BSK on all boards in parallel."""
+        with ThreadPoolExecutor(max_workers=len(self.boards)) as pool:
+            return list(pool.map(lambda b: b.load_bsk(image, base, windows), self.boards))
+
+    def validate(self) -> Dict[str, List[str]]:
+        """Checks the residency index of every board against its HBM; the dropped digests per board."""
+        return {board.name: board.residency.validate() for board in self.boards}
+
+    def place(self, image: np.ndarray, windows: Optional[List[Tuple[int, int]]] = None,
+              path: Optional[str] = None, tenant: str = "") -> Board:
+        """The board that holds the key set image (the file at path), loading it on the least recently used one."""
+        if path is not None:
+            digest = self.boards[0].residency.file_digest(path, windows or [(0, os.path.getsize(path))])
+        else:
+            digest = digest_of(image.reshape(-1).view(np.uint8), windows or [(0, image.nbytes)])
+        board = next((b for b in self.boards if b.bsk_digest == digest), None)
+        if board is None:
+            board = min(self.boards, key=lambda b: b.residency.bsk().last_used if b.residency.bsk() else 0.0)
+        board.load_bsk(image, windows=windows, digest=digest, tenant=tenant)
+        return board
+
+    # ---------- sharding ----------
+    async def _worker(self, board: Board, queue: asyncio.Queue, out: asyncio.Queue):
+        taken: List[int] = []
+
+        async def feed():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                index, batch = item
+                taken.append(index)
+                board.taken += 1
+                yield batch
+
+        try:
+            async for local, result in board.scheduler.run(feed()):
+                await out.put((taken[local], result))
+        except Exception as exc:
+            await out.put((None, exc))
+        else:
+            await out.put((None, None))
+
+    async def run(self, batches: Iterable[PbsBatch]) -> AsyncIterator[Tuple[int, np.ndarray]]:
+        """Yields (batch index, results) in submission order."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=len(self.boards))
+        out: asyncio.Queue = asyncio.Queue()
+        submitted: Dict[int, float] = {}
+
+        async def produce():
+            for i, batch in enumerate(batches):
+                submitted[i] = time.perf_counter()
+                await queue.put((i, batch))
+            for _ in self.boards:
+                await queue.put(None)
+
+        start = time.perf_counter()
+        tasks = [asyncio.ensure_future(produce())]
+        tasks += [asyncio.ensure_future(self._worker(b, queue, out)) for b in self.boards]
+        reorder: Dict[int, np.ndarray] = {}
+        next_index = 0
+        running = len(self.boards)
+        try:
+            while running:
+                index, result = await out.get()
+                if index is None:
+                    if result is not None:
+                        raise result
+                    running -= 1
+                    continue
+                self.latencies.append(time.perf_counter() - submitted.pop(index))
+                reorder[index] = result
+                while next_index in reorder:
+                    yield next_index, reorder.pop(next_index)
+                    next_index += 1
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._wall += time.perf_counter() - start
+
+    # ---------- metrics ----------
+    def metrics(self) -> dict:
+        boards = []
+        for board in self.boards:
+            m = board.scheduler.metrics()
+            boards.append({"board": board.name, "batches": board.taken, "pbs": m.get("pbs", 0),
+                           "pbs_per_s": m.get("pbs", 0) / self._wall if self._wall else 0.0,
+                           "engine_busy": m.get("engine_busy", 0.0)})
+        pbs = sum(b["pbs"] for b in boards)
+        latency = np.array(self.latencies or [0.0]) * 1e6
+        return {"boards": boards, "pbs": pbs, "seconds": self._wall,
+                "pbs_per_s": pbs / self._wall if self._wall else 0.0,
+                "latency_us": dict(zip(("p50", "p99", "max"), map(float, np.percentile(latency, (50, 99, 100)))))}
+
+
+def format_pool_metrics(m: dict) -> str:
+    lines = [f"{'board':<14} {'batches':>8} {'PBS/s':>10} {'busy':>7}"]
+    for b in m["boards"]:
+        lines.append(f"{b['board']:<14} {b['batches']:>8} {b['pbs_per_s']:>10.0f} {100 * b['engine_busy']:>6.1f}%")
+    lat = m["latency_us"]
+    lines.append(f"pool: {m['pbs']} PBS, {m['pbs_per_s']:.0f} PBS/s, batch latency p50/p99/max "
+                 f"{lat['p50']:.0f}/{lat['p99']:.0f}/{lat['max']:.0f} us")
+    return "\n".join(lines)
+
+
+async def run_checked(pool: DevicePool, batches: List[PbsBatch]) -> int:
+    """Runs the batches; returns the number of out-of-order or wrong results (the stand-ins echo b)."""
+    bad = 0
+    expected = 0
+    body = pool.boards[0].scheduler.geom.result_body_index
+    async for i, result in pool.run(batches):
+        bad += (i != expected) + int(np.count_nonzero(result[:, body] != batches[i].lwe[:, -1]))
+        expected += 1
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shard a PBS stream over all tfhe-PU boards")
+    parser.add_argument("--devices", help="comma separated device prefixes (default: all /dev/xdma*_user)")
+    parser.add_argument("--local", type=int, metavar="N", help="use N stand-in boards")
+    parser.add_argument("--pbs-time", default="1e-3", help="PBS duration per stand-in board, comma separated")
+    parser.add_argument("--bsk", help="BSK image of stack 0 to load on every board (tfhe_model.keygen)")
+    parser.add_argument("--bsk-size", type=parse_size, default=parse_size("16M"),
+                        help="size of the random BSK image loaded on stand-in boards without --bsk")
+    parser.add_argument("--index", metavar="DIR",
+                        help="keep the residency index of every board (and the stand-in cards) in DIR")
+    parser.add_argument("--batches", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.index:
+        os.makedirs(args.index, exist_ok=True)
+    if args.local:
+        pool = DevicePool.local(args.local, [float(t) for t in args.pbs_time.split(",")], index_dir=args.index)
+    else:
+        pool = DevicePool.open(args.devices.split(",") if args.devices else None, index_dir=args.index)
+    with pool:
+        if args.index:
+            for name, dropped in pool.validate().items():
+                if dropped:
+                    print(f"{name}: {len(dropped)} entries of the index are no longer in HBM")
+        windows = None
+        if args.bsk:
+            image = np.memmap(args.bsk, dtype=np.uint8, mode="r")
+            manifest = os.path.splitext(args.bsk)[0] + ".json"
+            if os.path.exists(manifest):
+                # keygen images are sparse: only the start of every channel window holds the key
+                with open(manifest) as f:
+                    windows = [tuple(w) for w in json.load(f)["windows"]]
+        elif args.local:
+            image = np.random.default_rng(args.seed).integers(0, 256, args.bsk_size, dtype=np.uint8)
+        else:
+            image = None
+        if image is not None:
+            start = time.perf_counter()
+            digests = pool.load_bsk(image, windows=windows)
+            nbytes = sum(w[1] for w in windows) if windows else len(image)
+            skipped = sum(b.residency.stats["hits"] for b in pool.boards)
+            print(f"BSK {digests[0]} ({nbytes >> 20} MB) loaded on {len(pool.boards)} boards "
+                  f"({skipped} already resident) in {time.perf_counter() - start:.2f} s")
+        geom = pool.boards[0].scheduler.geom
+        batches = list(random_batches(geom, args.batches, args.seed))
+        bad = asyncio.run(run_checked(pool, batches))
+        print(format_pool_metrics(pool.metrics()))
+        for board in pool.boards:
+            if board.scheduler.timings:
+                print(format_metrics(board.name, board.scheduler.metrics()))
+    if bad and args.local:
+        print(f"{bad} results out of order or wrong")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Residency of bootstrapping keys and LUTs in the HBM of a board.
+
+Residency remembers what the host has put into HBM, by content hash
+(BLAKE2b-128, the digest of DevicePool.load_bsk), and skips uploads of what
+is already there:
+  bsk - the engine reads the BSK at bsk_base_addr, the start of the stack 0
+        windows, so a board holds one key set; load_bsk() of another key set
+        replaces it. DevicePool.place() keeps key sets of several tenants
+        resident across boards and sends a missing one to the least recently
+        used board.
+  lut - LUT polynomials (tfhe_host.packing layout) are placed in the LUT
+        window by the HbmAllocator (tfhe_host.hbm_alloc); load_lut() returns
+        the lut_addr of PbsBatch. When the window is full, the least recently
+        used LUTs are evicted.
+The digest of an image file is kept in the index with the file's size and
+mtime, so a hit on an unchanged file costs a stat instead of a hash.
+
+The index is a JSON file per board in --index (default
+~/.cache/tfhe_pu/residency), written after every change, so a new host
+process starts with what the last one left. Nothing from it is trusted
+before validate(): for every entry, --samples blocks of SAMPLE_BYTES at
+random offsets were hashed when it was uploaded and are read back and
+compared. A reprogrammed or power-cycled card, or a key overwritten by
+another tool, fails this check, and the entry is dropped and uploaded again.
+While the engine is idle, validate() gives the host the reads of the
+channels it samples for the time of the readback and restores the selects.
+
+The shipped tfhe_pu.vhd connects the PCIe reads of the result channel only
+(TFHE_PU_HOST_READS), so the BSK and LUT channels of a real board cannot be
+read back. For them the index holds an epoch instead: a random token that the
+first upload after a mismatch writes to the last EPOCH_BYTES of the result
+window, which the host can read. validate() keeps such an entry if the card
+still holds the token of the index. A reprogrammed or power-cycled card, or
+one used with another index, loses it; a key overwritten by another tool
+without touching the token is not noticed. The stand-in boards of --local
+read every channel and check the samples.
+
+Usage:
+  python3 -m tfhe_host.residency --local --tenants 6 --boards 2 --jobs 200
+  sudo python3 -m tfhe_host.residency --device /dev/xdma0 --bsk bsk_stack0.bin
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .geometry import CHANNEL_LUT, CHANNEL_RESULT, TFHE_PU_HOST_READS, Geometry, load_geometry
+from .hbm_alloc import CHANNELS_PER_STACK, HbmAllocator, host_access
+from .packing import buffer_layouts
+from .xdma import MAX_CHUNK, XdmaDevice, parse_size
+
+SAMPLE_BYTES = 4096
+BSK_BASE = 0       # bsk_base_addr: stack 0, AXI_00..AXI_15
+EPOCH_BYTES = 512  # one HBM burst at the end of the result window, above the result regions
+EPOCH_TOKEN_BYTES = 16
+DEFAULT_INDEX_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "tfhe_pu", "residency")
+
+
+class Resident(NamedTuple):
+    kind: str                        # "bsk" or "lut"
+    digest: str                      # BLAKE2b-128 of the content
+    windows: List[Tuple[int, int]]   # (host address, bytes)
+    samples: List[Tuple[int, str]]   # (host address, BLAKE2b-128 of SAMPLE_BYTES there)
+    last_used: float
+    tenant: str = ""
+
+
+def digest_of(flat: np.ndarray, windows: List[Tuple[int, int]]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for first, length in windows:
+        for off in range(first, first + length, MAX_CHUNK):
+            digest.update(flat[off:min(off + MAX_CHUNK, first + length)])
+    return digest.hexdigest()
+
+
+def _sample_digest(data) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+@contextmanager
+def host_reads(ctrl, channels: List[int]):
+    """Gives the host the reads of the stacks of channels while the engine is idle, then restores the selects."""
+    if ctrl is None:
+        yield
+        return
+    if ctrl.busy:
+        raise RuntimeError("the engine is busy, its channels cannot be read back")
+    saved = {name: ctrl.get(name) for name in ("RD0", "RD1")}
+    with ctrl.batch("select") as b:
+        for stack in {c // CHANNELS_PER_STACK for c in channels}:
+            b.set(f"RD{stack}", 0)
+    try:
+        yield
+    finally:
+        with ctrl.batch("select") as b:
+            for name, value in saved.items():
+                b.set(name, value)
+
+
+class Residency:
+    def __init__(self, dev: XdmaDevice, alloc: Optional[HbmAllocator] = None, path: Optional[str] = None,
+                 geom: Optional[Geometry] = None, samples: int = 8, ctrl=None,
+                 readable: Optional[Iterable[int]] = None):
+        self.dev = dev
+        self.readable = None if readable is None else frozenset(readable)   # None: every channel
+        self.access = host_access(self.readable)
+        self.alloc = alloc or HbmAllocator()
+        self.path = path
+        self.geom = geom or load_geometry()
+        self.samples = samples
+        self.ctrl = ctrl
+        self.entries: Dict[str, Resident] = {}
+        self.files: Dict[str, list] = {}     # realpath -> [size, mtime_ns, windows, digest]
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "dropped": 0, "bytes_uploaded": 0, "bytes_skipped": 0}
+        self._lut_layout = buffer_layouts(self.geom, luts=1)["lut"]
+        self._unverified: Dict[str, Resident] = {}
+        amap = self.alloc.amap
+        self.epoch: Optional[str] = None   # token at epoch_addr when the entries were uploaded
+        self.epoch_addr = amap.base(CHANNEL_RESULT) + amap.size(CHANNEL_RESULT) - EPOCH_BYTES
+        self.alloc.reserve(CHANNEL_RESULT, amap.size(CHANNEL_RESULT) - EPOCH_BYTES, EPOCH_BYTES)
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                index = json.load(f)
+            self.files = index.get("files", {})
+            self.epoch = index.get("epoch")
+            for e in index.get("entries", []):
+                entry = Resident(e["kind"], e["digest"], [tuple(w) for w in e["windows"]],
+                                 [tuple(s) for s in e["samples"]], e["last_used"], e.get("tenant", ""))
+                self._unverified[entry.digest] = entry
+
+    # ---------- index ----------
+    def save(self):
+        if self.path is None:
+            return
+        index = {"epoch": self.epoch, "files": self.files, "entries": [e._asdict() for e in self.entries.values()]}
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def _write(self, addr: int, data):
+        self.alloc.amap.check(addr, data.nbytes, True, self.access)
+        self.dev.write(addr, data)
+
+    def _read(self, addr: int, nbytes: int) -> np.ndarray:
+        self.alloc.amap.check(addr, nbytes, False, self.access)
+        return self.dev.read(addr, nbytes)
+
+    def _card_epoch(self) -> str:
+        return self._read(self.epoch_addr, EPOCH_BYTES)[:EPOCH_TOKEN_BYTES].tobytes().hex()
+
+    def _write_epoch(self):
+        """Starts a new epoch on the card unless the index has one; before every upload."""
+        if self.epoch is not None:
+            return
+        token = self.dev.buffer(EPOCH_BYTES)
+        token[:] = 0
+        token[:EPOCH_TOKEN_BYTES] = np.frombuffer(os.urandom(EPOCH_TOKEN_BYTES), dtype=np.uint8)
+        self._write(self.epoch_addr, token)
+        self.epoch = token[:EPOCH_TOKEN_BYTES].tobytes().hex()
+
+    def validate(self) -> List[str]:
+        """Checks the entries of the index against the card; keeps those that match, returns the dropped digests.
+
+        Samples on channels the host can read are read back, the others count as intact while the card
+        holds the epoch token of the index.
+        """
+        pending = list(self._unverified.values()) + list(self.entries.values())
+        self._unverified = {}
+        channel_of = self.alloc.amap.channel_of
+        channels = sorted({channel_of(addr) for e in pending for addr, _ in e.samples})
+        if self.readable is not None:
+            channels = [c for c in channels if c in self.readable]
+        dropped = []
+        with host_reads(self.ctrl, sorted(set(channels) | {CHANNEL_RESULT})):
+            if self.epoch is not None and self._card_epoch() != self.epoch:
+                self.epoch = None
+            for entry in pending:
+                ok = all(_sample_digest(self._read(addr, SAMPLE_BYTES)) == digest if channel_of(addr) in channels
+                         else self.epoch is not None for addr, digest in entry.samples)
+                if ok and entry.digest not in self.entries:
+                    ok = self._claim(entry)
+                if ok:
+                    self.entries[entry.digest] = entry
+                else:
+                    self._release(entry)
+                    dropped.append(entry.digest)
+        self.stats["dropped"] += len(dropped)
+        self.save()
+        return dropped
+
+    def _claim(self, entry: Resident) -> bool:
+        """Reserves the LUT block of an entry read from the index; False if it overlaps another."""
+        if entry.kind != "lut":
+            return not any(e.kind == "bsk" for e in self.entries.values())
+        addr, nbytes = entry.windows[0]
+        channel = self.alloc.amap.channel_of(addr)
+        try:
+            self.alloc.reserve(channel, addr - self.alloc.amap.base(channel), nbytes)
+        except (MemoryError, ValueError):
+            return False
+        return True
+
+    def _release(self, entry: Resident):
+        if self.entries.pop(entry.digest, None) is not None and entry.kind == "lut":
+            addr, _ = entry.windows[0]
+            channel = self.alloc.amap.channel_of(addr)
+            self.alloc.free(self.alloc.block_at(channel, addr - self.alloc.amap.base(channel)))
+
+    def _touch(self, entry: Resident, nbytes: int) -> Resident:
+        entry = self.entries[entry.digest] = entry._replace(last_used=time.time())
+        self.stats["hits"] += 1
+        self.stats["bytes_skipped"] += nbytes
+        self.save()
+        return entry
+
+    def _upload(self, kind: str, digest: str, flat: np.ndarray, windows: List[Tuple[int, int]],
+                base: int, tenant: str) -> Resident:
+        self._write_epoch()
+        for first, length in windows:
+            self._write(base + first, flat[first:first + length])
+        rng = random.Random(digest)
+        samples = []
+        for _ in range(self.samples):
+            first, length = rng.choice(windows)
+            off = first + rng.randrange(max(length // SAMPLE_BYTES, 1)) * SAMPLE_BYTES
+            part = flat[off:min(off + SAMPLE_BYTES, first + length)]
+            if len(part) == SAMPLE_BYTES:
+                samples.append((base + off, _sample_digest(part)))
+        entry = self.entries[digest] = Resident(kind, digest, [(base + first, length) for first, length in windows],
+                                                samples, time.time(), tenant)
+        self.stats["misses"] += 1
+        self.stats["bytes_uploaded"] += sum(length for _, length in windows)
+        self.save()
+        return entry
+
+    # ---------- key sets ----------
+    def file_digest(self, path: str, windows: List[Tuple[int, int]]) -> str:
+        """Digest of the windows of an image file, hashed again only when the file changed."""
+        real = os.path.realpath(path)
+        st = os.stat(real)
+        known = self.files.get(real)
+        if known and known[:3] == [st.st_size, st.st_mtime_ns, [list(w) for w in windows]]:
+            return known[3]
+        digest = digest_of(np.memmap(real, dtype=np.uint8, mode="r"), windows)
+        self.files[real] = [st.st_size, st.st_mtime_ns, [list(w) for w in windows], digest]
+        return digest
+
+    def bsk(self) -> Optional[Resident]:
+        return next((e for e in self.entries.values() if e.kind == "bsk"), None)
+
+    def load_bsk(self, image: np.ndarray, windows: Optional[List[Tuple[int, int]]] = None,
+                 digest: Optional[str] = None, tenant: str = "", base: int = BSK_BASE) -> Tuple[str, bool]:
+        """Makes image the BSK of the board; returns its digest and whether it was already resident."""
+        flat = image.reshape(-1).view(np.uint8)
+        windows = [tuple(w) for w in windows] if windows else [(0, len(flat))]
+        digest = digest or digest_of(flat, windows)
+        current = self.bsk()
+        if current is not None and current.digest == digest:
+            self._touch(current, sum(length for _, length in windows))
+            return digest, True
+        if current is not None:
+            self.entries.pop(current.digest)
+            self.stats["evictions"] += 1
+        self._upload("bsk", digest, flat, windows, base, tenant)
+        return digest, False
+
+    # ---------- LUTs ----------
+    def load_lut(self, lut: np.ndarray, tenant: str = "") -> Tuple[int, bool]:
+        """Makes a LUT ((k+1) * N coefficients) resident; returns its lut_addr and whether it was."""
+        layout = self._lut_layout
+        words = layout.pack(np.asarray(lut, dtype=np.uint64).reshape(layout.logical_shape))
+        flat = words.reshape(-1)
+        digest = digest_of(flat, [(0, len(flat))])
+        entry = self.entries.get(digest)
+        if entry is None:
+            while True:
+                try:
+                    block = self.alloc.alloc(len(flat), [CHANNEL_LUT])
+                    break
+                except MemoryError:
+                    if not self.evict_lut():
+                        raise
+            entry = self._upload("lut", digest, flat, [(0, len(flat))], block.addr, tenant)
+            hit = False
+        else:
+            entry = self._touch(entry, len(flat))
+            hit = True
+        return entry.windows[0][0] - self.alloc.amap.base(CHANNEL_LUT), hit
+
+    def evict_lut(self) -> bool:
+        """Evicts the least recently used LUT; False if there is none."""
+        luts = [e for e in self.entries.values() if e.kind == "lut"]
+        if not luts:
+            return False
+        self._release(min(luts, key=lambda e: e.last_used))
+        self.stats["evictions"] += 1
+        self.save()
+        return True
+
+
+def format_stats(name: str, stats: dict) -> str:
+    return (f"{name}: {stats['hits']} hits, {stats['misses']} uploads, {stats['evictions']} evictions, "
+            f"{stats['dropped']} dropped at validation, {stats['bytes_uploaded'] / 1e6:.1f} MB uploaded, "
+            f"{stats['bytes_skipped'] / 1e6:.1f} MB skipped")
+
+
+def main():
+    from .pool import DevicePool
+
+    parser = argparse.ArgumentParser(description="BSK and LUT residency across host processes")
+    parser.add_argument("--device", action="append", help="device prefix, repeatable (default: all boards)")
+    parser.add_argument("--local", action="store_true", help="stand-in boards backed by files next to the index")
+    parser.add_argument("--boards", type=int, default=2, help="number of stand-in boards")
+    parser.add_argument("--index", default=DEFAULT_INDEX_DIR,
+                        help="directory of the per-board index files (and stand-in card images)")
+    parser.add_argument("--bsk", help="BSK image of stack 0 to make resident (tfhe_model.keygen)")
+    parser.add_argument("--tenants", type=int, default=4, help="tenants with random key sets for --local")
+    parser.add_argument("--bsk-size", type=parse_size, default=parse_size("8M"))
+    parser.add_argument("--luts", type=int, default=3, help="LUTs per tenant")
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--samples", type=int, default=8, help="sampled blocks per entry")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.index, exist_ok=True)
+    if args.local:
+        pool = DevicePool.local(args.boards, index_dir=args.index, samples=args.samples)
+    else:
+        pool = DevicePool.open(args.device, index_dir=args.index, samples=args.samples)
+    with pool:
+        start = time.perf_counter()
+        for board in pool.boards:
+            dropped = board.residency.validate()
+            print(f"{board.name}: {len(board.residency.entries)} entries valid, {len(dropped)} dropped")
+        print(f"validation took {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+        geom = pool.boards[0].scheduler.geom
+        rng = np.random.default_rng(args.seed)
+        if args.bsk:
+            image = np.memmap(args.bsk, dtype=np.uint8, mode="r")
+            board = pool.place(image, path=args.bsk)
+            print(f"{args.bsk} resident on {board.name}")
+        else:
+            keys = [np.random.default_rng([args.seed, t]).integers(0, 256, args.bsk_size, dtype=np.uint8)
+                    for t in range(args.tenants)]
+            luts = [[np.random.default_rng([args.seed, t, i]).integers(0, geom.modulus, (geom.k + 1) * geom.n,
+                                                                         dtype=np.uint64)
+                     for i in range(args.luts)] for t in range(args.tenants)]
+            # skewed tenant popularity, as in a shared service
+            weights = 1 / np.arange(1, args.tenants + 1)
+            start = time.perf_counter()
+            for tenant in rng.choice(args.tenants, args.jobs, p=weights / weights.sum()):
+                board = pool.place(keys[tenant], tenant=f"tenant{tenant}")
+                board.residency.load_lut(luts[tenant][rng.integers(args.luts)], f"tenant{tenant}")
+            elapsed = time.perf_counter() - start
+            naive = args.jobs * (args.bsk_size + pool.boards[0].residency._lut_layout.nbytes)
+            print(f"{args.jobs} jobs of {args.tenants} tenants in {elapsed:.2f} s, "
+                  f"{sum(b.residency.stats['bytes_uploaded'] for b in pool.boards) / 1e6:.1f} MB uploaded "
+                  f"instead of {naive / 1e6:.1f} MB")
+        for board in pool.boards:
+            print(format_stats(board.name, board.residency.stats))
+
+
+if __name__ == "__main__":
+    main()
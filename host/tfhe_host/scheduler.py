@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Asynchronous double-buffered PBS batch scheduler.
+
+The workflow of host/README.md is sequential: give the HBM to the host,
+upload, flip the selects, START, poll, flip back, read the result channel, so
+PCIe time and PBS time add up. Scheduler.run() pipelines a stream of batches
+instead: while batch i runs, batch i+1 is uploaded and batch i-1 is read back.
+
+The overlap needs no ownership flips: tfhe_pu.vhd wires the directions
+statically, the host to the writes of every channel and the reads of the
+result channel, the TFHE processor to the reads of op, lut, ai, b and the BSK
+and the writes of the result channel, so the scheduler never writes the
+selects. Before every START it checks that the engine is idle, and it clears
+DONE after every completion (tfhe_host.completion).
+
+Regions (Layout):
+  ai, b   - --input-slots regions of one batch each. The op records point
+            into the region of their batch, so batch i+1 is uploaded while
+            batch i reads its own region.
+  op      - the engine reads its op records from op_base_addr after every
+            START, so they are written between DONE(i-1) and START(i).
+  result  - --result-slots regions; the op records of batch i point
+            lwe_addr_out into region i % --result-slots, and START(i) waits for
+            the readback of batch i - --result-slots. pbs_lwe_n_storage_read_to_hbm
+            always writes to res_base_addr, so the current bitstream needs 1.
+With --result-slots 1 only the upload (and the op records) overlap a PBS; the
+readback of batch i-1, START and the completion wakeup stay in series with
+it. --compare shows a speedup only when the upload is a noticeable part of a
+batch; on --local, where uploading a batch takes about 0.1 ms, both modes run
+at about the same rate.
+Batches have at most pbs_batchsize ciphertexts (k_lwe a_i and b, uint64);
+shorter ones are padded because the engine always processes a full batch.
+
+Metrics: sustained PBS/s, engine busy fraction, and per batch the queueing
+delay from its submission to its START.
+
+Usage:
+  python3 -m tfhe_host.scheduler --local --batches 200 --pbs-time 1e-3 --compare
+  sudo python3 -m tfhe_host.scheduler --device /dev/xdma0 --user /dev/xdma0_user --batches 1000
+"""
+
+import argparse
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from . import trace
+from .completion import Completion, EventSource
+from .control import REG_CONTROL, Controller
+from .geometry import (CHANNEL_B, CHANNEL_OP, CHANNEL_RESULT, SAMPLE_EXTRACT_DEFAULT_IDX, TFHE_PU_HOST_READS,
+                       Geometry, load_geometry)
+from .hbm_alloc import HbmAllocator, host_access
+from .packing import buffer_layouts
+from .xdma import XdmaDevice
+
+
+class HandshakeError(RuntimeError):
+    pass
+
+
+class PbsBatch(NamedTuple):
+    lwe: np.ndarray              # (count, k_lwe + 1) uint64, a_0..a_{k_lwe-1} then b
+    lut_addr: int = 0            # lut_start_addr of every op of the batch
+    sample_extract_idx: int = SAMPLE_EXTRACT_DEFAULT_IDX
+
+
+class BatchTiming(NamedTuple):
+    index: int
+    count: int
+    submitted: float
+    uploaded: float
+    started: float
+    done: float
+    read: float
+
+    @property
+    def queue_delay(self) -> float:
+        return self.started - self.submitted
+
+
+class Layout:
+    """Host addresses of the engine's HBM regions for a geometry, taken from an HbmAllocator."""
+
+    def __init__(self, geom: Geometry, input_slots: int = 2, result_slots: int = 1,
+                 alloc: Optional[HbmAllocator] = None):
+        self.geom = geom
+        self.input_slots = input_slots
+        self.result_slots = result_slots
+        self.buffers = buffer_layouts(geom)
+        self.input_bytes = self.buffers["ai"].port_bytes
+        self.result_bytes = self.buffers["result"].nbytes
+        alloc = alloc or HbmAllocator()
+        ai = self.buffers["ai"]
+        # op_base_addr and res_base_addr are the start of their windows; the ai ports and b share lwe_addr_in
+        self.regions = [alloc.reserve(CHANNEL_OP, 0, self.buffers["op"].nbytes),
+                        alloc.reserve(CHANNEL_RESULT, 0, result_slots * self.result_bytes)]
+        self.regions += alloc.alloc_span(input_slots * self.input_bytes,
+                                         [ai.channel + p for p in range(ai.ports)] + [CHANNEL_B])
+        self.op = self.regions[0].addr
+        self.result = self.regions[1].addr
+        self.result_offset = self.regions[1].offset
+        self.input_offset = self.regions[2].offset
+        self.amap = alloc.amap
+        self.b = alloc.amap.base(CHANNEL_B)
+
+    def lwe_offset(self, slot: int, j: int) -> int:
+        """lwe_addr_in of ciphertext j of an input slot; a_i and b use the same offset in their channels."""
+        return self.input_offset + slot * self.input_bytes + j * self.geom.ai_bytes_per_lwe
+
+    def result_offset_of(self, slot: int, j: int) -> int:
+        """lwe_addr_out of ciphertext j of a result slot, in the result channel."""
+        return self.result_offset + slot * self.result_bytes + j * self.geom.result_bytes_per_lwe
+
+    def op_records(self, slot: int, batch: PbsBatch, result_slot: int = 0) -> np.ndarray:
+        """pbs_operation records (processor_utils.vhd), one HBM word each, fields packed from bit 0."""
+        g = self.geom
+        words = np.zeros((g.batchsize, g.word_bytes // 8), dtype=np.uint64)
+        for j in range(g.batchsize):
+            addr = self.lwe_offset(slot, j)
+            out = self.result_offset_of(result_slot, j)
+            record = addr | out << g.addr_bits | batch.lut_addr << 2 * g.addr_bits
+            record |= batch.sample_extract_idx << 3 * g.addr_bits
+            for w in range(words.shape[1]):
+                words[j, w] = (record >> (64 * w)) & ((1 << 64) - 1)
+        return words
+
+    def pack_inputs(self, lwe: np.ndarray, ai: Optional[np.ndarray] = None,
+                    b: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """The ai and b buffers (tfhe_host.packing) of one slot, packed into ai and b if given."""
+        return (self.buffers["ai"].pack(lwe[:, :self.geom.k_lwe], ai),
+                self.buffers["b"].pack(lwe[:, self.geom.k_lwe], b))
+
+
+def pad(lwe: np.ndarray, batchsize: int) -> np.ndarray:
+    if len(lwe) > batchsize:
+        raise ValueError(f"a batch has at most pbs_batchsize = {batchsize} ciphertexts, got {len(lwe)}")
+    if len(lwe) == batchsize:
+        return lwe
+    return np.concatenate([lwe, np.repeat(lwe[-1:], batchsize - len(lwe), axis=0)])
+
+
+async def _aiter(items):
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+class Scheduler:
+    def __init__(self, dev: XdmaDevice, waiter: Completion, layout: Optional[Layout] = None,
+                 pipelined: bool = True, timeout: float = 10.0, readable: Optional[Iterable[int]] = None):
+        self.dev = dev
+        self.access = host_access(readable)   # every transfer is checked against it, None: every channel
+        self.waiter = waiter
+        self.ctrl: Controller = waiter.ctrl
+        self.layout = layout or Layout(load_geometry())
+        self.geom = self.layout.geom
+        self.pipelined = pipelined
+        self.timeout = timeout
+        self.timings: List[BatchTiming] = []
+        self._flags: Dict[Tuple[str, int], asyncio.Event] = {}
+        self._wall = 0.0
+        # packed ai and b of every input slot, reused by the batches of that slot
+        self._staging = [(self.layout.buffers["ai"].allocate(), self.layout.buffers["b"].allocate())
+                         for _ in range(self.layout.input_slots)]
+
+    # ---------- handshake ----------
+    def _check_idle(self):
+        ctrl = self.ctrl.read(REG_CONTROL)
+        if ctrl & 0b011:
+            raise HandshakeError(f"engine not idle before START (slv_reg0 = {ctrl:#010x})")
+
+    # ---------- pipeline ----------
+    def _flag(self, kind: str, i: int) -> asyncio.Event:
+        event = self._flags.get((kind, i))
+        if event is None:
+            event = self._flags[(kind, i)] = asyncio.Event()
+            if i < 0:
+                event.set()
+        return event
+
+    async def _io(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def _room(self, i: int):
+        """Waits until batch i can be uploaded: the batch that used its input slot before has finished."""
+        await self._flag("done", i - self.layout.input_slots).wait()
+        if not self.pipelined:
+            await self._flag("read", i - 1).wait()
+
+    async def _batch(self, i: int, batch: PbsBatch, submitted: float) -> np.ndarray:
+        lay = self.layout
+        slot = i % lay.input_slots
+        count = len(batch.lwe)
+        lwe = pad(np.asarray(batch.lwe, dtype=np.uint64), self.geom.batchsize)
+
+        await self._room(i)
+        tracer = trace.ACTIVE
+        begin = time.perf_counter_ns()
+        ai, b = lay.pack_inputs(lwe, *self._staging[slot])
+        for name, buffer in (("ai", ai), ("b", b)):
+            for addr, part in lay.buffers[name].segments(buffer, lay.amap, lay.lwe_offset(slot, 0)):
+                lay.amap.check(addr, part.nbytes, True, self.access)
+                await self._io(self.dev.write, addr, part)
+        uploaded = time.perf_counter()
+        if tracer is not None:
+            tracer.record("upload", begin, int(uploaded * 1e9), ai.nbytes + b.nbytes, self.dev.name, "batches")
+
+        # execute in order; the op records only wait for the previous PBS, START also for the readback of
+        # the batch whose result region is reused
+        await self._flag("done", i - 1).wait()
+        begin = time.perf_counter_ns()
+        records = lay.op_records(slot, batch, i % lay.result_slots)
+        lay.amap.check(lay.op, records.nbytes, True, self.access)
+        await self._io(self.dev.write, lay.op, records)
+        if tracer is not None:
+            tracer.record("op", begin, time.perf_counter_ns(), records.nbytes, self.dev.name, "batches")
+        await self._flag("read", i - lay.result_slots).wait()
+        self._check_idle()
+        started = time.perf_counter()
+        self.waiter.start()
+        await self.waiter.wait_done_async(self.timeout)
+        done = time.perf_counter()
+        self._flag("done", i).set()
+
+        begin = time.perf_counter_ns()
+        addr = lay.result + (i % lay.result_slots) * lay.result_bytes
+        lay.amap.check(addr, lay.result_bytes, False, self.access)
+        result = await self._io(self.dev.read, addr, lay.result_bytes, None, np.uint64)
+        if tracer is not None:
+            tracer.record("readback", begin, time.perf_counter_ns(), result.nbytes, self.dev.name, "batches")
+        self._flag("read", i).set()
+        for kind in ("done", "read"):
+            self._flags.pop((kind, i - lay.input_slots - lay.result_slots), None)
+        self.timings.append(BatchTiming(i, count, submitted, uploaded, started, done, time.perf_counter()))
+        return lay.buffers["result"].unpack(result)[:count]
+
+    async def run(self, batches: Union[Iterable[PbsBatch], AsyncIterable[PbsBatch]]
+                  ) -> AsyncIterator[Tuple[int, np.ndarray]]:
+        """Yields (batch index, results) in order; results are the raw result words, (count, words * 4) uint64.
+
+        The next batch is only taken from batches once its input slot is free, so a pool of schedulers
+        sharing one queue (tfhe_host.pool) leaves the batches a board cannot upload yet to the others.
+        """
+        pending = deque()
+        items = _aiter(batches)
+        room = None
+        start = time.perf_counter()
+        try:
+            count = 0
+            while True:
+                # hand out finished results while waiting, and stop on the first failed batch
+                room = asyncio.ensure_future(self._room(count))
+                while not room.done():
+                    await asyncio.wait({room, pending[0][1]} if pending else {room},
+                                       return_when=asyncio.FIRST_COMPLETED)
+                    while pending and pending[0][1].done():
+                        i, task = pending.popleft()
+                        yield i, task.result()
+                try:
+                    batch = await items.__anext__()
+                except StopAsyncIteration:
+                    break
+                pending.append((count, asyncio.ensure_future(self._batch(count, batch, time.perf_counter()))))
+                count += 1
+            while pending:
+                i, task = pending.popleft()
+                yield i, await task
+        finally:
+            if room is not None:
+                room.cancel()
+            for _, task in pending:
+                task.cancel()
+            self._wall += time.perf_counter() - start
+
+    # ---------- metrics ----------
+    def metrics(self) -> dict:
+        if not self.timings:
+            return {}
+        pbs = sum(t.count for t in self.timings)
+        delay = np.array([t.queue_delay for t in self.timings]) * 1e6
+        busy = sum(t.done - t.started for t in self.timings)
+        return {"batches": len(self.timings), "pbs": pbs, "seconds": self._wall,
+                "pbs_per_s": pbs / self._wall if self._wall else 0.0,
+                "engine_busy": busy / self._wall if self._wall else 0.0,
+                "queue_delay_us": dict(zip(("p50", "p99", "max"), map(float, np.percentile(delay, (50, 99, 100))))),
+                "upload_us_mean": float(np.mean([t.uploaded - t.submitted for t in self.timings]) * 1e6),
+                "readback_us_mean": float(np.mean([t.read - t.done for t in self.timings]) * 1e6)}
+
+
+def format_metrics(name: str, m: dict) -> str:
+    d = m["queue_delay_us"]
+    return (f"{name}: {m['pbs']} PBS in {m['batches']} batches, {m['pbs_per_s']:.0f} PBS/s, engine busy "
+            f"{100 * m['engine_busy']:.1f}%, queueing delay p50/p99/max {d['p50']:.0f}/{d['p99']:.0f}/{d['max']:.0f} us")
+
+
+def local_engine(dev: XdmaDevice, layout: Layout):
+    """Stand-in for the engine's output: copies b of every op's ciphertext into the body of its result.
+
+    The results go to lwe_addr_out of each op, as a bitstream that honours it would write them.
+    """
+    g = layout.geom
+    mask = np.uint64((1 << g.addr_bits) - 1)
+    result_base = layout.result - layout.result_offset
+
+    def on_done():
+        ops = dev.read(layout.op, g.batchsize * g.word_bytes, dtype=np.uint64).reshape(g.batchsize, -1)
+        addrs = (ops[:, 0] & mask).astype(np.int64)
+        outs = (ops[:, 0] >> np.uint64(g.addr_bits) & mask).astype(np.int64)
+        first = int(addrs.min())
+        b = dev.read(layout.b + first, int(addrs.max()) - first + 8, dtype=np.uint64)
+        out_first = int(outs.min())
+        span = np.zeros(((int(outs.max()) - out_first) // g.result_bytes_per_lwe + 1,
+                         g.result_bytes_per_lwe // 8), dtype=np.uint64)
+        span[(outs - out_first) // g.result_bytes_per_lwe, g.result_body_index] = b[(addrs - first) // 8]
+        dev.write(result_base + out_first, span)
+
+    return on_done
+
+
+def random_batches(geom: Geometry, num: int, seed: int = 0) -> Iterable[PbsBatch]:
+    rng = np.random.default_rng(seed)
+    for _ in range(num):
+        yield PbsBatch(rng.integers(0, 1 << 64, (geom.batchsize, geom.k_lwe + 1), dtype=np.uint64, endpoint=False))
+
+
+async def run_stream(scheduler: Scheduler, batches: List[PbsBatch]) -> int:
+    """Runs the batches and returns how many came back with a wrong b (the local engine echoes b)."""
+    bad = 0
+    async for i, result in scheduler.run(batches):
+        bad += int(np.count_nonzero(result[:, scheduler.geom.result_body_index] != batches[i].lwe[:, -1]))
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Double-buffered PBS batch scheduler")
+    parser.add_argument("--device", default="/dev/xdma0", help="DMA device prefix")
+    parser.add_argument("--user", default="/dev/xdma0_user", help="control register device")
+    parser.add_argument("--events", help="XDMA events file to wait on, e.g. /dev/xdma0_events_0")
+    parser.add_argument("--local", action="store_true", help="memfd card and simulated engine")
+    parser.add_argument("--pbs-time", type=float, default=1e-3, help="PBS duration of the simulated engine")
+    parser.add_argument("--batches", type=int, default=100)
+    parser.add_argument("--input-slots", type=int, default=2)
+    parser.add_argument("--result-slots", type=int, default=1, help="2 only for bitstreams that honour lwe_addr_out")
+    parser.add_argument("--sequential", action="store_true", help="no overlap, like the README workflow")
+    parser.add_argument("--compare", action="store_true", help="run sequential and pipelined")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    geom = load_geometry()
+    layout = Layout(geom, args.input_slots, args.result_slots)
+    batches = list(random_batches(geom, args.batches, args.seed))
+    modes = [False, True] if args.compare else [not args.sequential]
+    status = 0
+    for pipelined in modes:
+        if args.local:
+            dev = XdmaDevice.local()
+            waiter = Completion.local(args.pbs_time)
+            waiter.ctrl.regs.on_done = local_engine(dev, layout)
+        else:
+            dev = XdmaDevice.open(args.device)
+            events = EventSource.open(args.events) if args.events else None
+            waiter = Completion(Controller.open(args.user, record=False), events)
+        with dev, waiter:
+            scheduler = Scheduler(dev, waiter, layout, pipelined,
+                                  readable=None if args.local else TFHE_PU_HOST_READS)
+            bad = asyncio.run(run_stream(scheduler, batches))
+            print(format_metrics("pipelined" if pipelined else "sequential", scheduler.metrics()))
+            if args.local and bad:
+                print(f"{bad} results do not match their batch")
+                status = 1
+    raise SystemExit(status)
+
+
+if __name__ == "__main__":
+    main()
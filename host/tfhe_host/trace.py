@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Phase-level tracing of the host stack, exported as Chrome/Perfetto trace JSON.
+
+enable() installs a Tracer as trace.ACTIVE; the instrumented places of
+tfhe_host record a span each, and do nothing while ACTIVE is None:
+  dma_h2c / dma_c2h - every transfer of a DMA queue (xdma), with its bytes
+  select / start    - stack select changes and START writes (control)
+  pbs               - START to DONE seen (completion), with the device cycles
+                      when a cycle counter is configured
+  upload / op / readback - the ai/b upload, the op records and the result
+                      readback of a batch (scheduler)
+  bsk_upload        - a BSK image written to a board (pool)
+Spans go into a preallocated ring of capacity records (numpy structured
+array), so recording is a few stores and never allocates; when the ring is
+full the oldest spans are overwritten. Device and queue names become pid and
+tid of the trace.
+
+The bitstream has no cycle counter yet: slv_reg1..3 are plain registers.
+For bitstreams that add one, --cycle-reg reads a free-running 32-bit counter
+at that offset of the user BAR (Completion.cycles); --local simulates one at
+--cycle-hz.
+
+Usage:
+  python3 -m tfhe_host.trace --local --batches 50 --out pbs_trace.json
+  python3 -m tfhe_host.trace --local --boards 2 --bsk-size 64M --out pbs_trace.json
+  sudo python3 -m tfhe_host.trace --device /dev/xdma0 --cycle-reg 0x10 --out pbs_trace.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import re
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+ACTIVE: Optional["Tracer"] = None
+
+SPAN = np.dtype([("phase", np.int16), ("device", np.int16), ("queue", np.int16),
+                 ("start_ns", np.int64), ("end_ns", np.int64), ("bytes", np.int64), ("cycles", np.int64)])
+
+
+class Tracer:
+    def __init__(self, capacity: int = 1 << 18):
+        self.capacity = capacity
+        self._spans = np.zeros(capacity, dtype=SPAN)
+        self._count = itertools.count()      # next() is atomic under the GIL
+        self._names: Dict[str, int] = {}
+        self._origin = time.perf_counter_ns()
+
+    def _id(self, name: str) -> int:
+        ident = self._names.get(name)
+        if ident is None:
+            ident = self._names.setdefault(name, len(self._names))
+        return ident
+
+    def record(self, phase: str, start_ns: int, end_ns: int, nbytes: int = 0, device: str = "host",
+               queue: str = "main", cycles: int = -1):
+        self._spans[next(self._count) % self.capacity] = (self._id(phase), self._id(device), self._id(queue),
+                                                          start_ns, end_ns, nbytes, cycles)
+
+    @contextmanager
+    def span(self, phase: str, nbytes: int = 0, device: str = "host", queue: str = "main"):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(phase, start, time.perf_counter_ns(), nbytes, device, queue)
+
+    # ---------- results ----------
+    def spans(self) -> np.ndarray:
+        """The recorded spans, oldest first."""
+        count = next(self._count)
+        self._count = itertools.count(count)
+        if count <= self.capacity:
+            return self._spans[:count].copy()
+        split = count % self.capacity
+        return np.concatenate([self._spans[split:], self._spans[:split]])
+
+    def chrome_trace(self) -> dict:
+        names = {i: name for name, i in self._names.items()}
+        events = []
+        spans = self.spans()
+        for device in np.unique(spans["device"]):
+            events.append({"name": "process_name", "ph": "M", "pid": int(device),
+                           "args": {"name": names[int(device)]}})
+        for queue in np.unique(spans["queue"]):
+            for device in np.unique(spans["device"][spans["queue"] == queue]):
+                events.append({"name": "thread_name", "ph": "M", "pid": int(device), "tid": int(queue),
+                               "args": {"name": names[int(queue)]}})
+        for s in spans:
+            args = {"bytes": int(s["bytes"])}
+            if s["cycles"] >= 0:
+                args["device_cycles"] = int(s["cycles"])
+            events.append({"name": names[int(s["phase"])], "ph": "X", "pid": int(s["device"]), "tid": int(s["queue"]),
+                           "ts": (int(s["start_ns"]) - self._origin) / 1e3,
+                           "dur": (int(s["end_ns"]) - int(s["start_ns"])) / 1e3, "args": args})
+        return {"traceEvents": events, "displayTimeUnit": "ns"}
+
+    def export_chrome(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self) -> Dict[str, dict]:
+        """Per phase: spans, total and mean time, bytes, GB/s while active and the share of the wall time."""
+        names = {i: name for name, i in self._names.items()}
+        spans = self.spans()
+        if not len(spans):
+            return {}
+        wall = (spans["end_ns"].max() - spans["start_ns"].min()) / 1e9
+        out = {}
+        for phase in np.unique(spans["phase"]):
+            mine = spans[spans["phase"] == phase]
+            seconds = float((mine["end_ns"] - mine["start_ns"]).sum()) / 1e9
+            nbytes = int(mine["bytes"].sum())
+            entry = {"spans": len(mine), "seconds": seconds, "mean_us": seconds / len(mine) * 1e6,
+                     "bytes": nbytes, "gbps": nbytes / seconds / 1e9 if seconds and nbytes else 0.0,
+                     "share": seconds / wall if wall else 0.0}
+            cycles = mine["cycles"][mine["cycles"] >= 0]
+            if len(cycles):
+                entry["device_cycles_mean"] = float(cycles.mean())
+            out[names[int(phase)]] = entry
+        return out
+
+
+def device_of(path: str) -> str:
+    """Board of a device file: /dev/xdma0_user, /dev/xdma0_h2c_1 -> /dev/xdma0."""
+    return re.sub(r"_(user|control|(h2c|c2h|events)_\d+)$", "", path)
+
+
+def enable(capacity: int = 1 << 18) -> Tracer:
+    global ACTIVE
+    ACTIVE = Tracer(capacity)
+    return ACTIVE
+
+
+def disable() -> Optional[Tracer]:
+    global ACTIVE
+    tracer, ACTIVE = ACTIVE, None
+    return tracer
+
+
+def register_cycles(regs, offset: int) -> Callable[[], int]:
+    """32-bit cycle counter at offset of the user BAR, read past the four registers of controller.v."""
+    return lambda: regs.read32(offset)
+
+
+def local_cycles(clock_hz: float) -> Callable[[], int]:
+    """Simulated 32-bit cycle counter of a clock_hz device clock."""
+    return lambda: int(time.perf_counter() * clock_hz) & 0xFFFFFFFF
+
+
+def format_summary(summary: Dict[str, dict]) -> str:
+    lines = [f"{'phase':<12} {'spans':>7} {'total ms':>10} {'mean us':>10} {'MB':>10} {'GB/s':>7} {'share':>7}"]
+    for phase, s in sorted(summary.items(), key=lambda kv: -kv[1]["seconds"]):
+        line = (f"{phase:<12} {s['spans']:>7} {s['seconds'] * 1e3:>10.2f} {s['mean_us']:>10.1f} "
+                f"{s['bytes'] / 1e6:>10.2f} {s['gbps']:>7.2f} {100 * s['share']:>6.1f}%")
+        if "device_cycles_mean" in s:
+            line += f"  {s['device_cycles_mean']:.0f} device cycles"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    from . import trace   # with -m this file runs as __main__; the hooks read tfhe_host.trace.ACTIVE
+    from .pool import DevicePool, run_checked
+    from .scheduler import random_batches
+    from .xdma import parse_size
+
+    parser = argparse.ArgumentParser(description="Trace a PBS run of the host stack")
+    parser.add_argument("--device", action="append", help="device prefix, repeatable (default: all boards)")
+    parser.add_argument("--local", action="store_true", help="stand-in boards")
+    parser.add_argument("--boards", type=int, default=1, help="number of stand-in boards")
+    parser.add_argument("--pbs-time", type=float, default=1e-3)
+    parser.add_argument("--bsk-size", type=parse_size, default=0, help="load a random BSK image of this size first")
+    parser.add_argument("--batches", type=int, default=50)
+    parser.add_argument("--cycle-reg", type=lambda x: int(x, 0), help="user BAR offset of a cycle counter")
+    parser.add_argument("--cycle-hz", type=float, default=250e6, help="clock of the simulated cycle counter")
+    parser.add_argument("--capacity", type=int, default=1 << 18, help="spans kept in the ring")
+    parser.add_argument("--out", default="pbs_trace.json")
+    args = parser.parse_args()
+
+    pool = DevicePool.local(args.boards, [args.pbs_time]) if args.local else DevicePool.open(args.device)
+    with pool:
+        for board in pool.boards:
+            if args.local:
+                board.waiter.cycles = local_cycles(args.cycle_hz)
+            elif args.cycle_reg is not None:
+                board.waiter.cycles = register_cycles(board.waiter.ctrl.regs, args.cycle_reg)
+        tracer = trace.enable(args.capacity)
+        if args.bsk_size:
+            pool.load_bsk(np.random.default_rng(0).integers(0, 256, args.bsk_size, dtype=np.uint8))
+        batches = list(random_batches(pool.boards[0].scheduler.geom, args.batches))
+        asyncio.run(run_checked(pool, batches))
+        trace.disable()
+    tracer.export_chrome(args.out)
+    print(format_summary(tracer.summary()))
+    print(f"{args.out}: open in chrome://tracing or ui.perfetto.dev")
+
+
+if __name__ == "__main__":
+    main()
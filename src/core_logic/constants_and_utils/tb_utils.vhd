@@ -8,7 +8,7 @@
 -- Project Name: TFHE Acceleration with FPGA
 -- Target Devices: Virtex UltraScale+ HBM VCU128 FPGA
 -- Tool Versions: Vivado 2024.1
--- Description: Compare functions for the testbench.
+-- Description: Compare functions for the testbench and readers for the block streams of tfhe_model/stimulus.py.
 -- Dependencies: see imports
 -- 
 -- Revision:
@@ -20,6 +20,7 @@
 library IEEE;
      use IEEE.STD_LOGIC_1164.all;
      use IEEE.NUMERIC_STD.all;
+     use std.textio.all;
 library work;
      use work.datatypes_utils.all;
      use work.constants_utils.all;
@@ -57,6 +58,45 @@ package tb_utils is
           throughput   :    integer
      ) return polynom;
 
+     -- A block stream is written by tfhe_model/stimulus.py as shards <name>.0.hex, <name>.1.hex, ...
+     -- with one throughput block per line. The readers hold the open shard in the file passed to them
+     -- and move on to the next shard when one ends, so a testbench replays one block per clock
+     -- without elaborating the data as constants.
+     type block_stream is record
+          is_open     : boolean;
+          done        : boolean; -- all shards are read
+          shard       : natural;
+          blocks      : natural; -- blocks read so far
+          mismatches  : natural; -- blocks that differed in stream_compare_block
+          first_block : integer; -- first mismatching block, -1 while everything matched
+          first_coeff : integer;
+          first_cycle : integer;
+     end record;
+
+     constant new_block_stream : block_stream := (false, false, 0, 0, 0, -1, -1, -1);
+
+     procedure stream_read_block(
+          file f          :       text;
+          variable stream : inout block_stream;
+          constant name   : in    string; -- path of the stream without .<shard>.hex
+          variable blk    : out   sub_polynom;
+          variable valid  : out   boolean -- false once the stream is done
+     );
+
+     -- reads the next expected block and reports the first mismatching block, coefficient and cycle
+     procedure stream_compare_block(
+          file f          :       text;
+          variable stream : inout block_stream;
+          constant name   : in    string;
+          constant actual : in    sub_polynom;
+          constant cycle  : in    integer
+     );
+
+     function stream_passed(
+          stream : in block_stream;
+          name   : in string
+     ) return boolean;
+
 end package;
 
 package body tb_utils is
@@ -182,4 +222,85 @@ package body tb_utils is
           return res;
      end function;
 
+     procedure stream_read_block(
+               file f          :       text;
+               variable stream : inout block_stream;
+               constant name   : in    string;
+               variable blk    : out   sub_polynom;
+               variable valid  : out   boolean
+          ) is
+          variable l      : line;
+          variable status : file_open_status;
+          variable word   : std_ulogic_vector(0 to synthesiseable_uint'length - 1);
+     begin
+          valid := false;
+          while not stream.done loop
+               if not stream.is_open then
+                    file_open(status, f, name & "." & integer'image(stream.shard) & ".hex", read_mode);
+                    if status /= open_ok then
+                         stream.done := true;
+                         exit;
+                    end if;
+                    stream.is_open := true;
+               end if;
+               if endfile(f) then
+                    file_close(f);
+                    stream.is_open := false;
+                    stream.shard := stream.shard + 1;
+               else
+                    readline(f, l);
+                    -- skip the '#' header of every shard
+                    if l'length > 0 and l(l'low) /= '#' then
+                         for i in 0 to blk'length - 1 loop
+                              hread(l, word);
+                              blk(blk'low + i) := unsigned(word);
+                         end loop;
+                         stream.blocks := stream.blocks + 1;
+                         valid := true;
+                         exit;
+                    end if;
+               end if;
+          end loop;
+          deallocate(l);
+     end procedure;
+
+     procedure stream_compare_block(
+               file f          :       text;
+               variable stream : inout block_stream;
+               constant name   : in    string;
+               constant actual : in    sub_polynom;
+               constant cycle  : in    integer
+          ) is
+          variable expected : sub_polynom(0 to actual'length - 1);
+          variable valid    : boolean;
+     begin
+          stream_read_block(f, stream, name, expected, valid);
+          if not valid then
+               report name & ": no expected block left for cycle " & integer'image(cycle) & ", the stream ended after " & integer'image(stream.blocks) & " blocks" severity error;
+               stream.mismatches := stream.mismatches + 1;
+               return;
+          end if;
+          for i in 0 to actual'length - 1 loop
+               if actual(actual'low + i) /= expected(i) then
+                    if stream.first_block < 0 then
+                         stream.first_block := stream.blocks - 1;
+                         stream.first_coeff := i;
+                         stream.first_cycle := cycle;
+                         report name & ": first mismatch in block " & integer'image(stream.blocks - 1) & ", coefficient " & integer'image(i) & ", cycle " & integer'image(cycle) & ": got " & to_hstring(actual(actual'low + i)) & ", expected " & to_hstring(expected(i)) severity error;
+                    end if;
+                    stream.mismatches := stream.mismatches + 1;
+                    exit;
+               end if;
+          end loop;
+     end procedure;
+
+     function stream_passed(
+               stream : in block_stream;
+               name   : in string
+          ) return boolean is
+     begin
+          report name & ": " & integer'image(stream.blocks) & " blocks compared, " & integer'image(stream.mismatches) & " mismatching" severity note;
+          return stream.mismatches = 0 and stream.blocks > 0;
+     end function;
+
 end package body;
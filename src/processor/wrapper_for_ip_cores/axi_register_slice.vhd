@@ -0,0 +1,103 @@
+----------------------------------------------------------------------------------
+-- Company: 
+-- Engineer: 
+-- 
+-- Create Date: 
+-- Design Name: 
+-- Module Name: axi_register_slice
+-- Project Name: TFHE Acceleration with FPGA
+-- Target Devices: Virtex UltraScale+ HBM VCU128 FPGA
+-- Tool Versions: Vivado 2024.1
+-- Description: Pipelined register slice for one AXI channel (valid/ready/payload).
+--             Every stage is a two-entry skid buffer: valid, data and ready are all
+--             driven from registers, so no combinational path crosses a stage, and
+--             a stage accepts one transfer per clock as long as the output is ready.
+--             depth = 0 connects input and output directly.
+-- Dependencies: see imports
+-- 
+-- Revision:
+-- Revision 0.01 - File Created
+-- Additional Comments: used by the registered mode of secondary_code/generators/mux_demux.py
+-- 
+----------------------------------------------------------------------------------
+
+library IEEE;
+     use IEEE.STD_LOGIC_1164.all;
+     use IEEE.numeric_std.all;
+
+entity axi_register_slice is
+     generic (
+          data_width : integer;
+          depth      : integer
+     );
+     port (
+          i_clk     : in  std_logic;
+          i_reset_n : in  std_logic;
+          -- towards the source of the channel
+          i_valid   : in  std_logic;
+          o_ready   : out std_logic;
+          i_data    : in  std_logic_vector(data_width - 1 downto 0);
+          -- towards the sink of the channel
+          o_valid   : out std_logic;
+          i_ready   : in  std_logic;
+          o_data    : out std_logic_vector(data_width - 1 downto 0)
+     );
+end entity;
+
+architecture Behavioral of axi_register_slice is
+
+     type data_arr is array (natural range <>) of std_logic_vector(data_width - 1 downto 0);
+
+     -- index 0 is the input of the chain, index depth its output
+     signal stage_valid : std_logic_vector(0 to depth);
+     signal stage_ready : std_logic_vector(0 to depth);
+     signal stage_data  : data_arr(0 to depth);
+
+begin
+
+     stage_valid(0) <= i_valid;
+     stage_data(0) <= i_data;
+     o_ready <= stage_ready(0);
+
+     o_valid <= stage_valid(depth);
+     o_data <= stage_data(depth);
+     stage_ready(depth) <= i_ready;
+
+     stages: for s in 0 to depth - 1 generate
+          signal main_valid : std_logic;
+          signal main_data  : std_logic_vector(data_width - 1 downto 0);
+          signal skid_valid : std_logic;
+          signal skid_data  : std_logic_vector(data_width - 1 downto 0);
+     begin
+          stage_valid(s + 1) <= main_valid;
+          stage_data(s + 1) <= main_data;
+          -- the skid register catches the transfer accepted while the output stalled
+          stage_ready(s) <= not skid_valid;
+
+          process (i_clk) is
+          begin
+               if rising_edge(i_clk) then
+                    if i_reset_n = '0' then
+                         main_valid <= '0';
+                         skid_valid <= '0';
+                    else
+                         if stage_ready(s + 1) = '1' or main_valid = '0' then
+                              -- output register is free: refill it, the skid entry first
+                              if skid_valid = '1' then
+                                   main_data <= skid_data;
+                                   main_valid <= '1';
+                                   skid_valid <= '0';
+                              else
+                                   main_data <= stage_data(s);
+                                   main_valid <= stage_valid(s);
+                              end if;
+                         elsif stage_valid(s) = '1' and skid_valid = '0' then
+                              skid_data <= stage_data(s);
+                              skid_valid <= '1';
+                         end if;
+                    end if;
+               end if;
+          end process;
+     end generate;
+
+end architecture;
@@ -1,18 +1,27 @@
 #!/usr/bin/env python3
 
+from axi_schema import AXI_CLOCK_DOMAIN, AXI_CLOCK_HZ, HBM_PORTS, signals, width_value
+
+# order of the aximm ports in the HBM top module
+ORDER = ["ARADDR", "ARBURST", "ARID", "ARLEN", "ARSIZE", "ARVALID", "ARREADY",
+         "AWADDR", "AWBURST", "AWID", "AWLEN", "AWSIZE", "AWVALID", "AWREADY",
+         "WDATA", "WSTRB", "WLAST", "WDATA_PARITY", "WVALID", "WREADY",
+         "RDATA", "RID", "RRESP", "RLAST", "RVALID", "RREADY",
+         "BID", "BRESP", "BVALID", "BREADY"]
+
 def iface_param(busif_name: str, clk_domain: str) -> str:
     # This matches the style/fields you pasted from the HBM top module.
     return (
         f"XIL_INTERFACENAME {busif_name}, "
-        f"DATA_WIDTH 256, PROTOCOL AXI3, FREQ_HZ 250000000, "
-        f"ID_WIDTH 6, ADDR_WIDTH 33, "
+        f"DATA_WIDTH {width_value('hbm_data_width')}, PROTOCOL AXI3, FREQ_HZ {AXI_CLOCK_HZ}, "
+        f"ID_WIDTH {width_value('hbm_id_bit_width')}, ADDR_WIDTH {width_value('hbm_addr_width')}, "
         f"AWUSER_WIDTH 0, ARUSER_WIDTH 0, WUSER_WIDTH 0, RUSER_WIDTH 0, BUSER_WIDTH 0, "
         f"READ_WRITE_MODE READ_WRITE, "
         f"HAS_BURST 1, HAS_LOCK 0, HAS_PROT 0, HAS_CACHE 0, HAS_QOS 0, HAS_REGION 0, "
         f"HAS_WSTRB 1, HAS_BRESP 1, HAS_RRESP 1, "
         f"SUPPORTS_NARROW_BURST 1, "
         f"NUM_READ_OUTSTANDING 2, NUM_WRITE_OUTSTANDING 2, "
-        f"MAX_BURST_LENGTH 16, PHASE 0.0, "
+        f"MAX_BURST_LENGTH {2 ** width_value('hbm_burstlen_bit_width')}, PHASE 0.0, "
         f"CLK_DOMAIN {clk_domain}, "
         f"NUM_READ_THREADS 1, NUM_WRITE_THREADS 1, "
         f"RUSER_BITS_PER_BYTE 0, WUSER_BITS_PER_BYTE 0, "
@@ -23,7 +32,7 @@ def clk_param(clk_if_name: str, busif_name: str, rst_sig: str, clk_domain: str)
     return (
         f"XIL_INTERFACENAME {clk_if_name}, "
         f"ASSOCIATED_BUSIF {busif_name}, "
-        f"FREQ_HZ 250000000, FREQ_TOLERANCE_HZ 0, PHASE 0.0, "
+        f"FREQ_HZ {AXI_CLOCK_HZ}, FREQ_TOLERANCE_HZ 0, PHASE 0.0, "
         f"CLK_DOMAIN {clk_domain}, "
         f"ASSOCIATED_RESET {rst_sig}, "
         f"INSERT_VIP 0"
@@ -54,60 +63,39 @@ def gen_one(i: int, clk_domain: str) -> str:
 
     # AXI signals (AXI3 subset used by HBM pseudo channels)
     # Put the big X_INTERFACE_PARAMETER on ARADDR like HBM does.
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} ARADDR" *)'
-             f' (* X_INTERFACE_MODE = "slave" *)'
-             f' (* X_INTERFACE_PARAMETER = "{iface_param(bus, clk_domain)}" *)'
-             f' input [32:0]AXI_{n2}_ARADDR,')
-
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} ARBURST" *) input [1:0]AXI_{n2}_ARBURST,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} ARID" *)    input [5:0]AXI_{n2}_ARID,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} ARLEN" *)   input [3:0]AXI_{n2}_ARLEN,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} ARSIZE" *)  input [2:0]AXI_{n2}_ARSIZE,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} ARVALID" *) input AXI_{n2}_ARVALID,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} ARREADY" *) output AXI_{n2}_ARREADY,')
-
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} AWADDR" *)  input [32:0]AXI_{n2}_AWADDR,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} AWBURST" *) input [1:0]AXI_{n2}_AWBURST,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} AWID" *)    input [5:0]AXI_{n2}_AWID,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} AWLEN" *)   input [3:0]AXI_{n2}_AWLEN,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} AWSIZE" *)  input [2:0]AXI_{n2}_AWSIZE,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} AWVALID" *) input AXI_{n2}_AWVALID,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} AWREADY" *) output AXI_{n2}_AWREADY,')
-
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} WDATA" *)   input [255:0]AXI_{n2}_WDATA,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} WSTRB" *)   input [31:0]AXI_{n2}_WSTRB,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} WLAST" *)   input AXI_{n2}_WLAST,')
-    p.append(f'  input [31:0]AXI_{n2}_WDATA_PARITY,')  # HBM-specific parity sideband (not aximm-tagged)
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} WVALID" *)  input AXI_{n2}_WVALID,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} WREADY" *)  output AXI_{n2}_WREADY,')
-
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} RDATA" *)   output [255:0]AXI_{n2}_RDATA,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} RID" *)     output [5:0]AXI_{n2}_RID,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} RRESP" *)   output [1:0]AXI_{n2}_RRESP,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} RLAST" *)   output AXI_{n2}_RLAST,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} RVALID" *)  output AXI_{n2}_RVALID,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} RREADY" *)  input AXI_{n2}_RREADY,')
-
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} BID" *)     output [5:0]AXI_{n2}_BID,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} BRESP" *)   output [1:0]AXI_{n2}_BRESP,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} BVALID" *)  output AXI_{n2}_BVALID,')
-    p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} BREADY" *)  input AXI_{n2}_BREADY,')
+    for sig in signals(ORDER):
+        direction = "input" if sig.to_hbm else "output"
+        width = "" if sig.is_scalar else f"[{width_value(sig.width) - 1}:0]"
+        port = f"{direction} {width}AXI_{n2}_{sig.name}," if width else f"{direction} AXI_{n2}_{sig.name},"
+        if not sig.axi:
+            # HBM-specific parity sideband (not aximm-tagged)
+            p.append(f"  {port}")
+        elif sig.name == "ARADDR":
+            p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} {sig.name}" *)'
+                     f' (* X_INTERFACE_MODE = "slave" *)'
+                     f' (* X_INTERFACE_PARAMETER = "{iface_param(bus, clk_domain)}" *)'
+                     f' {port}')
+        else:
+            tag = f'{sig.name}" *)'
+            p.append(f'  (* X_INTERFACE_INFO = "xilinx.com:interface:aximm:1.0 {bus} {tag:<12}{port}')
 
     return "\n".join(p)
 
-def main():
+def render(clk_domain: str = AXI_CLOCK_DOMAIN) -> str:
     # Use the same clock domain string you saw in the working HBM top
-    clk_domain = "xdma_axi_aclk"
+    out = ["// --------------------------------------------------------------------",
+           f"// Auto-generated AXI3 (HBM-style) interface metadata for SAXI_00_RT..{HBM_PORTS.stop - 1}",
+           "// Paste into your module port list (or wrapper) and adjust names if needed",
+           "// --------------------------------------------------------------------\n"]
 
-    print("// --------------------------------------------------------------------")
-    print("// Auto-generated AXI3 (HBM-style) interface metadata for SAXI_00_RT..31")
-    print("// Paste into your module port list (or wrapper) and adjust names if needed")
-    print("// --------------------------------------------------------------------\n")
+    for i in HBM_PORTS:
+        out.append(f"// -------------------- SAXI_{i:02d}_RT --------------------")
+        out.append(gen_one(i, clk_domain))
+        out.append("")
+    return "\n".join(out) + "\n"
 
-    for i in range(32):
-        print(f"// -------------------- SAXI_{i:02d}_RT --------------------")
-        print(gen_one(i, clk_domain))
-        print()
+def main():
+    print(render(), end="")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Single typed schema of the AXI3 interface of the HBM pseudo channels.
+
+Every generator in this directory renders its artifact from the signals and
+port ranges defined here instead of keeping its own copy of the signal list:
+  - SIGNALS: channel, direction (seen from the HBM slave), width constant and
+    the field of the TFHE read/write pkgs each AXI signal maps to
+  - port ranges: the HBM has 2 stacks of 16 pseudo-channel ports, AXI_00..AXI_31
+  - widths are VHDL constant names (ip_cores_constants.vhd); their values are
+    evaluated with tfhe_model.vhdl_constants for artifacts that need literal
+    widths, so a changed constant cannot leave a stale copy behind
+
+Usage:
+  python3 axi_schema.py
+"""
+
+import os
+import sys
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+CHANNELS = ("AR", "R", "AW", "W", "B")
+
+HBM_NUM_STACKS = 2
+HBM_STACK_NUM_PS_PORTS = 16
+HBM_PORTS = range(HBM_NUM_STACKS * HBM_STACK_NUM_PS_PORTS)  # AXI_00..AXI_31
+TFHE_PORTS = range(HBM_STACK_NUM_PS_PORTS)  # stack 0, shared between host and TFHE via the select signals
+
+AXI_CLOCK_HZ = 250000000
+AXI_CLOCK_DOMAIN = "xdma_axi_aclk"
+
+# TFHE package arrays
+I_RPKG = "i_read_pkgs"
+O_RPKG = "o_read_pkgs"
+I_WPKG = "i_write_pkgs"
+O_WPKG = "o_write_pkgs"
+
+
+class Signal(NamedTuple):
+    name: str                  # without the AXI_xx_ prefix
+    channel: str               # one of CHANNELS
+    to_hbm: bool               # driven by the master, an input of the HBM slave
+    width: Optional[str]       # VHDL constant with the bit width, None for std_logic
+    tfhe: Optional[str]        # what the TFHE side connects, "(p)" is the port index
+    axi: bool = True           # part of the aximm interface (the parity sideband is not)
+
+    @property
+    def is_scalar(self) -> bool:
+        return self.width is None
+
+    @property
+    def write(self) -> bool:
+        return self.channel in ("AW", "W", "B")
+
+    def vhdl_type(self) -> str:
+        if self.width is None:
+            return "std_logic"
+        return f"std_logic_vector({self.width}-1 downto 0)"
+
+    def verilog_macro(self) -> str:
+        return self.width.upper()
+
+    def default(self) -> str:
+        return "'0'" if self.width is None else "(others => '0')"
+
+    def tfhe_expr(self, port: int) -> str:
+        return self.tfhe.replace("(p)", f"({port})")
+
+
+def _pkg(signal: str, channel: str, to_hbm: bool) -> str:
+    write = channel in ("AW", "W", "B")
+    pkg = (I_WPKG if write else I_RPKG) if to_hbm else (O_WPKG if write else O_RPKG)
+    return f"{pkg}(p).{signal.lower()}"
+
+
+def _signal(name: str, channel: str, to_hbm: bool, width: Optional[str] = None, tfhe: Optional[str] = None,
+            axi: bool = True) -> Signal:
+    return Signal(name, channel, to_hbm, width, tfhe or _pkg(name, channel, to_hbm), axi)
+
+
+SIGNALS: Dict[str, Signal] = {s.name: s for s in (
+    _signal("ARADDR", "AR", True, "hbm_addr_width", f"std_logic_vector({I_RPKG}(p).araddr)"),
+    _signal("ARBURST", "AR", True, "hbm_burstmode_bit_width", "std_logic_vector(hbm_burstmode)"),
+    _signal("ARID", "AR", True, "hbm_id_bit_width"),
+    _signal("ARLEN", "AR", True, "hbm_burstlen_bit_width"),
+    _signal("ARSIZE", "AR", True, "hbm_burstsize_bit_width", "std_logic_vector(hbm_burstsize)"),
+    _signal("ARVALID", "AR", True),
+    _signal("ARREADY", "AR", False),
+
+    _signal("RDATA_PARITY", "R", False, "hbm_bytes_per_ps_port", axi=False),
+    _signal("RDATA", "R", False, "hbm_data_width"),
+    _signal("RID", "R", False, "hbm_id_bit_width"),
+    _signal("RLAST", "R", False),
+    _signal("RRESP", "R", False, "hbm_resp_bit_width"),
+    _signal("RVALID", "R", False),
+    _signal("RREADY", "R", True),
+
+    _signal("AWADDR", "AW", True, "hbm_addr_width", f"std_logic_vector({I_WPKG}(p).awaddr)"),
+    _signal("AWBURST", "AW", True, "hbm_burstmode_bit_width", "std_logic_vector(hbm_burstmode)"),
+    _signal("AWID", "AW", True, "hbm_id_bit_width"),
+    _signal("AWLEN", "AW", True, "hbm_burstlen_bit_width"),
+    _signal("AWSIZE", "AW", True, "hbm_burstsize_bit_width", "std_logic_vector(hbm_burstsize)"),
+    _signal("AWVALID", "AW", True),
+    _signal("AWREADY", "AW", False),
+
+    _signal("WDATA", "W", True, "hbm_data_width"),
+    _signal("WLAST", "W", True),
+    _signal("WSTRB", "W", True, "hbm_bytes_per_ps_port", "std_logic_vector(hbm_strobe_setting)"),
+    _signal("WDATA_PARITY", "W", True, "hbm_bytes_per_ps_port", axi=False),
+    _signal("WVALID", "W", True),
+    _signal("WREADY", "W", False),
+
+    _signal("BID", "B", False, "hbm_id_bit_width"),
+    _signal("BRESP", "B", False, "hbm_resp_bit_width"),
+    _signal("BVALID", "B", False),
+    _signal("BREADY", "B", True),
+)}
+
+# sideband signals of the HBM slave that the design leaves unused
+SIDEBAND = (
+    Signal("ARPROT", "AR", True, "axi_prot_bits", None),
+    Signal("ARCACHE", "AR", True, "axi_cache_bits", None),
+    Signal("ARLOCK", "AR", True, None, None),
+    Signal("ARQOS", "AR", True, "axi_qos_bits", None),
+    Signal("AWPROT", "AW", True, "axi_prot_bits", None),
+    Signal("AWCACHE", "AW", True, "axi_cache_bits", None),
+    Signal("AWLOCK", "AW", True, None, None),
+    Signal("AWQOS", "AW", True, "axi_qos_bits", None),
+)
+
+# the order of the HBM IP port list, used by every artifact that has no reason to deviate
+HBM_IP_ORDER = ("ARADDR", "ARBURST", "ARID", "ARLEN", "ARSIZE", "ARVALID", "ARREADY", "",
+                "AWADDR", "AWBURST", "AWID", "AWLEN", "AWSIZE", "AWVALID", "AWREADY", "",
+                "RREADY", "BREADY", "",
+                "WDATA", "WLAST", "WSTRB", "WDATA_PARITY", "WVALID", "WREADY", "",
+                "RDATA", "RDATA_PARITY", "RID", "RLAST", "RRESP", "RVALID", "",
+                "BID", "BRESP", "BVALID")
+
+
+def signals(order: Sequence[str]) -> List[Optional[Signal]]:
+    """The schema entries in the given order; "" becomes None (a blank line in most artifacts)."""
+    return [SIGNALS[name] if name else None for name in order]
+
+
+def select(channel: Optional[str] = None, to_hbm: Optional[bool] = None) -> List[Signal]:
+    return [s for s in SIGNALS.values()
+            if (channel is None or s.channel == channel) and (to_hbm is None or s.to_hbm == to_hbm)]
+
+
+def axi(port: int) -> str:
+    return f"AXI_{port:02d}"
+
+
+@lru_cache(maxsize=None)
+def width_value(constant: str) -> int:
+    """Bit width behind a width constant, evaluated from the VHDL packages."""
+    from tfhe_model.vhdl_constants import load
+    return load().value(constant)
+
+
+def main():
+    for ch in CHANNELS:
+        for s in select(ch):
+            width = f"{s.width} = {width_value(s.width)}" if s.width else "1"
+            print(f"{ch:<3} {'in ' if s.to_hbm else 'out'} {s.name:<13} {width:<32} {s.tfhe}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,38 @@
 #!/usr/bin/env python3
 
-START = 0
-END   = 31   # inclusive
+from axi_schema import HBM_IP_ORDER, HBM_PORTS, axi, signals
 
-PORTS = [
-    ("ARADDR",        "signal"),
-    ("ARBURST",       "signal"),
-    ("ARID",          "signal"),
-    ("ARLEN",         "signal"),
-    ("ARSIZE",        "signal"),
-    ("ARVALID",       "signal"),
-    ("ARREADY",       "signal"),
-    ("",              ""),
-    ("AWADDR",        "signal"),
-    ("AWBURST",       "signal"),
-    ("AWID",          "signal"),
-    ("AWLEN",         "signal"),
-    ("AWSIZE",        "signal"),
-    ("AWVALID",       "signal"),
-    ("AWREADY",       "signal"),
-    ("",              ""),
-    ("RREADY",        "signal"),
-    ("BREADY",        "signal"),
-    ("",              ""),
-    ("WDATA",         "signal"),
-    ("WLAST",         "signal"),
-    ("WSTRB",         "signal"),
-    ("WDATA_PARITY",  "open"),
-    ("WVALID",        "signal"),
-    ("WREADY",        "signal"),
-    ("",              ""),
-    ("RDATA",         "signal"),
-    ("RDATA_PARITY",  "open"),
-    ("RID",           "signal"),
-    ("RLAST",         "signal"),
-    ("RRESP",         "signal"),
-    ("RVALID",        "signal"),
-    ("",              ""),
-    ("BID",           "signal"),
-    ("BRESP",         "signal"),
-    ("BVALID",        "signal"),
-]
+START = HBM_PORTS.start
+END   = HBM_PORTS.stop - 1   # inclusive
 
-def axi(n):
-    return f"AXI_{n:02d}"
+# the parity sideband is not part of the block design interface and stays open
+PORTS = signals(HBM_IP_ORDER)
 
-def main():
+def render() -> str:
+    out = []
     for i in range(START, END + 1):
-        print("\t\t// --------------------------------------------------")
-        print(f"\t\t// {axi(i)}")
-        print("\t\t// --------------------------------------------------")
+        out.append("\t\t// --------------------------------------------------")
+        out.append(f"\t\t// {axi(i)}")
+        out.append("\t\t// --------------------------------------------------")
 
-        for name, kind in PORTS:
-            if name == "":
-                print()
+        for sig in PORTS:
+            if sig is None:
+                out.append("")
                 continue
 
-            lhs = f".{axi(i)}_{name:<22}"
-            if kind == "open":
+            lhs = f".{axi(i)}_{sig.name:<22}"
+            if not sig.axi:
                 rhs = "()"
             else:
-                rhs = f"({axi(i)}_{name})"
+                rhs = f"({axi(i)}_{sig.name})"
+
+            out.append(f"\t\t{lhs}{rhs},")
 
-            print(f"\t\t{lhs}{rhs},")
+        out.append("")
+    return "\n".join(out) + "\n"
 
-        print()
+def main():
+    print(render(), end="")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Render every generator artifact from axi_schema.py and write it only if its
+content changed.
+
+Each output is compared by content hash with the file on disk and left
+untouched (same modification time) when they match, so Vivado's incremental
+and out-of-context runs do not recompile tfhe_block.v or tfhe_pu.vhd after a
+regeneration that changes nothing. --check writes nothing and exits with 1 if
+an artifact is out of date.
+
+Usage:
+  python3 generate.py
+  python3 generate.py --check
+  python3 generate.py mux_demux.txt --out-dir /tmp/artifacts
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+from typing import Callable, Dict
+
+import axi_meta
+import block_inst
+import hbm_inst
+import hbm_interface
+import interface
+import ip_component
+import mux_debug
+import mux_demux
+import rw_select
+import sideband
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# output file -> renderer
+ARTIFACTS: Dict[str, Callable[[], str]] = {
+    "block_inst.txt": block_inst.render,
+    "hbm_inst.txt": hbm_inst.render,
+    "hbm_interface.txt": hbm_interface.render,
+    "ip.txt": ip_component.render,
+    "meta.txt": axi_meta.render,
+    "mux_debug.txt": mux_debug.render,
+    "mux_demux.txt": mux_demux.render,
+    "mux_demux_registered.txt": mux_demux.render_registered,
+    "rw_select.txt": rw_select.render,
+    "sideband.txt": sideband.render,
+    "tfhe_block.txt": interface.render,
+}
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_if_changed(path: str, content: str, check: bool = False) -> bool:
+    """Write content to path unless the file already holds it; returns whether it differed."""
+    data = content.encode()
+    try:
+        with open(path, "rb") as f:
+            if content_hash(f.read()) == content_hash(data):
+                return False
+    except FileNotFoundError:
+        pass
+    if not check:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the AXI/HBM generator artifacts")
+    parser.add_argument("artifacts", nargs="*", help=f"subset of {', '.join(ARTIFACTS)}")
+    parser.add_argument("--out-dir", default=HERE)
+    parser.add_argument("--check", action="store_true", help="only report out-of-date artifacts")
+    args = parser.parse_args()
+
+    names = args.artifacts or list(ARTIFACTS)
+    unknown = [n for n in names if n not in ARTIFACTS]
+    if unknown:
+        parser.error(f"unknown artifacts: {', '.join(unknown)}")
+    os.makedirs(args.out_dir, exist_ok=True)
+    changed = [n for n in names if write_if_changed(os.path.join(args.out_dir, n), ARTIFACTS[n](), args.check)]
+    for n in names:
+        state = ("out of date" if args.check else "written") if n in changed else "unchanged"
+        print(f"{n:<20} {state}")
+    if args.check and changed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
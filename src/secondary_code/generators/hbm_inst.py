@@ -1,14 +1,16 @@
 #!/usr/bin/env python3
 
+from axi_schema import HBM_STACK_NUM_PS_PORTS, axi, signals
+
 # --------------------------------------------------
 # Configuration
 # --------------------------------------------------
 SRC_START = 0      # AXI_00
-DST_START = 16     # AXI_16
-COUNT     = 16      # generate AXI_00..01 → AXI_16..17 (change as needed)
+DST_START = HBM_STACK_NUM_PS_PORTS     # AXI_16
+COUNT     = HBM_STACK_NUM_PS_PORTS      # generate AXI_00..15 → AXI_16..31 (change as needed)
 
 # AXI signal order template
-SIGNALS = [
+SIGNALS = signals([
     "ARADDR", "ARBURST", "ARID", "ARLEN", "ARSIZE", "ARVALID", "ARREADY",
     "",
     "AWADDR", "AWBURST", "AWID", "AWLEN", "AWSIZE", "AWVALID", "AWREADY",
@@ -19,39 +21,37 @@ SIGNALS = [
     "RDATA", "RDATA_PARITY", "RID", "RLAST", "RRESP", "RVALID",
     "",
     "BID", "BRESP", "BVALID",
-]
-
-OPEN_SIGNALS = {
-    "WDATA_PARITY",
-    "RDATA_PARITY",
-}
-
-def axi(n):
-    return f"AXI_{n:02d}"
+])
 
-def main():
+def render() -> str:
+    out = []
     for i in range(COUNT):
         src = SRC_START + i
         dst = DST_START + i
 
-        print("\t\t\t-- --------------------------------------------------")
-        print(f"\t\t\t-- {axi(src)}")
-        print("\t\t\t-- --------------------------------------------------")
+        out.append("\t\t\t-- --------------------------------------------------")
+        out.append(f"\t\t\t-- {axi(src)}")
+        out.append("\t\t\t-- --------------------------------------------------")
 
         for sig in SIGNALS:
-            if sig == "":
-                print()
+            if sig is None:
+                out.append("")
                 continue
 
-            lhs = f"{axi(src)}_{sig}"
-            if sig in OPEN_SIGNALS:
+            lhs = f"{axi(src)}_{sig.name}"
+            # the parity sideband stays open
+            if not sig.axi:
                 rhs = "open"
             else:
-                rhs = f"{axi(dst)}_{sig}"
+                rhs = f"{axi(dst)}_{sig.name}"
+
+            out.append(f"\t\t\t{lhs:<22} => {rhs},")
 
-            print(f"\t\t\t{lhs:<22} => {rhs},")
+        out.append("")
+    return "\n".join(out) + "\n"
 
-        print()
+def main():
+    print(render(), end="")
 
 if __name__ == "__main__":
     main()
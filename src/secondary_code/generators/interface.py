@@ -1,47 +1,37 @@
-def print_axi_ports(start=0, end=31):
-    template = """
-        // --------------------------------------------------
-        // AXI_{i:02d}
-        // --------------------------------------------------
-        input  wire [HBM_ADDR_WIDTH-1:0]               AXI_{i:02d}_ARADDR,
-        input  wire [HBM_BURSTMODE_BIT_WIDTH-1:0]      AXI_{i:02d}_ARBURST,
-        input  wire [HBM_ID_BIT_WIDTH-1:0]             AXI_{i:02d}_ARID,
-        input  wire [HBM_BURSTLEN_BIT_WIDTH-1:0]       AXI_{i:02d}_ARLEN,
-        input  wire [HBM_BURSTSIZE_BIT_WIDTH-1:0]      AXI_{i:02d}_ARSIZE,
-        input  wire                                    AXI_{i:02d}_ARVALID,
-        output wire                                    AXI_{i:02d}_ARREADY,
-
-        input  wire [HBM_ADDR_WIDTH-1:0]               AXI_{i:02d}_AWADDR,
-        input  wire [HBM_BURSTMODE_BIT_WIDTH-1:0]      AXI_{i:02d}_AWBURST,
-        input  wire [HBM_ID_BIT_WIDTH-1:0]             AXI_{i:02d}_AWID,
-        input  wire [HBM_BURSTLEN_BIT_WIDTH-1:0]       AXI_{i:02d}_AWLEN,
-        input  wire [HBM_BURSTSIZE_BIT_WIDTH-1:0]      AXI_{i:02d}_AWSIZE,
-        input  wire                                    AXI_{i:02d}_AWVALID,
-        output wire                                    AXI_{i:02d}_AWREADY,
-
-        input  wire                                    AXI_{i:02d}_RREADY,
-        input  wire                                    AXI_{i:02d}_BREADY,
-
-        input  wire [HBM_DATA_WIDTH-1:0]               AXI_{i:02d}_WDATA,
-        input  wire                                    AXI_{i:02d}_WLAST,
-        input  wire [HBM_BYTES_PER_PS_PORT-1:0]        AXI_{i:02d}_WSTRB,
-        input  wire                                    AXI_{i:02d}_WVALID,
-        output wire                                    AXI_{i:02d}_WREADY,
-
-        output wire [HBM_DATA_WIDTH-1:0]               AXI_{i:02d}_RDATA,
-        output wire [HBM_ID_BIT_WIDTH-1:0]             AXI_{i:02d}_RID,
-        output wire                                    AXI_{i:02d}_RLAST,
-        output wire [HBM_RESP_BIT_WIDTH-1:0]           AXI_{i:02d}_RRESP,
-        output wire                                    AXI_{i:02d}_RVALID,
-
-        output wire [HBM_ID_BIT_WIDTH-1:0]             AXI_{i:02d}_BID,
-        output wire [HBM_RESP_BIT_WIDTH-1:0]           AXI_{i:02d}_BRESP,
-        output wire                                    AXI_{i:02d}_BVALID,
-    """
-
-    for i in range(start, end + 1):
-        print(template.format(i=i))
+#!/usr/bin/env python3
+
+from axi_schema import HBM_PORTS, axi, signals
+
+# Verilog port list of the block design wrapper; the parity sideband is not part of it
+ORDER = signals(["ARADDR", "ARBURST", "ARID", "ARLEN", "ARSIZE", "ARVALID", "ARREADY", "",
+                 "AWADDR", "AWBURST", "AWID", "AWLEN", "AWSIZE", "AWVALID", "AWREADY", "",
+                 "RREADY", "BREADY", "",
+                 "WDATA", "WLAST", "WSTRB", "WVALID", "WREADY", "",
+                 "RDATA", "RID", "RLAST", "RRESP", "RVALID", "",
+                 "BID", "BRESP", "BVALID"])
+
+
+def port_block(i: int) -> str:
+    lines = ["", "        // --------------------------------------------------", f"        // {axi(i)}",
+             "        // --------------------------------------------------"]
+    for sig in ORDER:
+        if sig is None:
+            lines.append("")
+            continue
+        direction = "input" if sig.to_hbm else "output"
+        width = "" if sig.is_scalar else f"[{sig.verilog_macro()}-1:0]"
+        lines.append(f"        {direction:<6} wire {width:<35}{axi(i)}_{sig.name},")
+    lines.append("    ")
+    return "\n".join(lines)
+
+
+def render(start=HBM_PORTS.start, end=HBM_PORTS.stop - 1) -> str:
+    return "".join(port_block(i) + "\n" for i in range(start, end + 1))
+
+
+def print_axi_ports(start=HBM_PORTS.start, end=HBM_PORTS.stop - 1):
+    print(render(start, end), end="")
 
 
 if __name__ == "__main__":
-    print_axi_ports(0, 31)
+    print_axi_ports()
@@ -1,23 +1,25 @@
 #!/usr/bin/env python3
 """
 Generate IP-XACT <spirit:memoryMaps> entries for AXI_00..AXI_31
-with non-overlapping 256MB windows.
+with the windows of src/mmap/memory_map/AddressSegments.csv.
 
-Base step: 0x1000_0000 (256MB)
-Range:     268435456   (256MB)
+Base:      offset of the port's segment in /xdma_0/M_AXI
+Range:     range of that segment (256MB)
 Width:     256         (bits)
 Usage:     memory
 """
 
-NUM_PORTS = 32
-WINDOW_SIZE_BYTES = 256 * 1024 * 1024  # 256MB
-WIDTH_BITS = 256
+from axi_schema import HBM_PORTS, width_value
+from tfhe_model.address_segments import hbm_windows
+
+NUM_PORTS = len(HBM_PORTS)
+WIDTH_BITS = width_value("hbm_data_width")
 
 def hex0(x: int) -> str:
     return f"0x{x:X}"
 
-def gen_one(i: int) -> str:
-    base = i * WINDOW_SIZE_BYTES
+def gen_one(i: int, windows) -> str:
+    base = windows[i].offset
     axi = f"AXI_{i:02d}"
     mem = f"HBM_MEM_{i:02d}"
     return f"""    <spirit:memoryMap>
@@ -27,17 +29,18 @@ def gen_one(i: int) -> str:
         <spirit:name>{mem}</spirit:name>
         <spirit:displayName>memory</spirit:displayName>
         <spirit:baseAddress spirit:format="bitString" spirit:bitStringLength="1">{hex0(base)}</spirit:baseAddress>
-        <spirit:range spirit:format="long" spirit:minimum="4096" spirit:rangeType="long">{WINDOW_SIZE_BYTES}</spirit:range>
+        <spirit:range spirit:format="long" spirit:minimum="4096" spirit:rangeType="long">{windows[i].size}</spirit:range>
         <spirit:width spirit:format="long">{WIDTH_BITS}</spirit:width>
         <spirit:usage>memory</spirit:usage>
       </spirit:addressBlock>
     </spirit:memoryMap>"""
 
+def render() -> str:
+    windows = hbm_windows()
+    return "\n".join(["<spirit:memoryMaps>"] + [gen_one(i, windows) for i in range(NUM_PORTS)] + ["</spirit:memoryMaps>"]) + "\n"
+
 def main():
-    print("<spirit:memoryMaps>")
-    for i in range(NUM_PORTS):
-        print(gen_one(i))
-    print("</spirit:memoryMaps>")
+    print(render(), end="")
 
 if __name__ == "__main__":
     main()
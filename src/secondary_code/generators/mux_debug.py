@@ -10,31 +10,35 @@ with a simple direct connection:
   AXI_##_* <= hbm_##_*   for all HBM outputs
 
 It also drives the TFHE pkg outputs to safe zeros (optional, but avoids undriven nets).
+Signals come from axi_schema.py.
 
 Edit:
   FIRST_PORT/LAST_PORT if needed.
 """
 
-FIRST_PORT = 0
-LAST_PORT  = 15
+from axi_schema import TFHE_PORTS, signals
+
+FIRST_PORT = TFHE_PORTS.start
+LAST_PORT  = TFHE_PORTS.stop - 1
 
 # If you want to also force TFHE outputs low (recommended for a clean test)
 DRIVE_TFHE_DEFAULTS = True
 
-O_RPKG = "o_read_pkgs"
-O_WPKG = "o_write_pkgs"
-
 # HBM slave inputs (driven by host master)
-AR_IN = ["ARADDR", "ARBURST", "ARID", "ARLEN", "ARSIZE", "ARVALID", "RREADY"]
-AW_W_B_IN = ["AWADDR", "AWBURST", "AWID", "AWLEN", "AWSIZE", "AWVALID",
-            "WDATA", "WLAST", "WSTRB", "WDATA_PARITY", "WVALID",
-            "BREADY"]
+AR_IN = signals(["ARADDR", "ARBURST", "ARID", "ARLEN", "ARSIZE", "ARVALID", "RREADY"])
+AW_W_B_IN = signals(["AWADDR", "AWBURST", "AWID", "AWLEN", "AWSIZE", "AWVALID",
+                     "WDATA", "WLAST", "WSTRB", "WDATA_PARITY", "WVALID",
+                     "BREADY"])
 
 # HBM slave outputs (observed by host master)
-AR_OUT = ["ARREADY"]
-R_OUT  = ["RDATA_PARITY", "RDATA", "RID", "RLAST", "RRESP", "RVALID"]
-W_OUT  = ["AWREADY", "WREADY"]
-B_OUT  = ["BID", "BRESP", "BVALID"]
+AR_OUT = signals(["ARREADY"])
+R_OUT  = signals(["RDATA_PARITY", "RDATA", "RID", "RLAST", "RRESP", "RVALID"])
+W_OUT  = signals(["AWREADY", "WREADY"])
+B_OUT  = signals(["BID", "BRESP", "BVALID"])
+
+# TFHE pkg outputs, in the field order of the pkgs
+TFHE_READ_OUT = AR_OUT + R_OUT
+TFHE_WRITE_OUT = W_OUT + B_OUT
 
 def p2(i: int) -> str:
     return f"{i:02d}"
@@ -45,22 +49,7 @@ def host(port: str, sig: str) -> str:
 def hbm(port: str, sig: str) -> str:
     return f"hbm_{port}_{sig.lower()}"
 
-def default_for_sig(sig: str) -> str:
-    # Scalars
-    if sig in ("ARVALID","ARREADY","AWVALID","AWREADY","WVALID","WREADY",
-               "BVALID","BREADY","RVALID","RREADY","WLAST","RLAST"):
-        return "'0'"
-    # Vectors (width inferred by VHDL from LHS)
-    return "(others => '0')"
-
-def tfhe_read_fields():
-    # Match your field names in the snippet you posted
-    return ["arready", "rdata_parity", "rdata", "rid", "rlast", "rresp", "rvalid"]
-
-def tfhe_write_fields():
-    return ["awready", "wready", "bid", "bresp", "bvalid"]
-
-def main():
+def render() -> str:
     lines = []
     lines.append("-- ==================================================")
     lines.append("-- HOST-ONLY DIRECT CONNECT (HBM <-> HOST), TFHE DISABLED")
@@ -72,34 +61,27 @@ def main():
         lines.append(f"-- -------------------- AXI_{port} --------------------")
 
         # Drive HBM inputs from host
-        for sig in AR_IN:
-            lines.append(f"{hbm(port, sig)} <= {host(port, sig)};")
-        for sig in AW_W_B_IN:
-            lines.append(f"{hbm(port, sig)} <= {host(port, sig)};")
+        for sig in AR_IN + AW_W_B_IN:
+            lines.append(f"{hbm(port, sig.name)} <= {host(port, sig.name)};")
         lines.append("")
 
         # Drive host outputs from HBM outputs
-        for sig in AR_OUT:
-            lines.append(f"{host(port, sig)} <= {hbm(port, sig)};")
-        for sig in R_OUT:
-            lines.append(f"{host(port, sig)} <= {hbm(port, sig)};")
-        for sig in W_OUT:
-            lines.append(f"{host(port, sig)} <= {hbm(port, sig)};")
-        for sig in B_OUT:
-            lines.append(f"{host(port, sig)} <= {hbm(port, sig)};")
+        for sig in AR_OUT + R_OUT + W_OUT + B_OUT:
+            lines.append(f"{host(port, sig.name)} <= {hbm(port, sig.name)};")
         lines.append("")
 
         # Optionally force TFHE outputs to defaults so nothing is left floating/unknown
         if DRIVE_TFHE_DEFAULTS:
-            for f in tfhe_read_fields():
-                lines.append(f"{O_RPKG}({p}).{f} <= {default_for_sig(f.upper())};")
-            for f in tfhe_write_fields():
-                lines.append(f"{O_WPKG}({p}).{f} <= {default_for_sig(f.upper())};")
+            for sig in TFHE_READ_OUT + TFHE_WRITE_OUT:
+                lines.append(f"{sig.tfhe_expr(p)} <= {sig.default()};")
             lines.append("")
 
         lines.append("")
 
-    print("\n".join(lines))
+    return "\n".join(lines) + "\n"
+
+def main():
+    print(render(), end="")
 
 if __name__ == "__main__":
     main()
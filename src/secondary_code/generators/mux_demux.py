@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Generate VHDL glue for HBM AXI port mux/demux (ports 00..15) with CORRECT widths
-based on your HBM port declarations:
+based on your HBM port declarations. Signals, widths and the TFHE pkg fields
+come from axi_schema.py:
 
 ADDR   : std_logic_vector(hbm_addr_width-1 downto 0)
 BURST  : std_logic_vector(hbm_burstmode_bit_width-1 downto 0)
@@ -21,111 +22,52 @@ It outputs 3 sections:
 NOTE:
 - This is combinational routing. In a correct AXI system, you should LATCH/HOLD the
   select per-transaction (especially if you allow outstanding reads/writes).
+- --registered emits the registered variant instead: every channel (AR, R, AW, W, B)
+  of every port goes through an axi_register_slice (wrapper_for_ip_cores) of
+  --depth stages, and the select is sampled into an owner register per port and
+  direction only while no transaction of that direction is outstanding (counted
+  from the AR/AW handshake to the last R beat/the B handshake). Bursts in flight
+  keep their owner; the new owner takes over once the port is idle. A write burst
+  is assumed to be started by its AW no later than its last W beat.
+
+Usage:
+  python3 mux_demux.py > mux_demux.txt
+  python3 mux_demux.py --registered --depth 2 > mux_demux_registered.txt
 """
 
-FIRST_PORT = 0
-LAST_PORT  = 15
+import argparse
+
+from axi_schema import SIGNALS, TFHE_PORTS, select, width_value
+
+FIRST_PORT = TFHE_PORTS.start
+LAST_PORT  = TFHE_PORTS.stop - 1
+
+# Registered mode: clock/reset of the HBM AXI side (edit to match your design)
+SLICE_CLK = "TFHE_CLK"
+SLICE_RESET_N = "AXI_ARESET_N"
+SLICE_DEPTH = 1
 
 # Select signals (assume vectors indexed by port)
 HBM_R_SEL = "HBM_R_SELECT"   # used as HBM_R_SELECT(p)
 HBM_W_SEL = "HBM_W_SELECT"   # used as HBM_W_SELECT(p)
 
-# TFHE package arrays
-I_RPKG = "i_read_pkgs"
-O_RPKG = "o_read_pkgs"
-I_WPKG = "i_write_pkgs"
-O_WPKG = "o_write_pkgs"
+# ---------- AXI signal groupings ----------
+AR_IN  = select("AR", to_hbm=True)    # into HBM
+AR_OUT = select("AR", to_hbm=False)   # out of HBM
 
-# Constants used when TFHE is selected (edit expressions to match your design)
-HBM_BURSTMODE_SRC = "std_logic_vector(hbm_burstmode)"
-HBM_BURSTSIZE_SRC = "std_logic_vector(hbm_burstsize)"
-HBM_WSTRB_SRC     = "std_logic_vector(hbm_strobe_setting)"
+R_OUT  = select("R", to_hbm=False)    # out of HBM
+R_IN   = select("R", to_hbm=True)     # into HBM
 
-# ---------- AXI signal groupings ----------
-AR_IN  = ["ARADDR", "ARBURST", "ARID", "ARLEN", "ARSIZE", "ARVALID"]   # into HBM
-AR_OUT = ["ARREADY"]                                                  # out of HBM
-
-R_OUT  = ["RDATA_PARITY", "RDATA", "RID", "RLAST", "RRESP", "RVALID"]  # out of HBM
-R_IN   = ["RREADY"]                                                   # into HBM
-
-AW_IN  = ["AWADDR", "AWBURST", "AWID", "AWLEN", "AWSIZE", "AWVALID"]   # into HBM
-AW_OUT = ["AWREADY"]                                                  # out of HBM
-
-W_IN   = ["WDATA", "WLAST", "WSTRB", "WDATA_PARITY", "WVALID"]         # into HBM
-W_OUT  = ["WREADY"]                                                   # out of HBM
-
-B_OUT  = ["BID", "BRESP", "BVALID"]                                    # out of HBM
-B_IN   = ["BREADY"]                                                   # into HBM
-
-# ---------- Width/type rules from your HBM port list ----------
-def vhdl_type(sig: str) -> str:
-    # scalars
-    if sig in ("ARVALID", "ARREADY", "AWVALID", "AWREADY", "WVALID", "WREADY",
-               "BVALID", "BREADY", "RVALID", "RREADY", "WLAST", "RLAST"):
-        return "std_logic"
-
-    # vectors
-    if sig in ("ARADDR", "AWADDR"):
-        return "std_logic_vector(hbm_addr_width-1 downto 0)"
-    if sig in ("ARBURST", "AWBURST"):
-        return "std_logic_vector(hbm_burstmode_bit_width-1 downto 0)"
-    if sig in ("ARID", "AWID", "RID", "BID"):
-        return "std_logic_vector(hbm_id_bit_width-1 downto 0)"
-    if sig in ("ARLEN", "AWLEN"):
-        return "std_logic_vector(hbm_burstlen_bit_width-1 downto 0)"
-    if sig in ("ARSIZE", "AWSIZE"):
-        return "std_logic_vector(hbm_burstsize_bit_width-1 downto 0)"
-    if sig in ("WDATA", "RDATA"):
-        return "std_logic_vector(hbm_data_width-1 downto 0)"
-    if sig in ("WSTRB", "WDATA_PARITY", "RDATA_PARITY"):
-        return "std_logic_vector(hbm_bytes_per_ps_port-1 downto 0)"
-    if sig in ("RRESP", "BRESP"):
-        return "std_logic_vector(hbm_resp_bit_width-1 downto 0)"
-
-    raise ValueError(f"Unknown AXI signal for typing: {sig}")
-
-# ---------- TFHE field maps ----------
-# Use (p) placeholder then replace to (port_index) when emitting
-TFHE_READ_MAP = {
-    "ARADDR":  f"std_logic_vector({I_RPKG}(p).araddr)",
-    "ARBURST": HBM_BURSTMODE_SRC,
-    "ARID":    f"{I_RPKG}(p).arid",
-    "ARLEN":   f"{I_RPKG}(p).arlen",
-    "ARSIZE":  HBM_BURSTSIZE_SRC,
-    "ARVALID": f"{I_RPKG}(p).arvalid",
-    "RREADY":  f"{I_RPKG}(p).rready",
-
-    "ARREADY": f"{O_RPKG}(p).arready",
-    "RDATA":   f"{O_RPKG}(p).rdata",
-    "RDATA_PARITY": f"{O_RPKG}(p).rdata_parity",
-    "RID":     f"{O_RPKG}(p).rid",
-    "RLAST":   f"{O_RPKG}(p).rlast",
-    "RRESP":   f"{O_RPKG}(p).rresp",
-    "RVALID":  f"{O_RPKG}(p).rvalid",
-}
-
-TFHE_WRITE_MAP = {
-    "AWADDR":  f"std_logic_vector({I_WPKG}(p).awaddr)",
-    "AWBURST": HBM_BURSTMODE_SRC,
-    "AWID":    f"{I_WPKG}(p).awid",
-    "AWLEN":   f"{I_WPKG}(p).awlen",
-    "AWSIZE":  HBM_BURSTSIZE_SRC,
-    "AWVALID": f"{I_WPKG}(p).awvalid",
-
-    "WDATA":   f"{I_WPKG}(p).wdata",
-    "WLAST":   f"{I_WPKG}(p).wlast",
-    "WSTRB":   HBM_WSTRB_SRC,
-    "WDATA_PARITY": f"{I_WPKG}(p).wdata_parity",
-    "WVALID":  f"{I_WPKG}(p).wvalid",
-
-    "BREADY":  f"{I_WPKG}(p).bready",
-
-    "AWREADY": f"{O_WPKG}(p).awready",
-    "WREADY":  f"{O_WPKG}(p).wready",
-    "BID":     f"{O_WPKG}(p).bid",
-    "BRESP":   f"{O_WPKG}(p).bresp",
-    "BVALID":  f"{O_WPKG}(p).bvalid",
-}
+AW_IN  = select("AW", to_hbm=True)    # into HBM
+AW_OUT = select("AW", to_hbm=False)   # out of HBM
+
+W_IN   = select("W", to_hbm=True)     # into HBM
+W_OUT  = select("W", to_hbm=False)    # out of HBM
+
+B_OUT  = select("B", to_hbm=False)    # out of HBM
+B_IN   = select("B", to_hbm=True)     # into HBM
+
+ALL_SIGNALS = AR_IN + AR_OUT + R_IN + R_OUT + AW_IN + AW_OUT + W_IN + W_OUT + B_IN + B_OUT
 
 def p2(idx: int) -> str:
     return f"{idx:02d}"
@@ -148,12 +90,6 @@ def sel_write(idx: int) -> str:
 	return f"HBM_RW_SELECT(0)"
     # return f"{HBM_W_SEL}({idx})"
 
-def default_for(sig: str) -> str:
-    t = vhdl_type(sig)
-    if t == "std_logic":
-        return "'0'"
-    return "(others => '0')"
-
 def emit_header(title: str) -> str:
     return (
         "\n-- ==================================================\n"
@@ -165,9 +101,8 @@ def emit_signal_decls() -> str:
     out = [emit_header("INTERNAL HBM SIGNAL DECLARATIONS (AXI_00..AXI_15)")]
     for p in range(FIRST_PORT, LAST_PORT + 1):
         port = p2(p)
-        all_sigs = AR_IN + AR_OUT + R_IN + R_OUT + AW_IN + AW_OUT + W_IN + W_OUT + B_IN + B_OUT
-        for sig in all_sigs:
-            out.append(f"signal {hbm_sig(port, sig)} : {vhdl_type(sig)};")
+        for sig in ALL_SIGNALS:
+            out.append(f"signal {hbm_sig(port, sig.name)} : {sig.vhdl_type()};")
         out.append("")
     return "\n".join(out)
 
@@ -177,12 +112,25 @@ def emit_hbm_portmap() -> str:
     for p in range(FIRST_PORT, LAST_PORT + 1):
         port = p2(p)
         out.append(f"-- ---- AXI_{port} ----")
-        for sig in (AR_IN + AR_OUT + R_IN + R_OUT + AW_IN + AW_OUT + W_IN + W_OUT + B_IN + B_OUT):
-            out.append(f"{hbm_port(port, sig):<18} => {hbm_sig(port, sig)},")
+        for sig in ALL_SIGNALS:
+            out.append(f"{hbm_port(port, sig.name):<18} => {hbm_sig(port, sig.name)},")
         out.append("")
     out.append("-- Remove trailing comma on the final association in your real port map.")
     return "\n".join(out)
 
+def emit_mux(port: str, p: int, sigs, sel: str, inner=hbm_sig):
+    # mux inputs into HBM: host when sel='0', TFHE otherwise
+    return [f"{inner(port, s.name)} <= {host_sig(port, s.name)} when {sel}='0' else {s.tfhe_expr(p)};"
+            for s in sigs]
+
+def emit_demux(port: str, p: int, sigs, sel: str, inner=hbm_sig):
+    # demux outputs out of HBM: the owner sees the HBM output, the other side its default
+    out = []
+    for s in sigs:
+        out.append(f"{host_sig(port, s.name)} <= {inner(port, s.name)} when {sel}='0' else {s.default()};")
+        out.append(f"{s.tfhe_expr(p)} <= {inner(port, s.name)} when {sel}='1' else {s.default()};")
+    return out
+
 def emit_mux_demux() -> str:
     out = [emit_header("MUX INPUTS INTO HBM + DEMUX OUTPUTS OUT OF HBM")]
     out.append("-- Convention: select='0' => HOST owns that channel, select='1' => TFHE owns that channel\n")
@@ -191,80 +139,179 @@ def emit_mux_demux() -> str:
         out.append(f"-- -------------------- AXI_{port} --------------------")
 
         # READ: mux inputs into HBM
-        for sig in AR_IN:
-            tfhe_expr = TFHE_READ_MAP[sig].replace("(p)", f"({p})")
-            out.append(
-                f"{hbm_sig(port, sig)} <= {host_sig(port, sig)} when {sel_read(p)}='0' else {tfhe_expr};"
-            )
-        sig = "RREADY"
-        tfhe_expr = TFHE_READ_MAP[sig].replace("(p)", f"({p})")
-        out.append(
-            f"{hbm_sig(port, sig)} <= {host_sig(port, sig)} when {sel_read(p)}='0' else {tfhe_expr};"
-        )
+        out += emit_mux(port, p, AR_IN + R_IN, sel_read(p))
         out.append("")
 
         # READ: demux outputs from HBM
-        out.append(
-            f"{host_sig(port, 'ARREADY')} <= {hbm_sig(port, 'ARREADY')} when {sel_read(p)}='0' else '0';"
-        )
-        out.append(
-            f"{O_RPKG}({p}).arready <= {hbm_sig(port, 'ARREADY')} when {sel_read(p)}='1' else '0';"
-        )
-        for sig in R_OUT:
-            out.append(
-                f"{host_sig(port, sig)} <= {hbm_sig(port, sig)} when {sel_read(p)}='0' else {default_for(sig)};"
-            )
-            out.append(
-                f"{O_RPKG}({p}).{sig.lower()} <= {hbm_sig(port, sig)} when {sel_read(p)}='1' else {default_for(sig)};"
-            )
+        out += emit_demux(port, p, AR_OUT, sel_read(p))
+        out += emit_demux(port, p, R_OUT, sel_read(p))
         out.append("")
 
         # WRITE: mux inputs into HBM
-        for sig in AW_IN:
-            tfhe_expr = TFHE_WRITE_MAP[sig].replace("(p)", f"({p})")
-            out.append(
-                f"{hbm_sig(port, sig)} <= {host_sig(port, sig)} when {sel_write(p)}='0' else {tfhe_expr};"
-            )
-        for sig in W_IN:
-            tfhe_expr = TFHE_WRITE_MAP[sig].replace("(p)", f"({p})")
-            out.append(
-                f"{hbm_sig(port, sig)} <= {host_sig(port, sig)} when {sel_write(p)}='0' else {tfhe_expr};"
-            )
-        sig = "BREADY"
-        tfhe_expr = TFHE_WRITE_MAP[sig].replace("(p)", f"({p})")
-        out.append(
-            f"{hbm_sig(port, sig)} <= {host_sig(port, sig)} when {sel_write(p)}='0' else {tfhe_expr};"
-        )
+        out += emit_mux(port, p, AW_IN + W_IN + B_IN, sel_write(p))
         out.append("")
 
         # WRITE: demux outputs from HBM
-        out.append(
-            f"{host_sig(port, 'AWREADY')} <= {hbm_sig(port, 'AWREADY')} when {sel_write(p)}='0' else '0';"
-        )
-        out.append(
-            f"{O_WPKG}({p}).awready <= {hbm_sig(port, 'AWREADY')} when {sel_write(p)}='1' else '0';"
-        )
-        out.append(
-            f"{host_sig(port, 'WREADY')} <= {hbm_sig(port, 'WREADY')} when {sel_write(p)}='0' else '0';"
-        )
-        out.append(
-            f"{O_WPKG}({p}).wready <= {hbm_sig(port, 'WREADY')} when {sel_write(p)}='1' else '0';"
-        )
-        for sig in B_OUT:
-            out.append(
-                f"{host_sig(port, sig)} <= {hbm_sig(port, sig)} when {sel_write(p)}='0' else {default_for(sig)};"
-            )
-            out.append(
-                f"{O_WPKG}({p}).{sig.lower()} <= {hbm_sig(port, sig)} when {sel_write(p)}='1' else {default_for(sig)};"
-            )
+        out += emit_demux(port, p, AW_OUT + W_OUT, sel_write(p))
+        out += emit_demux(port, p, B_OUT, sel_write(p))
 
         out.append("\n")
     return "\n".join(out)
 
+# ---------- registered mode ----------
+def mux_sig(port: str, sig: str) -> str:
+    # master side of the register slices, after the mux / before the demux
+    return f"mux_{port}_{sig.lower()}"
+
+def owner_sig(port: str, write: bool) -> str:
+    return f"hbm_{port}_{'wr' if write else 'rd'}_owner"
+
+def outstanding_sig(port: str, write: bool) -> str:
+    return f"hbm_{port}_{'wr' if write else 'rd'}_outstanding"
+
+def channel_parts(channel: str):
+    """valid, ready and the payload signals (packed MSB first) of one AXI channel."""
+    valid, ready = SIGNALS[f"{channel}VALID"], SIGNALS[f"{channel}READY"]
+    payload = [s for s in select(channel) if s not in (valid, ready)]
+    return valid, ready, payload
+
+def payload_width(payload) -> int:
+    return sum(1 if s.is_scalar else width_value(s.width) for s in payload)
+
+def emit_pack(dst: str, port: str, payload, sig) -> str:
+    return f"{dst} <= " + " & ".join(sig(port, s.name) for s in payload) + ";"
+
+def emit_unpack(src: str, port: str, payload, sig):
+    out = []
+    hi = payload_width(payload) - 1
+    for s in payload:
+        if s.is_scalar:
+            out.append(f"{sig(port, s.name)} <= {src}({hi});")
+            hi -= 1
+        else:
+            w = width_value(s.width)
+            out.append(f"{sig(port, s.name)} <= {src}({hi} downto {hi - w + 1});")
+            hi -= w
+    return out
+
+def emit_registered_decls(depth: int) -> str:
+    out = [emit_header("REGISTER SLICE AND OWNER SIGNALS (AXI_00..AXI_15)")]
+    out.append(f"constant hbm_slice_depth : integer := {depth};")
+    out.append("")
+    for p in range(FIRST_PORT, LAST_PORT + 1):
+        port = p2(p)
+        for sig in ALL_SIGNALS:
+            out.append(f"signal {mux_sig(port, sig.name)} : {sig.vhdl_type()};")
+        for ch in ("AR", "R", "AW", "W", "B"):
+            w = payload_width(channel_parts(ch)[2])
+            out.append(f"signal mux_{port}_{ch.lower()}_data : std_logic_vector({w - 1} downto 0);")
+            out.append(f"signal hbm_{port}_{ch.lower()}_data : std_logic_vector({w - 1} downto 0);")
+        for write in (False, True):
+            out.append(f"signal {owner_sig(port, write)} : std_logic; -- '0' => HOST, '1' => TFHE")
+            # the HBM accepts 64 ids, the slices hold 2 * depth transfers more
+            out.append(f"signal {outstanding_sig(port, write)} : unsigned(hbm_id_bit_width downto 0);")
+        out.append(f"signal hbm_{port}_w_open : std_logic; -- inside a write burst")
+        out.append("")
+    return "\n".join(out)
+
+def emit_slice(port: str, ch: str) -> list:
+    valid, ready, payload = channel_parts(ch)
+    forward = valid.to_hbm
+    src, dst = (mux_sig, hbm_sig) if forward else (hbm_sig, mux_sig)
+    src_data = f"{'mux' if forward else 'hbm'}_{port}_{ch.lower()}_data"
+    dst_data = f"{'hbm' if forward else 'mux'}_{port}_{ch.lower()}_data"
+    out = [emit_pack(src_data, port, payload, src)]
+    out += emit_unpack(dst_data, port, payload, dst)
+    out += [
+        f"hbm_{port}_{ch.lower()}_slice: entity work.axi_register_slice",
+        f"  generic map (data_width => {payload_width(payload)}, depth => hbm_slice_depth)",
+        f"  port map (i_clk => {SLICE_CLK}, i_reset_n => {SLICE_RESET_N},",
+        f"            i_valid => {src(port, valid.name)}, o_ready => {src(port, ready.name)}, i_data => {src_data},",
+        f"            o_valid => {dst(port, valid.name)}, i_ready => {dst(port, ready.name)}, o_data => {dst_data});",
+    ]
+    return out
+
+def emit_owner_process(port: str, p: int) -> list:
+    rd, wr = owner_sig(port, False), owner_sig(port, True)
+    rd_cnt, wr_cnt = outstanding_sig(port, False), outstanding_sig(port, True)
+    m = lambda sig: mux_sig(port, sig)
+    ar_hs = f"({m('ARVALID')} and {m('ARREADY')})"
+    r_done = f"({m('RVALID')} and {m('RREADY')} and {m('RLAST')})"
+    aw_hs = f"({m('AWVALID')} and {m('AWREADY')})"
+    w_hs = f"({m('WVALID')} and {m('WREADY')})"
+    b_hs = f"({m('BVALID')} and {m('BREADY')})"
+    w_open = f"hbm_{port}_w_open"
+    return [
+        f"hbm_{port}_owner: process ({SLICE_CLK}) is",
+        "begin",
+        f"  if rising_edge({SLICE_CLK}) then",
+        f"    if {SLICE_RESET_N} = '0' then",
+        f"      {rd} <= '0';",
+        f"      {wr} <= '0';",
+        f"      {rd_cnt} <= (others => '0');",
+        f"      {wr_cnt} <= (others => '0');",
+        f"      {w_open} <= '0';",
+        "    else",
+        "      -- a read is outstanding from its AR handshake until its last R beat",
+        f"      if {ar_hs} = '1' and {r_done} = '0' then",
+        f"        {rd_cnt} <= {rd_cnt} + 1;",
+        f"      elsif {ar_hs} = '0' and {r_done} = '1' then",
+        f"        {rd_cnt} <= {rd_cnt} - 1;",
+        "      end if;",
+        "      -- a write is outstanding from its AW handshake until its B handshake",
+        f"      if {aw_hs} = '1' and {b_hs} = '0' then",
+        f"        {wr_cnt} <= {wr_cnt} + 1;",
+        f"      elsif {aw_hs} = '0' and {b_hs} = '1' then",
+        f"        {wr_cnt} <= {wr_cnt} - 1;",
+        "      end if;",
+        f"      if {w_hs} = '1' then",
+        f"        {w_open} <= not {m('WLAST')};",
+        "      end if;",
+        "      -- the select is only sampled at transaction boundaries",
+        f"      if {rd_cnt} = 0 and {ar_hs} = '0' then",
+        f"        {rd} <= {sel_read(p)};",
+        "      end if;",
+        f"      if {wr_cnt} = 0 and {aw_hs} = '0' and {w_hs} = '0' and {w_open} = '0' then",
+        f"        {wr} <= {sel_write(p)};",
+        "      end if;",
+        "    end if;",
+        "  end if;",
+        "end process;",
+    ]
+
+def emit_registered_mux_demux() -> str:
+    out = [emit_header("REGISTERED MUX INPUTS INTO HBM + DEMUX OUTPUTS OUT OF HBM")]
+    out.append("-- Convention: owner='0' => HOST owns that channel, owner='1' => TFHE owns that channel")
+    out.append("-- The owners follow the select signals only while their direction is idle.\n")
+    for p in range(FIRST_PORT, LAST_PORT + 1):
+        port = p2(p)
+        rd, wr = owner_sig(port, False), owner_sig(port, True)
+        out.append(f"-- -------------------- AXI_{port} --------------------")
+        out += emit_mux(port, p, AR_IN + R_IN, rd, mux_sig)
+        out += emit_demux(port, p, AR_OUT + R_OUT, rd, mux_sig)
+        out += emit_mux(port, p, AW_IN + W_IN + B_IN, wr, mux_sig)
+        out += emit_demux(port, p, AW_OUT + W_OUT + B_OUT, wr, mux_sig)
+        out.append("")
+        for ch in ("AR", "R", "AW", "W", "B"):
+            out += emit_slice(port, ch)
+            out.append("")
+        out += emit_owner_process(port, p)
+        out.append("\n")
+    return "\n".join(out)
+
+def render() -> str:
+    return "\n".join([emit_signal_decls(), emit_hbm_portmap(), emit_mux_demux()]) + "\n"
+
+def render_registered(depth: int = SLICE_DEPTH) -> str:
+    sections = [emit_signal_decls(), emit_registered_decls(depth), emit_hbm_portmap(), emit_registered_mux_demux()]
+    return "\n".join(sections) + "\n"
+
 def main():
-    print(emit_signal_decls())
-    print(emit_hbm_portmap())
-    print(emit_mux_demux())
+    parser = argparse.ArgumentParser(description="Generate the HBM AXI mux/demux glue")
+    parser.add_argument("--registered", action="store_true", help="register slices and per-transaction owners")
+    parser.add_argument("--depth", type=int, default=SLICE_DEPTH, help="register stages per channel")
+    args = parser.parse_args()
+    print(render_registered(args.depth) if args.registered else render(), end="")
 
 if __name__ == "__main__":
     main()
@@ -22,18 +22,24 @@
 #     print()
 
 
-NUM_PORTS = 32
-
-for i in range(NUM_PORTS):
-    idx = f"{i:02d}"
-
-    print(f"// AXI_{idx} sideband unused tie-offs")
-    print(f"wire _unused_axi_{idx}_arprot  = &AXI_{idx}_ARPROT;")
-    print(f"wire _unused_axi_{idx}_arcache = &AXI_{idx}_ARCACHE;")
-    print(f"wire _unused_axi_{idx}_arlock  = AXI_{idx}_ARLOCK;")
-    print(f"wire _unused_axi_{idx}_arqos   = &AXI_{idx}_ARQOS;")
-    print(f"wire _unused_axi_{idx}_awprot  = &AXI_{idx}_AWPROT;")
-    print(f"wire _unused_axi_{idx}_awcache = &AXI_{idx}_AWCACHE;")
-    print(f"wire _unused_axi_{idx}_awlock  = AXI_{idx}_AWLOCK;")
-    print(f"wire _unused_axi_{idx}_awqos   = &AXI_{idx}_AWQOS;")
-    print()
+from axi_schema import HBM_PORTS, SIDEBAND
+
+NUM_PORTS = len(HBM_PORTS)
+
+
+def render() -> str:
+    out = []
+    for i in range(NUM_PORTS):
+        idx = f"{i:02d}"
+
+        out.append(f"// AXI_{idx} sideband unused tie-offs")
+        for sig in SIDEBAND:
+            # reduce vectors to one bit
+            reduce = "" if sig.is_scalar else "&"
+            out.append(f"wire _unused_axi_{idx}_{sig.name.lower():<7} = {reduce}AXI_{idx}_{sig.name};")
+        out.append("")
+    return "\n".join(out) + "\n"
+
+
+if __name__ == "__main__":
+    print(render(), end="")
@@ -0,0 +1,7 @@
+"""
+Python models and table generators for the tfhe-PU.
+
+Everything in here mirrors values that the VHDL computes during elaboration
+(see src/core_logic/constants_and_utils), so that they can be checked and
+swept without starting Vivado.
+"""
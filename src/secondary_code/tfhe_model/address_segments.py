@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Address segments of the block design, as Vivado exports them to
+src/mmap/memory_map/AddressSegments.csv.
+
+Every row assigns a slave segment (/tfhe_block_0/AXI_nn/reg0) a window of a
+master's address space (/xdma_0/M_AXI): offset and range, with ranges written
+as 256M or 4K. hbm_windows() returns the windows of the HBM pseudo channel
+ports AXI_00..AXI_31 indexed by port, so the host stack, dma_test.sh and the
+IP-XACT generator take their channel addresses from the design instead of
+recomputing the 256 MB / 4 GB strides.
+
+Usage:
+  python -m tfhe_model.address_segments
+  python -m tfhe_model.address_segments --csv other_design/AddressSegments.csv
+"""
+
+import argparse
+import csv
+import os
+import re
+from typing import Dict, List, NamedTuple
+
+DEFAULT_CSV = os.path.join(os.path.dirname(__file__), "..", "..", "mmap", "memory_map", "AddressSegments.csv")
+HBM_SPACE = "/xdma_0/M_AXI"
+
+_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+_PORT = re.compile(r"/AXI_(\d+)/")
+
+
+class Segment(NamedTuple):
+    name: str
+    space: str     # address space of the master
+    slave: str     # slave segment
+    offset: int
+    size: int
+
+
+def parse_range(text: str) -> int:
+    """'256M' -> 268435456"""
+    match = re.fullmatch(r"\s*(\d+)\s*([KMGT]?)\s*", text, re.I)
+    if not match:
+        raise ValueError(f"bad range {text!r}")
+    return int(match.group(1)) * _UNITS[match.group(2).upper()]
+
+
+def load(path: str = DEFAULT_CSV) -> List[Segment]:
+    with open(path, newline="") as f:
+        rows = [row for row in csv.reader(f) if row and not row[0].lstrip().startswith("#")]
+    return [Segment(name, space, slave, int(offset, 16), parse_range(size))
+            for name, space, slave, offset, size, *_ in rows]
+
+
+def hbm_windows(path: str = DEFAULT_CSV, space: str = HBM_SPACE) -> Dict[int, Segment]:
+    """Windows of the HBM ports in space, by AXI port index."""
+    windows = {}
+    for seg in load(path):
+        match = _PORT.search(seg.slave)
+        if seg.space == space and match:
+            windows[int(match.group(1))] = seg
+    return dict(sorted(windows.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HBM windows of AddressSegments.csv")
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--space", default=HBM_SPACE)
+    args = parser.parse_args()
+    for port, seg in hbm_windows(args.csv, args.space).items():
+        print(f"AXI_{port:02d}  {seg.offset:#011x}  {seg.size >> 20:>5} MB  {seg.name}")
+
+
+if __name__ == "__main__":
+    main()
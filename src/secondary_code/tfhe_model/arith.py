@@ -0,0 +1,197 @@
+"""
+Bit-accurate models of src/core_logic/big_arithmetic and modulo_specific.
+
+Every function mirrors one entity signal by signal: same slices, same signal
+widths, same wrap-around of numeric_std arithmetic. Registers only delay the
+data, so they are left out; the latency of each entity is given by
+ArithConfig.latency() with the formulas from constants_utils.vhd.
+
+Operands and results are hwint vectors (32-bit limbs). The models cover any
+prime and both modulo solutions, so a changed width or prime shows up as a
+mismatch against the exact result instead of a long simulation.
+"""
+
+from typing import Dict, NamedTuple
+
+import numpy as np
+
+from . import hwint as h
+from .modarith import U64, add_mod, mul_mod
+
+# datatypes_utils.vhd, unsigned_polym_coefficient_bit_width = 64
+UINT = 64
+UINT_EXTENDED = UINT + 1
+UDOUBLE = 2 * UINT
+INT = UINT + 1
+INT_EXTENDED = UINT_EXTENDED + 1
+
+# constants_utils.vhd
+NTT_MODULO_SOLUTION_DEFAULT = 0
+NTT_MODULO_SOLUTION_SOLINAS = 1
+
+
+class ArithConfig(NamedTuple):
+    # defaults: the values constants_utils.vhd uses when debug_mode = false
+    use_karazuba: bool = True
+    karazuba_depth_2: bool = True
+    ntt_modulo_solution: int = NTT_MODULO_SOLUTION_SOLINAS
+    big_add_in_buf: bool = False
+    dsp_mult_latency: int = 4
+    default_32_bit_mult_latency: int = 6
+    mult_64_default_retiming_registers: int = 2
+
+    def latency(self) -> Dict[str, int]:
+        """Clock cycles from input to output, per entity (constants_utils.vhd)."""
+        karazuba_32_bit_mult_latency = 2 + self.dsp_mult_latency + 1
+        karazuba_64_mult_latency = 3 + (karazuba_32_bit_mult_latency if self.karazuba_depth_2
+                                        else self.default_32_bit_mult_latency)
+        clks_per_64_bit_mult = karazuba_64_mult_latency if self.use_karazuba else self.mult_64_default_retiming_registers
+        clks_per_64_bit_add = 1 + int(self.big_add_in_buf)
+        clks_per_34_bit_add = 1
+        solinas_modulo_latency = clks_per_34_bit_add + 2 * clks_per_64_bit_add + 1
+        default_modulo_latency = 1  # output_writing_latency
+        clks_per_mod = (solinas_modulo_latency if self.ntt_modulo_solution == NTT_MODULO_SOLUTION_SOLINAS
+                        else default_modulo_latency)
+        easy_reduction_latency = clks_per_64_bit_add + 1
+        return {
+            "big_mult": clks_per_64_bit_mult,
+            "big_add": clks_per_64_bit_add,
+            "easy_reduction": easy_reduction_latency,
+            "add_reduce": clks_per_64_bit_add + easy_reduction_latency,
+            "a_mod_p": clks_per_mod,
+            "ab_mod_p_plain": clks_per_64_bit_mult + clks_per_mod,
+        }
+
+
+# ---------- big_arithmetic ----------
+def default_mult(num0, num1, base_len: int):
+    return h.mul(num0, num1, 2 * base_len)
+
+
+def karazuba_mult_dsp_level(num0, num1, base_len: int):
+    half_base = base_len // 2
+    rest_base = base_len - half_base
+    a1 = h.bits(num0, half_base, rest_base)
+    b1 = h.bits(num1, half_base, rest_base)
+    a0 = h.bits(num0, 0, half_base)
+    b0 = h.bits(num1, 0, half_base)
+
+    p2 = h.mul(a0, b0, 2 * half_base)
+    p1 = h.mul(a1, b1, 2 * rest_base)
+    a1_plus_a0 = h.add(a1, a0, rest_base + 1)
+    b1_plus_b0 = h.add(b1, b0, rest_base + 1)
+    p3_len = 2 * (rest_base + 1)
+    p3 = h.mul(a1_plus_a0, b1_plus_b0, p3_len)
+
+    p2_upper = h.bits(p2, half_base, half_base)
+    p2_lower = h.bits(p2, 0, half_base)
+    p1_plus_p2_minus_p2upper = h.sub(h.add(p1, p2, 2 * rest_base + 2), p2_upper, 2 * rest_base + 2)
+    p123_temp = h.sub(p3, p1_plus_p2_minus_p2upper, p3_len)
+    p123_temp_upper = h.bits(p123_temp, half_base, p3_len - half_base)
+    p123_temp_lower = h.bits(p123_temp, 0, half_base)
+    p123_len = 2 * base_len - 2 * half_base
+    p123 = h.add(p1, p123_temp_upper, p123_len)
+    return h.concat((p123, p123_len), (p123_temp_lower, half_base), (p2_lower, half_base))
+
+
+def mult_dsp_level(num0, num1, base_len: int, config: ArithConfig):
+    if config.karazuba_depth_2:
+        return karazuba_mult_dsp_level(num0, num1, base_len)
+    return default_mult(num0, num1, base_len)
+
+
+def karazuba_mult(num0, num1, base_len: int, config: ArithConfig):
+    a1 = h.bits(num0, base_len, base_len)
+    b1 = h.bits(num1, base_len, base_len)
+    a0 = h.bits(num0, 0, base_len)
+    b0 = h.bits(num1, 0, base_len)
+
+    p1 = mult_dsp_level(a1, b1, base_len, config)
+    p2 = mult_dsp_level(a0, b0, base_len, config)
+    a1_plus_a0 = h.add(a1, a0, base_len + 1)
+    b1_plus_b0 = h.add(b1, b0, base_len + 1)
+    p3_len = 2 * (base_len + 1)
+    p3 = mult_dsp_level(a1_plus_a0, b1_plus_b0, base_len + 1, config)
+
+    p2_upper = h.bits(p2, base_len, base_len)
+    p2_lower = h.bits(p2, 0, base_len)
+    p2_minus_p2upper = h.sub(p2, p2_upper, 2 * base_len)
+    p123_temp = h.sub(h.sub(p3, p1, p3_len), p2_minus_p2upper, p3_len)
+    p123_temp_upper = h.bits(p123_temp, base_len, p3_len - base_len)
+    p123_temp_lower = h.bits(p123_temp, 0, base_len)
+    p123 = h.add(p1, p123_temp_upper, 2 * base_len)
+    return h.concat((p123, 2 * base_len), (p123_temp_lower, base_len), (p2_lower, base_len))
+
+
+def big_mult(num0, num1, config: ArithConfig = ArithConfig()):
+    if config.use_karazuba:
+        return karazuba_mult(num0, num1, UINT // 2, config)
+    return default_mult(num0, num1, UINT)
+
+
+def big_add(num0, num1, substraction: bool):
+    # synthesiseable_int operands, synthesiseable_int_extended result
+    num0 = h.sign_extend(num0, INT, INT_EXTENDED)
+    num1 = h.sign_extend(num1, INT, INT_EXTENDED)
+    if substraction:
+        return h.sub(num0, num1, INT_EXTENDED)
+    return h.add(num0, num1, INT_EXTENDED)
+
+
+# ---------- modulo_specific ----------
+def to_synth_uint(num):
+    # signed -> resize to synthesiseable_int -> drop the sign bit: the low 64 bits
+    return h.bits(num, 0, UINT)
+
+
+def easy_reduction(num, modulus: int, can_be_negative: bool):
+    mod = h.const(modulus, UINT)
+    num0_buf = to_synth_uint(num)
+    if can_be_negative:
+        reduced_res = h.add(num0_buf, mod, UINT)
+        take_reduced = h.is_negative(num, INT_EXTENDED)
+    else:
+        reduced_res = h.sub(num0_buf, mod, UINT)
+        take_reduced = ~h.signed_lt(num, h.const(modulus, INT_EXTENDED), INT_EXTENDED)
+    return np.where(take_reduced[..., None], reduced_res, num0_buf)
+
+
+def add_reduce(num0, num1, substraction: bool, modulus: int):
+    temp_res = big_add(h.truncate(num0, INT), h.truncate(num1, INT), substraction)
+    return easy_reduction(temp_res, modulus, substraction)
+
+
+def modulo_default(num, p: int):
+    lo = h.to_u64(h.bits(num, 0, UINT)) % U64(p)
+    hi = h.to_u64(h.bits(num, UINT, UINT)) % U64(p)
+    return h.from_u64(add_mod(mul_mod(hi, U64(2 ** UINT % p), p), lo, p))
+
+
+def modulo_solinas(num, p: int):
+    a = h.bits(num, 96, 32)
+    b = h.bits(num, 64, 32)
+    c = h.bits(num, 32, 32)
+    d = h.bits(num, 0, 32)
+    sub_int = 32 + 2  # +1 for sign, +1 for underflow avoidance
+    temp_d_a_b = h.sub(h.sub(d, a, sub_int), b, sub_int)
+    temp_b_c = h.add(b, c, 32 + 1)
+    temp_b_c_shifted = h.shift_left(temp_b_c, UINT_EXTENDED - 33, UINT_EXTENDED)
+    temp_res = h.add(temp_b_c_shifted, h.sign_extend(temp_d_a_b, sub_int, INT_EXTENDED), INT_EXTENDED)
+    temp_res_cropped = h.bits(temp_res, 0, UINT)
+
+    prime = h.const(p, UINT)
+    negative = h.is_negative(temp_res, INT_EXTENDED)
+    above_p = h.signed_lt(h.const(p, INT_EXTENDED), temp_res, INT_EXTENDED)
+    return np.where(negative[..., None], h.add(temp_res_cropped, prime, UINT),
+                    np.where(above_p[..., None], h.sub(temp_res_cropped, prime, UINT), temp_res_cropped))
+
+
+def a_mod_p(num, p: int, config: ArithConfig = ArithConfig()):
+    if config.ntt_modulo_solution == NTT_MODULO_SOLUTION_SOLINAS:
+        return modulo_solinas(num, p)
+    return modulo_default(num, p)
+
+
+def ab_mod_p_plain(num0, num1, p: int, config: ArithConfig = ArithConfig()):
+    """mult_reduce.vhd, also the datapath of solinas_ab_mod_p / default_ab_mod_p."""
+    return a_mod_p(big_mult(num0, num1, config), p, config)
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Fuzzer for the big_arithmetic / modulo_specific models in tfhe_model.arith.
+
+Runs every unit on random, reduced, carry-pattern and edge-case operands in
+chunks over a process pool and compares against the exact result, computed
+with Python ints on the raw operands (hwint.to_objects). Each result
+is classified as
+  exact   - equal to the canonical result
+  lazy    - congruent, but not fully reduced (e.g. modulo_solinas lets p through)
+  wrong   - anything else
+  outside - an input exceeds the range the unit is designed for (add_reduce
+            reduces only once, so its inputs must be <= p); not checked
+The summary can be written as JSON, and --stimulus writes per-unit vector
+files (hex, one vector per line) that testbenches/arith_replay_tb.vhd replays
+against the VHDL, including all vectors that were not exact.
+
+Usage:
+  python -m tfhe_model.arith_fuzz --count 1000000
+  python -m tfhe_model.arith_fuzz --count 100000000 --report fuzz.json --stimulus build/arith_stimulus
+  python -m tfhe_model.arith_fuzz --no-karazuba-depth-2 --modulo-solution default --units ab_mod_p_plain
+"""
+
+import argparse
+import collections
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from . import arith
+from . import hwint as h
+from .ntt_params import SOLINAS_PRIME, parse_prime
+
+CHUNK_SIZE = 1 << 16
+MAX_REPORTED = 16
+OPERAND_CLASSES = ("random", "reduced", "pattern", "edge")
+
+
+class Unit(NamedTuple):
+    entity: str          # key into ArithConfig.latency()
+    input_widths: tuple
+    output_width: int
+    model: Callable      # (inputs, p, config) -> output
+    reference: Callable  # (inputs, p) -> exact output
+    reduced: bool        # False: the result is not taken mod p (plain multiplier)
+    input_limit: Optional[Callable] = None  # p -> largest allowed input value, None: whole port range
+
+
+def _exact(fn, width: int) -> Callable:
+    """Reference on Python ints of the raw operands: fn(*operands, p) -> int, as limbs of width."""
+    return lambda x, p: h.from_objects(fn(*(h.to_objects(v) for v in x), p), width)
+
+
+UNITS: Dict[str, Unit] = {
+    "big_mult": Unit(
+        "big_mult", (arith.UINT, arith.UINT), arith.UDOUBLE,
+        lambda x, p, c: arith.big_mult(x[0], x[1], c),
+        _exact(lambda a, b, p: a * b, arith.UDOUBLE), False),
+    "a_mod_p": Unit(
+        "a_mod_p", (arith.UDOUBLE,), arith.UINT,
+        lambda x, p, c: arith.a_mod_p(x[0], p, c),
+        _exact(lambda a, p: a % p, arith.UINT), True),
+    "ab_mod_p_plain": Unit(
+        "ab_mod_p_plain", (arith.UINT, arith.UINT), arith.UINT,
+        lambda x, p, c: arith.ab_mod_p_plain(x[0], x[1], p, c),
+        _exact(lambda a, b, p: a * b % p, arith.UINT), True),
+    "add_reduce_add": Unit(
+        "add_reduce", (arith.UINT, arith.UINT), arith.UINT,
+        lambda x, p, c: arith.add_reduce(x[0], x[1], False, p),
+        _exact(lambda a, b, p: (a + b) % p, arith.UINT), True, lambda p: p),
+    "add_reduce_sub": Unit(
+        "add_reduce", (arith.UINT, arith.UINT), arith.UINT,
+        lambda x, p, c: arith.add_reduce(x[0], x[1], True, p),
+        _exact(lambda a, b, p: (a - b) % p, arith.UINT), True, lambda p: p),
+    "easy_reduction": Unit(
+        "easy_reduction", (arith.UINT_EXTENDED,), arith.UINT,
+        lambda x, p, c: arith.easy_reduction(x[0], p, False),
+        _exact(lambda a, p: a % p, arith.UINT), True, lambda p: 2 * p),
+}
+
+
+# ---------- operands ----------
+def edge_values(width: int, p: int) -> List[int]:
+    mask = (1 << width) - 1
+    values = {0, 1, 2, 3, mask, mask - 1, 1 << (width - 1), (1 << (width - 1)) - 1}
+    for k in (1, 2, 3):
+        for d in (-2, -1, 0, 1):
+            values.add(k * p + d)
+            values.add(p * p - k * p + d)
+    for bit in range(16, width, 16):
+        values.update(((1 << bit) - 1, 1 << bit, (1 << bit) + 1, mask ^ ((1 << bit) - 1)))
+    return sorted(v for v in values if 0 <= v <= mask)
+
+
+def edge_operands(unit: Unit, p: int) -> List[np.ndarray]:
+    """Cartesian product of the edge values of every input."""
+    columns = [edge_values(w, p) for w in unit.input_widths]
+    if len(columns) == 1:
+        return [h.from_ints(columns[0], unit.input_widths[0])]
+    combos = list(itertools.product(*columns))
+    return [h.from_ints([c[i] for c in combos], w) for i, w in enumerate(unit.input_widths)]
+
+
+def _random_limbs(rng, n: int, width: int) -> np.ndarray:
+    limbs = rng.integers(0, 1 << h.LIMB_BITS, size=(n, h.num_limbs(width)), dtype=np.uint64)
+    return h.truncate(limbs, width)
+
+
+def _pattern_limbs(rng, n: int, width: int) -> np.ndarray:
+    # 16-bit digits (the dsp-level split) forced to 0, 1, all ones or random to provoke carry chains
+    digits = (width + 15) // 16
+    choice = rng.integers(0, 4, size=(n, digits))
+    rand = rng.integers(0, 1 << 16, size=(n, digits), dtype=np.uint64)
+    table = np.array([0, 1, 0xFFFF, 0], dtype=np.uint64)
+    digit = np.where(choice == 3, rand, table[choice])
+    value = np.zeros((n, h.num_limbs(width)), dtype=np.uint64)
+    for i in range(digits):
+        value[:, i // 2] |= digit[:, i] << np.uint64(16 * (i % 2))
+    return h.truncate(value, width)
+
+
+def random_operands(unit: Unit, operand_class: str, rng, n: int, p: int) -> List[np.ndarray]:
+    res = []
+    for width in unit.input_widths:
+        if operand_class == "pattern":
+            res.append(_pattern_limbs(rng, n, width))
+        elif operand_class == "reduced":
+            # reduce random values below p: uniform enough for fuzzing
+            value = _random_limbs(rng, n, width)
+            res.append(h.truncate(arith.modulo_default(value, p), width))
+        else:
+            res.append(_random_limbs(rng, n, width))
+    return res
+
+
+# ---------- checking ----------
+def outside_contract(unit: Unit, inputs: List[np.ndarray], p: int) -> np.ndarray:
+    outside = np.zeros(inputs[0].shape[:-1], dtype=bool)
+    if unit.input_limit is not None:
+        for x, width in zip(inputs, unit.input_widths):
+            outside |= h.lt(h.const(unit.input_limit(p), width), x, width)
+    return outside
+
+
+def classify(unit: Unit, inputs: List[np.ndarray], p: int, config: arith.ArithConfig):
+    out = unit.model(inputs, p, config)
+    ref = unit.reference(inputs, p)
+    outside = outside_contract(unit, inputs, p)
+    exact = h.eq(out, ref, unit.output_width) & ~outside
+    if unit.reduced:
+        lazy = ~exact & ~outside & h.eq(_exact(lambda v, p: v % p, unit.output_width)([out], p), ref,
+                                        unit.output_width)
+    else:
+        lazy = np.zeros_like(exact)
+    return out, ref, exact, lazy, outside
+
+
+def _record(unit: Unit, inputs, out, ref, idx) -> dict:
+    return {
+        "inputs": [f"{v:#x}" for v in (h.to_ints(x[idx:idx + 1])[0] for x in inputs)],
+        "output": f"{h.to_ints(out[idx:idx + 1])[0]:#x}",
+        "expected": f"{h.to_ints(ref[idx:idx + 1])[0]:#x}",
+    }
+
+
+def check_chunk(task) -> dict:
+    name, operand_class, seed, chunk_idx, n, p, config = task
+    unit = UNITS[name]
+    if operand_class == "edge":
+        inputs = edge_operands(unit, p)
+    else:
+        rng = np.random.default_rng([seed, chunk_idx])
+        inputs = random_operands(unit, operand_class, rng, n, p)
+    out, ref, exact, lazy, outside = classify(unit, inputs, p, config)
+    wrong = ~(exact | lazy | outside)
+    inside = out[~outside]
+    return {
+        "unit": name,
+        "class": operand_class,
+        "count": len(exact),
+        "exact": int(exact.sum()),
+        "lazy": int(lazy.sum()),
+        "wrong": int(wrong.sum()),
+        "outside": int(outside.sum()),
+        "max_output": h.to_ints(inside[np.lexsort(inside.T)[-1]])[0] if len(inside) else 0,
+        "lazy_examples": [_record(unit, inputs, out, ref, i) for i in np.flatnonzero(lazy)[:MAX_REPORTED]],
+        "wrong_examples": [_record(unit, inputs, out, ref, i) for i in np.flatnonzero(wrong)[:MAX_REPORTED]],
+    }
+
+
+def _tasks(units: List[str], count: int, seed: int, p: int, config: arith.ArithConfig):
+    for name in units:
+        yield name, "edge", seed, 0, 0, p, config
+        per_class = count // (len(OPERAND_CLASSES) - 1)
+        for operand_class in OPERAND_CLASSES[:-1]:
+            for chunk_idx, start in enumerate(range(0, per_class, CHUNK_SIZE)):
+                yield name, operand_class, seed, chunk_idx, min(CHUNK_SIZE, per_class - start), p, config
+
+
+def _run(tasks, workers: int):
+    if workers <= 1:
+        yield from map(check_chunk, tasks)
+        return
+    # keep the number of queued chunks bounded, Executor.map would submit all of them
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = collections.deque()
+        for task in itertools.chain(tasks, [None]):
+            if task is not None:
+                in_flight.append(pool.submit(check_chunk, task))
+            while in_flight and (task is None or len(in_flight) >= 4 * workers):
+                yield in_flight.popleft().result()
+
+
+def fuzz(units: List[str], count: int, p: int, config: arith.ArithConfig, seed: int = 0,
+         workers: int = 1) -> dict:
+    summary = {}
+    for res in _run(_tasks(units, count, seed, p, config), workers):
+        entry = summary.setdefault(res["unit"], {"classes": {}, "max_output": 0,
+                                                 "lazy_examples": [], "wrong_examples": []})
+        cls = entry["classes"].setdefault(res["class"], {"count": 0, "exact": 0, "lazy": 0, "wrong": 0, "outside": 0})
+        for key in cls:
+            cls[key] += res[key]
+        entry["max_output"] = max(entry["max_output"], res["max_output"])
+        for key in ("lazy_examples", "wrong_examples"):
+            entry[key] = (entry[key] + res[key])[:MAX_REPORTED]
+    for entry in summary.values():
+        entry["max_output"] = f"{entry['max_output']:#x}"
+    return summary
+
+
+# ---------- stimulus files ----------
+def write_stimulus(out_dir: str, name: str, p: int, config: arith.ArithConfig, summary: dict,
+                   num_random: int, seed: int) -> str:
+    """<name>.txt: '#' header, then one line per vector: inputs and expected VHDL output in hex."""
+    unit = UNITS[name]
+    rng = np.random.default_rng([seed, 1 << 20])
+    parts = [edge_operands(unit, p)]
+    for operand_class in OPERAND_CLASSES[:-1]:
+        parts.append(random_operands(unit, operand_class, rng, num_random, p))
+    examples = summary[name]["lazy_examples"] + summary[name]["wrong_examples"]
+    if examples:
+        parts.append([h.from_ints([int(e["inputs"][i], 16) for e in examples], w)
+                      for i, w in enumerate(unit.input_widths)])
+    inputs = [np.concatenate(column) for column in zip(*parts)]
+    out = unit.model(inputs, p, config)
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{name}.txt")
+    digits = [w // 4 + (w % 4 > 0) for w in unit.input_widths + (unit.output_width,)]
+    with open(path, "w") as f:
+        f.write(f"# {name}: {len(out)} vectors, prime {p:#x}, latency {config.latency()[unit.entity]}\n")
+        f.write(f"# {config}\n")
+        columns = [h.to_ints(x) for x in inputs] + [h.to_ints(out)]
+        for row in zip(*columns):
+            f.write(" ".join(f"{v:0{d}X}" for v, d in zip(row, digits)) + "\n")
+    return path
+
+
+def format_summary(summary: dict) -> str:
+    lines = [f"{'unit':<16} {'class':<8} {'count':>11} {'exact':>11} {'lazy':>9} {'wrong':>9} {'outside':>9}"]
+    for name, entry in summary.items():
+        for operand_class, c in entry["classes"].items():
+            lines.append(f"{name:<16} {operand_class:<8} {c['count']:>11} {c['exact']:>11} {c['lazy']:>9} {c['wrong']:>9} {c['outside']:>9}")
+        lines.append(f"{'':<16} max output {entry['max_output']}")
+        for example in entry["wrong_examples"][:3]:
+            lines.append(f"{'':<16} WRONG {' '.join(example['inputs'])} -> {example['output']}, expected {example['expected']}")
+        for example in entry["lazy_examples"][:1]:
+            lines.append(f"{'':<16} lazy  {' '.join(example['inputs'])} -> {example['output']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz the bit-accurate arithmetic models")
+    parser.add_argument("--prime", default="solinas")
+    parser.add_argument("--units", default=",".join(UNITS), help=f"comma separated subset of {', '.join(UNITS)}")
+    parser.add_argument("--count", type=int, default=1 << 20, help="random operands per unit (edge cases come on top)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--modulo-solution", choices=("solinas", "default"), default="solinas")
+    parser.add_argument("--no-karazuba", action="store_true")
+    parser.add_argument("--no-karazuba-depth-2", action="store_true")
+    parser.add_argument("--report", help="write the summary as JSON")
+    parser.add_argument("--stimulus", help="directory for the testbench vector files")
+    parser.add_argument("--stimulus-random", type=int, default=1000, help="random vectors per class in the files")
+    parser.add_argument("--strict", action="store_true", help="treat lazy (not fully reduced) results as errors")
+    args = parser.parse_args()
+
+    p = parse_prime(args.prime)
+    solution = (arith.NTT_MODULO_SOLUTION_SOLINAS if args.modulo_solution == "solinas"
+                else arith.NTT_MODULO_SOLUTION_DEFAULT)
+    if solution == arith.NTT_MODULO_SOLUTION_SOLINAS and p != SOLINAS_PRIME:
+        parser.error("the solinas modulo solution only supports 0xFFFFFFFF00000001")
+    config = arith.ArithConfig(use_karazuba=not args.no_karazuba, karazuba_depth_2=not args.no_karazuba_depth_2,
+                               ntt_modulo_solution=solution)
+    units = args.units.split(",")
+
+    start = time.perf_counter()
+    summary = fuzz(units, args.count, p, config, args.seed, args.workers)
+    elapsed = time.perf_counter() - start
+    total = sum(c["count"] for e in summary.values() for c in e["classes"].values())
+    print(format_summary(summary))
+    print(f"{total} vectors in {elapsed:.1f} s ({total / elapsed / 1e6:.2f} M/s)")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"prime": f"{p:#x}", "config": config._asdict(), "latency": config.latency(),
+                       "units": summary}, f, indent=1)
+    if args.stimulus:
+        for name in units:
+            print(f"wrote {write_stimulus(args.stimulus, name, p, config, summary, args.stimulus_random, args.seed)}")
+
+    failed = sum(c["wrong"] + args.strict * c["lazy"] for e in summary.values() for c in e["classes"].values())
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
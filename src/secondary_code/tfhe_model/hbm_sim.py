@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Discrete-event stall simulator of the HBM channels and ping-pong buffers.
+
+Replays the read traffic of src/processor/hbm_channel_buffer against a model
+of the HBM pseudo channels and checks whether the data arrives before the
+blind rotation needs it:
+  - bski_pbs_pingpongbuffer: one BSK_i per iteration over bsk_hbm_num_ps_ports
+    ports, requested in bursts of bsk_burstlen + 1 beats; the next-but-one
+    BSK_i is requested once the last pass over a buffer half has started
+  - ai_pbs_pingpongbuffer: ai_burstlen + 1 beats per ciphertext, every beat
+    holds ai_hbm_coeffs_per_clk a_i, ping-pong over groups of iterations
+  - pbs_lut_buffer, pbs_b_buffer, op_pbs_pingpongbuffer: single-beat reads
+    for the next batch while the current one is in its blind rotation
+Every pseudo channel accepts one read request per clock while fewer than
+hbm_id_queue_depth requests are outstanding, answers in order with one beat
+per clock after a fixed read latency, and is blocked for refresh_clks every
+refresh interval (3.9 us, at a random phase per channel).
+
+The blind rotation consumes one slot per clock. Slot j of BSK_i is complete
+once beat j of every port arrived; if it is late, the whole pipeline stalls
+(clocks counted as underflow of that buffer) and every later deadline moves.
+The initial fill before the first iteration is reported as startup, not as
+underflow. The result is the achieved fraction of the peak PBS rate from
+pbs_latency and the worst first beat latency, compared with
+hbm_worst_case_delay_in_clks, which the VHDL speed check assumes.
+
+Usage:
+  python -m tfhe_model.hbm_sim
+  python -m tfhe_model.hbm_sim --log2-throughput 6 --decomp-length 3 --bsk-burstlen 3 --batches 4
+"""
+
+import argparse
+from collections import deque
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+from .pbs_latency import AI_HBM_COEFFS_PER_CLK, BSK_HBM_NUM_COEFFS_PER_CLK, LatencyConfig, evaluate
+
+# ip_cores_constants.vhd / processor_utils.vhd
+HBM_COEFFS_PER_CLOCK_PER_PS_PORT = 4
+HBM_BURSTLEN_MAX = 15
+HBM_ID_QUEUE_DEPTH = 64
+HBM_WORST_CASE_DELAY_IN_CLKS = 150
+BSK_HBM_NUM_PS_PORTS = BSK_HBM_NUM_COEFFS_PER_CLK // HBM_COEFFS_PER_CLOCK_PER_PS_PORT
+REFRESH_INTERVAL_US = 3.9
+
+BUFFERS = ("bski", "ai", "lut", "b", "op")
+
+
+class HbmConfig(NamedTuple):
+    bsk_burstlen: int = HBM_BURSTLEN_MAX
+    id_queue_depth: int = HBM_ID_QUEUE_DEPTH
+    read_latency: int = 40
+    read_jitter: int = 0
+    refresh_clks: int = 117
+    worst_case_delay: int = HBM_WORST_CASE_DELAY_IN_CLKS
+
+
+class BufferStats(NamedTuple):
+    ports: int
+    requests: int
+    beats: int
+    underflow_clks: int
+    late_slots: int
+    overwritten_slots: int
+    max_request_latency: int
+    port_utilization: float
+
+
+class SimResult(NamedTuple):
+    config: LatencyConfig
+    hbm: HbmConfig
+    batches: int
+    period: int
+    startup_clks: int
+    ideal_clks: int
+    actual_clks: int
+    buffers: Dict[str, BufferStats]
+    peak_pbs_per_s: float
+    vhdl_speed_check_ok: bool
+
+    @property
+    def underflow_clks(self) -> int:
+        return sum(s.underflow_clks for s in self.buffers.values())
+
+    @property
+    def peak_fraction(self) -> float:
+        return self.ideal_clks / self.actual_clks
+
+    def pbs_per_s(self) -> float:
+        return self.peak_pbs_per_s * self.peak_fraction
+
+
+class Channel:
+    """One HBM pseudo channel: in-order AXI reads with refresh and an ID queue limit."""
+
+    def __init__(self, hbm: HbmConfig, refresh_interval: int, rng: np.random.Generator):
+        self.hbm = hbm
+        self.refresh_interval = refresh_interval
+        self.refresh_phase = int(rng.integers(refresh_interval)) if refresh_interval else 0
+        self.rng = rng
+        self.outstanding = deque()
+        self.last_issue = -1
+        self.bus_free = 0
+        self.requests = 0
+        self.beats = 0
+        self.max_latency = 0
+
+    def _after_refresh(self, start: int, beats: int) -> int:
+        if not self.refresh_interval or not self.hbm.refresh_clks:
+            return start
+        while True:
+            window = (start - self.refresh_phase) // self.refresh_interval * self.refresh_interval + self.refresh_phase
+            if start < window + self.hbm.refresh_clks:
+                start = window + self.hbm.refresh_clks
+            elif start + beats > window + self.refresh_interval:
+                start = window + self.refresh_interval + self.hbm.refresh_clks
+            else:
+                return start
+
+    def read(self, enable: int, bursts: List[int]) -> np.ndarray:
+        """Issue the bursts (beats per request) from clock enable on, return the arrival clock of every beat."""
+        arrivals = []
+        issue = max(enable, self.last_issue + 1)
+        jitter = self.rng.integers(0, self.hbm.read_jitter + 1, len(bursts)) if self.hbm.read_jitter else None
+        for n, beats in enumerate(bursts):
+            while self.outstanding and self.outstanding[0] < issue:
+                self.outstanding.popleft()
+            if len(self.outstanding) >= self.hbm.id_queue_depth:
+                issue = self.outstanding.popleft() + 1
+            latency = self.hbm.read_latency + (int(jitter[n]) if jitter is not None else 0)
+            start = self._after_refresh(max(issue + latency, self.bus_free), beats)
+            arrivals.extend(range(start, start + beats))
+            self.bus_free = start + beats
+            self.outstanding.append(start + beats - 1)
+            self.max_latency = max(self.max_latency, start - issue)
+            self.last_issue = issue
+            issue += 1
+        self.requests += len(bursts)
+        self.beats += sum(bursts)
+        return np.array(arrivals, dtype=np.int64)
+
+
+def _bursts(beats: int, burstlen: int) -> List[int]:
+    full, rest = divmod(beats, burstlen + 1)
+    return [burstlen + 1] * full + ([rest] if rest else [])
+
+
+def simulate(cfg: LatencyConfig = LatencyConfig(), hbm: HbmConfig = HbmConfig(), batches: int = 1,
+             clock_mhz: float = 200.0, seed: int = 0) -> SimResult:
+    lat = evaluate(cfg)
+    rng = np.random.default_rng(seed)
+    refresh_interval = round(REFRESH_INTERVAL_US * clock_mhz)
+    n = 2 ** cfg.log2_n
+    t = 2 ** cfg.log2_pbs_throughput
+    polyms = cfg.k + 1
+    k_lwe = lat.k_lwe
+    batchsize = lat.pbs_batchsize
+    steps = polyms * n // t
+    period = batchsize * steps
+
+    # bski_pbs_pingpongbuffer: num_sub_blocks beats per port and slot
+    bsk_coeffs_needed_per_clk = cfg.decomp_length * polyms * t
+    bsk_coeffs_per_clk = min(BSK_HBM_NUM_COEFFS_PER_CLK, bsk_coeffs_needed_per_clk)
+    bsk_ports = bsk_coeffs_per_clk // HBM_COEFFS_PER_CLOCK_PER_PS_PORT
+    num_sub_blocks = bsk_coeffs_needed_per_clk // bsk_coeffs_per_clk
+    bsk_bursts = _bursts(steps * num_sub_blocks, hbm.bsk_burstlen)
+    # same as the assertion in bski_pbs_pingpongbuffer
+    clks_per_bski_load = (n // t) * polyms * num_sub_blocks
+    vhdl_speed_check_ok = period >= clks_per_bski_load + hbm.worst_case_delay
+
+    # ai_pbs_pingpongbuffer: one fill covers ai_iters iterations
+    ai_iters = AI_HBM_COEFFS_PER_CLK * (cfg.ai_burstlen + 1)
+    lut_beats = steps * t // HBM_COEFFS_PER_CLOCK_PER_PS_PORT
+
+    channels = {
+        "bski": [Channel(hbm, refresh_interval, rng) for _ in range(bsk_ports)],
+        "ai": [Channel(hbm, refresh_interval, rng)],
+        "lut": [Channel(hbm, refresh_interval, rng)],
+        "b": [Channel(hbm, refresh_interval, rng)],
+        "op": [Channel(hbm, refresh_interval, rng)],
+    }
+    underflow = dict.fromkeys(BUFFERS, 0)
+    late = dict.fromkeys(BUFFERS, 0)
+    overwritten = dict.fromkeys(BUFFERS, 0)
+
+    def fetch_bski(enable: int) -> np.ndarray:
+        per_port = [ch.read(enable, bsk_bursts) for ch in channels["bski"]]
+        # a slot is complete with its last sub block
+        return np.maximum.reduce(per_port)[num_sub_blocks - 1::num_sub_blocks][:steps]
+
+    def fetch_ai(enable: int) -> np.ndarray:
+        beats = channels["ai"][0].read(enable, [cfg.ai_burstlen + 1] * batchsize)
+        return beats.reshape(batchsize, cfg.ai_burstlen + 1)
+
+    def fetch_batch(enable: int):
+        op = channels["op"][0].read(enable, [1] * batchsize)
+        b = channels["b"][0].read(enable, [1] * batchsize)
+        lut = channels["lut"][0].read(enable, [1] * (batchsize * lut_beats))
+        lut_slots = lut.reshape(batchsize, steps, -1).max(axis=2)
+        return op, b, lut_slots
+
+    iterations = batches * k_lwe
+    bski = {0: fetch_bski(0), 1: fetch_bski(0)}
+    ai = {0: fetch_ai(0), 1: fetch_ai(0)}
+    batch_data = {0: fetch_batch(0)}
+    offsets = np.arange(steps)
+    ciphertext_offsets = np.arange(batchsize) * steps
+
+    start = 0
+    startup = 0
+    for g in range(iterations):
+        needs = [("bski", offsets, bski.pop(g))]
+        group, part = divmod(g % k_lwe, ai_iters)
+        ai_fill = (g // k_lwe) * (k_lwe // ai_iters) + group
+        needs.append(("ai", ciphertext_offsets, ai[ai_fill][:, part // AI_HBM_COEFFS_PER_CLK]))
+        if g % k_lwe == 0:
+            op, b, lut_slots = batch_data.pop(g // k_lwe)
+            needs += [("op", ciphertext_offsets, op), ("b", ciphertext_offsets, b),
+                      ("lut", (ciphertext_offsets[:, None] + offsets).ravel(), lut_slots.ravel())]
+
+        stall = 0
+        merged = sorted((int(o), int(a), name) for name, offs, arr in needs for o, a in zip(offs, arr))
+        for offset, arrival, name in merged:
+            wait = arrival - (start + offset + stall)
+            if wait > 0:
+                stall += wait
+                if g == 0:
+                    startup += wait
+                else:
+                    underflow[name] += wait
+                    late[name] += 1
+        start += stall
+
+        # the buffer half of BSK_g is free once its last pass started
+        last_pass = start + (batchsize - 1) * steps
+        if g + 2 < iterations:
+            nxt = fetch_bski(last_pass)
+            overwritten["bski"] += int(np.count_nonzero(nxt <= last_pass + offsets))
+            bski[g + 2] = nxt
+        # a_i fill f may be requested once fill f - 2 is consumed
+        if part == ai_iters - 1 and ai_fill + 2 < iterations // ai_iters:
+            ai[ai_fill + 2] = fetch_ai(start + period)
+            ai.pop(ai_fill)
+        if g % k_lwe == 1 % k_lwe and g // k_lwe + 1 < batches:
+            batch_data[g // k_lwe + 1] = fetch_batch(start)
+        start += period
+
+    actual = start - startup
+    ideal = iterations * period
+    stats = {}
+    for name in BUFFERS:
+        chs = channels[name]
+        stats[name] = BufferStats(len(chs), sum(c.requests for c in chs), sum(c.beats for c in chs),
+                                  underflow[name], late[name], overwritten[name],
+                                  max(c.max_latency for c in chs),
+                                  sum(c.beats for c in chs) / (len(chs) * max(start, 1)))
+    return SimResult(cfg, hbm, batches, period, startup, ideal, actual, stats, lat.pbs_per_s(clock_mhz),
+                     vhdl_speed_check_ok)
+
+
+def format_report(res: SimResult, clock_mhz: float) -> str:
+    keys = ("buffer",) + BufferStats._fields
+    rows = [(name,) + tuple(round(v, 3) if isinstance(v, float) else v for v in s) for name, s in res.buffers.items()]
+    widths = [max(len(k), *(len(str(r[i])) for r in rows)) for i, k in enumerate(keys)]
+    lines = ["  ".join(k.rjust(w) for k, w in zip(keys, widths))]
+    lines += ["  ".join(str(v).rjust(w) for v, w in zip(r, widths)) for r in rows]
+    lines += [
+        "",
+        f"{'iterations':<24} {res.batches * evaluate(res.config).k_lwe} ({res.batches} batches, {res.period} clks each)",
+        f"{'startup_clks':<24} {res.startup_clks}",
+        f"{'ideal_clks':<24} {res.ideal_clks}",
+        f"{'actual_clks':<24} {res.actual_clks}",
+        f"{'peak_fraction':<24} {res.peak_fraction:.4f}",
+        f"{'pbs_per_s':<24} {res.pbs_per_s():.0f} of {res.peak_pbs_per_s:.0f} at {clock_mhz} MHz",
+        f"{'vhdl_speed_check':<24} {'ok' if res.vhdl_speed_check_ok else 'fails'}",
+    ]
+    worst = max(s.max_request_latency for s in res.buffers.values())
+    if worst > res.hbm.worst_case_delay:
+        lines.append(f"worst first beat latency {worst} (queueing included) exceeds "
+                     f"hbm_worst_case_delay_in_clks = {res.hbm.worst_case_delay}")
+    return "\n".join(lines)
+
+
+def main():
+    defaults = LatencyConfig()
+    hbm_defaults = HbmConfig()
+    parser = argparse.ArgumentParser(description="HBM channel and ping-pong buffer stall simulator")
+    parser.add_argument("--clock-mhz", type=float, default=200.0)
+    parser.add_argument("--log2-n", type=int, default=defaults.log2_n)
+    parser.add_argument("--log2-throughput", type=int, default=defaults.log2_pbs_throughput)
+    parser.add_argument("--decomp-length", type=int, default=defaults.decomp_length)
+    parser.add_argument("--k-lwe", type=int, default=defaults.k_lwe)
+    parser.add_argument("--ai-burstlen", type=int, default=defaults.ai_burstlen)
+    parser.add_argument("--bsk-burstlen", type=int, default=hbm_defaults.bsk_burstlen)
+    parser.add_argument("--id-queue-depth", type=int, default=hbm_defaults.id_queue_depth)
+    parser.add_argument("--read-latency", type=int, default=hbm_defaults.read_latency)
+    parser.add_argument("--read-jitter", type=int, default=hbm_defaults.read_jitter)
+    parser.add_argument("--refresh-clks", type=int, default=hbm_defaults.refresh_clks, help="0 disables refresh")
+    parser.add_argument("--batches", type=int, default=1, help="number of batches, each streams the whole BSK")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not 0 <= args.bsk_burstlen <= HBM_BURSTLEN_MAX or not 0 <= args.ai_burstlen <= HBM_BURSTLEN_MAX:
+        parser.error(f"burst lengths must be between 0 and {HBM_BURSTLEN_MAX}")
+    cfg = defaults._replace(log2_n=args.log2_n, log2_pbs_throughput=args.log2_throughput,
+                            decomp_length=args.decomp_length, k_lwe=args.k_lwe, ai_burstlen=args.ai_burstlen)
+    hbm = HbmConfig(args.bsk_burstlen, args.id_queue_depth, args.read_latency, args.read_jitter, args.refresh_clks)
+    res = simulate(cfg, hbm, args.batches, args.clock_mhz, args.seed)
+    print(format_report(res, args.clock_mhz))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Fixed-width integer vectors for bit-accurate datapath models.
+
+A value of bit width w is a uint64 array of shape (..., ceil(w/32)) holding
+32-bit limbs, least significant limb first. Every operation takes the width of
+its result explicitly and wraps modulo 2**width, just like a numeric_std
+assignment to a signal of that length. Signed values use two's complement in
+the same representation; only the comparisons need to know about the sign.
+"""
+
+import numpy as np
+
+U64 = np.uint64
+LIMB_BITS = 32
+_MASK = U64(0xFFFFFFFF)
+_SHIFT = U64(LIMB_BITS)
+
+
+def num_limbs(width: int) -> int:
+    return max(1, -(-width // LIMB_BITS))
+
+
+def _resize(v: np.ndarray, limbs: int) -> np.ndarray:
+    have = v.shape[-1]
+    if have == limbs:
+        return v
+    if have > limbs:
+        return v[..., :limbs]
+    pad = np.zeros(v.shape[:-1] + (limbs - have,), dtype=U64)
+    return np.concatenate([v, pad], axis=-1)
+
+
+def truncate(v: np.ndarray, width: int) -> np.ndarray:
+    v = _resize(v, num_limbs(width)).copy()
+    rest = width % LIMB_BITS
+    if rest:
+        v[..., -1] &= U64((1 << rest) - 1)
+    return v
+
+
+def from_u64(x, width: int = 64) -> np.ndarray:
+    x = np.asarray(x, dtype=U64)
+    return truncate(np.stack([x & _MASK, x >> _SHIFT], axis=-1), width)
+
+
+def to_u64(v: np.ndarray) -> np.ndarray:
+    v = _resize(v, 2)
+    return v[..., 0] | (v[..., 1] << _SHIFT)
+
+
+def from_ints(values, width: int) -> np.ndarray:
+    limbs = num_limbs(width)
+    mask = (1 << width) - 1
+    rows = [[(int(x) & mask) >> (LIMB_BITS * i) & 0xFFFFFFFF for i in range(limbs)] for x in values]
+    return np.array(rows, dtype=U64).reshape(-1, limbs)
+
+
+def to_ints(v: np.ndarray) -> list:
+    v = np.asarray(v)
+    flat = v.reshape(-1, v.shape[-1])
+    return [sum(int(limb) << (LIMB_BITS * i) for i, limb in enumerate(row)) for row in flat]
+
+
+def to_objects(v: np.ndarray) -> np.ndarray:
+    """Python ints of v as an object array of shape v.shape[:-1], for exact reference arithmetic."""
+    v = np.asarray(v)
+    out = np.zeros(v.shape[:-1], dtype=object)
+    for i in range(v.shape[-1]):
+        out = out + (v[..., i].astype(object) << (LIMB_BITS * i))
+    return out
+
+
+def from_objects(values: np.ndarray, width: int) -> np.ndarray:
+    """Inverse of to_objects, wrapped to width."""
+    values = np.asarray(values, dtype=object) & ((1 << width) - 1)
+    return np.stack([((values >> (LIMB_BITS * i)) & 0xFFFFFFFF).astype(U64) for i in range(num_limbs(width))],
+                    axis=-1)
+
+
+def const(value: int, width: int) -> np.ndarray:
+    return from_ints([value], width)[0]
+
+
+def add(a: np.ndarray, b: np.ndarray, width: int, carry_in: int = 0) -> np.ndarray:
+    limbs = num_limbs(width)
+    a = _resize(a, limbs)
+    b = _resize(b, limbs)
+    out = np.empty(np.broadcast_shapes(a.shape, b.shape), dtype=U64)
+    carry = U64(carry_in)
+    for i in range(limbs):
+        s = a[..., i] + b[..., i] + carry
+        out[..., i] = s & _MASK
+        carry = s >> _SHIFT
+    return truncate(out, width)
+
+
+def invert(a: np.ndarray, width: int) -> np.ndarray:
+    return truncate(_resize(a, num_limbs(width)) ^ _MASK, width)
+
+
+def sub(a: np.ndarray, b: np.ndarray, width: int) -> np.ndarray:
+    return add(a, invert(b, width), width, carry_in=1)
+
+
+def sign_extend(v: np.ndarray, from_width: int, to_width: int) -> np.ndarray:
+    negative = is_negative(v, from_width)
+    ones = invert(const((1 << from_width) - 1, to_width), to_width)
+    v = truncate(v, to_width)
+    return np.where(negative[..., None], v | ones, v)
+
+
+def bits(v: np.ndarray, low: int, count: int) -> np.ndarray:
+    """v(low + count - 1 downto low), i.e. a slice in LSB-0 numbering."""
+    skip, rest = divmod(low, LIMB_BITS)
+    src = v[..., skip:]
+    limbs = num_limbs(count)
+    src = _resize(src, limbs + 1)
+    if rest:
+        out = (src[..., :-1] >> U64(rest)) | ((src[..., 1:] << U64(LIMB_BITS - rest)) & _MASK)
+    else:
+        out = src[..., :-1]
+    return truncate(out, count)
+
+
+def shift_left(v: np.ndarray, amount: int, width: int) -> np.ndarray:
+    skip, rest = divmod(amount, LIMB_BITS)
+    limbs = num_limbs(width)
+    zeros = np.zeros(v.shape[:-1] + (skip,), dtype=U64)
+    v = np.concatenate([zeros, v], axis=-1)
+    v = _resize(v, limbs + 1)
+    if rest:
+        hi = (v << U64(rest)) & _MASK
+        lo = np.concatenate([np.zeros(v.shape[:-1] + (1,), dtype=U64), v[..., :-1] >> U64(LIMB_BITS - rest)], axis=-1)
+        v = hi | lo
+    return truncate(v, width)
+
+
+def concat(*parts) -> np.ndarray:
+    """concat((msb_value, msb_width), ..., (lsb_value, lsb_width)) like VHDL '&'."""
+    width = sum(w for _, w in parts)
+    res = None
+    offset = width
+    for value, w in parts:
+        offset -= w
+        shifted = shift_left(truncate(value, w), offset, width)
+        res = shifted if res is None else res | shifted
+    return res
+
+
+def mul(a: np.ndarray, b: np.ndarray, width: int) -> np.ndarray:
+    """Schoolbook product over 32-bit limbs, truncated to width."""
+    limbs = num_limbs(width)
+    shape = np.broadcast_shapes(a.shape[:-1], b.shape[:-1])
+    cols = np.zeros(shape + (limbs + 1,), dtype=U64)
+    for i in range(min(a.shape[-1], limbs)):
+        for j in range(min(b.shape[-1], limbs - i)):
+            p = a[..., i] * b[..., j]
+            # every column collects at most 2*limbs values < 2**32, no overflow
+            cols[..., i + j] += p & _MASK
+            cols[..., i + j + 1] += p >> _SHIFT
+    out = np.empty(shape + (limbs,), dtype=U64)
+    carry = U64(0)
+    for k in range(limbs):
+        s = cols[..., k] + carry
+        out[..., k] = s & _MASK
+        carry = s >> _SHIFT
+    return truncate(out, width)
+
+
+def is_negative(v: np.ndarray, width: int) -> np.ndarray:
+    top = (width - 1) // LIMB_BITS
+    return ((v[..., top] >> U64((width - 1) % LIMB_BITS)) & U64(1)).astype(bool)
+
+
+def lt(a: np.ndarray, b: np.ndarray, width: int) -> np.ndarray:
+    """Unsigned a < b: the borrow of a - b, visible in one extra bit."""
+    return is_negative(sub(truncate(a, width), truncate(b, width), width + 1), width + 1)
+
+
+def signed_lt(a: np.ndarray, b: np.ndarray, width: int) -> np.ndarray:
+    # flipping the sign bit maps two's complement order onto unsigned order
+    flip = const(1 << (width - 1), width)
+    return lt(a ^ flip, b ^ flip, width)
+
+
+def eq(a: np.ndarray, b: np.ndarray, width: int) -> np.ndarray:
+    return np.all(truncate(a, width) == truncate(b, width), axis=-1)
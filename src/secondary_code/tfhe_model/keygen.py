@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Bootstrapping key generation straight into the HBM image of the BSK channels.
+
+BSK_i is the GGSW encryption of bit i of the LWE key under the GLWE key S:
+(k+1)*L rows, row (j, l) a GLWE encryption of zero with s_i * g_l added to
+polynomial j, where g_l = 2**(num_lsbs_to_round + l*log2_decomp_base) is the
+weight of digit l of decomposition.vhd. The rows are produced the way the
+hardware multiplies them (pbs.bsk_to_hardware: ntt domain, n_invers folded
+in). The uniform masks are drawn directly in that domain, where they are
+just as uniform, so a row costs one batched forward ntt of its noise and
+message and a pointwise product with ntt(S).
+
+bski_pbs_pingpongbuffer.vhd reads BSK_0..BSK_(k_lwe-1) in the order of
+pbs.bsk_stream: one (k+1)*L*throughput coefficient slot per clock, filled by
+bsk_hbm_num_ports_to_use ports of stack 0 with num_sub_blocks 256-bit words
+each. Port p streams its own channel window from offset 0; coefficient
+p*4*num_sub_blocks + lane*num_sub_blocks + sub_block of a slot is lane
+(64 bits each, lane 0 in the low bits) of word slot*num_sub_blocks +
+sub_block of port p.
+
+The image is a sparse file of the stack 0 address space (one 256 MB window
+per channel) that the host loads at the BSK base, e.g. with
+tfhe_host.pool --bsk; <image>.json lists the used part of every window.
+Key bits are encrypted --chunk at a time across --workers processes, each
+chunk from its own seed, so the image depends on --seed and --chunk but not
+on --workers, and at most 2 * workers chunks are held in memory. --check
+decrypts iterations back out of the image with the secret keys (written to
+--keys, or reused from there) and reports the noise. The rows are transformed
+with the roots of ntt_params.vhd, which the ntt entity multiplies them with;
+--check also decrypts one row with calc_ntt_res, which reads those roots
+itself, so a BSK built with other roots fails it.
+
+Usage:
+  python -m tfhe_model.keygen --out bsk_stack0.bin --keys secret_keys.npz --check 8
+  python -m tfhe_model.keygen --out bsk_test.bin --k-lwe 20 --decomp-length 3 --workers 4
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from .hbm_sim import HBM_COEFFS_PER_CLOCK_PER_PS_PORT
+from .modarith import U64, add_mod, mul_mod, sub_mod
+from .ntt import calc_ntt_res, from_blocks
+from .ntt_params import parse_prime
+from .pbs import PbsParams, bsk_stream
+from .pbs_latency import BSK_HBM_NUM_COEFFS_PER_CLK
+
+# ip_cores_constants.vhd
+HBM_BYTES_PER_PS_PORT = 32
+HBM_PS_PORT_ADDR_WIDTH = 28   # 256 MB per pseudo channel
+CHANNEL_WINDOW = 1 << HBM_PS_PORT_ADDR_WIDTH
+NOISE_STD = 2.845e-15         # GLWE noise, relative to the modulus
+
+
+class BskLayout(NamedTuple):
+    ports: int        # bsk_hbm_num_ports_to_use
+    sub_blocks: int   # num_sub_blocks, words per port and slot
+    slots: int        # ping_buf_length, slots per BSK_i
+
+    @property
+    def words_per_iteration(self) -> int:
+        """Words of one BSK_i on every port."""
+        return self.slots * self.sub_blocks
+
+    def bytes_per_port(self, k_lwe: int) -> int:
+        """bsk_end_addr - bsk_base_addr."""
+        return k_lwe * self.words_per_iteration * HBM_BYTES_PER_PS_PORT
+
+
+def bsk_layout(params: PbsParams) -> BskLayout:
+    part = (params.k + 1) * params.decomp_length * params.throughput
+    coeffs_per_clk = min(BSK_HBM_NUM_COEFFS_PER_CLK, part)
+    if part % coeffs_per_clk or coeffs_per_clk % HBM_COEFFS_PER_CLOCK_PER_PS_PORT:
+        raise ValueError(f"a BSK slot of {part} coefficients does not split into {coeffs_per_clk} per clock")
+    return BskLayout(coeffs_per_clk // HBM_COEFFS_PER_CLOCK_PER_PS_PORT, part // coeffs_per_clk,
+                     (params.k + 1) * params.n // params.throughput)
+
+
+class SecretKeys(NamedTuple):
+    lwe: np.ndarray    # (k_lwe,) bits
+    glwe: np.ndarray   # (k, N) bits, the polynomials of S
+
+
+def generate_keys(params: PbsParams, seed: Optional[int] = None) -> SecretKeys:
+    rng = np.random.default_rng(seed)
+    return SecretKeys(rng.integers(0, 2, params.k_lwe, dtype=U64),
+                      rng.integers(0, 2, (params.k, params.n), dtype=U64))
+
+
+def save_keys(path: str, keys: SecretKeys, params: PbsParams):
+    np.savez(path, lwe=keys.lwe, glwe=keys.glwe, **{f"param_{k}": v for k, v in params._asdict().items()})
+
+
+def load_keys(path: str) -> SecretKeys:
+    with np.load(path) as f:
+        return SecretKeys(f["lwe"].astype(U64), f["glwe"].astype(U64))
+
+
+def gadget(params: PbsParams) -> np.ndarray:
+    """g_l: the weight of digit l (digit 0 is the least significant one)."""
+    return np.array([pow(2, params.num_lsbs_to_round + level * params.log2_decomp_base, params.prime)
+                     for level in range(params.decomp_length)], dtype=U64)
+
+
+# ---------- encryption ----------
+def encrypt_bsk(bits, glwe_ntt, params: PbsParams, ntt, rng: np.random.Generator,
+                noise_std: float = NOISE_STD) -> np.ndarray:
+    """GGSW encryptions of bits (c,) -> hardware BSK (c, k+1, k+1, L, N); glwe_ntt = ntt(S)."""
+    p, k, n, levels = params.prime, params.k, params.n, params.decomp_length
+    bits = np.asarray(bits, dtype=U64)
+    # rows (c, j, l), polynomials of a row on the next axis: k masks, then the body
+    plain = np.zeros((len(bits), k + 1, levels, k + 1, n), dtype=U64)
+    noise = np.rint(rng.normal(0.0, noise_std * p, (len(bits), k + 1, levels, n))).astype(np.int64)
+    plain[..., k, :] = np.where(noise < 0, U64(p) - (-noise).astype(U64), noise.astype(U64))
+    for j in range(k + 1):
+        plain[:, j, :, j, 0] = add_mod(plain[:, j, :, j, 0], mul_mod(bits[:, None], gadget(params), p), p)
+    rows = mul_mod(ntt.ntt(plain), U64(ntt.params.n_invers), p)
+    masks = rng.integers(0, p, (len(bits), k + 1, levels, k, n), dtype=U64)
+    body = rows[..., k, :]
+    for j in range(k):
+        body = add_mod(body, mul_mod(masks[..., j, :], glwe_ntt[j], p), p)
+    rows[..., k, :] = body
+    rows[..., :k, :] = add_mod(rows[..., :k, :], masks, p)
+    # BSK_i[o, j, l] is polynomial o of row (j, l)
+    return np.ascontiguousarray(np.moveaxis(rows, 3, 1))
+
+
+def to_ports(bsk_hw, params: PbsParams, layout: BskLayout) -> np.ndarray:
+    """Hardware BSK (c, k+1, k+1, L, N) -> the HBM words of every port, (ports, c * words_per_iteration, 4)."""
+    stream = np.stack([bsk_stream(bsk_i, params) for bsk_i in bsk_hw])
+    lanes = HBM_COEFFS_PER_CLOCK_PER_PS_PORT
+    slots = stream.reshape(len(bsk_hw), layout.slots, layout.ports, lanes, layout.sub_blocks)
+    words = slots.transpose(2, 0, 1, 4, 3)   # (ports, c, slot, sub_block, lane)
+    return np.ascontiguousarray(words).reshape(layout.ports, -1, lanes)
+
+
+def from_ports(words, params: PbsParams, layout: BskLayout) -> np.ndarray:
+    """Inverse of to_ports."""
+    lanes = HBM_COEFFS_PER_CLOCK_PER_PS_PORT
+    words = np.asarray(words, dtype=U64).reshape(layout.ports, -1, layout.slots, layout.sub_blocks, lanes)
+    slots = words.transpose(1, 2, 0, 4, 3).reshape(words.shape[1], params.k + 1, params.n // params.throughput,
+                                                   params.k + 1, params.decomp_length, params.throughput)
+    return from_blocks(np.moveaxis(slots, 2, -2))
+
+
+# ---------- image ----------
+_worker_state = {}
+
+
+def _init_worker(params: PbsParams, keys: SecretKeys, seed: int, noise_std: float):
+    ntt = params.ntt_model()
+    _worker_state.update(params=params, ntt=ntt, lwe=keys.lwe, glwe_ntt=ntt.ntt(keys.glwe), seed=seed,
+                         noise_std=noise_std, layout=bsk_layout(params))
+
+
+def _encrypt_chunk(args):
+    first, count = args
+    s = _worker_state
+    rng = np.random.default_rng([s["seed"], first])
+    bsk_hw = encrypt_bsk(s["lwe"][first:first + count], s["glwe_ntt"], s["params"], s["ntt"], rng,
+                         s["noise_std"])
+    return first, to_ports(bsk_hw, s["params"], s["layout"])
+
+
+def manifest_path(image_path: str) -> str:
+    return os.path.splitext(image_path)[0] + ".json"
+
+
+def write_image(path: str, keys: SecretKeys, params: PbsParams, seed: int = 0, noise_std: float = NOISE_STD,
+                workers: int = 1, chunk: int = 16) -> dict:
+    """Writes the BSK image of stack 0 and its manifest; returns the manifest."""
+    layout = bsk_layout(params)
+    per_port = layout.bytes_per_port(params.k_lwe)
+    if per_port > CHANNEL_WINDOW:
+        raise ValueError(f"{per_port} bytes per port do not fit into a {CHANNEL_WINDOW >> 20} MB channel window")
+    chunk_bytes = layout.words_per_iteration * HBM_BYTES_PER_PS_PORT
+    image = np.memmap(path, dtype=np.uint8, mode="w+", shape=((layout.ports - 1) * CHANNEL_WINDOW + per_port,))
+    chunks = [(first, min(chunk, params.k_lwe - first)) for first in range(0, params.k_lwe, chunk)]
+
+    def store(result):
+        first, words = result
+        data = words.view(np.uint8).reshape(layout.ports, -1)
+        for port in range(layout.ports):
+            offset = port * CHANNEL_WINDOW + first * chunk_bytes
+            image[offset:offset + data.shape[1]] = data[port]
+
+    if workers <= 1:
+        _init_worker(params, keys, seed, noise_std)
+        for item in chunks:
+            store(_encrypt_chunk(item))
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(params, keys, seed, noise_std)) as pool:
+            # keep at most 2 * workers chunks in flight, written in order as they complete
+            pending = deque()
+            for item in chunks:
+                pending.append(pool.submit(_encrypt_chunk, item))
+                if len(pending) >= 2 * workers:
+                    store(pending.popleft().result())
+            while pending:
+                store(pending.popleft().result())
+    image.flush()
+    del image
+
+    manifest = {"params": params._asdict(), "seed": seed, "noise_std": noise_std, "ports": layout.ports,
+                "sub_blocks": layout.sub_blocks, "window": CHANNEL_WINDOW, "bytes_per_port": per_port,
+                "windows": [[port * CHANNEL_WINDOW, per_port] for port in range(layout.ports)]}
+    with open(manifest_path(path), "w") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def read_bsk(path: str, params: PbsParams, first: int, count: int = 1) -> np.ndarray:
+    """Hardware BSK_first..BSK_(first+count-1) out of an image, (count, k+1, k+1, L, N)."""
+    layout = bsk_layout(params)
+    image = np.memmap(path, dtype=np.uint8, mode="r")
+    chunk_bytes = layout.words_per_iteration * HBM_BYTES_PER_PS_PORT
+    words = np.stack([image[port * CHANNEL_WINDOW + first * chunk_bytes:
+                            port * CHANNEL_WINDOW + (first + count) * chunk_bytes].view(U64)
+                      for port in range(layout.ports)])
+    return from_ports(words, params, layout)
+
+
+def decryption_noise(bsk_hw, bits, keys: SecretKeys, params: PbsParams, ntt) -> np.ndarray:
+    """|phase - message| of every row coefficient, (c, k+1, L, N); the message of row (j, l) is s_i * g_l * e_j."""
+    p, k = params.prime, params.k
+    rows = np.moveaxis(np.asarray(bsk_hw, dtype=U64), 1, 3)   # (c, j, l, o, N)
+    glwe_ntt = ntt.ntt(keys.glwe)
+    phase = rows[..., k, :]
+    for j in range(k):
+        phase = sub_mod(phase, mul_mod(rows[..., j, :], glwe_ntt[j], p), p)
+    phase = ntt.intt(phase, rescale=False)
+    g = mul_mod(np.asarray(bits, dtype=U64)[:, None], gadget(params), p)   # (c, L)
+    # the body row carries +s_i*g_l, mask row j carries s_i*g_l on a_j, which decrypts to -s_i*g_l*S_j
+    expected = np.zeros_like(phase)
+    expected[:, k, :, 0] = g
+    for j in range(k):
+        expected[:, j] = sub_mod(U64(0), mul_mod(g[..., None], keys.glwe[j], p), p)
+    diff = sub_mod(phase, expected, p)
+    return np.where(diff > U64(p // 2), U64(p) - diff, diff)
+
+
+def reference_noise(bsk_i, bit, keys: SecretKeys, params: PbsParams, ntt) -> int:
+    """decryption_noise of the body row (k, 0) of one BSK_i, with calc_ntt_res instead of the model (slow)."""
+    p, k = params.prime, params.k
+    row = [np.asarray(bsk_i[o, k, 0], dtype=U64) for o in range(k + 1)]
+    phase = row[k]
+    for j in range(k):
+        glwe_ntt = np.array(calc_ntt_res(ntt, keys.glwe[j], False), dtype=U64)
+        phase = sub_mod(phase, mul_mod(row[j], glwe_ntt, p), p)
+    # calc_ntt_res takes the intt input in natural order; bit_reverse is its own inverse
+    phase = np.array(calc_ntt_res(ntt, phase[ntt.bit_reverse], True, True, False), dtype=U64)
+    phase[0] = (int(phase[0]) - bit * int(gadget(params)[0])) % p
+    return int(np.where(phase > U64(p // 2), U64(p) - phase, phase).max())
+
+
+def check(path: str, keys: SecretKeys, params: PbsParams, samples: int, seed: int = 0) -> int:
+    """Decrypts samples iterations out of the image; returns the largest noise magnitude.
+
+    The first one is also decrypted with reference_noise.
+    """
+    ntt = params.ntt_model()
+    worst = 0
+    for n, i in enumerate(np.random.default_rng(seed).choice(params.k_lwe, min(samples, params.k_lwe),
+                                                             replace=False)):
+        bsk_hw = read_bsk(path, params, int(i))
+        noise = decryption_noise(bsk_hw, keys.lwe[i:i + 1], keys, params, ntt)
+        worst = max(worst, int(noise.max()))
+        if n == 0:
+            worst = max(worst, reference_noise(bsk_hw[0], int(keys.lwe[i]), keys, params, ntt))
+    return worst
+
+
+def main():
+    defaults = PbsParams()
+    parser = argparse.ArgumentParser(description="Generate the bootstrapping key into an HBM image of stack 0")
+    parser.add_argument("--out", default="bsk_stack0.bin", help="image file, the manifest goes next to it")
+    parser.add_argument("--keys", default="secret_keys.npz",
+                        help="secret keys, reused if the file exists, otherwise generated from --seed")
+    parser.add_argument("--prime", default="solinas", help="'solinas', 'small' (7681) or an integer")
+    parser.add_argument("--log2-n", type=int, default=defaults.log2_n)
+    parser.add_argument("--throughput", type=int, default=defaults.throughput)
+    parser.add_argument("--k-lwe", type=int, default=defaults.k_lwe)
+    parser.add_argument("--decomp-length", type=int, default=defaults.decomp_length)
+    parser.add_argument("--log2-decomp-base", type=int, default=defaults.log2_decomp_base)
+    parser.add_argument("--num-lsbs-to-round", type=int, default=defaults.num_lsbs_to_round)
+    parser.add_argument("--noise-std", type=float, default=NOISE_STD, help="GLWE noise relative to the modulus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk", type=int, default=16, help="key bits per task")
+    parser.add_argument("--check", type=int, default=0, metavar="N", help="decrypt N iterations afterwards")
+    args = parser.parse_args()
+
+    params = PbsParams(args.log2_n, 1, args.decomp_length, args.log2_decomp_base, args.num_lsbs_to_round,
+                       args.k_lwe, parse_prime(args.prime), args.throughput)
+    if os.path.exists(args.keys):
+        keys = load_keys(args.keys)
+        if len(keys.lwe) != params.k_lwe or keys.glwe.shape != (params.k, params.n):
+            raise SystemExit(f"{args.keys} holds keys of another parameter set")
+    else:
+        keys = generate_keys(params, args.seed)
+        save_keys(args.keys, keys, params)
+
+    start = time.perf_counter()
+    manifest = write_image(args.out, keys, params, args.seed, args.noise_std, args.workers, args.chunk)
+    elapsed = time.perf_counter() - start
+    total = manifest["ports"] * manifest["bytes_per_port"]
+    print(f"{args.out}: BSK of {params.k_lwe} key bits, {total / 1e6:.1f} MB on {manifest['ports']} channels "
+          f"({manifest['bytes_per_port'] / 1e6:.2f} MB each) in {elapsed:.2f} s, {total / elapsed / 1e6:.0f} MB/s")
+    if args.check:
+        worst = check(args.out, keys, params, args.check, args.seed)
+        bound = max(1, int(8 * args.noise_std * params.prime))
+        print(f"{args.check} iterations decrypted, largest noise {worst} (bound {bound})")
+        if worst > bound:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Vectorized modular arithmetic on uint64 NumPy arrays.
+
+NumPy has no 128-bit integers, so a*b for 64-bit operands is formed from
+32-bit limbs (mul_wide) and then reduced. There are three reduction paths:
+  - q < 2**32:       the product fits into 64 bits, plain %
+  - q = solinas:     2**64 = 2**32-1 and 2**96 = -1 mod q (like modulo_solinas.vhd)
+  - any other odd q: Montgomery reduction with R = 2**64
+All functions accept scalars or arrays and broadcast like NumPy does.
+"""
+
+import numpy as np
+
+from .ntt_params import SOLINAS_PRIME
+
+U64 = np.uint64
+_MASK32 = U64(0xFFFFFFFF)
+_SHIFT32 = U64(32)
+_ONE = U64(1)
+_ZERO = U64(0)
+
+
+def as_u64(x) -> np.ndarray:
+    return np.asarray(x, dtype=U64)
+
+
+def mul_wide(a, b):
+    """Full 128-bit product of two uint64 arrays as (hi, lo)."""
+    a = as_u64(a)
+    b = as_u64(b)
+    a0 = a & _MASK32
+    a1 = a >> _SHIFT32
+    b0 = b & _MASK32
+    b1 = b >> _SHIFT32
+    p00 = a0 * b0
+    p01 = a0 * b1
+    p10 = a1 * b0
+    p11 = a1 * b1
+    mid = (p00 >> _SHIFT32) + (p01 & _MASK32) + (p10 & _MASK32)
+    lo = (p00 & _MASK32) | (mid << _SHIFT32)
+    hi = p11 + (p01 >> _SHIFT32) + (p10 >> _SHIFT32) + (mid >> _SHIFT32)
+    return hi, lo
+
+
+def add_mod(a, b, q: int) -> np.ndarray:
+    # a, b < q <= 2**64: detect the wrap-around explicitly
+    a = as_u64(a)
+    b = as_u64(b)
+    qq = U64(q)
+    s = a + b
+    overflow = s < a
+    return np.where(overflow | (s >= qq), s - qq, s)
+
+
+def sub_mod(a, b, q: int) -> np.ndarray:
+    a = as_u64(a)
+    b = as_u64(b)
+    d = a - b
+    return np.where(a < b, d + U64(q), d)
+
+
+def neg_mod(a, q: int) -> np.ndarray:
+    a = as_u64(a)
+    return np.where(a == _ZERO, a, U64(q) - a)
+
+
+def _solinas_reduce(hi, lo):
+    # x = h1*2**96 + h0*2**64 + lo = lo - h1 + h0*(2**32-1) mod p
+    epsilon = U64(0xFFFFFFFF)  # 2**64 mod p
+    h0 = hi & _MASK32
+    h1 = hi >> _SHIFT32
+    t = lo - h1
+    t = np.where(lo < h1, t - epsilon, t)
+    u = (h0 << _SHIFT32) - h0
+    r = t + u
+    r = np.where(r < u, r + epsilon, r)
+    p = U64(SOLINAS_PRIME)
+    return np.where(r >= p, r - p, r)
+
+
+class _Montgomery:
+    _cache = {}
+
+    def __init__(self, q: int):
+        if q % 2 == 0:
+            raise ValueError("Montgomery reduction needs an odd modulus")
+        self.q = U64(q)
+        self.q_neg_inv = U64((-pow(q, -1, 2 ** 64)) % 2 ** 64)
+        self.r2 = U64(pow(2, 128, q))
+
+    @classmethod
+    def get(cls, q: int) -> "_Montgomery":
+        if q not in cls._cache:
+            cls._cache[q] = cls(q)
+        return cls._cache[q]
+
+    def redc(self, hi, lo):
+        # (hi*2**64 + lo) * 2**-64 mod q, requires hi < q
+        m = lo * self.q_neg_inv
+        mh, _ = mul_wide(m, self.q)
+        carry = (lo != _ZERO).astype(U64)  # lo + m*q = 0 mod 2**64
+        s = hi + mh
+        overflow = s < hi
+        t = s + carry
+        overflow |= t < s
+        return np.where(overflow | (t >= self.q), t - self.q, t)
+
+
+def mul_mod(a, b, q: int) -> np.ndarray:
+    """a*b mod q for a, b < q and any q < 2**64."""
+    if q < 2 ** 32:
+        return (as_u64(a) * as_u64(b)) % U64(q)
+    hi, lo = mul_wide(a, b)
+    if q == SOLINAS_PRIME:
+        return _solinas_reduce(hi, lo)
+    mont = _Montgomery.get(q)
+    t = mont.redc(hi, lo)
+    return mont.redc(*mul_wide(t, mont.r2))
+
+
+def pow_mod(base, exponent, q: int) -> np.ndarray:
+    """Batched square-and-multiply; base and exponent broadcast against each other."""
+    base = as_u64(base) % U64(q)
+    exponent = as_u64(exponent)
+    base, exponent = np.broadcast_arrays(base, exponent)
+    base = base.copy()
+    res = np.ones(base.shape, dtype=U64)
+    num_bits = int(exponent.max()).bit_length() if exponent.size else 0
+    for bit in range(num_bits):
+        mask = ((exponent >> U64(bit)) & _ONE).astype(bool)
+        res = np.where(mask, mul_mod(res, base, q), res)
+        if bit != num_bits - 1:
+            base = mul_mod(base, base, q)
+    return res
+
+
+def power_table(omega: int, length: int, q: int) -> np.ndarray:
+    """omega**0 .. omega**(length-1) mod q, built by doubling the table each step."""
+    table = np.ones(1, dtype=U64)
+    step = omega % q
+    while table.size < length:
+        table = np.concatenate([table, mul_mod(table, U64(step), q)])
+        step = step * step % q
+    return table[:length]
+
+
+def from_ints(values) -> np.ndarray:
+    return np.array([int(v) for v in values], dtype=U64)
+
+
+def to_ints(array) -> list:
+    return [int(v) for v in np.asarray(array).ravel()]
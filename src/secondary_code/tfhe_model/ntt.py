@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Batched golden model of the ntt entity (src/core_logic/ntt/ntt.vhd).
+
+Reproduces what ntt_tb.vhd checks, for a whole batch of polynomials at once:
+  - forward: natural-order input, result in bit-reversed order (calc_ntt_res
+    with bit_reverse_order = true)
+  - inverse: bit-reversed input, natural-order result, scaled by n_invers
+    unless intt_no_final_reduction
+  - ntt_mixed_format (no_first_last_stage_logic = true): the ntt expects its
+    input and the intt delivers its output in to_ntt_mixed_format order
+  - both stream throughput coefficients per clock, i.e. the polynomial is cut
+    into consecutive sub_polynom blocks of size throughput
+Arrays are uint64 with the polynomial index on the last axis; any leading axes
+are batch dimensions. Products are formed with modarith (32-bit limbs).
+
+The roots are those of ntt_params.vhd (ntt_params.vhdl_params), so the
+transform is bit-exact with the ntt entity and not only on intt(ntt(x))
+round trips: ntt_utils.vhd uses omega_2n = list(log2 N + 1).omega for the
+negacyclic transform and list(log2 N).omega for the cyclic one. solver_roots
+takes the roots of ntt_params.get_params(hw=False) instead, for primes that
+have no list in ntt_params.vhd.
+
+Usage:
+  python -m tfhe_model.ntt --prime solinas --log2-n 10 --throughput 32 --batch 4096 --check 4
+  python -m tfhe_model.ntt --prime 0xffffffff00000001 --log2-n 10 --solver-roots
+"""
+
+import argparse
+import time
+from typing import Optional
+
+import numpy as np
+
+from .modarith import U64, add_mod, mul_mod, power_table, sub_mod
+from .ntt_params import SOLINAS_PRIME, VHDL_PARAMS_LISTS, get_params, parse_prime, vhdl_params
+from .twiddles import bit_reverse_indices
+
+
+def to_ntt_mixed_format(polys: np.ndarray, is_ntt_input: bool, throughput: int) -> np.ndarray:
+    """to_ntt_mixed_format from tb_utils.vhd, applied along the last axis."""
+    n = polys.shape[-1]
+    thr_half = throughput // 2
+    batch = polys.shape[:-1]
+    if is_ntt_input:
+        # res(2i*h + j) = polym(i*h + j), res((2i+1)*h + j) = polym(i*h + N/2 + j)
+        halves = polys.reshape(batch + (2, n // 2 // thr_half, thr_half))
+        return np.swapaxes(halves, -3, -2).reshape(batch + (n,))
+    blocks = polys.reshape(batch + (n // 2 // thr_half, 2, thr_half))
+    return np.swapaxes(blocks, -3, -2).reshape(batch + (n,))
+
+
+def to_blocks(polys: np.ndarray, throughput: int) -> np.ndarray:
+    """(..., N) -> (..., N/throughput, throughput): one sub_polynom per clock."""
+    return polys.reshape(polys.shape[:-1] + (-1, throughput))
+
+
+def from_blocks(blocks: np.ndarray) -> np.ndarray:
+    return blocks.reshape(blocks.shape[:-2] + (-1,))
+
+
+class NttModel:
+    def __init__(self, log2_n: int, prime: int = SOLINAS_PRIME, negacyclic: bool = True,
+                 throughput: Optional[int] = None, mixed_format: bool = True,
+                 intt_no_final_reduction: bool = False, solver_roots: bool = False):
+        self.log2_n = log2_n
+        self.n = 2 ** log2_n
+        self.prime = prime
+        self.negacyclic = negacyclic
+        self.throughput = self.n if throughput is None else throughput
+        if self.n % self.throughput != 0 or self.throughput < 2:
+            raise ValueError(f"throughput {self.throughput} does not divide N = {self.n}")
+        self.mixed_format = mixed_format
+        self.intt_no_final_reduction = intt_no_final_reduction
+        self.solver_roots = solver_roots
+
+        params = get_params(self.n, prime, hw=not solver_roots)
+        if negacyclic and params.w_2n is None:
+            raise ValueError(f"{prime} has no primitive {2 * self.n}-th root of unity")
+        self.params = params
+        self.bit_reverse = bit_reverse_indices(log2_n)
+        # butterfly twiddles w^k, k < N/2; stage with span m uses every (N/m)-th entry. The negacyclic
+        # transform only uses omega_2n, and the ntt_params.vhd omega of N is not its square.
+        w, w_invers = params.w, params.w_invers
+        if negacyclic:
+            w, w_invers = pow(params.w_2n, 2, prime), pow(params.w_2n_invers, 2, prime)
+        self._tw = power_table(w, self.n // 2, prime)
+        self._tw_invers = power_table(w_invers, self.n // 2, prime)
+        if negacyclic:
+            self._psi = power_table(params.w_2n, self.n, prime)
+            self._psi_invers = power_table(params.w_2n_invers, self.n, prime)
+        self._n_invers = U64(params.n_invers)
+
+    # ---------- math, hardware coefficient order ----------
+    def ntt(self, polys) -> np.ndarray:
+        """Natural-order input, bit-reversed output (Gentleman-Sande, decimation in frequency)."""
+        q = self.prime
+        a = np.asarray(polys, dtype=U64)
+        batch = a.shape[:-1]
+        if self.negacyclic:
+            a = mul_mod(a, self._psi, q)
+        m = self.n
+        while m > 1:
+            h = m // 2
+            a = a.reshape(batch + (self.n // m, m))
+            u, v = a[..., :h], a[..., h:]
+            tw = self._tw[::self.n // m][:h]
+            a = np.concatenate([add_mod(u, v, q), mul_mod(sub_mod(u, v, q), tw, q)], axis=-1)
+            m = h
+        return a.reshape(batch + (self.n,))
+
+    def intt(self, polys, rescale: bool = True) -> np.ndarray:
+        """Bit-reversed input, natural-order output (Cooley-Tukey, decimation in time)."""
+        q = self.prime
+        a = np.asarray(polys, dtype=U64)
+        batch = a.shape[:-1]
+        m = 2
+        while m <= self.n:
+            h = m // 2
+            a = a.reshape(batch + (self.n // m, m))
+            u = a[..., :h]
+            v = mul_mod(a[..., h:], self._tw_invers[::self.n // m][:h], q)
+            a = np.concatenate([add_mod(u, v, q), sub_mod(u, v, q)], axis=-1)
+            m *= 2
+        a = a.reshape(batch + (self.n,))
+        if self.negacyclic:
+            a = mul_mod(a, self._psi_invers, q)
+        if rescale:
+            a = mul_mod(a, self._n_invers, q)
+        return a
+
+    # ---------- what the entity sees on its ports ----------
+    def ntt_input_stream(self, polys) -> np.ndarray:
+        """Blocks to apply to i_sub_polym of a forward ntt, one per clock."""
+        polys = np.asarray(polys, dtype=U64)
+        if self.mixed_format:
+            polys = to_ntt_mixed_format(polys, True, self.throughput)
+        return to_blocks(polys, self.throughput)
+
+    def ntt_entity(self, in_blocks) -> np.ndarray:
+        """o_result blocks of ntt(invers => false) for the given i_sub_polym blocks."""
+        polys = from_blocks(np.asarray(in_blocks, dtype=U64))
+        if self.mixed_format:
+            polys = to_ntt_mixed_format(polys, False, self.throughput)
+        return to_blocks(self.ntt(polys), self.throughput)
+
+    def intt_entity(self, in_blocks) -> np.ndarray:
+        """o_result blocks of ntt(invers => true) for bit-reversed i_sub_polym blocks."""
+        res = self.intt(from_blocks(np.asarray(in_blocks, dtype=U64)), not self.intt_no_final_reduction)
+        if self.mixed_format:
+            res = to_ntt_mixed_format(res, True, self.throughput)
+        return to_blocks(res, self.throughput)
+
+    def polym_mult(self, a, b) -> np.ndarray:
+        """Cyclic or negacyclic product a*b via the transform, natural order."""
+        return self.intt(mul_mod(self.ntt(a), self.ntt(b), self.prime))
+
+    def random_polys(self, batch: int, seed: Optional[int] = None) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        return rng.integers(0, self.prime, size=(batch, self.n), dtype=U64)
+
+
+def calc_ntt_res(model: NttModel, poly, invers: bool, no_rescaling: bool = False,
+                 bit_reverse_order: bool = True) -> list:
+    """Straight transcription of calc_ntt_res from tb_utils.vhd with Python ints (slow, for checking).
+
+    Like ntt_tb.vhd it takes the roots from ntt_params.vhd, not from the model,
+    if the prime has a list there.
+    """
+    q = model.prime
+    p = vhdl_params(model.n, q) if q in VHDL_PARAMS_LISTS else model.params
+    if model.negacyclic:
+        omega = p.w_2n_invers if invers else p.w_2n
+    else:
+        omega = p.w_invers if invers else p.w
+    poly = [int(c) for c in poly]
+    res = [0] * model.n
+    for j in range(model.n):
+        temp = 0
+        for i, coeff in enumerate(poly):
+            if model.negacyclic:
+                ij = j * (2 * i + 1) if invers else i * (2 * j + 1)
+            else:
+                ij = i * j
+            temp = (temp + pow(omega, ij, q) * coeff) % q
+        idx = int(model.bit_reverse[j]) if bit_reverse_order else j
+        res[idx] = temp * p.n_invers % q if invers and not no_rescaling else temp
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched golden model of the ntt entity")
+    parser.add_argument("--prime", default="solinas", help="'solinas', 'small' (7681) or an integer")
+    parser.add_argument("--log2-n", type=int, default=10)
+    parser.add_argument("--throughput", type=int, default=32)
+    parser.add_argument("--batch", type=int, default=1024)
+    parser.add_argument("--cyclic", action="store_true")
+    parser.add_argument("--no-mixed-format", action="store_true")
+    parser.add_argument("--check", type=int, default=2, help="polynomials compared against calc_ntt_res")
+    parser.add_argument("--solver-roots", action="store_true",
+                        help="roots of the ntt_params solver instead of ntt_params.vhd (primes without a list)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    model = NttModel(args.log2_n, parse_prime(args.prime), not args.cyclic, args.throughput,
+                     not args.no_mixed_format, solver_roots=args.solver_roots)
+    polys = model.random_polys(args.batch, args.seed)
+
+    start = time.perf_counter()
+    ntt_out = model.ntt_entity(model.ntt_input_stream(polys))
+    ntt_time = time.perf_counter() - start
+    start = time.perf_counter()
+    intt_out = model.intt_entity(ntt_out)
+    intt_time = time.perf_counter() - start
+
+    num_coeffs = args.batch * model.n
+    print(f"ntt:  {num_coeffs / ntt_time / 1e6:.2f} Mcoeffs/s")
+    print(f"intt: {num_coeffs / intt_time / 1e6:.2f} Mcoeffs/s")
+
+    ok = np.array_equal(intt_out, model.ntt_input_stream(polys))
+    print(f"intt(ntt(x)) == x: {ok}")
+    for idx in range(min(args.check, args.batch)):
+        ref = calc_ntt_res(model, polys[idx], False)
+        same = ref == from_blocks(ntt_out[idx]).tolist()
+        ok &= same
+        print(f"polynomial {idx} matches calc_ntt_res: {same}")
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Compute the prime-related NTT parameters (n_invers, omega, omega_invers, omega_2n)
+that ntt_params.vhd expects, for every power-of-two polynomial size.
+
+Replaces the root search in ntt_param_computation.ipynb: instead of testing
+w^k != 1 for every k < N, we factor the group order p-1 once, take a generator
+g of Z_p^* and set w_2n = g^((p-1)/2N), w = w_2n^2. Both are primitive by
+construction, so every N costs a handful of modular exponentiations.
+
+Results are cached on disk keyed by (prime, N).
+
+The roots the hardware uses are not necessarily these: ntt_utils.vhd takes
+omega and n_invers from list(log2 N) and omega_2n from list(log2 N + 1) of
+the ntt_params.vhd list of the prime, and those were found by a different
+search. get_params() therefore returns the ntt_params.vhd values for the
+primes that have a list there (vhdl_params), and the solver's for the others
+only with hw=False. Note that the VHDL list(log2 N + 1).omega squared is not
+list(log2 N).omega; a negacyclic transform only uses omega_2n.
+
+Usage:
+  python -m tfhe_model.ntt_params --prime solinas --max-log2-n 17
+  python -m tfhe_model.ntt_params --prime 7681 --max-log2-n 16 --vhdl
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Tuple
+
+SMALL_PRIME = 7681
+SOLINAS_PRIME = 0xFFFFFFFF00000001
+
+PRIME_ALIASES = {
+    "solinas": SOLINAS_PRIME,
+    "small": SMALL_PRIME,
+}
+
+DEFAULT_CACHE_FILE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "tfhe_pu", "ntt_params.json")
+
+VHDL_PARAMS_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "core_logic", "constants_and_utils",
+                                "ntt_params.vhd")
+# the ntt_params_list constants of ntt_params.vhd, by prime
+VHDL_PARAMS_LISTS = {
+    SMALL_PRIME: "ntt_params_prime7681",
+    SOLINAS_PRIME: "ntt_params_solinas_binary",
+}
+
+# deterministic Miller-Rabin witnesses for n < 3.3e24
+_MR_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+_SMALL_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97)
+
+
+class NttParams(NamedTuple):
+    # same field order as get_params() in ntt_param_computation.ipynb
+    polym_size: int
+    prime: int
+    w: int
+    w_invers: int
+    w_2n: Optional[int]       # None if 2N does not divide p-1
+    w_2n_invers: Optional[int]
+    n_invers: int
+
+
+# ---------- number theory ----------
+def parse_prime(text: str) -> int:
+    if text.lower() in PRIME_ALIASES:
+        return PRIME_ALIASES[text.lower()]
+    return int(text, 0)
+
+
+def is_probable_prime(n: int) -> bool:
+    if n < 2:
+        return False
+    for p in _SMALL_PRIMES:
+        if n % p == 0:
+            return n == p
+    d = n - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in _MR_BASES:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _pollard_brent(n: int) -> int:
+    # returns a non-trivial factor of the composite n
+    if n % 2 == 0:
+        return 2
+    rng = random.Random(n)
+    while True:
+        y = rng.randrange(1, n)
+        c = rng.randrange(1, n)
+        m = 128
+        g = r = q = 1
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % n
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in range(min(m, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = math.gcd(q, n)
+                k += m
+            r *= 2
+        if g == n:
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = math.gcd(abs(x - ys), n)
+        if g != n:
+            return g
+
+
+def factorize(n: int) -> Dict[int, int]:
+    factors: Dict[int, int] = {}
+    for p in _SMALL_PRIMES:
+        while n % p == 0:
+            factors[p] = factors.get(p, 0) + 1
+            n //= p
+    stack = [n] if n > 1 else []
+    while stack:
+        m = stack.pop()
+        if is_probable_prime(m):
+            factors[m] = factors.get(m, 0) + 1
+            continue
+        d = _pollard_brent(m)
+        stack += [d, m // d]
+    return dict(sorted(factors.items()))
+
+
+def find_generator(prime: int, order_factors: Optional[Dict[int, int]] = None) -> int:
+    # smallest g whose order is the full group order p-1
+    order = prime - 1
+    if order_factors is None:
+        order_factors = factorize(order)
+    for g in range(2, prime):
+        if all(pow(g, order // q, prime) != 1 for q in order_factors):
+            return g
+    raise ValueError(f"{prime} has no generator - is it prime?")
+
+
+def mod_inverse(x: int, prime: int) -> int:
+    # iterative, no recursion depth issues like gcdExtended
+    return pow(x, -1, prime)
+
+
+def max_log2_ntt_size(prime: int) -> int:
+    order = prime - 1
+    return (order & -order).bit_length() - 1
+
+
+def primitive_root_of_unity(n: int, prime: int, generator: Optional[int] = None) -> int:
+    if (prime - 1) % n != 0:
+        raise ValueError(f"no primitive {n}-th root of unity modulo {prime}")
+    if generator is None:
+        generator = find_generator(prime)
+    return pow(generator, (prime - 1) // n, prime)
+
+
+def is_primitive_root_of_unity(w: int, n: int, prime: int) -> bool:
+    # n is a power of 2: w has order n iff w^(n/2) = -1
+    if pow(w, n, prime) != 1:
+        return False
+    return n == 1 or pow(w, n // 2, prime) == prime - 1
+
+
+def compute_params(polym_size: int, prime: int, generator: Optional[int] = None) -> NttParams:
+    if generator is None:
+        generator = find_generator(prime)
+    n_invers = mod_inverse(polym_size, prime)
+    if (prime - 1) % (2 * polym_size) == 0:
+        w_2n = primitive_root_of_unity(2 * polym_size, prime, generator)
+        w = w_2n * w_2n % prime
+        w_2n_invers = mod_inverse(w_2n, prime)
+    else:
+        w = primitive_root_of_unity(polym_size, prime, generator)
+        w_2n = w_2n_invers = None
+    return NttParams(polym_size, prime, w, mod_inverse(w, prime), w_2n, w_2n_invers, n_invers)
+
+
+# ---------- ntt_params.vhd ----------
+_VHDL_FIELD = re.compile(r'(n_invers|omega_invers|omega)\s*=>\s*(?:to_synth_uint\((\d+)\)|x"([0-9a-fA-F]+)")')
+
+
+@lru_cache(maxsize=None)
+def load_vhdl_list(prime: int, path: str = VHDL_PARAMS_FILE) -> Dict[int, Optional[Tuple[int, int, int]]]:
+    """(n_invers, omega, omega_invers) of the ntt_params.vhd list of prime by log2 N, None for NO PARAMS FOUND."""
+    if prime not in VHDL_PARAMS_LISTS:
+        raise KeyError(f"ntt_params.vhd has no list for {prime}")
+    with open(path) as f:
+        text = re.sub(r"--[^\n]*", "", f.read())
+    match = re.search(rf"constant\s+{VHDL_PARAMS_LISTS[prime]}\s*:[^=]*:=\s*\((.*?)\)\s*;", text, re.S)
+    if match is None:
+        raise ValueError(f"{VHDL_PARAMS_LISTS[prime]} not found in {path}")
+    values = [int(dec) if dec else int(hexa, 16) for _, dec, hexa in _VHDL_FIELD.findall(match.group(1))]
+    entries = [tuple(values[i:i + 3]) for i in range(0, len(values), 3)]
+    return {log2_n: entry if any(entry) else None for log2_n, entry in enumerate(entries, start=1)}
+
+
+def vhdl_params(polym_size: int, prime: int, path: str = VHDL_PARAMS_FILE) -> NttParams:
+    """The roots of the hardware for N = polym_size, picked from ntt_params.vhd like ntt_utils.vhd does."""
+    log2_n = polym_size.bit_length() - 1
+    table = load_vhdl_list(prime, path)
+    if table.get(log2_n) is None:
+        raise ValueError(f"ntt_params.vhd has no params for N = 2**{log2_n} modulo {prime}")
+    n_invers, w, w_invers = table[log2_n]
+    upper = table.get(log2_n + 1)
+    w_2n, w_2n_invers = (upper[1], upper[2]) if upper is not None else (None, None)
+    return NttParams(polym_size, prime, w, w_invers, w_2n, w_2n_invers, n_invers)
+
+
+# ---------- disk cache ----------
+class ParamCache:
+    def __init__(self, path: str = DEFAULT_CACHE_FILE):
+        self.path = path
+        self._entries: Optional[Dict[str, list]] = None
+        self._dirty = False
+
+    @staticmethod
+    def key(prime: int, polym_size: int) -> str:
+        return f"{prime:#x}:{polym_size}"
+
+    def _load(self) -> Dict[str, list]:
+        if self._entries is None:
+            try:
+                with open(self.path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, prime: int, polym_size: int) -> Optional[NttParams]:
+        entry = self._load().get(self.key(prime, polym_size))
+        return NttParams(*entry) if entry is not None else None
+
+    def put(self, params: NttParams):
+        self._load()[self.key(params.prime, params.polym_size)] = list(params)
+        self._dirty = True
+
+    def flush(self):
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._entries, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+
+def get_params(polym_size: int, prime: int, cache: Optional[ParamCache] = None, hw: bool = True) -> NttParams:
+    """The ntt_params.vhd roots (vhdl_params), or with hw=False the solver's, for primes without a VHDL list."""
+    if hw:
+        if prime not in VHDL_PARAMS_LISTS:
+            raise ValueError(f"ntt_params.vhd has no list for {prime}, use the solver roots (hw=False)")
+        return vhdl_params(polym_size, prime)
+    if cache is not None:
+        hit = cache.get(prime, polym_size)
+        if hit is not None:
+            return hit
+    params = compute_params(polym_size, prime)
+    if cache is not None:
+        cache.put(params)
+        cache.flush()
+    return params
+
+
+def get_params_table(prime: int, max_log2_n: int, cache: Optional[ParamCache] = None) -> Dict[int, NttParams]:
+    """Parameters for N = 2**1 .. 2**max_log2_n, None where the prime has no N-th root."""
+    table = {}
+    generator = None
+    for log2_n in range(1, max_log2_n + 1):
+        n = 2 ** log2_n
+        hit = cache.get(prime, n) if cache is not None else None
+        if hit is None and log2_n <= max_log2_ntt_size(prime):
+            if generator is None:
+                generator = find_generator(prime)
+            hit = compute_params(n, prime, generator)
+            if cache is not None:
+                cache.put(hit)
+        table[log2_n] = hit
+    if cache is not None:
+        cache.flush()
+    return table
+
+
+# ---------- output ----------
+def format_vhdl_entry(log2_n: int, params: Optional[NttParams], width_bits: int = 64) -> str:
+    digits = width_bits // 4
+    lines = ["          ("]
+    if params is None:
+        lines.append("               -- NO PARAMS FOUND")
+        lines.append(f"               --n               => 2 ** {log2_n},")
+        values = (0, 0, 0)
+    else:
+        lines.append(f"               --n               => 2 ** {log2_n},")
+        values = (params.n_invers, params.w, params.w_invers)
+    names = ("n_invers", "omega", "omega_invers")
+    for idx, (name, value) in enumerate(zip(names, values)):
+        end = ")" if idx == len(names) - 1 else ","
+        lines.append(f'               {name:<12} => x"{value:0{digits}x}"{end}')
+    return "\n".join(lines)
+
+
+def format_vhdl_list(table: Dict[int, Optional[NttParams]], width_bits: int = 64) -> str:
+    return ",\n".join(format_vhdl_entry(log2_n, p, width_bits) for log2_n, p in sorted(table.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--prime", default="solinas", help="'solinas', 'small' (7681) or an integer")
+    parser.add_argument("--max-log2-n", type=int, default=17)
+    parser.add_argument("--vhdl", action="store_true", help="print as ntt_params_binary_list entries")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_FILE)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    prime = parse_prime(args.prime)
+    if not is_probable_prime(prime):
+        parser.error(f"{prime} is not prime")
+    cache = None if args.no_cache else ParamCache(args.cache)
+    table = get_params_table(prime, args.max_log2_n, cache)
+
+    if args.vhdl:
+        print(format_vhdl_list(table))
+        return
+    print(f"prime = {prime} = 0x{prime:x}")
+    for log2_n, p in table.items():
+        if p is None:
+            print(f"N = 2**{log2_n}: no params found")
+            continue
+        w_2n = f"0x{p.w_2n:x}" if p.w_2n is not None else "-"
+        print(f"N = 2**{log2_n}: n_invers=0x{p.n_invers:x} w=0x{p.w:x} w_invers=0x{p.w_invers:x} w_2n={w_2n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Batched bit-exact model of the pbs entity (src/tfhe/pbs.vhd).
+
+Follows the datapath of the hardware step by step, for a whole batch of LWE
+ciphertexts at once:
+  - init:  rotate_polym_with_buffer(rotate_right) turns the lookup table into
+           X^b * LUT
+  - blind_rotation_iteration, k_lwe times:
+           decomposition -> ntt (per digit) -> elementwise mult with BSK_i ->
+           adder tree -> intt (intt_no_final_reduction) ->
+           mult_x_ai_minus_1_plus_acc: ACC + (X^-ai - 1) * result
+  - sample_extract: the output ciphertext is read reversed, negated and
+           rotated right by idx + 1
+Polynomials are kept in natural coefficient order, shape (..., k+1, N); the
+entities see them as to_ntt_mixed_format streams (to_stream / from_stream).
+i_lwe_b and i_lwe_ai are rotate_idx values, i.e. already switched to 2N.
+
+BSK_i is expected the way the hardware multiplies it: in the ntt domain
+(bit-reversed order) with n_invers folded in, because the intt does not
+rescale. Its shape is (k_lwe, k+1, k+1, L, N): output polynomial, input
+polynomial, decomposition level. bsk_to_hardware converts a coefficient-domain
+key into this form.
+
+With a dump directory every iteration writes iter_XXXX.npz with the
+accumulator, iterations selected by --trace additionally the intermediate
+values of every stage. first_divergence compares two dump directories (e.g.
+the model against values captured from a simulation) and reports the first
+iteration, stage, ciphertext and coefficient that differ.
+
+The ntt_digits and ntt_sum stages depend on the roots of the transform, so
+they only match a simulation because NttModel takes them from ntt_params.vhd,
+like the ntt entities do. The PBS output itself does not depend on the roots
+as long as the BSK was brought into the ntt domain with the same ones
+(bsk_to_hardware, tfhe_model.keygen). --check compares ntt_digits against
+calc_ntt_res, which uses the ntt_params.vhd roots.
+
+Usage:
+  python -m tfhe_model.pbs --batch 256 --workers 8
+  python -m tfhe_model.pbs --batch 4 --k-lwe 20 --dump pbs_dump --trace 0,19 --check
+  python -m tfhe_model.pbs --compare pbs_dump other_dump
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .modarith import U64, add_mod, mul_mod, neg_mod, sub_mod
+from .ntt import NttModel, calc_ntt_res, from_blocks, to_blocks, to_ntt_mixed_format
+from .ntt_params import SOLINAS_PRIME, parse_prime
+
+STAGES = ("acc_in", "digits", "ntt_digits", "ntt_sum", "intt", "acc_out")
+
+
+class PbsParams(NamedTuple):
+    # defaults: tfhe_constants.vhd / constants_utils.vhd with debug_mode = false
+    log2_n: int = 10
+    k: int = 1
+    decomp_length: int = 2
+    log2_decomp_base: int = 10
+    num_lsbs_to_round: int = 10
+    k_lwe: int = 500
+    prime: int = SOLINAS_PRIME
+    throughput: int = 32
+
+    @property
+    def n(self) -> int:
+        return 2 ** self.log2_n
+
+    def ntt_model(self) -> NttModel:
+        return NttModel(self.log2_n, self.prime, True, self.throughput, True, intt_no_final_reduction=True)
+
+
+# ---------- single entities ----------
+def decompose(polys, params: PbsParams) -> np.ndarray:
+    """decomposition.vhd: (..., N) -> (..., L, N), digit 0 is the least significant one.
+
+    The round bit is added with add_reduce, so a value close to p wraps around
+    before the round bits are dropped, and the slices are cut from the LSB end
+    of what is left. The signed digits leave the entity reduced into [0, p).
+    """
+    x = np.asarray(polys, dtype=U64)
+    p = params.prime
+    r = U64(params.num_lsbs_to_round)
+    base_bits = params.log2_decomp_base
+    mask = U64((1 << base_bits) - 1)
+    msb = U64(1 << (base_bits - 1))
+
+    zeroed = x & ~U64((1 << params.num_lsbs_to_round) - 1)
+    round_val = ((x >> (r - U64(1))) & U64(1)) << r
+    wo_round_bits = add_mod(zeroed, round_val, p) >> r
+
+    digits = []
+    carry = np.zeros_like(x)
+    for level in range(params.decomp_length):
+        digit = ((wo_round_bits >> U64(level * base_bits)) + carry) & mask
+        carry = digit >> U64(base_bits - 1)
+        # resize(signed(slice)) followed by easy_reduction(can_be_negative)
+        negative = (digit & msb) != 0
+        digits.append(np.where(negative, digit + (U64(p) - U64(1 << base_bits)), digit))
+    return np.stack(digits, axis=-2)
+
+
+def rotate(polys, rotate_by, rotate_right: bool, params: PbsParams, rotate_offset: int = 0,
+           negate: bool = False, reverse: bool = False) -> np.ndarray:
+    """rotate_polym_with_buffer.vhd along the last axis; rotate_by broadcasts over the batch axes.
+
+    The upper bit of the rotate_idx flips the sign of every coefficient, the
+    lower ones rotate; a coefficient that rolls over the polynomial bounds
+    flips its sign once more (negacyclic). Left = X^-a, right = X^a.
+    """
+    x = np.asarray(polys, dtype=U64)
+    n = params.n
+    if reverse:
+        x = x[..., ::-1]
+    amount = (np.asarray(rotate_by, dtype=np.int64) + rotate_offset) % (2 * n)
+    sign_part = (amount >= n)[..., None]
+    roll = (amount % n)[..., None]
+    idx = np.arange(n)
+    if rotate_right:
+        src = idx - roll
+        rolled = src < 0
+    else:
+        src = idx + roll
+        rolled = src >= n
+    src %= n
+    shape = np.broadcast_shapes(x.shape, src.shape)
+    gathered = np.take_along_axis(np.broadcast_to(x, shape), np.broadcast_to(src, shape), axis=-1)
+    flip = sign_part ^ (rolled != negate)
+    return np.where(flip, neg_mod(gathered, params.prime), gathered)
+
+
+def mult_x_ai_minus_1_plus_acc(polys, ai, acc, params: PbsParams) -> np.ndarray:
+    """mult_x_ai_minus_1_plus_acc.vhd: rotate_left(polys, ai) + (acc - polys)."""
+    p = params.prime
+    ai = np.asarray(ai)[..., None]  # same ai for all k+1 polynomials of a ciphertext
+    return add_mod(rotate(polys, ai, False, params), sub_mod(acc, polys, p), p)
+
+
+def external_product(acc, bsk_i, params: PbsParams, ntt: NttModel,
+                     trace: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+    """decomposition, ntts, ntt_out_buf, elementwise mults, adder tree and intt of one iteration."""
+    p = params.prime
+    digits = decompose(acc, params)        # (..., k+1 in, L, N)
+    ntt_digits = ntt.ntt(digits)           # bit-reversed order
+    # output polynomial o: sum over input polynomial and level of ntt(digit) * BSK_i[o, in, level]
+    prods = mul_mod(ntt_digits[..., None, :, :, :], bsk_i, p)
+    prods = prods.reshape(prods.shape[:-3] + (-1, params.n))
+    ntt_sum = prods[..., 0, :]
+    for term in range(1, prods.shape[-2]):
+        ntt_sum = add_mod(ntt_sum, prods[..., term, :], p)
+    res = ntt.intt(ntt_sum, rescale=False)
+    if trace is not None:
+        trace.update(digits=digits, ntt_digits=ntt_digits, ntt_sum=ntt_sum, intt=res)
+    return res
+
+
+def blind_rotation_iteration(acc, ai, bsk_i, params: PbsParams, ntt: NttModel,
+                             trace: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+    res = external_product(acc, bsk_i, params, ntt, trace)
+    acc_out = mult_x_ai_minus_1_plus_acc(res, ai, acc, params)
+    if trace is not None:
+        trace.update(acc_in=acc, acc_out=acc_out)
+    return acc_out
+
+
+def blind_rotate(acc, lwe_a, bsk, params: PbsParams, ntt: NttModel, dump: Optional[Path] = None,
+                 trace_iterations: Sequence[int] = ()) -> np.ndarray:
+    """blind_rotation.vhd; lwe_a has shape (..., k_lwe), bsk (k_lwe, k+1, k+1, L, N)."""
+    lwe_a = np.asarray(lwe_a)
+    for i in range(lwe_a.shape[-1]):
+        trace = {} if dump is not None and i in trace_iterations else None
+        acc = blind_rotation_iteration(acc, lwe_a[..., i], bsk[i], params, ntt, trace)
+        if dump is not None:
+            np.savez(dump / f"iter_{i:04d}.npz", **(trace if trace is not None else {"acc_out": acc}))
+    return acc
+
+
+def sample_extract(acc, sample_extract_idx, params: PbsParams) -> np.ndarray:
+    """Second rotate_polym_with_buffer of pbs.vhd, applied to all k+1 polynomials.
+
+    The mask of the extracted LWE ciphertext is the first k polynomials, its
+    body is coefficient 0 of the last one (see to_lwe).
+    """
+    idx = np.asarray(sample_extract_idx)[..., None]
+    return rotate(acc, idx, True, params, rotate_offset=1, negate=True, reverse=True)
+
+
+def to_lwe(extracted, params: PbsParams):
+    """(mask, body) of the sample-extracted ciphertext: shapes (..., k*N) and (...)."""
+    mask = extracted[..., :params.k, :].reshape(extracted.shape[:-2] + (-1,))
+    return mask, extracted[..., params.k, 0]
+
+
+def pbs(lut, lwe_b, lwe_a, bsk, params: PbsParams, ntt: Optional[NttModel] = None,
+        sample_extract_idx=0, dump: Optional[Path] = None, trace_iterations: Sequence[int] = ()) -> np.ndarray:
+    """pbs.vhd: lut (k+1, N) or (..., k+1, N), lwe_b (...), lwe_a (..., k_lwe) -> (..., k+1, N)."""
+    ntt = params.ntt_model() if ntt is None else ntt
+    lwe_b = np.asarray(lwe_b)
+    acc = rotate(np.asarray(lut, dtype=U64), lwe_b[..., None], True, params)
+    if dump is not None:
+        dump.mkdir(parents=True, exist_ok=True)
+        np.savez(dump / "init.npz", acc_out=acc)
+    acc = blind_rotate(acc, lwe_a, bsk, params, ntt, dump, trace_iterations)
+    res = sample_extract(acc, np.broadcast_to(sample_extract_idx, lwe_b.shape), params)
+    if dump is not None:
+        np.savez(dump / "sample_extract.npz", acc_out=res)
+    return res
+
+
+# ---------- hardware layouts ----------
+def to_stream(polys, params: PbsParams) -> np.ndarray:
+    """(..., k+1, N) natural order -> (..., (k+1)*N/throughput, throughput) blocks as the entities stream them."""
+    mixed = to_ntt_mixed_format(np.asarray(polys, dtype=U64), True, params.throughput)
+    return to_blocks(mixed.reshape(mixed.shape[:-2] + (-1,)), params.throughput)
+
+
+def from_stream(blocks, params: PbsParams) -> np.ndarray:
+    polys = from_blocks(np.asarray(blocks, dtype=U64))
+    polys = polys.reshape(polys.shape[:-1] + (params.k + 1, params.n))
+    return to_ntt_mixed_format(polys, False, params.throughput)
+
+
+def bsk_to_hardware(bsk, params: PbsParams, ntt: Optional[NttModel] = None) -> np.ndarray:
+    """Coefficient-domain BSK (k_lwe, k+1, k+1, L, N) -> ntt domain with n_invers folded in."""
+    ntt = params.ntt_model() if ntt is None else ntt
+    return mul_mod(ntt.ntt(np.asarray(bsk, dtype=U64)), U64(ntt.params.n_invers), params.prime)
+
+
+def bsk_stream(bsk_i, params: PbsParams) -> np.ndarray:
+    """i_BSK_i_part words of one iteration: (k+1 output polys, N/throughput, (k+1)*L*throughput).
+
+    Block k_idx*L + L_idx of a word carries BSK_i[o, k_idx, L_idx], matching
+    the line format of ntt_out_buf.
+    """
+    t = params.throughput
+    blocks = to_blocks(np.asarray(bsk_i, dtype=U64), t)  # (k+1, k+1, L, N/t, t)
+    blocks = np.moveaxis(blocks, -2, 1)                   # (k+1, N/t, k+1, L, t)
+    return blocks.reshape(blocks.shape[:2] + (-1,))
+
+
+def random_inputs(params: PbsParams, batch: int, seed: Optional[int] = None):
+    """Uniform lut, lwe_b, lwe_a and hardware BSK; enough to exercise every datapath bit."""
+    rng = np.random.default_rng(seed)
+    n, k = params.n, params.k
+    lut = rng.integers(0, params.prime, size=(k + 1, n), dtype=U64)
+    lwe_b = rng.integers(0, 2 * n, size=batch)
+    lwe_a = rng.integers(0, 2 * n, size=(batch, params.k_lwe))
+    bsk = rng.integers(0, params.prime, size=(params.k_lwe, k + 1, k + 1, params.decomp_length, n), dtype=U64)
+    return lut, lwe_b, lwe_a, bsk
+
+
+# ---------- checking ----------
+def _negacyclic_mult(a, b, q: int) -> list:
+    full = np.convolve(np.array([int(v) for v in a], dtype=object), np.array([int(v) for v in b], dtype=object))
+    n = len(a)
+    full = np.concatenate([full, [0]])
+    return [int((full[i] - full[i + n]) % q) for i in range(n)]
+
+
+def reference_iteration(acc, ai: int, bsk_i, params: PbsParams, ntt: NttModel) -> list:
+    """One blind rotation iteration of a single ciphertext with Python ints and schoolbook products (slow)."""
+    q = params.prime
+    n = params.n
+    base = 2 ** params.log2_decomp_base
+    bsk_coeff = ntt.intt(bsk_i)  # undoes the ntt and the folded n_invers
+    bsk_coeff = mul_mod(bsk_coeff, U64(n % q), q)
+    res = [[0] * n for _ in range(params.k + 1)]
+    for j, poly in enumerate(acc):
+        digits = [[0] * n for _ in range(params.decomp_length)]
+        for c, x in enumerate(int(v) for v in poly):
+            x = (x >> params.num_lsbs_to_round) + (x >> (params.num_lsbs_to_round - 1) & 1)
+            if x << params.num_lsbs_to_round >= q:  # add_reduce wrapped around
+                x = (x << params.num_lsbs_to_round) - q >> params.num_lsbs_to_round
+            carry = 0
+            for level in range(params.decomp_length):
+                d = (x // base ** level % base + carry) % base
+                carry = d >= base // 2
+                digits[level][c] = d - base if carry else d
+        for level in range(params.decomp_length):
+            for o in range(params.k + 1):
+                prod = _negacyclic_mult(digits[level], bsk_coeff[o, j, level], q)
+                res[o] = [(r + v) % q for r, v in zip(res[o], prod)]
+    out = []
+    for o in range(params.k + 1):
+        acc_o = [int(v) for v in acc[o]]
+        rot = [0] * n
+        for i in range(n):  # X^-ai * res
+            e = (i - ai) % (2 * n)
+            v = res[o][i] if e < n else (q - res[o][i]) % q
+            rot[e % n] = v
+        out.append([(r + a - v) % q for r, a, v in zip(rot, acc_o, res[o])])
+    return out
+
+
+def first_divergence(dir_a: Path, dir_b: Path) -> Optional[str]:
+    """Walks two dump directories in pipeline order and describes the first difference."""
+    names = ["init.npz"] + sorted(f.name for f in dir_a.glob("iter_*.npz")) + ["sample_extract.npz"]
+    for name in names:
+        fa, fb = dir_a / name, dir_b / name
+        if not fa.exists() or not fb.exists():
+            continue
+        with np.load(fa) as a, np.load(fb) as b:
+            for stage in STAGES:
+                if stage not in a.files or stage not in b.files:
+                    continue
+                va, vb = a[stage], b[stage]
+                if va.shape != vb.shape:
+                    return f"{name} {stage}: shape {va.shape} != {vb.shape}"
+                diff = np.argwhere(va != vb)
+                if diff.size:
+                    where = tuple(int(i) for i in diff[0])
+                    return f"{name} {stage}: first difference at {where}: {va[where]} != {vb[where]} ({len(diff)} in total)"
+    return None
+
+
+# ---------- parallel batches ----------
+_worker_state = {}
+
+
+def _init_worker(lut, bsk, params: PbsParams):
+    _worker_state.update(lut=lut, bsk=bsk, params=params, ntt=params.ntt_model())
+
+
+def _run_chunk(args):
+    lwe_b, lwe_a = args
+    s = _worker_state
+    return pbs(s["lut"], lwe_b, lwe_a, s["bsk"], s["params"], s["ntt"])
+
+
+def run_batch(lut, lwe_b, lwe_a, bsk, params: PbsParams, workers: int = 1, chunk: int = 32) -> np.ndarray:
+    """pbs for many ciphertexts, split into chunks over worker processes (no dumps)."""
+    if workers <= 1:
+        return pbs(lut, lwe_b, lwe_a, bsk, params)
+    chunks = [(lwe_b[i:i + chunk], lwe_a[i:i + chunk]) for i in range(0, len(lwe_b), chunk)]
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(lut, bsk, params)) as pool:
+        return np.concatenate(list(pool.map(_run_chunk, chunks)))
+
+
+def _int_list(text: str) -> list:
+    return [int(v) for v in text.split(",") if v]
+
+
+def main():
+    defaults = PbsParams()
+    parser = argparse.ArgumentParser(description="Batched bit-exact model of the pbs entity")
+    parser.add_argument("--prime", default="solinas", help="'solinas', 'small' (7681) or an integer")
+    parser.add_argument("--log2-n", type=int, default=defaults.log2_n)
+    parser.add_argument("--throughput", type=int, default=defaults.throughput)
+    parser.add_argument("--k-lwe", type=int, default=defaults.k_lwe)
+    parser.add_argument("--decomp-length", type=int, default=defaults.decomp_length)
+    parser.add_argument("--log2-decomp-base", type=int, default=defaults.log2_decomp_base)
+    parser.add_argument("--num-lsbs-to-round", type=int, default=defaults.num_lsbs_to_round)
+    parser.add_argument("--batch", type=int, default=16, help="number of LWE ciphertexts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--dump", type=Path, help="directory for per-iteration npz dumps (single process)")
+    parser.add_argument("--trace", type=_int_list, default=[], help="iterations that dump every stage, e.g. 0,499")
+    parser.add_argument("--check", action="store_true",
+                        help="compare iteration 0 of ciphertext 0 against a schoolbook reference and calc_ntt_res")
+    parser.add_argument("--compare", type=Path, nargs=2, metavar="DIR", help="report the first divergence of two dumps")
+    args = parser.parse_args()
+
+    if args.compare:
+        found = first_divergence(*args.compare)
+        print(found or "dumps are identical")
+        if found:
+            raise SystemExit(1)
+        return
+
+    params = PbsParams(args.log2_n, 1, args.decomp_length, args.log2_decomp_base, args.num_lsbs_to_round,
+                       args.k_lwe, parse_prime(args.prime), args.throughput)
+    lut, lwe_b, lwe_a, bsk = random_inputs(params, args.batch, args.seed)
+
+    start = time.perf_counter()
+    if args.dump is not None:
+        res = pbs(lut, lwe_b, lwe_a, bsk, params, dump=args.dump, trace_iterations=args.trace)
+    else:
+        res = run_batch(lut, lwe_b, lwe_a, bsk, params, args.workers)
+    duration = time.perf_counter() - start
+    print(f"{args.batch} pbs x {params.k_lwe} iterations: {duration:.1f} s, "
+          f"{args.batch * params.k_lwe / duration:.1f} iterations/s")
+    print(f"ciphertext 0 body: {int(to_lwe(res, params)[1][0])}")
+
+    if args.check:
+        ntt = params.ntt_model()
+        acc = rotate(lut, lwe_b[0], True, params)
+        trace = {}
+        model = blind_rotation_iteration(acc, lwe_a[0, 0], bsk[0], params, ntt, trace)
+        ref = reference_iteration(acc, int(lwe_a[0, 0]), bsk[0], params, ntt)
+        ok = model.tolist() == ref
+        print(f"iteration 0 matches the reference: {ok}")
+        same = trace["ntt_digits"][0, 0].tolist() == calc_ntt_res(ntt, trace["digits"][0, 0], False)
+        print(f"ntt_digits of iteration 0 match calc_ntt_res (ntt_params.vhd roots): {same}")
+        if not ok or not same:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Analytical latency/throughput model of the PBS (tfhe_constants.vhd).
+
+Re-evaluates the closed-form delay calculations that tfhe_constants.vhd,
+constants_utils.vhd and get_ntt_latency (ntt_utils.vhd) do during
+elaboration, for any parameter set:
+  - cycles per blind rotation iteration (blind_rot_iter_latency) and the
+    number of ciphertexts that fill the pipeline (pbs_batchsize)
+  - clocks until the first result block / the whole batch is out
+  - PBS latency and PBS/s at a given clock
+k_lwe is rounded up to a multiple of ai_hbm_coeffs_per_clk * (ai_burstlen + 1),
+the granularity in which ai_pbs_pingpongbuffer fetches a_i from HBM.
+
+The sweep evaluates the cartesian product of the given parameter lists on a
+process pool and prints the Pareto front over latency, PBS/s and the number
+of 64-bit modular multipliers (a proxy for DSP usage). Sub-latencies that do
+not depend on k_lwe or ai_burstlen (ntt, rotate, iteration) are memoized, and
+the grid is chunked so that configurations sharing them land in one worker.
+
+Usage:
+  python -m tfhe_model.pbs_latency
+  python -m tfhe_model.pbs_latency --sweep --log2-throughput 3,4,5,6 --decomp-length 1,2,3 --ai-burstlen 0,1,3 --buffers
+"""
+
+import argparse
+import csv
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, NamedTuple
+
+from .arith import ArithConfig
+
+# constants_utils.vhd / ip_cores_constants.vhd / processor_utils.vhd
+LOG2_COEFFS_PER_BRAM = 9
+MINIMUM_RAM_RETIMING_LATENCY = 2
+OUTPUT_WRITING_LATENCY = 1
+BLIND_ROTATION_DECISION_DELAY = 1
+AI_HBM_COEFFS_PER_CLK = 4
+BSK_HBM_NUM_COEFFS_PER_CLK = 16 * 4
+
+BUFFER_FLAGS = ("use_ntt_out_buf_input_buffer", "use_elem_mult_res_output_buffer", "use_intt_res_output_buffer",
+                "ntt_butterfly_in_bufs", "ntt_butterfly_out_bufs")
+
+
+class LatencyConfig(NamedTuple):
+    # defaults: the values the VHDL uses when debug_mode = false
+    log2_n: int = 10
+    log2_pbs_throughput: int = 5
+    decomp_length: int = 2
+    k: int = 1
+    k_lwe: int = 500
+    ai_burstlen: int = 0
+    negacyclic: bool = True
+    use_ntt_out_buf_input_buffer: bool = True
+    use_elem_mult_res_output_buffer: bool = False
+    use_intt_res_output_buffer: bool = False
+    ntt_butterfly_in_bufs: bool = False
+    ntt_butterfly_out_bufs: bool = False
+    counter_buffer_len: int = 1
+    arith: ArithConfig = ArithConfig()
+
+    def iteration_key(self) -> "LatencyConfig":
+        """The config with everything that does not influence the iteration latency zeroed."""
+        return self._replace(k_lwe=0, ai_burstlen=0)
+
+
+class PbsLatency(NamedTuple):
+    config: LatencyConfig
+    k_lwe: int
+    ntt_latency: int
+    intt_latency: int
+    rotate_with_buffer_latency: int
+    blind_rot_iter_min_latency: int
+    blind_rot_iter_extra_latency: int
+    blind_rot_iter_latency: int
+    pbs_batchsize: int
+    bs_clks_till_first_result_block: int
+    bs_clks_till_ciphertext_batch_out: int
+    clks_per_pbs: float
+    num_mults: int
+    bsk_coeffs_per_clk: float
+
+    def latency_us(self, clock_mhz: float) -> float:
+        return self.bs_clks_till_first_result_block / clock_mhz
+
+    def pbs_per_s(self, clock_mhz: float) -> float:
+        return clock_mhz * 1e6 / self.clks_per_pbs
+
+    @property
+    def bsk_bandwidth_ok(self) -> bool:
+        return self.bsk_coeffs_per_clk <= BSK_HBM_NUM_COEFFS_PER_CLK
+
+
+# ---------- constants_utils.vhd ----------
+@lru_cache(maxsize=None)
+def _unit_latencies(arith: ArithConfig) -> Dict[str, int]:
+    return arith.latency()
+
+
+def _butterfly_latencies(cfg: LatencyConfig):
+    lat = _unit_latencies(cfg.arith)
+    without_mult_modulo = lat["add_reduce"] + int(cfg.ntt_butterfly_in_bufs) + int(cfg.ntt_butterfly_out_bufs)
+    return without_mult_modulo, without_mult_modulo + lat["ab_mod_p_plain"]
+
+
+@lru_cache(maxsize=None)
+def get_ntt_latency(log2_input_size: int, log2_throughput: int, negacyclic: bool, intt: bool,
+                    with_intt_rescaling: bool, with_format_switch: bool,
+                    clks_per_butterfly_without_mult_modulo: int, clks_per_ab_mod_p: int,
+                    ntt_stage_logic_out_bufs: int) -> int:
+    """get_ntt_latency from ntt_utils.vhd: first input to first output."""
+    clks_per_butterfly = clks_per_butterfly_without_mult_modulo + clks_per_ab_mod_p
+    num_parallel = log2_throughput
+    num_single = log2_input_size - num_parallel
+    num_blocks = 2 ** log2_input_size // 2 ** log2_throughput
+    if num_single > 0:
+        first_stage = clks_per_butterfly if negacyclic else clks_per_butterfly_without_mult_modulo
+        pipeline = clks_per_butterfly * (num_single - 1) + first_stage + clks_per_butterfly * num_parallel
+        block_delay = num_blocks // 2 if with_format_switch else 0
+        for stage in range(num_single):
+            block_delay += ntt_stage_logic_out_bufs + (num_blocks // 2) // 2 ** stage
+        res = pipeline + block_delay
+    elif negacyclic:
+        res = num_parallel * clks_per_butterfly
+    else:
+        res = (num_parallel - 1) * clks_per_butterfly + clks_per_butterfly_without_mult_modulo
+    if intt and with_intt_rescaling:
+        res += clks_per_ab_mod_p
+    return res
+
+
+# ---------- tfhe_constants.vhd ----------
+@lru_cache(maxsize=None)
+def iteration_latencies(cfg: LatencyConfig) -> Dict[str, int]:
+    """The blind_rot_iter_* block of tfhe_constants.vhd; independent of k_lwe and ai_burstlen."""
+    lat = _unit_latencies(cfg.arith)
+    add_mod = lat["add_reduce"]
+    n = 2 ** cfg.log2_n
+    polyms_per_ciphertext = cfg.k + 1
+    pbs_throughput = 2 ** cfg.log2_pbs_throughput
+    # ntt_throughput = (decomp_length / ex_prod_num_ntts) * pbs_throughput with one ntt per level
+    log2_ntt_throughput = cfg.log2_pbs_throughput
+    ntt_num_blocks_per_polym = n // pbs_throughput
+
+    ntt_cascaded_twiddle_bram = (cfg.log2_n - 1) - log2_ntt_throughput > LOG2_COEFFS_PER_BRAM
+    ntt_twiddle_rams_retiming_latency = MINIMUM_RAM_RETIMING_LATENCY + int(ntt_cascaded_twiddle_bram)
+    cascaded_pingpongbram = (cfg.log2_n + 1) - log2_ntt_throughput > LOG2_COEFFS_PER_BRAM
+    pingpong_ram_retiming_latency = MINIMUM_RAM_RETIMING_LATENCY + int(cascaded_pingpongbram)
+    without_mult_modulo, _ = _butterfly_latencies(cfg)
+    ntt_args = (without_mult_modulo, lat["ab_mod_p_plain"], ntt_twiddle_rams_retiming_latency)
+
+    ntt_latency = get_ntt_latency(cfg.log2_n, log2_ntt_throughput, cfg.negacyclic, False, False, False, *ntt_args)
+    intt_latency = (get_ntt_latency(cfg.log2_n, log2_ntt_throughput, cfg.negacyclic, True, False, False, *ntt_args)
+                    + int(cfg.use_intt_res_output_buffer))
+    decomp_latency = add_mod + (cfg.decomp_length - 1) + lat["easy_reduction"]
+
+    rotate_polym_reset_clks_ahead = 3 + (cfg.counter_buffer_len - 1)
+    buffer_answer_delay = pingpong_ram_retiming_latency + 1 + (cfg.counter_buffer_len - 1)
+    rotate_first_block = 3 + buffer_answer_delay + add_mod + rotate_polym_reset_clks_ahead
+    rotate_with_buffer_latency = rotate_first_block + ntt_num_blocks_per_polym - rotate_polym_reset_clks_ahead
+    end_step_initial_delay = rotate_with_buffer_latency + add_mod
+
+    adder_tree_latency = (polyms_per_ciphertext * cfg.decomp_length - 1).bit_length() * add_mod
+    clks_till_ntt_out_buffer_ready = (ntt_latency + polyms_per_ciphertext * ntt_num_blocks_per_polym
+                                      + pingpong_ram_retiming_latency + int(cfg.use_ntt_out_buf_input_buffer))
+    min_till_elem_wise_mult = decomp_latency + clks_till_ntt_out_buffer_ready
+    min_till_monomial_mult = (min_till_elem_wise_mult + lat["ab_mod_p_plain"] + int(cfg.use_elem_mult_res_output_buffer)
+                              + adder_tree_latency + intt_latency)
+    minimum_latency = min_till_monomial_mult + end_step_initial_delay
+
+    steps_per_ciphertext = ntt_num_blocks_per_polym * polyms_per_ciphertext
+    min_in_pipeline = minimum_latency // steps_per_ciphertext
+    extra_latency = ((steps_per_ciphertext - (minimum_latency - min_in_pipeline * steps_per_ciphertext)
+                      - BLIND_ROTATION_DECISION_DELAY) % steps_per_ciphertext)
+    iter_latency = minimum_latency + extra_latency
+    return {
+        "ntt_latency": ntt_latency,
+        "intt_latency": intt_latency,
+        "rotate_with_buffer_latency": rotate_with_buffer_latency,
+        "blind_rot_iter_min_latency": minimum_latency,
+        "blind_rot_iter_extra_latency": extra_latency,
+        "blind_rot_iter_latency": iter_latency,
+        "steps_per_ciphertext": steps_per_ciphertext,
+        "pbs_batchsize": (iter_latency + BLIND_ROTATION_DECISION_DELAY) // steps_per_ciphertext,
+    }
+
+
+def num_mults(cfg: LatencyConfig) -> int:
+    """64-bit modular multipliers: one per butterfly of the L ntts and the intt, plus the elementwise mults."""
+    t = 2 ** cfg.log2_pbs_throughput
+    butterflies = (cfg.decomp_length + 1) * cfg.log2_n * t // 2
+    return butterflies + (cfg.k + 1) * cfg.decomp_length * t
+
+
+def evaluate(cfg: LatencyConfig) -> PbsLatency:
+    it = iteration_latencies(cfg.iteration_key())
+    granularity = AI_HBM_COEFFS_PER_CLK * (cfg.ai_burstlen + 1)
+    k_lwe = math.ceil(cfg.k_lwe / granularity) * granularity
+    n = 2 ** cfg.log2_n
+    t = 2 ** cfg.log2_pbs_throughput
+    polyms = cfg.k + 1
+
+    bs_init_latency = it["rotate_with_buffer_latency"] + OUTPUT_WRITING_LATENCY
+    first_result = bs_init_latency + k_lwe * it["blind_rot_iter_latency"] + it["rotate_with_buffer_latency"]
+    batch_out = first_result + (n // t) * polyms * it["pbs_batchsize"] - 1
+    # every iteration takes pbs_batchsize * steps_per_ciphertext clocks, the batch shares them
+    clks_per_pbs = k_lwe * it["steps_per_ciphertext"]
+    # BSK_i is reused by every ciphertext of the batch during one iteration
+    bsk_coeffs_per_iter = polyms * polyms * cfg.decomp_length * n
+    bsk_coeffs_per_clk = bsk_coeffs_per_iter / (it["pbs_batchsize"] * it["steps_per_ciphertext"])
+    return PbsLatency(cfg, k_lwe, it["ntt_latency"], it["intt_latency"], it["rotate_with_buffer_latency"],
+                      it["blind_rot_iter_min_latency"], it["blind_rot_iter_extra_latency"],
+                      it["blind_rot_iter_latency"], it["pbs_batchsize"], first_result, batch_out,
+                      clks_per_pbs, num_mults(cfg), bsk_coeffs_per_clk)
+
+
+def _evaluate_chunk(configs: List[LatencyConfig]) -> List[PbsLatency]:
+    return [evaluate(cfg) for cfg in configs]
+
+
+# ---------- sweep ----------
+def grid(log2_n, log2_throughput, decomp_length, k_lwe, ai_burstlen, buffers: bool,
+         base: LatencyConfig = LatencyConfig()) -> List[LatencyConfig]:
+    flag_sets = (itertools.product((False, True), repeat=len(BUFFER_FLAGS)) if buffers
+                 else [tuple(getattr(base, f) for f in BUFFER_FLAGS)])
+    flag_sets = list(flag_sets)
+    configs = []
+    for n_, t_, l_, kl, burst in itertools.product(log2_n, log2_throughput, decomp_length, k_lwe, ai_burstlen):
+        # log2_pbs_throughput must be between 2 and log2(N)
+        if not 2 <= t_ <= n_:
+            continue
+        for flags in flag_sets:
+            configs.append(base._replace(log2_n=n_, log2_pbs_throughput=t_, decomp_length=l_, k_lwe=kl,
+                                         ai_burstlen=burst, **dict(zip(BUFFER_FLAGS, flags))))
+    return configs
+
+
+def sweep(configs: List[LatencyConfig], workers: int = 1) -> List[PbsLatency]:
+    # one chunk per iteration_key, so the memoized sub-latencies are shared inside a worker
+    chunks: Dict[LatencyConfig, List[LatencyConfig]] = {}
+    for cfg in configs:
+        chunks.setdefault(cfg.iteration_key(), []).append(cfg)
+    if workers <= 1:
+        return [r for chunk in chunks.values() for r in _evaluate_chunk(chunk)]
+    with ProcessPoolExecutor(workers) as pool:
+        return [r for res in pool.map(_evaluate_chunk, chunks.values(), chunksize=8) for r in res]
+
+
+def pareto_front(results: List[PbsLatency], clock_mhz: float) -> List[PbsLatency]:
+    """Non-dominated results: lower latency, higher PBS/s, fewer multipliers.
+
+    N, L and k_lwe also decide noise and security, so results are only compared
+    with others of the same parameter set; the fronts are concatenated.
+    """
+    def objectives(r):
+        return r.latency_us(clock_mhz), -r.pbs_per_s(clock_mhz), r.num_mults
+
+    groups: Dict[tuple, List[PbsLatency]] = {}
+    for r in results:
+        groups.setdefault((r.config.log2_n, r.config.decomp_length, r.config.k_lwe), []).append(r)
+    fronts = []
+    for key in sorted(groups):
+        # sorted by the objectives, a result can only be dominated by an earlier one
+        front = []
+        for r in sorted(groups[key], key=objectives):
+            obj = objectives(r)
+            if not any(all(a <= b for a, b in zip(objectives(f), obj)) for f in front):
+                front.append(r)
+        fronts += sorted(front, key=lambda r: -r.pbs_per_s(clock_mhz))
+    return fronts
+
+
+def _buffer_string(cfg: LatencyConfig) -> str:
+    return "".join("1" if getattr(cfg, f) else "0" for f in BUFFER_FLAGS)
+
+
+def row(r: PbsLatency, clock_mhz: float) -> Dict[str, object]:
+    c = r.config
+    return {
+        "N": 2 ** c.log2_n, "throughput": 2 ** c.log2_pbs_throughput, "L": c.decomp_length, "k_lwe": r.k_lwe,
+        "ai_burstlen": c.ai_burstlen, "buffers": _buffer_string(c), "iter_clks": r.blind_rot_iter_latency,
+        "batchsize": r.pbs_batchsize, "latency_us": round(r.latency_us(clock_mhz), 1),
+        "pbs_per_s": round(r.pbs_per_s(clock_mhz)), "mults": r.num_mults,
+        "bsk_coeffs_per_clk": round(r.bsk_coeffs_per_clk, 2), "bsk_ok": r.bsk_bandwidth_ok,
+    }
+
+
+def format_table(rows: List[Dict[str, object]]) -> str:
+    if not rows:
+        return "no configuration"
+    keys = list(rows[0])
+    widths = [max(len(k), *(len(str(r[k])) for r in rows)) for k in keys]
+    lines = ["  ".join(k.rjust(w) for k, w in zip(keys, widths))]
+    lines += ["  ".join(str(r[k]).rjust(w) for k, w in zip(keys, widths)) for r in rows]
+    return "\n".join(lines)
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(v) for v in text.split(",") if v]
+
+
+def main():
+    defaults = LatencyConfig()
+    parser = argparse.ArgumentParser(description="Analytical PBS latency model and design-space sweep")
+    parser.add_argument("--clock-mhz", type=float, default=200.0)
+    parser.add_argument("--log2-n", type=_int_list, default=[defaults.log2_n])
+    parser.add_argument("--log2-throughput", type=_int_list, default=[defaults.log2_pbs_throughput])
+    parser.add_argument("--decomp-length", type=_int_list, default=[defaults.decomp_length])
+    parser.add_argument("--k-lwe", type=_int_list, default=[defaults.k_lwe])
+    parser.add_argument("--ai-burstlen", type=_int_list, default=[defaults.ai_burstlen])
+    parser.add_argument("--buffers", action="store_true", help="also sweep all combinations of " + ", ".join(BUFFER_FLAGS))
+    parser.add_argument("--sweep", action="store_true", help="print the Pareto front instead of the single configuration")
+    parser.add_argument("--all", action="store_true", help="print every configuration, not only the Pareto front")
+    parser.add_argument("--csv", help="write every configuration to this csv file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    configs = grid(args.log2_n, args.log2_throughput, args.decomp_length, args.k_lwe, args.ai_burstlen, args.buffers)
+    if not args.sweep and len(configs) == 1:
+        r = evaluate(configs[0])
+        for key, value in r._asdict().items():
+            if key != "config":
+                print(f"{key:<36} {value}")
+        print(f"{'latency_us':<36} {r.latency_us(args.clock_mhz):.1f}")
+        print(f"{'pbs_per_s':<36} {r.pbs_per_s(args.clock_mhz):.0f}")
+        return
+
+    results = sweep(configs, args.workers)
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(row(results[0], args.clock_mhz)))
+            writer.writeheader()
+            writer.writerows(row(r, args.clock_mhz) for r in results)
+    shown = results if args.all else pareto_front(results, args.clock_mhz)
+    print(f"{len(results)} configurations, {len(shown)} shown (buffers = {','.join(BUFFER_FLAGS)})")
+    print(format_table([row(r, args.clock_mhz) for r in shown]))
+
+
+if __name__ == "__main__":
+    main()
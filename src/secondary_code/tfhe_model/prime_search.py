@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Search NTT-friendly primes q = 1 mod 2N and rank them by how cheap their
+modular reduction is in hardware.
+
+Like the Solinas prime 0xFFFFFFFF00000001 = 2^64 - 2^32 + 1 used by
+modulo_solinas.vhd, a prime with few non-zero digits in signed-binary (NAF)
+form can be reduced with shifts and adds: 2^top = -(rest) mod q, so every
+fold of the upper half costs (weight-1) adders and a fold removes
+(top - second_exponent) bits. We score
+    reduction_cost = (naf_weight - 1) * folds_for_a_2*bits_product
+and sort by it.
+
+Candidates are either generated as sparse signed-digit numbers (default,
+covers the interesting region of the search space) or scanned densely as
+k*2N+1. Primality is checked with batched Miller-Rabin over a process pool.
+
+Usage:
+  python -m tfhe_model.prime_search --bits 32,48,64 --log2-n 11 --top 10
+  python -m tfhe_model.prime_search --bits 64 --log2-n 16 --max-weight 5 --dense 2000
+"""
+
+import argparse
+import collections
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, NamedTuple, Optional
+
+from .ntt_params import compute_params, find_generator, is_probable_prime, max_log2_ntt_size
+
+_SIEVE_PRODUCT = math.prod((3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97))
+_BATCH_SIZE = 4096
+
+
+class PrimeCandidate(NamedTuple):
+    bits: int
+    prime: int
+    naf: tuple              # ((exponent, sign), ...) from high to low
+    naf_weight: int
+    folds: int
+    reduction_cost: int
+    two_adicity: int        # largest e with 2^e | q-1, so N <= 2^(e-1) for negacyclic
+    w: Optional[int]        # primitive N-th root of unity
+    w_2n: Optional[int]     # primitive 2N-th root of unity
+
+
+def naf_digits(q: int) -> tuple:
+    """Non-adjacent form of q as ((exponent, +1/-1), ...), highest exponent first."""
+    digits = []
+    e = 0
+    while q:
+        if q & 1:
+            d = 2 - (q & 3)  # +1 if q = 1 mod 4, -1 if q = 3 mod 4
+            digits.append((e, d))
+            q -= d
+        q >>= 1
+        e += 1
+    return tuple(reversed(digits))
+
+
+def format_naf(naf: tuple) -> str:
+    parts = []
+    for idx, (e, d) in enumerate(naf):
+        term = "1" if e == 0 else f"2^{e}"
+        if idx == 0:
+            parts.append(term if d > 0 else f"-{term}")
+        else:
+            parts.append(f"{'+' if d > 0 else '-'} {term}")
+    return " ".join(parts)
+
+
+def reduction_folds(naf: tuple, bits: int) -> int:
+    # a 2*bits wide product shrinks by (top - second) bits per fold
+    if len(naf) < 2:
+        return 1
+    top, second = naf[0][0], naf[1][0]
+    return max(1, math.ceil(bits / (top - second)))
+
+
+def two_adicity(q: int) -> int:
+    return max_log2_ntt_size(q)
+
+
+def sparse_candidates(bits: int, log2_2n: int, max_weight: int) -> Iterable[int]:
+    """q = +-2^top + sum(+-2^e) + 1 with log2_2n <= e < top, so q = 1 mod 2N by construction."""
+    lo, hi = 2 ** (bits - 1), 2 ** bits
+    seen = set()
+    for top in (bits - 1, bits):
+        exponents = range(log2_2n, top)
+        for num_mid in range(0, max_weight - 1):
+            for exps in itertools.combinations(exponents, num_mid):
+                for signs in itertools.product((1, -1), repeat=num_mid):
+                    q = 2 ** top + 1 + sum(s * 2 ** e for s, e in zip(signs, exps))
+                    if lo <= q < hi and q not in seen:
+                        seen.add(q)
+                        yield q
+
+
+def dense_candidates(bits: int, log2_2n: int, start: Optional[int] = None) -> Iterable[int]:
+    step = 2 ** log2_2n
+    q = start if start is not None else 2 ** (bits - 1)
+    q += (1 - q) % step
+    while q < 2 ** bits:
+        yield q
+        q += step
+
+
+def _primes_in_batch(batch: List[int]) -> List[int]:
+    # cheap gcd sieve first, Miller-Rabin only for the survivors
+    return [q for q in batch if math.gcd(q, _SIEVE_PRODUCT) == 1 and is_probable_prime(q)]
+
+
+def _batches(candidates: Iterable[int], size: int = _BATCH_SIZE) -> Iterable[List[int]]:
+    it = iter(candidates)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def find_primes(candidates: Iterable[int], pool: Optional[ProcessPoolExecutor] = None,
+                limit: Optional[int] = None) -> List[int]:
+    found = []
+    batches = _batches(candidates)
+    if pool is None:
+        for batch in batches:
+            found += _primes_in_batch(batch)
+            if limit is not None and len(found) >= limit:
+                return found[:limit]
+        return found
+    # Executor.map would consume the (possibly huge) candidate stream up front,
+    # so keep only a bounded number of batches in flight
+    in_flight = collections.deque()
+    window = 4 * (os.cpu_count() or 1)
+    for batch in itertools.chain(batches, [None]):
+        if batch is not None:
+            in_flight.append(pool.submit(_primes_in_batch, batch))
+        while in_flight and (batch is None or len(in_flight) >= window):
+            found += in_flight.popleft().result()
+            if limit is not None and len(found) >= limit:
+                for future in in_flight:
+                    future.cancel()
+                return found[:limit]
+    return found
+
+
+def describe(q: int, bits: int, log2_n: int) -> PrimeCandidate:
+    naf = naf_digits(q)
+    folds = reduction_folds(naf, bits)
+    w = w_2n = None
+    if two_adicity(q) >= log2_n:
+        params = compute_params(2 ** log2_n, q, find_generator(q))
+        w, w_2n = params.w, params.w_2n
+    return PrimeCandidate(bits, q, naf, len(naf), folds, (len(naf) - 1) * folds, two_adicity(q), w, w_2n)
+
+
+def rank(candidates: List[PrimeCandidate]) -> List[PrimeCandidate]:
+    return sorted(candidates, key=lambda c: (c.reduction_cost, c.naf_weight, -c.two_adicity, c.prime))
+
+
+def search(bits: int, log2_n: int, max_weight: int = 4, dense: int = 0,
+           pool: Optional[ProcessPoolExecutor] = None) -> List[PrimeCandidate]:
+    log2_2n = log2_n + 1
+    primes = set(find_primes(sparse_candidates(bits, log2_2n, max_weight), pool))
+    if dense:
+        primes.update(find_primes(dense_candidates(bits, log2_2n), pool, limit=dense))
+    return rank([describe(q, bits, log2_n) for q in primes])
+
+
+def format_table(ranked: List[PrimeCandidate], top: int) -> str:
+    header = f"{'bits':>4} {'q':>18} {'cost':>4} {'wt':>2} {'fold':>4} {'2-adic':>6}  {'w_N':>18} {'w_2N':>18}  form"
+    lines = [header, "-" * len(header)]
+    for c in ranked[:top]:
+        w = f"{c.w:#x}" if c.w is not None else "-"
+        w_2n = f"{c.w_2n:#x}" if c.w_2n is not None else "-"
+        lines.append(f"{c.bits:>4} {c.prime:>#18x} {c.reduction_cost:>4} {c.naf_weight:>2} {c.folds:>4} "
+                     f"{c.two_adicity:>6}  {w:>18} {w_2n:>18}  {format_naf(c.naf)}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank NTT-friendly primes by modular-reduction cost")
+    parser.add_argument("--bits", default="64", help="comma separated bit widths, e.g. 32,48,64")
+    parser.add_argument("--log2-n", type=int, default=10, help="polynomial size; primes satisfy q = 1 mod 2N")
+    parser.add_argument("--max-weight", type=int, default=4, help="max non-zero signed digits of sparse candidates")
+    parser.add_argument("--dense", type=int, default=0, help="additionally take the first DENSE primes k*2N+1")
+    parser.add_argument("--top", type=int, default=10, help="rows printed per bit width")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for bits in (int(b) for b in args.bits.split(",")):
+            if bits > 80:
+                parser.error("Miller-Rabin bases are only deterministic below 2^81")
+            ranked = search(bits, args.log2_n, args.max_weight, args.dense, pool)
+            print(f"\n{len(ranked)} primes with {bits} bits and q = 1 mod 2^{args.log2_n + 1}")
+            print(format_table(ranked, args.top))
+
+
+if __name__ == "__main__":
+    main()
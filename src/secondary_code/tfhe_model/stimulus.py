@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Streaming stimulus and expected-response files for the VHDL testbenches.
+
+A stream is a sequence of throughput blocks, i.e. the sub_polynom an entity
+sees on its ports in one clock. Streams are written in shards of at most
+--blocks-per-shard blocks, <name>.<shard>.hex or <name>.<shard>.bin, so a
+testbench replays millions of coefficients without elaborating them as
+constants and the files stay small enough to move around:
+  hex - a '#' header line, then one block per line: throughput words of
+        unsigned_polym_coefficient_bit_width bits, fixed-width hex, coefficient
+        0 first. stream_read_block / stream_compare_block in tb_utils.vhd read
+        these with textio, one block per call, and move on to the next shard
+        when one ends.
+  bin - the same words as raw little-endian uint64, for readers outside textio
+<name>.json records the throughput, the block count and the shards.
+
+Streams written (replayed by testbenches/ntt_stream_tb.vhd):
+  ntt_in  - i_sub_polym blocks of the forward ntt (mixed format unless --no-mixed-format)
+  ntt_out - its o_result blocks; they are also the input of the inverse ntt,
+            whose o_result blocks are ntt_in again
+The polynomials are generated and transformed --chunk at a time, so the
+number of polynomials is only bounded by disk space.
+
+ntt_out is computed with the roots of ntt_params.vhd, as the ntt entity uses
+them, and <name>.json records the root; --solver-roots is only for primes
+without a list there, and such a stream does not match the hardware. --verify
+also checks the first polynomial against calc_ntt_res.
+
+Usage:
+  python -m tfhe_model.stimulus --polys 100000 --out build/ntt_stream
+  python -m tfhe_model.stimulus --polys 4096 --log2-n 10 --throughput 32 --format bin --out build/ntt_stream
+  python -m tfhe_model.stimulus --verify build/ntt_stream/ntt_out.json
+"""
+
+import argparse
+import binascii
+import json
+import os
+import time
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from .modarith import U64
+from .ntt import NttModel, calc_ntt_res, from_blocks, to_ntt_mixed_format
+from .ntt_params import parse_prime
+
+WORD_BITS = 64  # unsigned_polym_coefficient_bit_width
+WORD_DIGITS = WORD_BITS // 4
+FORMATS = ("hex", "bin")
+
+
+def hex_lines(blocks: np.ndarray) -> bytes:
+    """(num_blocks, throughput) uint64 -> one line of fixed-width hex words per block."""
+    num_blocks, throughput = blocks.shape
+    digits = np.frombuffer(binascii.hexlify(blocks.astype(">u8").tobytes()).upper(), dtype="S1")
+    digits = digits.reshape(num_blocks, throughput, WORD_DIGITS)
+    sep = np.full((num_blocks, throughput, 1), b" ", dtype="S1")
+    sep[:, -1, 0] = b"\n"
+    return np.concatenate([digits, sep], axis=-1).tobytes()
+
+
+def parse_hex_lines(text: bytes, throughput: int) -> np.ndarray:
+    lines = [line for line in text.splitlines() if line and not line.startswith(b"#")]
+    words = b"".join(line.replace(b" ", b"") for line in lines)
+    blocks = np.frombuffer(binascii.unhexlify(words), dtype=">u8").astype(U64)
+    return blocks.reshape(-1, throughput)
+
+
+class StreamWriter:
+    """Appends blocks to <out_dir>/<name>.<shard>.<fmt>, starting a new shard every blocks_per_shard blocks."""
+
+    def __init__(self, out_dir: str, name: str, throughput: int, fmt: str = "hex",
+                 blocks_per_shard: int = 1 << 16, params: Optional[dict] = None):
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown format {fmt}, use one of {', '.join(FORMATS)}")
+        self.out_dir = out_dir
+        self.name = name
+        self.throughput = throughput
+        self.fmt = fmt
+        self.blocks_per_shard = blocks_per_shard
+        self.params = params or {}
+        self.blocks = 0
+        self.shards: List[dict] = []
+        self._file = None
+        os.makedirs(out_dir, exist_ok=True)
+
+    def _open_shard(self):
+        shard = len(self.shards)
+        path = f"{self.name}.{shard}.{self.fmt}"
+        self._file = open(os.path.join(self.out_dir, path), "wb")
+        if self.fmt == "hex":
+            params = "".join(f", {k} {v}" for k, v in self.params.items())
+            self._file.write(f"# {self.name} shard {shard}, first block {self.blocks}, "
+                             f"throughput {self.throughput}{params}\n".encode())
+        self.shards.append({"file": path, "first_block": self.blocks, "blocks": 0})
+
+    def write(self, blocks: np.ndarray):
+        blocks = np.asarray(blocks, dtype=U64).reshape(-1, self.throughput)
+        while len(blocks):
+            if self._file is None or self.shards[-1]["blocks"] == self.blocks_per_shard:
+                self.close_shard()
+                self._open_shard()
+            room = self.blocks_per_shard - self.shards[-1]["blocks"]
+            part, blocks = blocks[:room], blocks[room:]
+            self._file.write(hex_lines(part) if self.fmt == "hex" else part.astype("<u8").tobytes())
+            self.shards[-1]["blocks"] += len(part)
+            self.blocks += len(part)
+
+    def close_shard(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self) -> str:
+        """Closes the last shard and writes <name>.json; returns its path."""
+        self.close_shard()
+        manifest = {"name": self.name, "format": self.fmt, "throughput": self.throughput,
+                    "word_bits": WORD_BITS, "blocks": self.blocks, "params": self.params, "shards": self.shards}
+        path = os.path.join(self.out_dir, f"{self.name}.json")
+        with open(path, "w") as f:
+            json.dump(manifest, f, indent=1)
+        return path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_stream(manifest_path: str) -> Iterator[np.ndarray]:
+    """Yields the blocks of a stream shard by shard, as (blocks, throughput) uint64 arrays."""
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    out_dir = os.path.dirname(manifest_path)
+    for shard in manifest["shards"]:
+        with open(os.path.join(out_dir, shard["file"]), "rb") as f:
+            data = f.read()
+        if manifest["format"] == "hex":
+            blocks = parse_hex_lines(data, manifest["throughput"])
+        else:
+            blocks = np.frombuffer(data, dtype="<u8").astype(U64).reshape(-1, manifest["throughput"])
+        if len(blocks) != shard["blocks"]:
+            raise ValueError(f"{shard['file']}: {len(blocks)} blocks, the manifest says {shard['blocks']}")
+        yield blocks
+
+
+def write_ntt_streams(out_dir: str, model: NttModel, num_polys: int, fmt: str = "hex",
+                      blocks_per_shard: int = 1 << 16, chunk: int = 4096, seed: Optional[int] = None) -> List[str]:
+    omega = model.params.w_2n if model.negacyclic else model.params.w
+    params = {"log2_n": model.log2_n, "prime": model.prime, "negacyclic": model.negacyclic,
+              "mixed_format": model.mixed_format, "solver_roots": model.solver_roots, "omega": f"{omega:#x}"}
+    rng = np.random.default_rng(seed)
+    with StreamWriter(out_dir, "ntt_in", model.throughput, fmt, blocks_per_shard, params) as ntt_in, \
+            StreamWriter(out_dir, "ntt_out", model.throughput, fmt, blocks_per_shard, params) as ntt_out:
+        for start in range(0, num_polys, chunk):
+            polys = rng.integers(0, model.prime, size=(min(chunk, num_polys - start), model.n), dtype=U64)
+            in_blocks = model.ntt_input_stream(polys)
+            ntt_in.write(in_blocks)
+            ntt_out.write(model.ntt_entity(in_blocks))
+    return [os.path.join(out_dir, "ntt_in.json"), os.path.join(out_dir, "ntt_out.json")]
+
+
+def verify(manifest_path: str) -> int:
+    """Re-reads a stream; for ntt_out also recomputes it from ntt_in. Returns the number of bad blocks."""
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    blocks = sum(len(b) for b in read_stream(manifest_path))
+    print(f"{manifest['name']}: {blocks} blocks in {len(manifest['shards'])} shards")
+    if manifest["name"] != "ntt_out":
+        return 0
+    params = manifest["params"]
+    model = NttModel(params["log2_n"], params["prime"], params["negacyclic"], manifest["throughput"],
+                     params["mixed_format"], solver_roots=params.get("solver_roots", False))
+    blocks_per_poly = model.n // model.throughput
+    errors = 0
+    first = True
+    # shards need not end on a polynomial boundary, so compare whole polynomials out of a carry
+    in_carry = out_carry = np.empty((0, model.throughput), dtype=U64)
+    ins = read_stream(os.path.join(os.path.dirname(manifest_path), "ntt_in.json"))
+    for out_blocks, in_blocks in zip(read_stream(manifest_path), ins):
+        in_carry = np.concatenate([in_carry, in_blocks])
+        out_carry = np.concatenate([out_carry, out_blocks])
+        whole = len(in_carry) // blocks_per_poly * blocks_per_poly
+        ref = model.ntt_entity(in_carry[:whole].reshape(-1, blocks_per_poly, model.throughput))
+        errors += int(np.count_nonzero((ref.reshape(-1, model.throughput) != out_carry[:whole]).any(axis=1)))
+        if first and whole:
+            # the model above shares the roots it wrote the stream with; calc_ntt_res takes them from ntt_params.vhd
+            poly = from_blocks(in_carry[:blocks_per_poly])
+            if model.mixed_format:
+                poly = to_ntt_mixed_format(poly, False, model.throughput)
+            same = calc_ntt_res(model, poly, False) == from_blocks(out_carry[:blocks_per_poly]).tolist()
+            print(f"first polynomial matches calc_ntt_res: {same}")
+            errors += 0 if same else blocks_per_poly
+            first = False
+        in_carry, out_carry = in_carry[whole:], out_carry[whole:]
+    print(f"ntt_out against the model: {errors} mismatching blocks")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming stimulus/response files for the VHDL testbenches")
+    parser.add_argument("--out", default="ntt_stream", help="output directory")
+    parser.add_argument("--polys", type=int, default=1024, help="number of polynomials per stream")
+    parser.add_argument("--prime", default="solinas", help="'solinas', 'small' (7681) or an integer")
+    parser.add_argument("--log2-n", type=int, default=10)
+    parser.add_argument("--throughput", type=int, default=32)
+    parser.add_argument("--cyclic", action="store_true")
+    parser.add_argument("--no-mixed-format", action="store_true")
+    parser.add_argument("--format", choices=FORMATS, default="hex")
+    parser.add_argument("--blocks-per-shard", type=int, default=1 << 16)
+    parser.add_argument("--chunk", type=int, default=4096, help="polynomials transformed at a time")
+    parser.add_argument("--solver-roots", action="store_true",
+                        help="roots of the ntt_params solver instead of ntt_params.vhd (primes without a list)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", metavar="MANIFEST", help="check an existing stream instead of writing one")
+    args = parser.parse_args()
+
+    if args.verify:
+        raise SystemExit(1 if verify(args.verify) else 0)
+
+    model = NttModel(args.log2_n, parse_prime(args.prime), not args.cyclic, args.throughput,
+                     not args.no_mixed_format, solver_roots=args.solver_roots)
+    start = time.perf_counter()
+    manifests = write_ntt_streams(args.out, model, args.polys, args.format, args.blocks_per_shard, args.chunk,
+                                  args.seed)
+    elapsed = time.perf_counter() - start
+    for path in manifests:
+        with open(path) as f:
+            manifest = json.load(f)
+        print(f"{path}: {manifest['blocks']} blocks in {len(manifest['shards'])} shards")
+    print(f"{args.polys * model.n / elapsed / 1e6:.2f} Mcoeffs/s per stream")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Twiddle-factor ROM generator.
+
+Computes the tables that ntt_utils.vhd builds during elaboration
+(init_twiddle_exponents, init_twiddle_factors) and rearranges them per stage
+and per butterfly exactly like single_stage_base.vhd and
+ntt_fully_parallel_stage_base.vhd do before handing them to
+manual_constant_bram.vhd (get_idx_column_for_stage + tw_idx_column_to_tw_factors
+with interweave).
+
+Outputs:
+  - a VHDL package with an ntt_params_binary_list constant for the prime
+  - one .mem file per stage and direction (one hex word per line, butterfly-major,
+    so the slice butterfly_idx*tws_per_bf .. (butterfly_idx+1)*tws_per_bf-1 is
+    the ram_content of that butterfly's manual_constant_bram)
+The roots are those of ntt_params.vhd for primes that have a list there; for
+an N beyond the list, or with --vhdl-package, they are the solver's, with a
+warning in the first case since those ROMs do not match ntt_params.vhd.
+
+Usage:
+  python -m tfhe_model.twiddles --prime solinas --log2-n 16 --throughputs all --timing-only
+  python -m tfhe_model.twiddles --prime solinas --log2-n 10 --throughputs 32 --out build/twiddles \\
+      --vhdl-package build/ntt_params_solinas.vhd
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from .modarith import U64, power_table
+from .ntt_params import (VHDL_PARAMS_LISTS, NttParams, ParamCache, format_vhdl_list, get_params, get_params_table,
+                         is_probable_prime, parse_prime)
+
+# defaults from constants_utils.vhd
+GENTLEMAN_SANDE_TWIDDLE_OFFSET = 3  # clks_per_64_bit_add_mod
+NTT_BUTTERFLY_IN_BUFS = False
+NTT_PARAMS_LIST_LENGTH = 16
+UNSIGNED_POLYM_COEFFICIENT_BIT_WIDTH = 64
+
+
+class TwiddleRoms(NamedTuple):
+    log2_n: int
+    throughput: int
+    invers: bool
+    negacyclic: bool
+    # one (num_butterflys, tws_per_bf) array per single stage, in ntt.vhd stage_idx order
+    single_stages: List[np.ndarray]
+    # (num_stages_fully_parallel, num_butterflys, tws_per_bf), empty if throughput == N
+    fully_parallel: np.ndarray
+    # the plain table, used as constants by ntt_fully_parallel_constant_twiddles if throughput == N
+    table: np.ndarray
+
+
+def bit_reverse_indices(num_bits: int) -> np.ndarray:
+    idx = np.arange(2 ** num_bits, dtype=np.int64)
+    res = np.zeros_like(idx)
+    for bit in range(num_bits):
+        res |= ((idx >> bit) & 1) << (num_bits - 1 - bit)
+    return res
+
+
+def twiddle_exponents(log2_n: int, negacyclic: bool) -> np.ndarray:
+    """init_twiddle_exponents as a (log2_n, N/2) array indexed [col, row]."""
+    n = 2 ** log2_n
+    half = n // 2
+    j = np.arange(half, dtype=np.int64)
+    j_reversed = bit_reverse_indices(log2_n - 1)
+    table = np.empty((log2_n, half), dtype=np.int64)
+    for stage_idx in range(log2_n):
+        i = 2 ** stage_idx
+        if negacyclic:
+            exps = (i * (2 * j + 1)) % n
+        else:
+            exps = (i * j) % half
+        table[log2_n - 1 - stage_idx, j_reversed] = exps
+    return table
+
+
+def twiddle_factor_table(prime: int, omega: int, exponents: np.ndarray) -> np.ndarray:
+    """init_twiddle_factors: every exponent turned into omega**exponent mod prime."""
+    n = 2 * exponents.shape[1]
+    powers = power_table(omega, n, prime)
+    return powers[exponents]
+
+
+def stage_rom(column: np.ndarray, throughput: int, delay: int) -> np.ndarray:
+    """get_idx_column_for_stage + interweaved tw_idx_column_to_tw_factors for one column."""
+    num_butterflys = throughput // 2
+    num_blocks = column.size // num_butterflys
+    blocks = column.reshape(num_blocks, num_butterflys)
+    blocks = np.roll(blocks, delay, axis=0)
+    return np.ascontiguousarray(blocks.T)
+
+
+def ntt_twiddle_roms(table: np.ndarray, throughput: int, invers: bool, negacyclic: bool,
+                     gentleman_sande_twiddle_offset: int = GENTLEMAN_SANDE_TWIDDLE_OFFSET,
+                     ntt_butterfly_in_bufs: bool = NTT_BUTTERFLY_IN_BUFS) -> TwiddleRoms:
+    log2_n = table.shape[0]
+    log2_throughput = throughput.bit_length() - 1
+    num_single_stages = log2_n - log2_throughput
+    in_bufs = int(ntt_butterfly_in_bufs)
+
+    single_stages = []
+    for stage_idx in range(num_single_stages):
+        no_mult = not negacyclic and stage_idx == 0
+        delay = int(invers and not no_mult) * gentleman_sande_twiddle_offset + in_bufs
+        single_stages.append(stage_rom(table[stage_idx], throughput, delay))
+
+    if num_single_stages > 0:
+        delay = int(invers) * gentleman_sande_twiddle_offset + in_bufs
+        fully_parallel = np.stack([stage_rom(table[col], throughput, delay)
+                                   for col in range(num_single_stages, log2_n)])
+    else:
+        fully_parallel = np.empty((0, throughput // 2, 1), dtype=U64)
+    return TwiddleRoms(log2_n, throughput, invers, negacyclic, single_stages, fully_parallel, table)
+
+
+def ntt_tables(params: NttParams, log2_n: int, negacyclic: bool) -> Dict[bool, np.ndarray]:
+    """Forward (False) and inverse (True) twiddle tables like get_ntt_params in ntt_utils.vhd."""
+    if negacyclic:
+        if params.w_2n is None:
+            raise ValueError(f"prime {params.prime} has no 2N-th root of unity for N=2**{log2_n}")
+        omega, omega_invers = params.w_2n, params.w_2n_invers
+    else:
+        omega, omega_invers = params.w, params.w_invers
+    exponents = twiddle_exponents(log2_n, negacyclic)
+    return {
+        False: twiddle_factor_table(params.prime, omega, exponents),
+        True: twiddle_factor_table(params.prime, omega_invers, exponents),
+    }
+
+
+def all_throughput_roms(params: NttParams, log2_n: int, negacyclic: bool,
+                        throughputs: Optional[List[int]] = None) -> Dict[tuple, TwiddleRoms]:
+    """ROM contents keyed by (throughput, invers); the tables are computed once for all throughputs."""
+    if throughputs is None:
+        throughputs = [2 ** i for i in range(1, log2_n + 1)]
+    tables = ntt_tables(params, log2_n, negacyclic)
+    return {(t, invers): ntt_twiddle_roms(tables[invers], t, invers, negacyclic)
+            for t in throughputs for invers in (False, True)}
+
+
+# ---------- writers ----------
+def _hex_lines(values: np.ndarray, width_bits: int) -> str:
+    fmt = f"{{:0{width_bits // 4}x}}"
+    return "\n".join(map(fmt.format, values.ravel().tolist())) + "\n"
+
+
+def write_rom_init_files(out_dir: str, roms: TwiddleRoms, width_bits: int = UNSIGNED_POLYM_COEFFICIENT_BIT_WIDTH) -> List[str]:
+    direction = "intt" if roms.invers else "ntt"
+    prefix = os.path.join(out_dir, f"{direction}_n{2 ** roms.log2_n}_t{roms.throughput}")
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    manifest = {
+        "log2_n": roms.log2_n,
+        "throughput": roms.throughput,
+        "invers": roms.invers,
+        "negacyclic": roms.negacyclic,
+        "num_butterflys": roms.throughput // 2,
+        "single_stages": [],
+        "fully_parallel_stages": [],
+    }
+    for stage_idx, rom in enumerate(roms.single_stages):
+        path = f"{prefix}_stage{stage_idx}.mem"
+        with open(path, "w") as f:
+            f.write(_hex_lines(rom, width_bits))
+        manifest["single_stages"].append({"file": os.path.basename(path), "tws_per_bf": rom.shape[1]})
+        written.append(path)
+    for sub_stage_idx, rom in enumerate(roms.fully_parallel):
+        path = f"{prefix}_fp{sub_stage_idx}.mem"
+        with open(path, "w") as f:
+            f.write(_hex_lines(rom, width_bits))
+        manifest["fully_parallel_stages"].append({"file": os.path.basename(path), "tws_per_bf": rom.shape[1]})
+        written.append(path)
+    if not roms.single_stages:
+        path = f"{prefix}_table.mem"
+        with open(path, "w") as f:
+            f.write(_hex_lines(roms.table, width_bits))
+        manifest["table"] = os.path.basename(path)
+        written.append(path)
+    path = f"{prefix}.json"
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    written.append(path)
+    return written
+
+
+def format_params_package(name: str, prime: int, table: Dict[int, Optional[NttParams]],
+                          width_bits: int = UNSIGNED_POLYM_COEFFICIENT_BIT_WIDTH) -> str:
+    digits = width_bits // 4
+    lines = [
+        "----------------------------------------------------------------------------------",
+        "-- Module Name: ntt_params_" + name,
+        "-- Project Name: TFHE Acceleration with FPGA",
+        "-- Description: Generated by src/secondary_code/tfhe_model/twiddles.py - do not edit by hand.",
+        "--             Prime-related values for the NTT, same layout as ntt_params_solinas_binary",
+        "--             in ntt_params.vhd. Point get_ntt_prime_list_pair in ntt_utils.vhd to",
+        f"--             params_{name}_prime to use them.",
+        "-- Dependencies: see imports",
+        "----------------------------------------------------------------------------------",
+        "",
+        "library IEEE;",
+        "     use IEEE.STD_LOGIC_1164.all;",
+        "     use IEEE.numeric_std.all;",
+        "library work;",
+        "     use work.constants_utils.all;",
+        "     use work.datatypes_utils.all;",
+        "     use work.ntt_prime_list_pair.all;",
+        "",
+        f"package ntt_params_{name} is",
+        "",
+        f"     constant ntt_params_{name}_binary : ntt_params_binary_list := (",
+        "          -- info: this list starts from 1",
+        "          -- n is set by the index of the element in this list",
+        format_vhdl_list(table, width_bits),
+        "     );",
+        "",
+        f"     constant {name}_prime : binary_vector := x\"{prime:0{digits}x}\";",
+        "",
+        f"     constant params_{name}_prime : prime_list_pair := (",
+        f"          prime => to_synth_uint(unsigned({name}_prime)),",
+        f"          list  => ntt_params_binary_list_to_synthesisable_int(ntt_params_{name}_binary));",
+        "",
+        "end package;",
+        "",
+    ]
+    # the VHDL sources use windows line endings
+    return "\n".join(lines).replace("\n", "\r\n")
+
+
+def write_params_package(path: str, name: str, prime: int, list_length: int = NTT_PARAMS_LIST_LENGTH,
+                         cache: Optional[ParamCache] = None) -> str:
+    table = get_params_table(prime, list_length, cache)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="") as f:
+        f.write(format_params_package(name, prime, table))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate NTT twiddle ROM contents and ntt_params packages")
+    parser.add_argument("--prime", default="solinas", help="'solinas', 'small' (7681) or an integer")
+    parser.add_argument("--name", default=None, help="name used in the VHDL package (default: derived from --prime)")
+    parser.add_argument("--log2-n", type=int, default=10)
+    parser.add_argument("--throughputs", default="32", help="comma separated list or 'all'")
+    parser.add_argument("--cyclic", action="store_true", help="cyclic instead of negacyclic twiddles")
+    parser.add_argument("--out", default=None, help="directory for the .mem ROM init files")
+    parser.add_argument("--vhdl-package", default=None, help="path of the ntt_params package to write")
+    parser.add_argument("--list-length", type=int, default=NTT_PARAMS_LIST_LENGTH, help="ntt_params_list_length")
+    parser.add_argument("--timing-only", action="store_true", help="compute all tables but write nothing")
+    args = parser.parse_args()
+
+    prime = parse_prime(args.prime)
+    if not is_probable_prime(prime):
+        parser.error(f"{prime} is not prime")
+    name = args.name or (args.prime.lower() if args.prime.isidentifier() else f"prime{prime}")
+    cache = ParamCache()
+    negacyclic = not args.cyclic
+    if args.throughputs == "all":
+        throughputs = [2 ** i for i in range(1, args.log2_n + 1)]
+    else:
+        throughputs = [int(t) for t in args.throughputs.split(",")]
+
+    start = time.perf_counter()
+    # the ROMs of the roots in ntt_params.vhd, unless they go with a newly written package
+    params = None
+    if args.vhdl_package is None and prime in VHDL_PARAMS_LISTS:
+        try:
+            params = get_params(2 ** args.log2_n, prime, cache)
+        except ValueError:
+            pass
+        if params is None or negacyclic and params.w_2n is None:
+            # the list ends at ntt_params_list_length, the solver still finds roots for larger N
+            print(f"warning: ntt_params.vhd has no {'2N' if negacyclic else 'N'}-th root for N=2**{args.log2_n}, "
+                  f"using the solver's; these ROMs do not match ntt_params.vhd", file=sys.stderr)
+            params = None
+    try:
+        if params is None:
+            params = get_params(2 ** args.log2_n, prime, cache, hw=False)
+        roms = all_throughput_roms(params, args.log2_n, negacyclic, throughputs)
+    except ValueError as exc:
+        parser.error(str(exc))
+    elapsed = time.perf_counter() - start
+    num_words = sum(sum(r.size for r in v.single_stages) + v.fully_parallel.size for v in roms.values())
+    print(f"computed {len(roms)} ROM sets ({num_words} twiddles) for N=2**{args.log2_n} in {elapsed:.2f}s")
+
+    if args.timing_only:
+        return
+    if args.out is not None:
+        for rom in roms.values():
+            write_rom_init_files(args.out, rom)
+        print(f"wrote ROM init files to {args.out}")
+    if args.vhdl_package is not None:
+        write_params_package(args.vhdl_package, name, prime, args.list_length, cache)
+        print(f"wrote {args.vhdl_package}")
+
+
+if __name__ == "__main__":
+    main()
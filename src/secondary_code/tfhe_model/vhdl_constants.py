@@ -0,0 +1,650 @@
+#!/usr/bin/env python3
+"""
+Incremental evaluator of the VHDL constants packages.
+
+Parses the constant declarations of ip_cores_constants.vhd, constants_utils.vhd
+and tfhe_constants.vhd into one dependency graph and evaluates the subset of
+VHDL they use: integer/real/boolean arithmetic with VHDL division and mod,
+comparisons, boolean'pos, 'length of vector constants, bit string literals,
+ceil/floor/log2/integer/real, to_integer/to_unsigned, get_bit_length,
+get_min and get_max (math_utils.vhd), get_ntt_latency (ntt_utils.vhd, via
+pbs_latency) and parameterless functions that select a value with a case
+statement (init_clks_per_mod). Constants outside the subset, e.g. the
+ntt_prime record lookups, evaluate to an UnsupportedConstant error that
+propagates to their dependents only.
+
+Values are computed lazily and cached. set() replaces the value or expression
+of a constant and invalidates exactly its transitive dependents, so a sweep
+that changes log2_num_coefficients re-evaluates a few dozen constants, not the
+packages. load() caches the parsed graph per file modification time.
+
+Usage:
+  python -m tfhe_model.vhdl_constants pbs_batchsize blind_rot_iter_latency hbm_data_width
+  python -m tfhe_model.vhdl_constants pbs_batchsize --set log2_ntt_throughput=4 --set decomp_length=3
+  python -m tfhe_model.vhdl_constants --all
+"""
+
+import argparse
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+
+PACKAGE_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "core_logic", "constants_and_utils")
+DEFAULT_PACKAGES = ("constants_utils.vhd", "ip_cores_constants.vhd", "tfhe_constants.vhd")
+
+# record fields the packages read from ntt_params; get_ntt_params (ntt_utils.vhd) copies them from these constants
+ALIASES = {"ntt_params.negacyclic": "negacyclic"}
+
+
+class UnsupportedConstant(Exception):
+    pass
+
+
+class Bits(NamedTuple):
+    """Value of an unsigned/std_logic_vector constant."""
+    value: int
+    width: int
+
+
+Value = Union[int, float, bool, str, Bits]
+
+
+class Constant(NamedTuple):
+    name: str
+    type: str
+    expr: str
+    package: str
+    line: int
+
+
+class Function(NamedTuple):
+    """A parameterless function returning the value of the case branch that matches selector."""
+    name: str
+    selector: str
+    branches: Tuple[Tuple[str, str], ...]  # (choice, expression), choice "others" last
+
+
+# ---------- parsing ----------
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<bitstr>[xXbBoO]"[0-9a-fA-F_]*")
+  | (?P<str>"[^"]*")
+  | (?P<char>'[01]')
+  | (?P<num>\d[\d_]*(\.[\d_]+)?([eE][+-]?\d+)?)
+  | (?P<id>[A-Za-z]\w*)
+  | (?P<op>\*\*|/=|<=|>=|=>|[-+*/&()<>=,.'])
+""", re.VERBOSE)
+
+_UNIT_RADIX = {"x": 16, "b": 2, "o": 8}
+
+
+def _strip_comments(text: str) -> str:
+    return re.sub(r"--[^\n]*", "", text.replace("\r", ""))
+
+
+def tokenize(expr: str) -> List[Tuple[str, str]]:
+    tokens = []
+    pos = 0
+    while pos < len(expr):
+        m = _TOKEN.match(expr, pos)
+        if not m:
+            raise UnsupportedConstant(f"cannot tokenize {expr[pos:]!r}")
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "ws":
+            continue
+        if kind == "char" and tokens and (tokens[-1][0] == "id" or tokens[-1][1] == ")"):
+            # name'... is an attribute, not a character literal
+            pos = m.start() + 1
+            kind, text = "op", "'"
+        else:
+            text = m.group(kind)
+        tokens.append((kind, text.lower() if kind == "id" else text))
+    return tokens
+
+
+class _Parser:
+    """Recursive descent over the VHDL expression grammar, producing nested tuples."""
+
+    def __init__(self, expr: str):
+        self.tokens = tokenize(expr)
+        self.pos = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos][1] if self.pos < len(self.tokens) else None
+
+    def take(self, expected: Optional[str] = None) -> Tuple[str, str]:
+        if self.pos >= len(self.tokens):
+            raise UnsupportedConstant("unexpected end of expression")
+        tok = self.tokens[self.pos]
+        if expected is not None and tok[1] != expected:
+            raise UnsupportedConstant(f"expected {expected!r}, got {tok[1]!r}")
+        self.pos += 1
+        return tok
+
+    def parse(self):
+        node = self.expression()
+        if self.pos != len(self.tokens):
+            raise UnsupportedConstant(f"trailing {self.peek()!r}")
+        return node
+
+    def expression(self):
+        node = self.relation()
+        while self.peek() in ("and", "or", "xor", "nand", "nor"):
+            op = self.take()[1]
+            node = ("bin", op, node, self.relation())
+        return node
+
+    def relation(self):
+        node = self.simple()
+        if self.peek() in ("=", "/=", "<", "<=", ">", ">="):
+            op = self.take()[1]
+            node = ("bin", op, node, self.simple())
+        return node
+
+    def simple(self):
+        if self.peek() in ("+", "-"):
+            node = ("un", self.take()[1], self.term())
+        else:
+            node = self.term()
+        while self.peek() in ("+", "-", "&"):
+            op = self.take()[1]
+            node = ("bin", op, node, self.term())
+        return node
+
+    def term(self):
+        node = self.factor()
+        while self.peek() in ("*", "/", "mod", "rem"):
+            op = self.take()[1]
+            node = ("bin", op, node, self.factor())
+        return node
+
+    def factor(self):
+        if self.peek() in ("not", "abs"):
+            return ("un", self.take()[1], self.primary())
+        node = self.primary()
+        if self.peek() == "**":
+            self.take()
+            node = ("bin", "**", node, self.primary())
+        return node
+
+    def primary(self):
+        kind, text = self.take()
+        if text == "(":
+            node = self.expression()
+            self.take(")")
+            return node
+        if kind == "num":
+            text = text.replace("_", "")
+            return ("lit", float(text) if "." in text or "e" in text.lower() else int(text))
+        if kind == "bitstr":
+            digits = text[2:-1].replace("_", "")
+            radix = _UNIT_RADIX[text[0].lower()]
+            return ("lit", Bits(int(digits or "0", radix), len(digits) * radix.bit_length() - 1))
+        if kind == "str":
+            return ("lit", text[1:-1])
+        if kind != "id":
+            raise UnsupportedConstant(f"unexpected {text!r}")
+        if text in ("true", "false"):
+            return ("lit", text == "true")
+        node = ("name", text)
+        while True:
+            if self.peek() == ".":
+                self.take()
+                node = ("name", node[1] + "." + self.take()[1]) if node[0] == "name" else ("field", node, self.take()[1])
+            elif self.peek() == "'":
+                self.take()
+                node = ("attr", node, self.take()[1])
+            elif self.peek() == "(":
+                self.take()
+                args = [self.expression()]
+                while self.peek() == ",":
+                    self.take()
+                    args.append(self.expression())
+                self.take(")")
+                node = ("call", node, args)
+            else:
+                return node
+
+
+def parse_expression(expr: str):
+    return _Parser(expr).parse()
+
+
+_PACKAGE = re.compile(r"\bpackage\s+(\w+)\s+is\b(.*?)\bend\s+package\b", re.S | re.I)
+_BODY = re.compile(r"\bpackage\s+body\s+(\w+)\s+is\b(.*?)\bend\s+package\s+body\b", re.S | re.I)
+_CONSTANT = re.compile(r"\bconstant\s+(\w+)\s*:\s*(.+?)\s*:=\s*(.+?)\s*;", re.S | re.I)
+_FUNCTION = re.compile(r"\bfunction\s+(\w+)\s+return\s+\w+\s+is\b(.*?)\bend\s+function\b", re.S | re.I)
+_CASE = re.compile(r"\bcase\s+(\w+)\s+is\b(.*?)\bend\s+case\b", re.S | re.I)
+_WHEN = re.compile(r"\bwhen\s+(\w+)\s*=>\s*\w+\s*:=\s*(.+?)\s*;", re.S | re.I)
+
+
+def parse_package(text: str, package: str) -> Tuple[List[Constant], List[Function]]:
+    """The package-level constants and the parameterless case functions of one .vhd file."""
+    text = _strip_comments(text)
+    constants = []
+    for m in _PACKAGE.finditer(text):
+        if m.group(1).lower() == "body":
+            continue
+        for c in _CONSTANT.finditer(m.group(2)):
+            line = text.count("\n", 0, m.start(2) + c.start()) + 1
+            constants.append(Constant(c.group(1).lower(), " ".join(c.group(2).split()).lower(),
+                                      " ".join(c.group(3).split()), package, line))
+    functions = []
+    for m in _BODY.finditer(text):
+        for f in _FUNCTION.finditer(m.group(2)):
+            case = _CASE.search(f.group(2))
+            if case:
+                branches = tuple((w.group(1).lower(), " ".join(w.group(2).split())) for w in _WHEN.finditer(case.group(2)))
+                functions.append(Function(f.group(1).lower(), case.group(1).lower(), branches))
+    return constants, functions
+
+
+# ---------- evaluation ----------
+def _names(node, out: Set[str]) -> Set[str]:
+    kind = node[0]
+    if kind == "name":
+        out.add(ALIASES.get(node[1], node[1]))
+    elif kind == "bin":
+        _names(node[2], out)
+        _names(node[3], out)
+    elif kind == "un":
+        _names(node[2], out)
+    elif kind == "attr":
+        if node[1][0] == "name" and node[1][1] not in _TYPE_NAMES:
+            _names(node[1], out)
+    elif kind == "call":
+        _names(node[1], out)
+        for a in node[2]:
+            _names(a, out)
+    elif kind == "field":
+        _names(node[1], out)
+    return out
+
+
+_TYPE_NAMES = {"integer", "boolean", "real", "natural", "positive"}
+
+
+def _int_div(a: int, b: int) -> int:
+    q = abs(a) // abs(b)
+    return q if (a >= 0) == (b >= 0) else -q
+
+
+def _to_int(v) -> int:
+    if isinstance(v, Bits):
+        return v.value
+    if isinstance(v, float):
+        # VHDL integer(real) rounds to nearest, halves away from zero
+        return int(math.floor(abs(v) + 0.5)) * (1 if v >= 0 else -1)
+    return int(v)
+
+
+def _bit_length(num) -> int:
+    # math_utils.vhd: integer(ceil(log2(real(num + 1))))
+    return _to_int(math.ceil(math.log2(_to_int(num) + 1)))
+
+
+def _ntt_latency(graph: "ConstantGraph", log2_input_size, log2_throughput, negacyclic, intt, with_rescaling,
+                 with_format_switch):
+    from .pbs_latency import get_ntt_latency
+    return get_ntt_latency(log2_input_size, log2_throughput, negacyclic, intt, with_rescaling, with_format_switch,
+                           graph.value("clks_per_butterfly_without_mult_modulo"), graph.value("clks_per_ab_mod_p"),
+                           graph.value("ntt_stage_logic_out_bufs"))
+
+
+# functions evaluated in Python: (implementation, constants they read besides their arguments)
+BUILTINS = {
+    "real": (lambda g, x: float(_to_int(x) if isinstance(x, Bits) else x), ()),
+    "integer": (lambda g, x: _to_int(x), ()),
+    "ceil": (lambda g, x: float(math.ceil(x)), ()),
+    "floor": (lambda g, x: float(math.floor(x)), ()),
+    "log2": (lambda g, x: math.log2(x), ()),
+    "realmax": (lambda g, a, b: float(max(a, b)), ()),
+    "realmin": (lambda g, a, b: float(min(a, b)), ()),
+    "to_integer": (lambda g, x: _to_int(x), ()),
+    "to_unsigned": (lambda g, x, w: Bits(_to_int(x) % 2 ** w, w), ()),
+    "unsigned": (lambda g, x: x, ()),
+    "std_logic_vector": (lambda g, x: x, ()),
+    "std_ulogic_vector": (lambda g, x: x, ()),
+    "get_bit_length": (lambda g, x: _bit_length(x), ()),
+    "get_max": (lambda g, a, b: _to_int(max(_to_int(a), _to_int(b))), ()),
+    "get_min": (lambda g, a, b: _to_int(min(_to_int(a), _to_int(b))), ()),
+    "get_ntt_latency": (_ntt_latency, ("clks_per_butterfly_without_mult_modulo", "clks_per_ab_mod_p",
+                                       "ntt_stage_logic_out_bufs")),
+}
+
+
+def _binary(op: str, a, b):
+    if op in ("and", "or", "xor", "nand", "nor"):
+        res = {"and": a and b, "or": a or b, "xor": a != b, "nand": not (a and b), "nor": not (a or b)}[op]
+        return bool(res)
+    if isinstance(a, Bits) or isinstance(b, Bits):
+        if op == "&":
+            return Bits((a.value << b.width) | b.value, a.width + b.width)
+        a, b = _to_int(a), _to_int(b)
+    if op == "+":
+        return a + b
+    if op == "-":
+        return a - b
+    if op == "*":
+        return a * b
+    if op == "/":
+        return _int_div(a, b) if isinstance(a, int) and isinstance(b, int) else a / b
+    if op == "mod":
+        return a % b
+    if op == "rem":
+        return a - b * _int_div(a, b)
+    if op == "**":
+        return a ** b
+    if op == "&":
+        return a + b
+    return {"=": a == b, "/=": a != b, "<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+
+
+_RANGE = re.compile(r"^(\w+)\s*\((.+?)\s+(downto|to)\s+(.+)\)$")
+
+
+class ConstantGraph:
+    """Dependency graph of VHDL constants with lazy, cached and incrementally invalidated evaluation."""
+
+    def __init__(self, constants: Iterable[Constant], functions: Iterable[Function] = ()):
+        self.constants: Dict[str, Constant] = {}
+        self.functions: Dict[str, Function] = {f.name: f for f in functions}
+        self._ast: Dict[str, object] = {}
+        self.deps: Dict[str, Set[str]] = {}
+        self.dependents: Dict[str, Set[str]] = {}
+        self._cache: Dict[str, Value] = {}
+        self._errors: Dict[str, UnsupportedConstant] = {}
+        self.evaluations = 0
+        for c in constants:
+            if c.name in self.constants:
+                raise ValueError(f"{c.name} declared in {self.constants[c.name].package} and {c.package}")
+            self.constants[c.name] = c
+        for name in self.constants:
+            self._link(name)
+
+    # ---- structure ----
+    def _parse(self, name: str):
+        c = self.constants[name]
+        try:
+            ast = parse_expression(c.expr)
+        except UnsupportedConstant as e:
+            ast = ("error", str(e))
+        width = None
+        m = _RANGE.match(c.type)
+        if m:
+            try:
+                width = (parse_expression(m.group(2)), parse_expression(m.group(4)))
+            except UnsupportedConstant:
+                width = None
+        return ast, width
+
+    def _function_names(self, fn: str, seen: Set[str]) -> Set[str]:
+        out = set()
+        if fn in self.functions and fn not in seen:
+            seen.add(fn)
+            f = self.functions[fn]
+            out.add(f.selector)
+            for choice, expr in f.branches:
+                if choice != "others":
+                    out.add(choice)
+                try:
+                    _names(parse_expression(expr), out)
+                except UnsupportedConstant:
+                    pass
+        elif fn in BUILTINS:
+            out.update(BUILTINS[fn][1])
+        return out
+
+    def _link(self, name: str):
+        ast, width = self._parse(name)
+        self._ast[name] = (ast, width)
+        names: Set[str] = set()
+        if ast[0] != "error":
+            _names(ast, names)
+        if width:
+            _names(width[0], names)
+            _names(width[1], names)
+        deps = set()
+        for n in names:
+            if n in self.constants:
+                deps.add(n)
+            else:
+                deps |= {d for d in self._function_names(n, set()) if d in self.constants}
+        for old in self.deps.get(name, ()):
+            self.dependents[old].discard(name)
+        self.deps[name] = deps
+        for d in deps:
+            self.dependents.setdefault(d, set()).add(name)
+
+    def transitive_dependents(self, name: str) -> Set[str]:
+        out, todo = set(), [name]
+        while todo:
+            for d in self.dependents.get(todo.pop(), ()):
+                if d not in out:
+                    out.add(d)
+                    todo.append(d)
+        return out
+
+    def transitive_deps(self, name: str) -> Set[str]:
+        out, todo = set(), [name]
+        while todo:
+            for d in self.deps.get(todo.pop(), ()):
+                if d not in out:
+                    out.add(d)
+                    todo.append(d)
+        return out
+
+    # ---- evaluation ----
+    def set(self, name: str, value: Union[Value, str]) -> Set[str]:
+        """Override a constant with a value or a VHDL expression; returns the invalidated constants."""
+        name = name.lower()
+        if name not in self.constants:
+            raise KeyError(name)
+        if isinstance(value, bool):
+            expr = "true" if value else "false"
+        elif isinstance(value, Bits):
+            expr = f"to_unsigned({value.value}, {value.width})"
+        else:
+            expr = str(value)
+        self.constants[name] = self.constants[name]._replace(expr=expr)
+        invalidated = {name} | self.transitive_dependents(name)
+        self._link(name)
+        invalidated |= self.transitive_dependents(name)
+        for n in invalidated:
+            self._cache.pop(n, None)
+            self._errors.pop(n, None)
+        return invalidated
+
+    def value(self, name: str) -> Value:
+        name = ALIASES.get(name.lower(), name.lower())
+        if name in self._cache:
+            return self._cache[name]
+        if name in self._errors:
+            raise self._errors[name]
+        if name not in self.constants:
+            raise KeyError(name)
+        # evaluate the missing dependencies first, deepest first, so the recursion stays shallow
+        for dep in self._topological(name):
+            if dep not in self._cache and dep not in self._errors:
+                self._evaluate(dep)
+        if name in self._errors:
+            raise self._errors[name]
+        return self._cache[name]
+
+    def _topological(self, name: str) -> List[str]:
+        order, state = [], {}
+        stack = [(name, False)]
+        while stack:
+            n, done = stack.pop()
+            if done:
+                state[n] = 2
+                order.append(n)
+                continue
+            if state.get(n) or n in self._cache or n in self._errors:
+                continue
+            state[n] = 1
+            stack.append((n, True))
+            for d in self.deps[n]:
+                if state.get(d) == 1:
+                    raise UnsupportedConstant(f"circular dependency between {n} and {d}")
+                if not state.get(d):
+                    stack.append((d, False))
+        return order
+
+    def _evaluate(self, name: str):
+        self.evaluations += 1
+        ast, width = self._ast[name]
+        try:
+            if ast[0] == "error":
+                raise UnsupportedConstant(ast[1])
+            value = self._eval(ast)
+            ctype = self.constants[name].type
+            if width is not None:
+                hi, lo = self._eval(width[0]), self._eval(width[1])
+                bits = abs(_to_int(hi) - _to_int(lo)) + 1
+                value = Bits(_to_int(value) % 2 ** bits, bits)
+            elif ctype == "integer":
+                if isinstance(value, float):
+                    raise UnsupportedConstant(f"real value {value} assigned to integer")
+                value = _to_int(value)
+            elif ctype == "boolean":
+                value = bool(value)
+            elif ctype == "real":
+                value = float(value)
+            elif ctype != "string":
+                raise UnsupportedConstant(f"type {ctype} is not supported")
+            self._cache[name] = value
+        except UnsupportedConstant as e:
+            self._errors[name] = UnsupportedConstant(f"{name}: {e}")
+        except (ArithmeticError, ValueError, TypeError) as e:
+            self._errors[name] = UnsupportedConstant(f"{name}: {type(e).__name__}: {e}")
+
+    def _eval(self, node):
+        kind = node[0]
+        if kind == "lit":
+            return node[1]
+        if kind == "name":
+            name = ALIASES.get(node[1], node[1])
+            if name in self.functions:
+                return self._call_case(self.functions[name])
+            if name not in self.constants:
+                raise UnsupportedConstant(f"unknown name {node[1]}")
+            return self.value(name)
+        if kind == "un":
+            v = self._eval(node[2])
+            return {"-": lambda: -_to_int(v) if isinstance(v, Bits) else -v, "+": lambda: v,
+                    "not": lambda: not v, "abs": lambda: abs(v)}[node[1]]()
+        if kind == "bin":
+            return _binary(node[1], self._eval(node[2]), self._eval(node[3]))
+        if kind == "attr":
+            prefix, attr = node[1], node[2]
+            if attr == "pos" and prefix == ("name", "boolean"):
+                raise UnsupportedConstant("boolean'pos without argument")
+            if attr == "length":
+                v = self._eval(prefix)
+                if not isinstance(v, Bits):
+                    raise UnsupportedConstant(f"'length of non-vector {prefix}")
+                return v.width
+            raise UnsupportedConstant(f"attribute '{attr}")
+        if kind == "call":
+            fn, args = node[1], [self._eval(a) for a in node[2]]
+            if fn[0] == "attr" and fn[1] == ("name", "boolean") and fn[2] == "pos":
+                return int(bool(args[0]))
+            if fn[0] == "name" and fn[1] in BUILTINS:
+                return BUILTINS[fn[1]][0](self, *args)
+            raise UnsupportedConstant(f"call of {fn}")
+        raise UnsupportedConstant(f"{kind} expressions")
+
+    def _call_case(self, f: Function) -> Value:
+        selector = self.value(f.selector)
+        for choice, expr in f.branches:
+            if choice == "others" or self.value(choice) == selector:
+                return self._eval(parse_expression(expr))
+        raise UnsupportedConstant(f"no case branch of {f.name} matches {selector}")
+
+    def evaluate_all(self) -> Dict[str, Union[Value, UnsupportedConstant]]:
+        res = {}
+        for name in self.constants:
+            try:
+                res[name] = self.value(name)
+            except UnsupportedConstant as e:
+                res[name] = e
+        return res
+
+
+def _package_files(packages: Iterable[str]) -> List[str]:
+    return [p if os.path.isabs(p) else os.path.join(PACKAGE_DIR, p) for p in packages]
+
+
+@lru_cache(maxsize=8)
+def _load(files: Tuple[str, ...], mtimes: Tuple[float, ...]) -> Tuple[List[Constant], List[Function]]:
+    constants, functions = [], []
+    for path in files:
+        with open(path) as f:
+            c, fn = parse_package(f.read(), os.path.splitext(os.path.basename(path))[0])
+        constants += c
+        functions += fn
+    return constants, functions
+
+
+def load(packages: Iterable[str] = DEFAULT_PACKAGES, **overrides) -> ConstantGraph:
+    """A fresh graph of the packages (parsed once per file version) with the given constants overridden."""
+    files = tuple(_package_files(packages))
+    constants, functions = _load(files, tuple(os.path.getmtime(f) for f in files))
+    graph = ConstantGraph(constants, functions)
+    for name, value in overrides.items():
+        graph.set(name, value)
+    return graph
+
+
+def _format(value) -> str:
+    if isinstance(value, Bits):
+        return f"{value.value} ({value.width} bits)"
+    if isinstance(value, UnsupportedConstant):
+        return f"unsupported: {value}"
+    return str(value)
+
+
+def _assignment(text: str) -> Tuple[str, str]:
+    name, _, value = text.partition("=")
+    if not value:
+        raise argparse.ArgumentTypeError(f"expected name=value, got {text}")
+    return name.strip(), value.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the VHDL constants packages")
+    parser.add_argument("names", nargs="*", help="constants to print")
+    parser.add_argument("--all", action="store_true", help="print every constant")
+    parser.add_argument("--set", type=_assignment, action="append", default=[], metavar="NAME=VALUE",
+                        help="override a constant with a VHDL expression, can be repeated")
+    parser.add_argument("--deps", action="store_true", help="also print the constants each name depends on")
+    parser.add_argument("--package", action="append", help=f"package files (default: {', '.join(DEFAULT_PACKAGES)})")
+    args = parser.parse_args()
+
+    graph = load(args.package or DEFAULT_PACKAGES)
+    invalidated = set()
+    for name, value in args.set:
+        invalidated |= graph.set(name, value)
+    names = list(graph.constants) if args.all or not args.names else [n.lower() for n in args.names]
+    for name in names:
+        try:
+            value = graph.value(name)
+        except UnsupportedConstant as e:
+            value = e
+        except KeyError:
+            parser.error(f"unknown constant {name}")
+        c = graph.constants[ALIASES.get(name, name)]
+        mark = "*" if name in invalidated else " "
+        print(f"{mark} {name:<52} {_format(value)}")
+        if args.deps:
+            print(f"    {c.package}.vhd:{c.line} depends on {', '.join(sorted(graph.transitive_deps(name))) or '-'}")
+    if args.set:
+        print(f"* = re-evaluated after --set ({len(invalidated)} of {len(graph.constants)} constants)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+----------------------------------------------------------------------------------
+-- Company:
+-- Engineer:
+--
+-- Create Date:
+-- Design Name:
+-- Module Name: arith_replay_tb - Behavioral
+-- Project Name:
+-- Target Devices:
+-- Tool Versions:
+-- Description: Replays the vector files written by
+--             python -m tfhe_model.arith_fuzz --stimulus <dir>
+--             (run from src/secondary_code) against big_mult, a_mod_p, ab_mod_p_plain and add_reduce.
+--             One vector per clock, expected values are delayed by the latency constants of constants_utils,
+--             so a wrong result and a wrong latency constant both show up as mismatch.
+--             The files must be generated for the same prime and configuration (modulo solution, karazuba).
+--
+-- Dependencies:
+--
+-- Revision:
+-- Revision 0.01 - File Created
+-- Additional Comments:
+--
+----------------------------------------------------------------------------------
+
+library IEEE;
+     use IEEE.STD_LOGIC_1164.all;
+     use IEEE.NUMERIC_STD.all;
+     use std.textio.all;
+library work;
+     use work.constants_utils.all;
+     use work.datatypes_utils.all;
+     use work.ntt_utils.all;
+
+entity arith_replay_tb is
+     generic (
+          stimulus_dir : string := "arith_stimulus/"
+     );
+end entity;
+
+architecture Behavioral of arith_replay_tb is
+
+     component big_mult is
+          port (
+               i_clk  : in  std_ulogic;
+               i_num0 : in  synthesiseable_uint;
+               i_num1 : in  synthesiseable_uint;
+               o_res  : out synthesiseable_udouble
+          );
+     end component;
+
+     component a_mod_p is
+          generic (
+               p : synthesiseable_uint
+          );
+          port (
+               i_clk     : in  std_ulogic;
+               i_num     : in  synthesiseable_udouble;
+               o_mod_res : out synthesiseable_uint
+          );
+     end component;
+
+     component ab_mod_p_plain is
+          generic (
+               p : synthesiseable_uint
+          );
+          port (
+               i_clk    : in  std_ulogic;
+               i_num0   : in  synthesiseable_uint;
+               i_num1   : in  synthesiseable_uint;
+               o_result : out synthesiseable_uint
+          );
+     end component;
+
+     component add_reduce is
+          generic (
+               substraction : boolean;
+               modulus      : synthesiseable_uint
+          );
+          port (
+               i_clk    : in  std_ulogic;
+               i_num0   : in  synthesiseable_uint;
+               i_num1   : in  synthesiseable_uint;
+               o_result : out synthesiseable_uint
+          );
+     end component;
+
+     constant TIME_DELTA : time := 10 ns;
+     constant clk_period : time := TIME_DELTA * 2;
+
+     type wait_registers_udouble is array (natural range <>) of synthesiseable_udouble;
+
+     -- skips '#' comment lines, found is false at the end of the file
+     procedure next_vector(
+               file stimulus : text;
+               variable l     : inout line;
+               variable found : out boolean
+          ) is
+     begin
+          found := false;
+          while not endfile(stimulus) loop
+               readline(stimulus, l);
+               if l'length > 0 and l(l'low) /= '#' then
+                    found := true;
+                    return;
+               end if;
+          end loop;
+     end procedure;
+
+     signal clk      : std_ulogic := '1';
+     signal finished : std_ulogic := '0';
+
+     signal mult_num0   : synthesiseable_uint := (others => '0');
+     signal mult_num1   : synthesiseable_uint := (others => '0');
+     signal mult_res    : synthesiseable_udouble;
+     signal mod_num     : synthesiseable_udouble := (others => '0');
+     signal mod_res     : synthesiseable_uint;
+     signal ab_num0     : synthesiseable_uint := (others => '0');
+     signal ab_num1     : synthesiseable_uint := (others => '0');
+     signal ab_res      : synthesiseable_uint;
+     signal add_num0    : synthesiseable_uint := (others => '0');
+     signal add_num1    : synthesiseable_uint := (others => '0');
+     signal add_res     : synthesiseable_uint;
+     signal sub_num0    : synthesiseable_uint := (others => '0');
+     signal sub_num1    : synthesiseable_uint := (others => '0');
+     signal sub_res     : synthesiseable_uint;
+
+     signal units_done   : std_ulogic_vector(0 to 5 - 1) := (others => '0');
+     signal units_passed : std_ulogic_vector(0 to 5 - 1) := (others => '0');
+
+begin
+     clk <= not clk after TIME_DELTA when finished /= '1' else '0';
+
+     mult_dut: big_mult
+          port map (
+               i_clk  => clk,
+               i_num0 => mult_num0,
+               i_num1 => mult_num1,
+               o_res  => mult_res
+          );
+
+     mod_dut: a_mod_p
+          generic map (
+               p => ntt_prime
+          )
+          port map (
+               i_clk     => clk,
+               i_num     => mod_num,
+               o_mod_res => mod_res
+          );
+
+     ab_dut: ab_mod_p_plain
+          generic map (
+               p => ntt_prime
+          )
+          port map (
+               i_clk    => clk,
+               i_num0   => ab_num0,
+               i_num1   => ab_num1,
+               o_result => ab_res
+          );
+
+     add_dut: add_reduce
+          generic map (
+               substraction => false,
+               modulus      => ntt_prime
+          )
+          port map (
+               i_clk    => clk,
+               i_num0   => add_num0,
+               i_num1   => add_num1,
+               o_result => add_res
+          );
+
+     sub_dut: add_reduce
+          generic map (
+               substraction => true,
+               modulus      => ntt_prime
+          )
+          port map (
+               i_clk    => clk,
+               i_num0   => sub_num0,
+               i_num1   => sub_num1,
+               o_result => sub_res
+          );
+
+     -- every replay process: read a vector, apply it, push its expected value into a queue of latency+1 entries
+     -- (the dut needs latency clocks, we see its register output one clock later) and compare what falls out
+     replay_big_mult: process
+          file stimulus      : text;
+          variable l         : line;
+          variable found     : boolean;
+          variable num0      : std_ulogic_vector(0 to synthesiseable_uint'length - 1);
+          variable num1      : std_ulogic_vector(0 to synthesiseable_uint'length - 1);
+          variable res       : std_ulogic_vector(0 to synthesiseable_udouble'length - 1);
+          variable expected  : wait_registers_udouble(0 to clks_per_64_bit_mult);
+          variable valid     : std_ulogic_vector(0 to clks_per_64_bit_mult) := (others => '0');
+          variable errors    : integer := 0;
+          variable checked   : integer := 0;
+     begin
+          file_open(stimulus, stimulus_dir & "big_mult.txt", read_mode);
+          loop
+               wait until rising_edge(clk);
+               if valid(valid'length - 1) = '1' then
+                    checked := checked + 1;
+                    if mult_res /= expected(expected'length - 1) then
+                         errors := errors + 1;
+                         report "big_mult vector " & integer'image(checked) & ": got " & to_hstring(mult_res) & ", expected " & to_hstring(expected(expected'length - 1)) severity error;
+                    end if;
+               end if;
+               expected(1 to expected'length - 1) := expected(0 to expected'length - 2);
+               valid(1 to valid'length - 1) := valid(0 to valid'length - 2);
+               next_vector(stimulus, l, found);
+               valid(0) := '0';
+               if found then
+                    hread(l, num0);
+                    hread(l, num1);
+                    hread(l, res);
+                    mult_num0 <= unsigned(num0);
+                    mult_num1 <= unsigned(num1);
+                    expected(0) := unsigned(res);
+                    valid(0) := '1';
+               end if;
+               exit when not found and valid = (valid'range => '0');
+          end loop;
+          file_close(stimulus);
+          report "big_mult: " & integer'image(checked) & " vectors, " & integer'image(errors) & " errors" severity note;
+          if errors = 0 then
+               units_passed(0) <= '1';
+          end if;
+          units_done(0) <= '1';
+          wait;
+     end process;
+
+     replay_a_mod_p: process
+          file stimulus      : text;
+          variable l         : line;
+          variable found     : boolean;
+          variable num       : std_ulogic_vector(0 to synthesiseable_udouble'length - 1);
+          variable res       : std_ulogic_vector(0 to synthesiseable_uint'length - 1);
+          variable expected  : wait_registers_uint(0 to clks_per_mod);
+          variable valid     : std_ulogic_vector(0 to clks_per_mod) := (others => '0');
+          variable errors    : integer := 0;
+          variable checked   : integer := 0;
+     begin
+          file_open(stimulus, stimulus_dir & "a_mod_p.txt", read_mode);
+          loop
+               wait until rising_edge(clk);
+               if valid(valid'length - 1) = '1' then
+                    checked := checked + 1;
+                    if mod_res /= expected(expected'length - 1) then
+                         errors := errors + 1;
+                         report "a_mod_p vector " & integer'image(checked) & ": got " & to_hstring(mod_res) & ", expected " & to_hstring(expected(expected'length - 1)) severity error;
+                    end if;
+               end if;
+               expected(1 to expected'length - 1) := expected(0 to expected'length - 2);
+               valid(1 to valid'length - 1) := valid(0 to valid'length - 2);
+               next_vector(stimulus, l, found);
+               valid(0) := '0';
+               if found then
+                    hread(l, num);
+                    hread(l, res);
+                    mod_num <= unsigned(num);
+                    expected(0) := unsigned(res);
+                    valid(0) := '1';
+               end if;
+               exit when not found and valid = (valid'range => '0');
+          end loop;
+          file_close(stimulus);
+          report "a_mod_p: " & integer'image(checked) & " vectors, " & integer'image(errors) & " errors" severity note;
+          if errors = 0 then
+               units_passed(1) <= '1';
+          end if;
+          units_done(1) <= '1';
+          wait;
+     end process;
+
+     replay_ab_mod_p: process
+          file stimulus      : text;
+          variable l         : line;
+          variable found     : boolean;
+          variable num0      : std_ulogic_vector(0 to synthesiseable_uint'length - 1);
+          variable num1      : std_ulogic_vector(0 to synthesiseable_uint'length - 1);
+          variable res       : std_ulogic_vector(0 to synthesiseable_uint'length - 1);
+          variable expected  : wait_registers_uint(0 to clks_per_mult_mod);
+          variable valid     : std_ulogic_vector(0 to clks_per_mult_mod) := (others => '0');
+          variable errors    : integer := 0;
+          variable checked   : integer := 0;
+     begin
+          file_open(stimulus, stimulus_dir & "ab_mod_p_plain.txt", read_mode);
+          loop
+               wait until rising_edge(clk);
+               if valid(valid'length - 1) = '1' then
+                    checked := checked + 1;
+                    if ab_res /= expected(expected'length - 1) then
+                         errors := errors + 1;
+                         report "ab_mod_p_plain vector " & integer'image(checked) & ": got " & to_hstring(ab_res) & ", expected " & to_hstring(expected(expected'length - 1)) severity error;
+                    end if;
+               end if;
+               expected(1 to expected'length - 1) := expected(0 to expected'length - 2);
+               valid(1 to valid'length - 1) := valid(0 to valid'length - 2);
+               next_vector(stimulus, l, found);
+               valid(0) := '0';
+               if found then
+                    hread(l, num0);
+                    hread(l, num1);
+                    hread(l, res);
+                    ab_num0 <= unsigned(num0);
+                    ab_num1 <= unsigned(num1);
+                    expected(0) := unsigned(res);
+                    valid(0) := '1';
+               end if;
+               exit when not found and valid = (valid'range => '0');
+          end loop;
+          file_close(stimulus);
+          report "ab_mod_p_plain: " & integer'image(checked) & " vectors, " & integer'image(errors) & " errors" severity note;
+          if errors = 0 then
+               units_passed(2) <= '1';
+          end if;
+          units_done(2) <= '1';
+          wait;
+     end process;
+
+     replay_add_reduce_add: process
+          file stimulus      : text;
+          variable l         : line;
+          variable found     : boolean;
+          variable num0      : std_ulogic_vector(0 to synthesiseable_uint'length - 1);
+          variable num1      : std_ulogic_vector(0 to synthesiseable_uint'length - 1);
+          variable res       : std_ulogic_vector(0 to synthesiseable_uint'length - 1);
+          variable expected  : wait_registers_uint(0 to clks_per_64_bit_add_mod);
+          variable valid     : std_ulogic_vector(0 to clks_per_64_bit_add_mod) := (others => '0');
+          variable errors    : integer := 0;
+          variable checked   : integer := 0;
+     begin
+          file_open(stimulus, stimulus_dir & "add_reduce_add.txt", read_mode);
+          loop
+               wait until rising_edge(clk);
+               if valid(valid'length - 1) = '1' then
+                    checked := checked + 1;
+                    if add_res /= expected(expected'length - 1) then
+                         errors := errors + 1;
+                         report "add_reduce (add) vector " & integer'image(checked) & ": got " & to_hstring(add_res) & ", expected " & to_hstring(expected(expected'length - 1)) severity error;
+                    end if;
+               end if;
+               expected(1 to expected'length - 1) := expected(0 to expected'length - 2);
+               valid(1 to valid'length - 1) := valid(0 to valid'length - 2);
+               next_vector(stimulus, l, found);
+               valid(0) := '0';
+               if found then
+                    hread(l, num0);
+                    hread(l, num1);
+                    hread(l, res);
+                    add_num0 <= unsigned(num0);
+                    add_num1 <= unsigned(num1);
+                    expected(0) := unsigned(res);
+                    valid(0) := '1';
+               end if;
+               exit when not found and valid = (valid'range => '0');
+          end loop;
+          file_close(stimulus);
+          report "add_reduce (add): " & integer'image(checked) & " vectors, " & integer'image(errors) & " errors" severity note;
+          if errors = 0 then
+               units_passed(3) <= '1';
+          end if;
+          units_done(3) <= '1';
+          wait;
+     end process;
+
+     replay_add_reduce_sub: process
+          file stimulus      : text;
+          variable l         : line;
+          variable found     : boolean;
+          variable num0      : std_ulogic_vector(0 to synthesiseable_uint'length - 1);
+          variable num1      : std_ulogic_vector(0 to synthesiseable_uint'length - 1);
+          variable res       : std_ulogic_vector(0 to synthesiseable_uint'length - 1);
+          variable expected  : wait_registers_uint(0 to clks_per_64_bit_add_mod);
+          variable valid     : std_ulogic_vector(0 to clks_per_64_bit_add_mod) := (others => '0');
+          variable errors    : integer := 0;
+          variable checked   : integer := 0;
+     begin
+          file_open(stimulus, stimulus_dir & "add_reduce_sub.txt", read_mode);
+          loop
+               wait until rising_edge(clk);
+               if valid(valid'length - 1) = '1' then
+                    checked := checked + 1;
+                    if sub_res /= expected(expected'length - 1) then
+                         errors := errors + 1;
+                         report "add_reduce (sub) vector " & integer'image(checked) & ": got " & to_hstring(sub_res) & ", expected " & to_hstring(expected(expected'length - 1)) severity error;
+                    end if;
+               end if;
+               expected(1 to expected'length - 1) := expected(0 to expected'length - 2);
+               valid(1 to valid'length - 1) := valid(0 to valid'length - 2);
+               next_vector(stimulus, l, found);
+               valid(0) := '0';
+               if found then
+                    hread(l, num0);
+                    hread(l, num1);
+                    hread(l, res);
+                    sub_num0 <= unsigned(num0);
+                    sub_num1 <= unsigned(num1);
+                    expected(0) := unsigned(res);
+                    valid(0) := '1';
+               end if;
+               exit when not found and valid = (valid'range => '0');
+          end loop;
+          file_close(stimulus);
+          report "add_reduce (sub): " & integer'image(checked) & " vectors, " & integer'image(errors) & " errors" severity note;
+          if errors = 0 then
+               units_passed(4) <= '1';
+          end if;
+          units_done(4) <= '1';
+          wait;
+     end process;
+
+     resumee: process
+     begin
+          wait until units_done = (units_done'range => '1');
+          assert units_passed = (units_passed'range => '1') report "Testbench found errors in the arithmetic units" severity error;
+          assert units_passed /= (units_passed'range => '1') report "All arithmetic replays passed" severity note;
+          finished <= '1';
+          wait;
+     end process;
+
+end architecture;
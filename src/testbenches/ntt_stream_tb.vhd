@@ -0,0 +1,213 @@
+----------------------------------------------------------------------------------
+-- Company: 
+-- Engineer: 
+-- 
+-- Create Date: 
+-- Design Name: 
+-- Module Name: ntt_stream_tb - Behavioral
+-- Project Name: 
+-- Target Devices: 
+-- Tool Versions: 
+-- Description: Replays the block streams written by
+--             python -m tfhe_model.stimulus --polys <n> --out <dir>
+--             (run from src/secondary_code) through the ntt and the intt, one block per clock, with the
+--             same reset and input timing as ntt_tb. ntt_in is the stimulus and ntt_out the expected result
+--             of the ntt; the intt gets ntt_out and must return ntt_in. The streams must be generated for
+--             the same prime, log2_num_coefficients and throughput as the constants packages.
+--             The expected blocks use the roots of ntt_params.vhd, as ntt_utils.vhd does; streams written
+--             with --solver-roots will not match. Not yet run on a simulator.
+-- 
+-- Dependencies: 
+-- 
+-- Revision:
+-- Revision 0.01 - File Created
+-- Additional Comments:
+-- 
+----------------------------------------------------------------------------------
+
+library IEEE;
+     use IEEE.STD_LOGIC_1164.all;
+     use IEEE.NUMERIC_STD.all;
+     use std.textio.all;
+library work;
+     use work.constants_utils.all;
+     use work.datatypes_utils.all;
+     use work.math_utils.all;
+     use work.ntt_utils.all;
+     use work.tb_utils.all;
+
+entity ntt_stream_tb is
+     generic (
+          stream_dir : string := "ntt_stream/"
+     );
+end entity;
+
+architecture Behavioral of ntt_stream_tb is
+
+     component ntt is
+          generic (
+               throughput                : integer;
+               ntt_params                : ntt_params_with_precomputed_values;
+               invers                    : boolean;
+               intt_no_final_reduction   : boolean;
+               no_first_last_stage_logic : boolean
+          );
+          port (
+               i_clk               : in  std_ulogic;
+               i_reset             : in  std_ulogic; -- reset must be 1 for at least ram_retiming_latency tics to set up the twiddle factors!
+               i_sub_polym         : in  sub_polynom(0 to throughput - 1);
+               o_result            : out sub_polynom(0 to throughput - 1);
+               o_next_module_reset : out std_ulogic
+          );
+     end component;
+
+     constant TIME_DELTA : time := 10 ns;
+     constant clk_period : time := TIME_DELTA * 2;
+
+     constant throughput       : integer := 2 ** log2_ntt_throughput;
+     constant ntt_mixed_format : boolean := true;
+
+     -- clocks after the last input block until its result must have been compared
+     constant drain_clks : integer := get_ntt_latency(ntt_params.log2_num_coeffs, log2_ntt_throughput, ntt_params.negacyclic, false, true, false) + 2 * num_coefficients / throughput + counter_buffer_len;
+
+     signal clk      : std_ulogic := '1';
+     signal finished : std_ulogic := '0';
+
+     signal ntt_reset             : std_ulogic := '1';
+     signal intt_reset            : std_ulogic := '1';
+     signal ntt_input             : sub_polynom(0 to throughput - 1) := (others => (others => '0'));
+     signal intt_input            : sub_polynom(0 to throughput - 1) := (others => (others => '0'));
+     signal ntt_result            : sub_polynom(0 to throughput - 1);
+     signal intt_result           : sub_polynom(0 to throughput - 1);
+     signal ntt_output_not_ready  : std_ulogic_vector(0 to counter_buffer_len - 1);
+     signal intt_output_not_ready : std_ulogic_vector(0 to counter_buffer_len - 1);
+
+     signal ntt_done    : std_ulogic := '0';
+     signal intt_done   : std_ulogic := '0';
+     signal ntt_passed  : boolean    := false;
+     signal intt_passed : boolean    := false;
+
+     -- feeds stimulus blocks after the reset sequence of ntt_tb and compares every valid output block
+     procedure replay(
+               signal clk             : in  std_ulogic;
+               signal reset           : out std_ulogic;
+               signal input           : out sub_polynom;
+               signal result          : in  sub_polynom;
+               signal not_ready       : in  std_ulogic_vector;
+               constant stimulus_name : in  string;
+               constant response_name : in  string;
+               variable passed        : out boolean
+          ) is
+          file stimulus  : text;
+          file response  : text;
+          variable stim  : block_stream := new_block_stream;
+          variable resp  : block_stream := new_block_stream;
+          variable blk   : sub_polynom(0 to throughput - 1);
+          variable valid : boolean;
+          variable cycle : integer      := 0;
+          variable drain : integer      := 0;
+     begin
+          -- it takes a few cycles for the reset to propagate through the ntt
+          wait until not_ready(not_ready'low) = '1';
+          wait until rising_edge(clk);
+          reset <= '0';
+          -- drop reset early
+          for i in 0 to ntt_num_clks_reset_early - 2 loop
+               wait until rising_edge(clk);
+          end loop;
+          loop
+               wait until rising_edge(clk);
+               cycle := cycle + 1;
+               if not_ready(not_ready'high) = '0' and resp.blocks < stim.blocks then
+                    stream_compare_block(response, resp, response_name, result, cycle);
+               end if;
+               stream_read_block(stimulus, stim, stimulus_name, blk, valid);
+               if valid then
+                    input <= blk;
+               else
+                    input <= (others => (others => '0'));
+                    drain := drain + 1;
+               end if;
+               exit when stim.done and resp.blocks = stim.blocks;
+               if drain > drain_clks then
+                    report response_name & ": only " & integer'image(resp.blocks) & " of " & integer'image(stim.blocks) & " result blocks arrived" severity error;
+                    exit;
+               end if;
+          end loop;
+          passed := stream_passed(resp, response_name) and resp.blocks = stim.blocks;
+     end procedure;
+
+begin
+     clk <= not clk after TIME_DELTA when finished /= '1' else '0';
+
+     dut: ntt
+          generic map (
+               throughput                => throughput,
+               ntt_params                => ntt_params,
+               invers                    => false,
+               intt_no_final_reduction   => false,
+               no_first_last_stage_logic => ntt_mixed_format
+          )
+          port map (
+               i_clk               => clk,
+               i_reset             => ntt_reset,
+               i_sub_polym         => ntt_input,
+               o_result            => ntt_result,
+               o_next_module_reset => ntt_output_not_ready(0)
+          );
+
+     idut: ntt
+          generic map (
+               throughput                => throughput,
+               ntt_params                => ntt_params,
+               invers                    => true,
+               intt_no_final_reduction   => false,
+               no_first_last_stage_logic => ntt_mixed_format
+          )
+          port map (
+               i_clk               => clk,
+               i_reset             => intt_reset,
+               i_sub_polym         => intt_input,
+               o_result            => intt_result,
+               o_next_module_reset => intt_output_not_ready(0)
+          );
+
+     process (clk)
+     begin
+          if rising_edge(clk) then
+               ntt_output_not_ready(1 to ntt_output_not_ready'length - 1) <= ntt_output_not_ready(0 to ntt_output_not_ready'length - 2);
+               intt_output_not_ready(1 to intt_output_not_ready'length - 1) <= intt_output_not_ready(0 to intt_output_not_ready'length - 2);
+          end if;
+     end process;
+
+     replay_ntt: process
+          variable passed : boolean;
+     begin
+          replay(clk, ntt_reset, ntt_input, ntt_result, ntt_output_not_ready, stream_dir & "ntt_in", stream_dir & "ntt_out", passed);
+          ntt_passed <= passed;
+          ntt_done <= '1';
+          wait;
+     end process;
+
+     replay_intt: process
+          variable passed : boolean;
+     begin
+          replay(clk, intt_reset, intt_input, intt_result, intt_output_not_ready, stream_dir & "ntt_out", stream_dir & "ntt_in", passed);
+          intt_passed <= passed;
+          intt_done <= '1';
+          wait;
+     end process;
+
+     resumee: process
+     begin
+          wait until ntt_done = '1' and intt_done = '1';
+
+          assert ntt_passed report "Testbench found errors in ntt" severity error;
+          assert intt_passed report "Testbench found errors in intt" severity error;
+
+          assert not (ntt_passed and intt_passed) report "All ntt stream tests passed" severity note;
+          finished <= '1';
+          wait;
+     end process;
+
+end architecture;